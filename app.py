@@ -1,12 +1,12 @@
-from flask import Flask, render_template, jsonify, request, send_from_directory, Response
+from flask import Flask, render_template, jsonify, request, send_from_directory, Response, g, stream_with_context
 from flask_cors import CORS
+from werkzeug.local import LocalProxy
 import pandas as pd
 import os
 import time
 import random
 import socket
 import random
-from threading import Thread
 import traceback
 import sys
 import json
@@ -16,6 +16,7 @@ import shutil
 from pathlib import Path
 from datetime import datetime
 import difflib
+import uuid
 
 project_root = Path(__file__).parent.parent  # 根据实际结构调整
 sys.path.append("ChartPipeline")
@@ -27,6 +28,8 @@ from chart_modules.process import conduct_reference_finding, conduct_layout_extr
 from chart_modules.style_refinement import process_final_export, direct_generate_with_ai, svg_to_png, check_material_cache
 from chart_modules.ChartPipeline.modules.infographics_generator.template_utils import block_list
 from chart_modules.ChartPipeline.modules.chart_type_recommender.chart_type_recommender import recommend_chart_types_with_llm
+from chart_modules.state_store import create_state_store, SessionState, StateConflictError
+from chart_modules.job_scheduler import get_job_scheduler
 
 
 app = Flask(__name__)
@@ -40,43 +43,64 @@ try:
 except Exception as e:
     print(f"Warning: Could not load parsed_variations.json: {e}")
 
-# 存储生成状态
-generation_status = {
-    'step': 'idle',
-    'status': 'idle',
-    'progress': '',
-    'completed': False,
-    'style': {},
-    'selected_data': '',
-    'selected_pictogram': '',
-    'selected_title': '',  # 添加选中的标题信息
-    "extraction_templates" : [],
-    'id': ''
-}
-
-# 分页状态（不需要持久化）
-reference_page = 0
-
-CACHE_FILE = "generation_status_cache.json"
+# 生成状态的初始值（每个会话一份）
+def default_generation_status():
+    return {
+        'step': 'idle',
+        'status': 'idle',
+        'progress': '',
+        'completed': False,
+        'style': {},
+        'selected_data': '',
+        'selected_pictogram': '',
+        'selected_title': '',  # 添加选中的标题信息
+        "extraction_templates" : [],
+        'reference_page': 0,  # 参考图分页
+        'id': ''
+    }
+
+def session_has_active_jobs(session_id):
+    """会话是否还有未结束的后台任务（有任务时空闲会话不从内存中移除）"""
+    return any(not job.done() for job in job_scheduler.list_jobs(session_id))
+
+# 按会话隔离的状态存储（默认持久化到 SQLite，只写入变化的 key；空闲会话写回后从内存中移除）
+state_store = create_state_store(default_generation_status, in_use=session_has_active_jobs)
+
+SESSION_COOKIE = "chartgalaxy_session"
+
+def get_session_id():
+    """当前请求的会话 ID：优先使用 cookie，其次是 X-Session-Id 请求头，都没有时新建"""
+    session_id = getattr(g, 'session_id', None)
+    if session_id:
+        return session_id
+    session_id = request.cookies.get(SESSION_COOKIE) or request.headers.get('X-Session-Id')
+    if not session_id:
+        session_id = uuid.uuid4().hex
+        g.new_session_id = session_id
+    g.session_id = session_id
+    return session_id
+
+@app.after_request
+def set_session_cookie(response):
+    new_session_id = getattr(g, 'new_session_id', None)
+    if new_session_id:
+        response.set_cookie(SESSION_COOKIE, new_session_id, max_age=30 * 24 * 3600, samesite='Lax')
+    return response
+
+def get_generation_status():
+    """当前请求所属会话的 generation_status"""
+    return state_store.get(get_session_id())
+
+# 路由中的 generation_status 指向当前会话的状态；后台线程需传入 _get_current_object() 得到的实际对象
+generation_status = LocalProxy(get_generation_status)
 
 def load_generation_status():
-    """每次读取最新的 generation_status（如果文件不存在，则写入初始值）"""
-    global generation_status
-    if os.path.exists(CACHE_FILE):
-        try:
-            with open(CACHE_FILE, "r", encoding="utf-8") as f:
-                generation_status = json.load(f)
-        except:
-            pass
-    else:
-        # 第一次运行自动写入
-        save_generation_status()
+    """获取当前会话的 generation_status（状态常驻内存，首次访问时从存储后端加载）"""
+    return generation_status._get_current_object()
 
-def save_generation_status():
-    """每次更新 generation_status 都保存到 cache 中"""
-    global generation_status
-    with open(CACHE_FILE, "w", encoding="utf-8") as f:
-        json.dump(generation_status, f, indent=2, ensure_ascii=False)
+def save_generation_status(state=None, full_check=False):
+    """将会话状态中变化的 key 写回存储后端"""
+    state_store.flush(state if state is not None else generation_status._get_current_object(), full_check=full_check)
 
 def threaded_task(task_fn, *args):
     """
@@ -84,11 +108,28 @@ def threaded_task(task_fn, *args):
     1) 先执行任务函数
     2) 任务函数结束之后保存 generation_status
     """
-    global generation_status
     try:
         task_fn(*args)
     finally:
-        save_generation_status()   # 👈 线程结束后更新 cache
+        for arg in args:
+            if isinstance(arg, SessionState):
+                save_generation_status(arg, full_check=True)   # 👈 线程结束后写回变化的 key
+
+job_scheduler = get_job_scheduler()
+
+def start_session_task(task_fn, *args):
+    """
+    在 task 线程池中为当前会话启动后台任务（替代直接创建 Thread）。
+    同一会话中参数相同且尚未结束的任务只会运行一次，重复请求返回已有任务。
+
+    Returns:
+        Job
+    """
+    session_id = get_session_id()
+    dedup_args = [arg for arg in args if not isinstance(arg, SessionState)]
+    dedup_key = (session_id, task_fn.__name__, json.dumps(dedup_args, sort_keys=True, default=str))
+    return job_scheduler.submit(threaded_task, task_fn, *args, resource='task', name=task_fn.__name__,
+                                dedup_key=dedup_key, session_id=session_id)
 
 
 @app.route('/authoring/generate_final')
@@ -176,7 +217,7 @@ def generate_chart():
         output_path = f"buffer/{generation_status['id']}/{charttype}.svg"
         print("generate_variation:", charttype, chart_template, generation_status['style']["colors"], generation_status['style']["bg_color"])
 
-        svg = generate_variation(
+        result = generate_variation(
             input = f"processed_data/{datafile}.json",
             output = output_path,
             chart_template = chart_template,
@@ -184,14 +225,7 @@ def generate_chart():
             bg_color = generation_status['style']["bg_color"]
         )
 
-        # generate_variation now also generates a PNG file at output_path.replace('.svg', '.png')
-        png_filename = f"{charttype}.png"
-        png_url = f"/currentfilepath/{png_filename}"
-
-        with open(output_path, 'r', encoding='utf-8') as file:
-            svg = file.read()
-
-        if svg is None:
+        if not result:
             return jsonify({'error': 'no result'}), 401
 
         # 获取背景色并转换为 hex 格式
@@ -201,9 +235,11 @@ def generate_chart():
         else:
             bg_hex = "#f5f3ef"
 
-        # 将 SVG 转换为 PNG，使用透明背景
-        png_output_path = output_path.replace('.svg', '.png')
-        svg_to_png(svg, png_output_path, background_color=None)
+        # generate_variation 已经生成了透明背景的 PNG，转换失败时再补一次
+        png_output_path = result.png_path
+        if png_output_path is None:
+            png_output_path = output_path.replace('.svg', '.png')
+            svg_to_png(result.svg, png_output_path, background_color=None)
 
         # 将 PNG 转换为 base64
         chart_base64 = image_to_base64(png_output_path)
@@ -249,7 +285,7 @@ def get_data(datafile):
 @app.route('/api/start_find_reference/<datafile>')
 def start_find_reference(datafile):
     # 寻找适配的variation
-    global generation_status, reference_page
+    global generation_status
     load_generation_status()
 
     generation_status["selected_data"] = f'processed_data/{datafile.replace("csv","json")}'
@@ -268,15 +304,13 @@ def start_find_reference(datafile):
     generation_status['selected_chart_type'] = ''
     generation_status['extraction_templates'] = None
     generation_status['available_chart_types'] = None
+    # 重置 reference 分页
+    generation_status['reference_page'] = 0
     save_generation_status()
 
-    # 重置 reference 分页（内存变量）
-    reference_page = 0
-
     # 启动布局抽取线程
-    thread = Thread(target = threaded_task, args=(conduct_reference_finding, datafile, generation_status,))
-    thread.start()
-    return jsonify({'status': 'started'})
+    job = start_session_task(conduct_reference_finding, datafile, generation_status._get_current_object())
+    return jsonify({'status': 'started', 'job_id': job.id})
 
 @app.route('/api/start_layout_extraction/<reference>/<datafile>')
 def start_layout_extraction(reference, datafile):
@@ -287,10 +321,9 @@ def start_layout_extraction(reference, datafile):
     app.logger.debug(generation_status)
     
     # 启动布局抽取线程
-    thread = Thread(target=threaded_task, args=(conduct_layout_extraction, reference, datafile, generation_status,))
-    thread.start()
+    job = start_session_task(conduct_layout_extraction, reference, datafile, generation_status._get_current_object())
 
-    return jsonify({'status': 'started'})
+    return jsonify({'status': 'started', 'job_id': job.id})
 
 @app.route('/api/start_title_generation/<datafile>')
 def start_title_generation(datafile):
@@ -300,10 +333,9 @@ def start_title_generation(datafile):
     # 需要开始保存生成的结果，创建一个ID
     
     # 启动布局抽取线程
-    thread = Thread(target=threaded_task, args=(conduct_title_generation, datafile,generation_status,))
-    thread.start()
+    job = start_session_task(conduct_title_generation, datafile, generation_status._get_current_object())
     
-    return jsonify({'status': 'started'})
+    return jsonify({'status': 'started', 'job_id': job.id})
 
 @app.route('/api/start_pictogram_generation/<title>')
 def start_pictogram_generation(title):
@@ -312,10 +344,9 @@ def start_pictogram_generation(title):
     app.logger.debug(f"title_text:{title}")
 
     # 启动配图生成线程
-    thread = Thread(target=threaded_task, args=(conduct_pictogram_generation, title, generation_status,))
-    thread.start()
+    job = start_session_task(conduct_pictogram_generation, title, generation_status._get_current_object())
 
-    return jsonify({'status': 'started'})
+    return jsonify({'status': 'started', 'job_id': job.id})
 
 @app.route('/api/regenerate_title/<datafile>')
 def regenerate_title(datafile):
@@ -324,10 +355,9 @@ def regenerate_title(datafile):
     load_generation_status()
 
     # 启动标题重新生成线程，use_cache=False 强制重新生成
-    thread = Thread(target=threaded_task, args=(conduct_title_generation, datafile, generation_status, False))
-    thread.start()
+    job = start_session_task(conduct_title_generation, datafile, generation_status._get_current_object(), False)
 
-    return jsonify({'status': 'started'})
+    return jsonify({'status': 'started', 'job_id': job.id})
 
 @app.route('/api/regenerate_pictogram/<title>')
 def regenerate_pictogram(title):
@@ -336,10 +366,9 @@ def regenerate_pictogram(title):
     load_generation_status()
 
     # 启动配图重新生成线程，use_cache=False 强制重新生成
-    thread = Thread(target=threaded_task, args=(conduct_pictogram_generation, title, generation_status, False))
-    thread.start()
+    job = start_session_task(conduct_pictogram_generation, title, generation_status._get_current_object(), False)
 
-    return jsonify({'status': 'started'})
+    return jsonify({'status': 'started', 'job_id': job.id})
 
 # @app.route('/api/generate_final/<filename>')
 # def generate_final_infographic(filename):
@@ -367,7 +396,95 @@ def regenerate_pictogram(title):
 def get_status():
     # Do NOT load from file here, as it might overwrite in-memory progress updates from running threads
     # load_generation_status()
-    return jsonify(generation_status)
+    return jsonify(dict(generation_status))
+
+# 推送流中不随增量事件下发值的大字段（客户端按需通过对应接口获取）
+STREAM_OMITTED_KEYS = {'extraction_templates'}
+# 状态 key -> 推送事件类型，其余 key 作为 artifact 事件
+STREAM_EVENT_TYPES = {'step': 'step', 'status': 'progress', 'progress': 'progress', 'completed': 'completed'}
+STREAM_HEARTBEAT_INTERVAL = 15
+
+def _sse_event(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+@app.route('/api/status/stream')
+def stream_status():
+    """
+    以 Server-Sent Events 推送当前会话的生成状态：
+    连接时先发送一次 snapshot（不含 STREAM_OMITTED_KEYS），之后只推送变化的 key：
+    step / progress / completed / artifact 事件，data 为 {"version", "key", "value"}
+    """
+    state = generation_status._get_current_object()
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    since_version = int(last_event_id) if last_event_id.isdigit() else None
+
+    def snapshot_event():
+        with state.lock:
+            version = state.version
+            data = {key: value for key, value in state.items() if key not in STREAM_OMITTED_KEYS}
+        return version, _sse_event('snapshot', {'version': version, 'state': data}, version)
+
+    def generate():
+        version = since_version
+        if version is None or version > state.version:
+            version, event = snapshot_event()
+            yield event
+        while True:
+            changes = state.wait_for_changes(version, timeout=STREAM_HEARTBEAT_INTERVAL)
+            if changes is None:
+                # 落后太多，变更日志已被覆盖：重新发送快照
+                version, event = snapshot_event()
+                yield event
+                continue
+            new_version, keys = changes
+            if not keys:
+                yield ": keepalive\n\n"
+                continue
+            events = []
+            with state.lock:
+                for key in keys:
+                    data = {'version': state.version_of(key) or new_version, 'key': key}
+                    if key not in state:
+                        data['deleted'] = True
+                    elif key in STREAM_OMITTED_KEYS:
+                        data['omitted'] = True
+                    else:
+                        data['value'] = state[key]
+                    events.append(_sse_event(STREAM_EVENT_TYPES.get(key, 'artifact'), data, new_version))
+            version = new_version
+            yield "".join(events)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/jobs')
+def list_jobs():
+    """当前会话的后台任务列表"""
+    return jsonify({'jobs': [job.to_dict() for job in job_scheduler.list_jobs(get_session_id())]})
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """查询后台任务状态"""
+    job = job_scheduler.get(job_id)
+    if job is None or (job.session_id and job.session_id != get_session_id()):
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """取消后台任务（排队中的任务直接取消，运行中的任务在下一个检查点退出）"""
+    job = job_scheduler.get(job_id)
+    if job is None or (job.session_id and job.session_id != get_session_id()):
+        return jsonify({'error': '任务不存在'}), 404
+    cancelled = job_scheduler.cancel(job_id)
+    return jsonify({'cancelled': cancelled, 'job': job.to_dict()})
 
 @app.route('/api/layout')
 def get_layout():
@@ -669,10 +786,9 @@ def generate_chart_type_previews():
     print(f"[DEBUG API] extraction_templates 数量: {len(generation_status.get('extraction_templates', []))}")
 
     # 启动预览生成线程
-    thread = Thread(target=threaded_task, args=(conduct_chart_type_preview_generation, current_page_types, generation_status,))
-    thread.start()
+    job = start_session_task(conduct_chart_type_preview_generation, current_page_types, generation_status._get_current_object())
 
-    return jsonify({'status': 'started', 'chart_types': current_page_types})
+    return jsonify({'status': 'started', 'job_id': job.id, 'chart_types': current_page_types})
 
 @app.route('/api/chart_types/next')
 def get_next_chart_types():
@@ -681,14 +797,19 @@ def get_next_chart_types():
     load_generation_status()
 
     chart_types = generation_status.get('available_chart_types', [])
+    page_version = generation_status.version_of('chart_type_page')
     page = generation_status.get('chart_type_page', 0)
     page_size = 3
     total_pages = (len(chart_types) + page_size - 1) // page_size
 
     # 加载下一页（不循环，如果已经到最后一页则不再加载）
     if (page + 1) < total_pages:
-        generation_status['chart_type_page'] = page + 1
-        save_generation_status()
+        try:
+            generation_status.set('chart_type_page', page + 1, expected_version=page_version)
+            save_generation_status()
+        except StateConflictError:
+            # 同一会话的并发请求已经翻过页，不再重复翻页
+            pass
 
     return get_chart_types()
 
@@ -830,10 +951,9 @@ def generate_variation_previews():
         variations_to_generate = variations[start_idx:end_idx]
 
     # 启动预览生成线程
-    thread = Thread(target=threaded_task, args=(conduct_variation_preview_generation, variations_to_generate, generation_status,))
-    thread.start()
+    job = start_session_task(conduct_variation_preview_generation, variations_to_generate, generation_status._get_current_object())
 
-    return jsonify({'status': 'started', 'variations': variations_to_generate, 'total': len(variations_to_generate)})
+    return jsonify({'status': 'started', 'job_id': job.id, 'variations': variations_to_generate, 'total': len(variations_to_generate)})
 
 @app.route('/api/variations/next')
 def get_next_variations():
@@ -842,14 +962,19 @@ def get_next_variations():
     load_generation_status()
 
     variations = generation_status.get('available_variations', [])
+    page_version = generation_status.version_of('variation_page')
     page = generation_status.get('variation_page', 0)
     page_size = 3
     total_pages = (len(variations) + page_size - 1) // page_size
 
     # 加载下一页（不循环，如果已经到最后一页则不再加载）
     if (page + 1) < total_pages:
-        generation_status['variation_page'] = page + 1
-        save_generation_status()
+        try:
+            generation_status.set('variation_page', page + 1, expected_version=page_version)
+            save_generation_status()
+        except StateConflictError:
+            # 同一会话的并发请求已经翻过页，不再重复翻页
+            pass
 
     return get_variations()
 
@@ -863,7 +988,7 @@ def get_extraction_templates():
 @app.route('/api/references')
 def get_references():
     """获取参考图：基于主题相似性排序，支持分页（首次返回5张，可加载更多）"""
-    global generation_status, reference_page
+    global generation_status
     load_generation_status()
 
     # 获取当前用户的数据文件
@@ -871,7 +996,7 @@ def get_references():
     datafile = selected_data.replace('processed_data/', '').replace('.json', '.csv') if selected_data else ''
 
     # 获取分页参数
-    page = reference_page
+    page = generation_status.get('reference_page', 0)
     page_size = 3
 
     if datafile:
@@ -910,7 +1035,7 @@ def get_references():
 @app.route('/api/references/next')
 def get_next_references():
     """获取下一批参考图（加载更多功能）"""
-    global generation_status, reference_page
+    global generation_status
     load_generation_status()
 
     # 获取当前数据文件
@@ -922,13 +1047,14 @@ def get_next_references():
     else:
         return jsonify({'status': 'error', 'message': 'No data file selected'}), 400
 
-    page = reference_page
+    page = generation_status.get('reference_page', 0)
     page_size = 3
     total_pages = (len(sorted_images) + page_size - 1) // page_size
 
     # 加载下一页（不循环）
     if (page + 1) < total_pages:
-        reference_page = page + 1
+        generation_status['reference_page'] = page + 1
+        save_generation_status()
 
     return get_references()
 
@@ -1031,20 +1157,22 @@ def export_final():
                 materials['variation'] = v['name']
                 break
 
-        # 启动后台线程处理导出
+        # 启动后台线程处理导出（线程中没有请求上下文，使用当前会话的状态对象）
+        state = generation_status._get_current_object()
+
         def export_task():
             try:
-                generation_status['step'] = 'final_export'
-                generation_status['status'] = 'processing'
+                state['step'] = 'final_export'
+                state['status'] = 'processing'
 
                 # 根据是否强制重新生成设置不同的提示
                 if force_regenerate:
-                    generation_status['progress'] = '正在AI精修...'
+                    state['progress'] = '正在AI精修...'
                 else:
-                    generation_status['progress'] = '正在加载...'
+                    state['progress'] = '正在加载...'
 
-                generation_status['completed'] = False
-                save_generation_status()
+                state['completed'] = False
+                save_generation_status(state)
 
                 # 处理导出
                 result = process_final_export(
@@ -1057,34 +1185,34 @@ def export_final():
                 )
 
                 if result['success']:
-                    generation_status['status'] = 'completed'
+                    state['status'] = 'completed'
                     if result.get('from_cache'):
-                        generation_status['progress'] = f"加载完成！（版本{result.get('version', 1)}）"
+                        state['progress'] = f"加载完成！（版本{result.get('version', 1)}）"
                     else:
                         # 获取新版本号
                         cache_info = result.get('cache_info', {})
                         version = cache_info.get('version', 1)
-                        generation_status['progress'] = f"AI精修完成！（版本{version}）"
-                    generation_status['final_image_path'] = result['image_path']
+                        state['progress'] = f"AI精修完成！（版本{version}）"
+                    state['final_image_path'] = result['image_path']
                 else:
-                    generation_status['status'] = 'error'
-                    generation_status['progress'] = result.get('error', '导出失败')
+                    state['status'] = 'error'
+                    state['progress'] = result.get('error', '导出失败')
 
-                generation_status['completed'] = True
-                save_generation_status()
+                state['completed'] = True
+                save_generation_status(state)
 
             except Exception as e:
-                generation_status['status'] = 'error'
-                generation_status['progress'] = str(e)
-                generation_status['completed'] = True
-                save_generation_status()
+                state['status'] = 'error'
+                state['progress'] = str(e)
+                state['completed'] = True
+                save_generation_status(state)
                 print(f"导出任务出错: {e}")
                 traceback.print_exc()
 
-        thread = Thread(target=export_task)
-        thread.start()
+        job = job_scheduler.submit(export_task, resource='task', name='final_export',
+                                   dedup_key=(get_session_id(), 'final_export'), session_id=get_session_id())
 
-        return jsonify({'status': 'started'})
+        return jsonify({'status': 'started', 'job_id': job.id})
 
     except Exception as e:
         print(f"导出 API 出错: {e}")
@@ -1,6 +1,6 @@
 import os
+import asyncio
 import pandas as pd
-import openai
 import requests
 from pathlib import Path
 import time
@@ -8,8 +8,6 @@ import json
 from typing import List, Dict, Optional
 from PIL import Image
 import base64
-import numpy as np
-import cv2
 from io import BytesIO
 from pathlib import Path
 import sys
@@ -38,6 +36,8 @@ project_root = Path(__file__).resolve().parents[3]
 sys.path.append(str(project_root))
 
 import config
+from chart_modules.llm_client import get_llm_client, run_async
+from chart_modules.image_postprocess import clean_generated_image
 
 API_KEY = config.OPENAI_API_KEY
 BASE_URL = "https://aihubmix.com/v1"
@@ -51,10 +51,8 @@ class InfographicImageGenerator:
             api_key: OpenAI API key
             base_url: Optional API base URL for custom endpoint
         """
-        self.client = openai.OpenAI(
-            api_key=API_KEY,
-            base_url=BASE_URL
-        )
+        # 共享的 LLM 客户端（连接池、并发限制和重试见 chart_modules.llm_client）
+        self.client = get_llm_client(BASE_URL, API_KEY)
         self.processed_data_dir = "processed_data"
         # output_dir 将在运行时被设置为 buffer/{dataset_name}
         self.output_dir = None
@@ -101,6 +99,10 @@ class InfographicImageGenerator:
     
     def generate_title_text(self, csv_data: str) -> str:
         """Generate title text using GPT-4"""
+        return run_async(self.agenerate_title_text(csv_data))
+
+    async def agenerate_title_text(self, csv_data: str, variant=None) -> str:
+        """Generate title text using GPT-4 (async); variant separates independent samples of the same prompt"""
         try:
             # Load title recommendation prompt
             title_prompt_template = self.load_prompt_file("generate_title_recommendation_prompt.md")
@@ -110,13 +112,14 @@ class InfographicImageGenerator:
             # Replace CSV data placeholder
             prompt = title_prompt_template.replace("{csv_data}", csv_data)
             
-            response = self.client.chat.completions.create(
+            response = await self.client.achat(
                 model="gpt-4.1",
                 messages=[
                     {"role": "user", "content": prompt}
                 ],
                 max_tokens=50,
-                temperature=0.7
+                temperature=0.7,
+                variant=variant
             )
             
             title = response.choices[0].message.content.strip()
@@ -143,6 +146,10 @@ class InfographicImageGenerator:
             color: Color palette to use
             style_description: Optional style description from reference image
         """
+        return run_async(self.agenerate_image_prompt(title, prompt_type, color, style_description))
+
+    async def agenerate_image_prompt(self, title: str, prompt_type: str, color=None, style_description: str = None) -> str:
+        """Generate image generation prompt (async), see generate_image_prompt"""
         try:
             color_text = f"{color}" if color else ""
             if prompt_type == "title":
@@ -158,7 +165,7 @@ class InfographicImageGenerator:
                     .replace("{artistic_effect}", art_effect_hint)
                 )
 
-                response = self.client.chat.completions.create(
+                response = await self.client.achat(
                     model="gpt-image-1",
                     messages=[
                         {"role": "user", "content": title_prompt}
@@ -196,59 +203,26 @@ class InfographicImageGenerator:
     
     def generate_image(self, prompt: str, image_type: str, filename: str) -> bool:
         """Generate image using GPT-Image-1"""
+        return run_async(self.agenerate_image(prompt, image_type, filename))
+
+    async def agenerate_image(self, prompt: str, image_type: str, filename: str, variant=None) -> bool:
+        """Generate image using GPT-Image-1 (async); post-processing runs in a worker thread"""
         try:
             print(f"Generating {image_type} image: {filename}")
 
-            response = self.client.images.generate(
+            response = await self.client.agenerate_image(
                 model="gpt-image-1",
                 prompt=prompt,
                 n=1,
                 size="1024x1024",
                 quality="high",
                 background="transparent",  # 生成透明背景图片
+                variant=variant
             )
 
             if response and response.data:
-                image_base64 = response.data[0].b64_json
-                image_data = base64.b64decode(image_base64)
-                image= Image.open(BytesIO(image_data))
-                # Convert to RGBA mode
-                image = image.convert('RGBA')
-                data = image.getdata()
-
-                # Convert white (tolerance 20) to transparent
-                new_data = []
-                for item in data:
-                    # Check if RGB value is close to white (tolerance 20)
-                    if item[0] > 235 and item[1] > 235 and item[2] > 235:
-                        new_data.append((255, 255, 255, 0))
-                    else:
-                        new_data.append(item)
-
-                image.putdata(new_data)
-
-                # Convert image to numpy array
-                img_array = np.array(image)
-
-                # Create binary mask, non-transparent pixels are 1, transparent pixels are 0
-                mask = (img_array[:,:,3] > 0).astype(np.uint8)
-
-                # Mark connected regions
-                num_labels, labels = cv2.connectedComponents(mask)
-
-                # Calculate number of pixels in each connected region
-                for label in range(1, num_labels):
-                    area = np.sum(labels == label)
-                    # If region pixel count is less than 20, set it to transparent
-                    if area < 20:
-                        img_array[labels == label] = [255, 255, 255, 0]
-
-                # Convert back to PIL image
-                image = Image.fromarray(img_array)
-
-                os.makedirs(os.path.dirname(filename), exist_ok=True)
-                image.save(filename)
-                print(f"Image saved: {filename}")
+                image_data = base64.b64decode(response.data[0].b64_json)
+                await asyncio.to_thread(self._save_generated_image, image_data, filename)
                 return True
 
             else:
@@ -259,6 +233,15 @@ class InfographicImageGenerator:
             print(f"Failed to generate image: {e}")
             return False
 
+    def _save_generated_image(self, image_data: bytes, filename: str):
+        """Remove near-white background and small specks, then save the generated image"""
+        # Convert white (tolerance 20) to transparent, then drop components smaller than 20 pixels
+        image = clean_generated_image(Image.open(BytesIO(image_data)))
+
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        image.save(filename)
+        print(f"Image saved: {filename}")
+
     def process_csv_file(self, csv_file: str):
         """Process a single CSV file"""
         print(f"\nProcessing CSV file: {csv_file}")
@@ -336,6 +319,15 @@ class InfographicImageGenerator:
         Returns:
             Dict with title text and image path
         """
+        return run_async(self.agenerate_single_title(csv_path, bg_color, output_filename, use_cache, style_description))
+
+    async def agenerate_single_title(self, csv_path: str, bg_color: str, output_filename: str, use_cache: bool = True, style_description: str = None, variant=None):
+        """
+        Generate a single title image (async), see generate_single_title
+
+        variant: index of this option when several titles are generated from the same data;
+            identical in-flight requests with the same variant share one upstream call
+        """
         import shutil
 
         # 简化的缓存逻辑：如果文件存在就直接使用
@@ -367,7 +359,7 @@ class InfographicImageGenerator:
         csv_data = self.read_csv_data(csv_path)
 
         # Step 1: Generate title text from CSV data using LLM
-        title_text = self.generate_title_text(csv_data)
+        title_text = await self.agenerate_title_text(csv_data, variant=variant)
 
         # 测试模式：直接复制测试图片到输出路径
         if TEST_MODE:
@@ -399,7 +391,9 @@ class InfographicImageGenerator:
 
             # 直接生成到目标路径
             os.makedirs(os.path.dirname(output_filename), exist_ok=True)
-            result_path = get_image_only_title(
+            # 标题图片生成流程是同步实现，放到线程中执行，不阻塞其他请求
+            result_path = await asyncio.to_thread(
+                get_image_only_title,
                 texts=[title_text],
                 bg_hex=bg_color,
                 save_path=output_filename,
@@ -449,6 +443,10 @@ class InfographicImageGenerator:
         Returns:
             Dict with pictogram prompt and success status
         """
+        return run_async(self.agenerate_single_pictogram(title_text, colors, output_filename, use_cache, style_description))
+
+    async def agenerate_single_pictogram(self, title_text: str, colors, output_filename: str, use_cache: bool = True, style_description: str = None, variant=None):
+        """Generate a single pictogram image (async), see generate_single_pictogram; variant as in agenerate_single_title"""
         import shutil
 
         # 简化的缓存逻辑：如果文件存在就直接使用
@@ -485,11 +483,11 @@ class InfographicImageGenerator:
                 }
 
         # Generate pictogram prompt (with style description if available)
-        pictogram_prompt = self.generate_image_prompt(title_text, "pictogram", colors, style_description)
+        pictogram_prompt = await self.agenerate_image_prompt(title_text, "pictogram", colors, style_description)
 
         # Generate the pictogram image directly to output path
         os.makedirs(os.path.dirname(output_filename), exist_ok=True)
-        success = self.generate_image(pictogram_prompt, "pictogram", output_filename)
+        success = await self.agenerate_image(pictogram_prompt, "pictogram", output_filename, variant=variant)
 
         if success and os.path.exists(output_filename):
             return {
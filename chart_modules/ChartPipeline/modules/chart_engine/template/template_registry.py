@@ -3,17 +3,34 @@ import re
 import json
 import importlib.util
 import random
+import threading
 
 # Regular expression to extract requirements JSON from template files
 REQUIREMENTS_PATTERN = re.compile(r'REQUIREMENTS_BEGIN\s*({.*?})\s*REQUIREMENTS_END', re.DOTALL)
 
+# 模板索引文件：缓存每个模板文件的requirements及mtime/size，启动时只对变化的文件重新解析
+TEMPLATE_INDEX_VERSION = 1
+TEMPLATE_INDEX_PATH = os.environ.get(
+    'TEMPLATE_INDEX_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.template_index.json')
+)
+
+class TemplateDict(dict):
+    """
+    模板映射（engine -> chart_type -> chart_name -> 模板信息）。
+
+    generation 在每次重新扫描后递增，下游按 (映射, generation) 缓存由模板派生的数据，
+    不需要遍历模板内容判断是否变化。
+    """
+    generation = 0
+
 # Dictionary to store template mappings
-templates = {
+templates = TemplateDict({
     'echarts_py': {},  # chart_type -> module
     'echarts-js': {},  # chart_type -> js_file_path
     'd3-js': {},        # chart_type -> js_file_path
     'vegalite_py': {}   # chart_type -> module
-}
+})
 
 # 全局标识符，用于跟踪是否已扫描过模板
 _templates_scanned = False
@@ -26,6 +43,64 @@ def load_python_template(file_path):
     spec.loader.exec_module(module)
     return module
 
+class LazyTemplateModule:
+    """
+    Python模板模块的延迟加载代理。
+
+    扫描时只记录文件路径，首次访问模块属性（如make_options）时才真正import，
+    避免启动时导入所有echarts_py模板。
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = load_python_template(self.file_path)
+        return self._module
+
+    def __getattr__(self, name):
+        # 只有实例上不存在的属性才会走到这里
+        return getattr(self.load(), name)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<LazyTemplateModule {self.file_path} ({state})>"
+
+def load_template_index(index_path=None):
+    """
+    读取模板索引文件
+
+    Returns:
+        dict: 相对路径 -> {'mtime': ..., 'size': ..., 'requirements': ...}，文件不存在或版本不符时返回空字典
+    """
+    index_path = index_path or TEMPLATE_INDEX_PATH
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if index.get('version') != TEMPLATE_INDEX_VERSION:
+        return {}
+    return index.get('files', {})
+
+def save_template_index(entries, index_path=None):
+    """原子地写入模板索引文件，写入失败（如目录只读）时忽略"""
+    index_path = index_path or TEMPLATE_INDEX_PATH
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': TEMPLATE_INDEX_VERSION, 'files': entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        print(f"Warning: Failed to save template index {index_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
 def extract_requirements(file_path):
     """Extract requirements JSON from a template file"""
     with open(file_path, 'r', encoding='utf-8') as f:
@@ -41,7 +116,7 @@ def extract_requirements(file_path):
             print(f"Warning: Invalid JSON in requirements section of {file_path}")
     return None
 
-def scan_directory(dir_path, engine_type, file_extension):
+def scan_directory(dir_path, engine_type, file_extension, index=None, seen=None, template_dir=None):
     """
     递归扫描目录及其子目录，寻找符合条件的模板文件
     
@@ -49,26 +124,53 @@ def scan_directory(dir_path, engine_type, file_extension):
         dir_path: 要扫描的目录路径
         engine_type: 引擎类型，'echarts_py', 'echarts-js' 或 'd3-js'
         file_extension: 文件扩展名，'.py' 或 '.js'
+        index: 模板索引（相对路径 -> 条目），mtime和size未变化的文件直接复用其中的requirements，
+               新增或修改的文件会被重新解析并写回索引
+        seen: 记录本次扫描到的相对路径，用于清理索引中已删除的文件
+        template_dir: 模板根目录，索引中的路径相对于该目录，默认为本文件所在目录
+
+    Returns:
+        bool: 索引是否有更新
     """
     if not os.path.exists(dir_path):
-        return
+        return False
+    
+    template_dir = template_dir or os.path.dirname(os.path.abspath(__file__))
+    changed = False
     
     # 遍历目录中的所有文件和子目录
-    for item in os.listdir(dir_path):
-        item_path = os.path.join(dir_path, item)
+    for entry in os.scandir(dir_path):
+        item = entry.name
+        item_path = entry.path
         
         # 如果是目录，递归扫描
-        if os.path.isdir(item_path):
-            scan_directory(item_path, engine_type, file_extension)
+        if entry.is_dir():
+            changed = scan_directory(item_path, engine_type, file_extension, index, seen, template_dir) or changed
         
         # 如果是符合条件的文件
-        elif os.path.isfile(item_path) and item.endswith(file_extension):
+        elif entry.is_file() and item.endswith(file_extension):
             # 对于Python文件，跳过以__开头的文件
             if file_extension == '.py' and item.startswith('__'):
                 continue
                 
-            # 提取需求并注册模板
-            requirements = extract_requirements(item_path)
+            # 提取需求（优先使用索引中的缓存）并注册模板
+            rel_path = os.path.relpath(item_path, template_dir)
+            if seen is not None:
+                seen.add(rel_path)
+            stat = entry.stat()
+            cached = index.get(rel_path) if index is not None else None
+            if cached and cached.get('mtime') == stat.st_mtime_ns and cached.get('size') == stat.st_size:
+                requirements = cached.get('requirements')
+            else:
+                requirements = extract_requirements(item_path)
+                if index is not None:
+                    index[rel_path] = {
+                        'engine_type': engine_type,
+                        'mtime': stat.st_mtime_ns,
+                        'size': stat.st_size,
+                        'requirements': requirements
+                    }
+                    changed = True
             # if engine_type == 'vegalite_py':
             #     print(f"requirements: {requirements['chart_name']}")
             if requirements and 'chart_type' in requirements:
@@ -83,7 +185,8 @@ def scan_directory(dir_path, engine_type, file_extension):
                 
                 # 根据引擎类型处理不同的模板
                 if engine_type == 'echarts_py':
-                    template = load_python_template(item_path)
+                    # Python模板在首次渲染时才导入
+                    template = LazyTemplateModule(item_path)
                 else:  # echarts-js 或 d3-js
                     template = item_path
                 
@@ -93,19 +196,17 @@ def scan_directory(dir_path, engine_type, file_extension):
                     'template': template,
                     'requirements': requirements
                 }
-                    
-                # 计算相对于模板引擎主目录的路径
-                template_dir = os.path.dirname(os.path.abspath(__file__))
-                engine_dir = os.path.join(template_dir, engine_type)
-                rel_path = os.path.relpath(item_path, engine_dir)
                 # print(f"Registered {engine_type} template: {chart_type} -> {chart_name} -> {rel_path}")
+    return changed
 
-def scan_templates(force=False):
+def scan_templates(force=False, template_dir=None, index_path=None):
     """
     扫描模板目录并构建映射
     
     Args:
         force: 如果为True，即使已经扫描过也会强制重新扫描
+        template_dir: 模板根目录，默认为本文件所在目录
+        index_path: 模板索引文件路径，默认为 TEMPLATE_INDEX_PATH
     """
     global _templates_scanned
     
@@ -119,25 +220,38 @@ def scan_templates(force=False):
     templates['echarts-js'].clear()
     templates['d3-js'].clear()
     
-    template_dir = os.path.dirname(os.path.abspath(__file__))
+    template_dir = template_dir or os.path.dirname(os.path.abspath(__file__))
+    
+    # 读取模板索引，只重新解析新增或修改过的文件
+    index = load_template_index(index_path)
+    seen = set()
+    changed = False
     
     # 扫描 echarts_py 目录及子目录
     echarts_py_dir = os.path.join(template_dir, 'echarts_py')
-    scan_directory(echarts_py_dir, 'echarts_py', '.py')
+    changed = scan_directory(echarts_py_dir, 'echarts_py', '.py', index, seen, template_dir) or changed
     
     # 扫描 echarts-js 目录及子目录
     echarts_js_dir = os.path.join(template_dir, 'echarts-js')
-    scan_directory(echarts_js_dir, 'echarts-js', '.js')
+    changed = scan_directory(echarts_js_dir, 'echarts-js', '.js', index, seen, template_dir) or changed
     
     # 扫描 d3-js 目录及子目录
     d3_js_dir = os.path.join(template_dir, 'd3-js')
-    scan_directory(d3_js_dir, 'd3-js', '.js')
+    changed = scan_directory(d3_js_dir, 'd3-js', '.js', index, seen, template_dir) or changed
     
     # 扫描 vegalite_py 目录及子目录
     vegalite_py_dir = os.path.join(template_dir, 'vegalite_py')
-    scan_directory(vegalite_py_dir, 'vegalite_py', '.py')
+    changed = scan_directory(vegalite_py_dir, 'vegalite_py', '.py', index, seen, template_dir) or changed
+    
+    # 清理已删除文件的索引条目
+    for rel_path in set(index) - seen:
+        del index[rel_path]
+        changed = True
+    if changed:
+        save_template_index(index, index_path)
     
     # 标记已完成扫描
+    templates.generation += 1
     _templates_scanned = True
     return templates
 
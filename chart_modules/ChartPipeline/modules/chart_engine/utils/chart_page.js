@@ -0,0 +1,112 @@
+// 预加载渲染页面的运行时：图表库和 utils.js 在页面中只加载一次，
+// 渲染服务通过 page.evaluate 调用 window.__renderChart(payload) 逐个渲染图表。
+// payload: {template_id, template_source, json_data, width, height}
+//   template_source 只在页面第一次遇到该模板时提供，编译后的模板按 template_id 缓存在页面中
+// 返回的 Promise 在图表绘制完成（makeChart 返回的 Promise 或 ECharts finished 事件）、字体就绪并绘制一帧后 resolve
+(function() {
+    var framework = window.__CHART_FRAMEWORK || 'd3';
+    var factories = {};
+    var container = document.getElementById('chart-container');
+    var baseHeadCount = document.head.children.length;
+
+    function resetPage(width, height) {
+        // 清理上一个图表留下的内容：ECharts 实例、模板追加的节点和样式、截图时对页面的修改
+        if (window.echarts) {
+            var previous = echarts.getInstanceByDom(container);
+            if (previous) {
+                previous.dispose();
+            }
+        }
+        container.innerHTML = '';
+        Array.from(document.body.children).forEach(function(node) {
+            if (node === container || node.tagName === 'SCRIPT') {
+                node.style.display = '';
+            } else {
+                node.remove();
+            }
+        });
+        while (document.head.children.length > baseHeadCount) {
+            document.head.lastElementChild.remove();
+        }
+        document.documentElement.style.background = '';
+        document.body.style.cssText = '';
+        if (framework === 'd3') {
+            container.style.maxWidth = width + 'px';
+        } else {
+            container.style.width = width + 'px';
+        }
+        container.style.height = height + 'px';
+    }
+
+    function compile(id, source) {
+        // 模板源码编译成工厂函数：每次调用得到新的模板作用域（与单独页面中执行模板一致）
+        if (!(id in factories)) {
+            if (source === null || source === undefined) {
+                throw new Error('template_not_loaded: ' + id);
+            }
+            factories[id] = framework === 'd3'
+                ? new Function('json_data', source + '\n;return makeChart;')
+                : new Function('jsonData', source + '\n;return make_option;');
+        }
+        return factories[id];
+    }
+
+    function renderD3(factory, jsonData) {
+        var makeChart = factory(jsonData);
+        return makeChart('#chart-container', jsonData);
+    }
+
+    function renderECharts(factory, jsonData) {
+        var chart = echarts.init(container, null, {
+            renderer: 'svg',
+            animation: false,
+            useUTC: true
+        });
+        var option;
+        try {
+            option = factory(jsonData)(jsonData);
+            option.animation = false;
+            option.animationDuration = 0;
+            option.animationDurationUpdate = 0;
+            option.animationDelay = 0;
+            option.animationDelayUpdate = 0;
+        } catch (e) {
+            console.error("Error creating chart:", e);
+            option = {
+                title: { text: "Error: " + e.message, left: 'center' }
+            };
+        }
+        return new Promise(function(resolve) {
+            chart.on('finished', resolve);
+            chart.setOption(option);
+        });
+    }
+
+    window.__hasTemplate = function(id) {
+        return id in factories;
+    };
+
+    window.__renderChart = function(payload) {
+        resetPage(payload.width, payload.height);
+        var factory = compile(payload.template_id, payload.template_source);
+        var errors = [];
+        var rendered;
+        try {
+            rendered = framework === 'd3'
+                ? renderD3(factory, payload.json_data)
+                : renderECharts(factory, payload.json_data);
+        } catch (e) {
+            console.error("Error rendering chart:", e);
+            errors.push(String(e && e.message || e));
+        }
+        return Promise.resolve(rendered).catch(function(e) {
+            errors.push(String(e && e.message || e));
+        }).then(function() {
+            return document.fonts ? document.fonts.ready : null;
+        }).then(function() {
+            return new Promise(function(resolve) { requestAnimationFrame(resolve); });
+        }).then(function() {
+            return { errors: errors };
+        });
+    };
+})();
@@ -3,13 +3,80 @@ import json
 import subprocess
 import tempfile
 from modules.chart_engine.utils.file_utils import create_temp_file, create_temp_dir, cleanup_temp_file, cleanup_temp_dir
+from modules.chart_engine.utils.render_service import get_render_service, RenderServiceError
 
 import importlib
 import logging
+import hashlib
+import threading
 
 logger = logging.getLogger(__name__)
 
+# 批量渲染页面使用的本地图表库（与 load_d3js / load_js_echarts 一致）
+STATIC_LIB_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'lib'))
+D3_LIBS = ['d3.min.js', 'd3-voronoi-map.min.js', 'd3-weighted-voronoi.min.js', 'd3-sankey.min.js', 'svg2roughjs.umd.min.js']
+ECHARTS_LIBS = ['echarts.min.js']
+
+# 渲染完成信号：图表通过 __trackChart 登记（渲染函数可以返回 Promise），
+# 页面加载完成、登记的图表全部结束、字体就绪并绘制一帧后置 window.__chartReady = true，
+# 渲染服务等待该标记（带超时），不再固定等待
+CHART_READY_SCRIPT = """
+        <script>
+        (function() {
+            var pending = 0;
+            var loaded = false;
+            window.__chartReady = false;
+            window.__chartErrors = [];
+            function settle() {
+                if (!loaded || pending > 0 || window.__chartReady) return;
+                var fontsReady = document.fonts ? document.fonts.ready : Promise.resolve();
+                fontsReady.then(function() {
+                    requestAnimationFrame(function() { window.__chartReady = true; });
+                });
+            }
+            window.__trackChart = function(render) {
+                pending += 1;
+                var result;
+                try {
+                    result = render();
+                } catch (e) {
+                    console.error("Error rendering chart:", e);
+                    window.__chartErrors.push(String(e && e.message || e));
+                }
+                return Promise.resolve(result).catch(function(e) {
+                    window.__chartErrors.push(String(e && e.message || e));
+                }).then(function() {
+                    pending -= 1;
+                    settle();
+                });
+            };
+            window.addEventListener('error', function(e) { window.__chartErrors.push(String(e.message)); });
+            window.addEventListener('load', function() { loaded = true; settle(); });
+        })();
+        </script>"""
+
 def html_to_svg(html_file, output_svg=None, width=1200, height=800):
+    """
+    Convert an HTML file with ECharts or D3.js to SVG using Puppeteer.
+    Uses the shared render service (warm browser + reusable pages) and falls back
+    to launching a one-off node process if the service is unavailable.
+    
+    Args:
+        html_file: Path to the HTML file
+        output_svg: Optional path to save the SVG file (not used in this version)
+        width: Width of the SVG
+        height: Height of the SVG
+    
+    Returns:
+        SVG content as string or None if conversion fails
+    """
+    try:
+        return get_render_service().render_html(html_file, width=width, height=height)
+    except RenderServiceError as e:
+        logger.warning(f"Render service failed, falling back to one-off node process: {e}")
+        return _html_to_svg_subprocess(html_file, output_svg, width=width, height=height)
+
+def _html_to_svg_subprocess(html_file, output_svg=None, width=1200, height=800):
     """
     Convert an HTML file with ECharts or D3.js to SVG using Puppeteer.
     Returns SVG content directly instead of saving to file.
@@ -39,9 +106,13 @@ def html_to_svg(html_file, output_svg=None, width=1200, height=800):
         await page.setViewport({ width: %d, height: %d });
         
         try {
-            // 加载HTML文件
-            await page.goto('file://' + path.resolve('%s'), { waitUntil: 'networkidle0' });
-            await new Promise(resolve => setTimeout(resolve, 1000));
+            // 加载HTML文件，等待图表发出渲染完成信号（旧页面没有该信号时 load 后直接继续）
+            await page.goto('file://' + path.resolve('%s'), { waitUntil: 'load' });
+            await page.waitForFunction(
+                () => window.__chartReady === undefined || window.__chartReady === true,
+                { timeout: 10000 }
+            ).catch(() => console.error('chart ready signal timed out'));
+            await page.waitForNetworkIdle({ idleTime: 50, timeout: 5000 }).catch(() => {});
             
             // 检查是否是ECharts图表
             const isECharts = await page.evaluate(() => {
@@ -201,6 +272,25 @@ def _get_dimensions(options, default_width=1200, default_height=800):
     height = options["variables"].get("height", default_height)
     return width, height
 
+# JS 源码缓存：path -> (mtime_ns, size, 源码, 模板 id)
+_js_source_cache = {}
+_js_source_lock = threading.Lock()
+
+def _load_js_source(js_file):
+    """读取 JS 文件，按 (path, mtime, size) 缓存在内存中，返回 (源码, 模板 id)"""
+    path = os.path.abspath(js_file)
+    stat = os.stat(path)
+    with _js_source_lock:
+        cached = _js_source_cache.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2], cached[3]
+    with open(path, 'r', encoding='utf-8') as f:
+        source = f.read()
+    template_id = hashlib.sha1(f"{path}:{stat.st_mtime_ns}:{stat.st_size}".encode('utf-8')).hexdigest()
+    with _js_source_lock:
+        _js_source_cache[path] = (stat.st_mtime_ns, stat.st_size, source, template_id)
+    return source, template_id
+
 def _load_js_code(js_file, base_dirs=None):
     """
     Helper function to load JavaScript code from a file
@@ -214,8 +304,7 @@ def _load_js_code(js_file, base_dirs=None):
     """
     # If js_file is provided and exists, use it
     if js_file and os.path.exists(js_file):
-        with open(js_file, 'r', encoding='utf-8') as f:
-            return f.read()
+        return _load_js_source(js_file)[0]
     
     raise ValueError(f"No JavaScript file found for chart path: {js_file}. Please provide a valid JS file.")
 
@@ -243,6 +332,7 @@ def load_js_echarts(json_data=None, output_file=None, js_file=None, width=None,
         <meta charset="utf-8">
         <title>ECharts Chart</title>
         <script src="%s"></script>
+        READY_SCRIPT_PLACEHOLDER
         <style>
             #chart-container {
                 width: %dpx;
@@ -287,14 +377,21 @@ def load_js_echarts(json_data=None, output_file=None, js_file=None, width=None,
                 };
             }
             
-            // 立即设置选项并渲染
-            chart.setOption(option);
+            // 设置选项并渲染，渲染结束（finished 事件）后导出 SVG 并发出完成信号
+            __trackChart(function() {
+                return new Promise(function(resolve) {
+                    chart.on('finished', function() {
+                        exportSvg();
+                        resolve();
+                    });
+                    chart.setOption(option);
+                });
+            });
             
             // 导出SVG的优化函数
             function exportSvg() {
+                if (document.getElementById('svg-output')) return;
                 try {
-                    chart.setOption(option, {notMerge: true});
-                    
                     const svgContent = chart.renderToSVGString();
                     
                     if (svgContent && svgContent.length > 0) {
@@ -308,12 +405,6 @@ def load_js_echarts(json_data=None, output_file=None, js_file=None, width=None,
                     console.error("Error exporting SVG:", e);
                 }
             }
-            
-            // 立即尝试导出
-            exportSvg();
-            
-            // 设置备用导出计时器，500ms后再尝试一次
-            setTimeout(exportSvg, 500);
         </script>
     </body>
     </html>
@@ -337,6 +428,7 @@ def load_js_echarts(json_data=None, output_file=None, js_file=None, width=None,
 
     # Create HTML content
     formatted_html = html_template % (echarts_lib_url, width, height)
+    formatted_html = formatted_html.replace('READY_SCRIPT_PLACEHOLDER', CHART_READY_SCRIPT)
     formatted_html = formatted_html.replace('JSON_DATA_PLACEHOLDER', json.dumps(json_data))
     formatted_html = formatted_html.replace('JS_CODE_PLACEHOLDER', js_code)
     
@@ -369,6 +461,7 @@ def load_d3js(json_data=None, output_file=None, js_file=None, width=None, height
         <meta charset="utf-8">
         <title>D3.js Chart</title>
         %s
+        READY_SCRIPT_PLACEHOLDER
         <style>
             body {
                 font-family: Arial, sans-serif;
@@ -397,11 +490,10 @@ def load_d3js(json_data=None, output_file=None, js_file=None, width=None, height
             // D3.js实现
             JS_CODE_PLACEHOLDER
             
-            // 文档就绪时立即创建图表
-            makeChart('#chart-container', json_data);
-            
-            // 500ms后检查SVG是否已生成
-            setTimeout(function() {
+            // 创建图表（makeChart 可以返回 Promise 表示异步绘制），绘制完成后复制 SVG 供提取使用
+            __trackChart(function() {
+                return makeChart('#chart-container', json_data);
+            }).then(function() {
                 const svg = document.querySelector('#chart-container svg');
                 if (svg) {
                     // 创建一个包含SVG内容的容器供提取使用
@@ -411,7 +503,7 @@ def load_d3js(json_data=None, output_file=None, js_file=None, width=None, height
                     svgContainer.innerHTML = svg.outerHTML;
                     document.body.appendChild(svgContainer);
                 }
-            }, 500);
+            });
         </script>
     </body>
     </html>
@@ -437,6 +529,7 @@ def load_d3js(json_data=None, output_file=None, js_file=None, width=None, height
     js_code = _load_js_code(js_file)
     # Create HTML content    
     formatted_html = html_template % (lib_urls_str, width, height)
+    formatted_html = formatted_html.replace('READY_SCRIPT_PLACEHOLDER', CHART_READY_SCRIPT)
     formatted_html = formatted_html.replace('JSON_DATA_PLACEHOLDER', json.dumps(json_data))
     formatted_html = formatted_html.replace('JS_CODE_PLACEHOLDER', js_code)
     formatted_html = formatted_html.replace('UTILS_LIB_PLACEHOLDER', utils_code)
@@ -445,6 +538,337 @@ def load_d3js(json_data=None, output_file=None, js_file=None, width=None, height
     # 简化日志输出
     return output_file
 
+def _write_chart_html(json_data, js_file, width, height, framework, framework_type, html_file):
+    """根据框架类型生成图表 HTML 文件"""
+    if framework.lower() == "echarts" and framework_type == 'js':
+        load_js_echarts(json_data=json_data, output_file=html_file, js_file=js_file, width=width, height=height)
+    elif framework.lower() == "echarts" and framework_type == 'py':
+        template = js_file
+        options = template.make_options(json_data)
+        option_data = json.dumps(options)
+        load_js_echarts(json_data=option_data, output_file=html_file, width=width, height=height)
+    elif framework.lower() == "d3":
+        load_d3js(json_data=json_data, output_file=html_file, js_file=js_file, width=width, height=height)
+    else:
+        raise ValueError(f"Unsupported framework: {framework}")
+
+CHART_PAGE_RUNTIME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chart_page.js')
+# echarts py 模板在 Python 端生成 option，页面中只需解析
+ECHARTS_OPTION_PASSTHROUGH = "function make_option(jsonData) { return JSON.parse(jsonData); }"
+
+_chart_pages = {}
+_chart_pages_lock = threading.Lock()
+
+def chart_page_file(framework):
+    """
+    预加载渲染页面：只包含图表库、utils.js 和 chart_page.js 运行时，每个进程按框架生成一次。
+    页面引用的文件变化（mtime）时生成新的页面文件，渲染服务按路径判断是否需要重新加载。
+    """
+    framework = framework.lower()
+    libs = [os.path.join(STATIC_LIB_DIR, name) for name in (D3_LIBS if framework == "d3" else ECHARTS_LIBS)]
+    if framework == "d3":
+        libs.append(os.path.join(STATIC_LIB_DIR, 'utils.js'))
+    libs.append(CHART_PAGE_RUNTIME)
+    signature = "|".join(f"{path}:{os.stat(path).st_mtime_ns}" for path in libs)
+    with _chart_pages_lock:
+        cached = _chart_pages.get(framework)
+        if cached and cached[0] == signature and os.path.exists(cached[1]):
+            return cached[1]
+
+        if framework == "d3":
+            style = """
+            body {
+                font-family: Arial, sans-serif;
+                margin: 20px;
+            }
+            #chart-container {
+                width: 100%;
+                max-width: 1200px;
+                height: 800px;
+                margin: 0 auto;
+                background-color: white;
+                border-radius: 8px;
+                overflow: hidden;
+            }"""
+        else:
+            style = """
+            #chart-container {
+                width: 1200px;
+                height: 800px;
+            }"""
+        lib_tags = "\n".join(f"<script src='file://{path}'></script>" for path in libs[:-1])
+        html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <title>Chart Page</title>
+        {lib_tags}
+        <style>{style}
+        </style>
+    </head>
+    <body>
+        <div id="chart-container"></div>
+        <script>window.__CHART_FRAMEWORK = '{framework}';</script>
+        <script src='file://{CHART_PAGE_RUNTIME}'></script>
+    </body>
+    </html>
+    """
+        page_dir = os.path.join(tempfile.gettempdir(), 'chart_pages')
+        os.makedirs(page_dir, exist_ok=True)
+        digest = hashlib.sha1(signature.encode('utf-8')).hexdigest()[:16]
+        page_file = os.path.join(page_dir, f"{framework}_{digest}.html")
+        _save_to_file(html, page_file)
+        _chart_pages[framework] = (signature, page_file)
+        return page_file
+
+def _render_on_chart_page(json_data, js_file, width, height, framework, framework_type,
+                          artifacts=False, png_path=None, background_color=None):
+    """在预加载页面中渲染图表（模板源码按 id 缓存，数据通过 page.evaluate 传入）"""
+    framework = framework.lower()
+    if framework == "echarts" and framework_type == 'py':
+        template_id = "echarts-py-passthrough"
+        template_source = ECHARTS_OPTION_PASSTHROUGH
+        json_data = json.dumps(js_file.make_options(json_data))
+    else:
+        if not js_file or not os.path.exists(js_file):
+            raise ValueError(f"No JavaScript file found for chart path: {js_file}. Please provide a valid JS file.")
+        template_source, template_id = _load_js_source(js_file)
+    if png_path:
+        os.makedirs(os.path.dirname(os.path.abspath(png_path)), exist_ok=True)
+    return get_render_service().render_chart(
+        chart_page_file(framework), template_id, template_source, json_data,
+        width=width, height=height, artifacts=artifacts, png_file=png_path, background_color=background_color
+    )
+
+def render_chart_artifacts(json_data, js_file=None, width=None, height=None,
+                           framework="echarts", framework_type='js', png_path=None, background_color=None):
+    """
+    在渲染服务的预加载页面中一次渲染得到 SVG、边界框和 PNG 截图（替代 render_chart_to_svg + 裁剪 + 二次截图）
+
+    Args:
+        json_data (dict): 完整的JSON数据，包含图表数据和配置信息
+        js_file (str, optional): JavaScript文件路径（echarts py 模板时为模板对象）
+        width (int, optional): 图表宽度(像素)
+        height (int, optional): 图表高度(像素)
+        framework (str): "echarts" 或 "d3"
+        framework_type (str): "js" 或 "py"
+        png_path (str, optional): 裁剪后透明背景 PNG 的输出路径
+        background_color (str, optional): 背景色（hex），与背景色相同的图形不计入边界框
+
+    Returns:
+        dict（svg、bbox、elements、png_file，见 ChartRenderService.render_html_artifacts），
+        渲染服务不可用或不支持该框架时返回 None，调用方应回退到 render_chart_to_svg
+    """
+    if framework.lower() not in ("echarts", "d3"):
+        return None
+
+    if width is None or height is None:
+        w, h = _get_dimensions(json_data)
+        width = width or w
+        height = height or h
+
+    try:
+        return _render_on_chart_page(json_data, js_file, width, height, framework, framework_type,
+                                     artifacts=True, png_path=png_path, background_color=background_color)
+    except Exception as e:
+        logger.warning(f"Render service failed, artifacts unavailable: {e}")
+        return None
+
+def _batch_chart_script(index, framework, json_data, js_code):
+    """批量页面中单个图表的脚本：模板代码放在独立的函数作用域中，避免不同模板的全局定义互相覆盖"""
+    container = f"chart-container-{index}"
+    if framework == "d3":
+        return f"""
+        <script>
+        (function() {{
+            const json_data = {json.dumps(json_data)};
+            {js_code}
+            __trackChart(function() {{
+                return makeChart('#{container}', json_data);
+            }});
+        }})();
+        </script>"""
+    return f"""
+        <script>
+        (function() {{
+            var chart = echarts.init(document.getElementById('{container}'), null, {{
+                renderer: 'svg',
+                animation: false,
+                useUTC: true
+            }});
+            const jsonData = {json.dumps(json_data)};
+            {js_code}
+            let option;
+            try {{
+                option = make_option(jsonData);
+                option.animation = false;
+                option.animationDuration = 0;
+                option.animationDurationUpdate = 0;
+                option.animationDelay = 0;
+                option.animationDelayUpdate = 0;
+            }} catch (e) {{
+                console.error("Error creating chart:", e);
+                option = {{
+                    title: {{ text: "Error: " + e.message, left: 'center' }}
+                }};
+            }}
+            __trackChart(function() {{
+                return new Promise(function(resolve) {{
+                    chart.on('finished', resolve);
+                    chart.setOption(option);
+                }});
+            }});
+        }})();
+        </script>"""
+
+def load_charts_batch(charts, framework, output_file=None):
+    """
+    生成在一个页面中渲染多个图表的 HTML：图表库和 utils.js 只加载一次，每个图表一个容器。
+    只用于预加载页面渲染失败时的回退（见 render_charts_batch）
+
+    Args:
+        charts: [{'json_data', 'js_file', 'width', 'height', 'framework_type'}]
+        framework: "d3" 或 "echarts"（同一批次内必须一致）
+        output_file: HTML 输出路径（可选）
+
+    Returns:
+        (HTML 文件路径, 容器选择器列表)
+    """
+    framework = framework.lower()
+    libs = D3_LIBS if framework == "d3" else ECHARTS_LIBS
+    lib_tags = "\n".join(f"<script src='file://{os.path.join(STATIC_LIB_DIR, name)}'></script>" for name in libs)
+    utils_tag = f"<script src='file://{os.path.join(STATIC_LIB_DIR, 'utils.js')}'></script>" if framework == "d3" else ""
+
+    containers = []
+    bodies = []
+    for index, chart in enumerate(charts):
+        width, height = chart['width'], chart['height']
+        if framework == "d3":
+            # 与单图页面一致：body 左右各 20px 边距，容器宽度为视口宽度减 40
+            style = f"width: {max(1, width - 40)}px; height: {height}px; margin: 0 auto 40px auto;"
+        else:
+            style = f"width: {width}px; height: {height}px;"
+        if chart.get('framework_type') == 'py':
+            # Python 模板在本地生成 option，页面中直接解析
+            json_data = json.dumps(chart['js_file'].make_options(chart['json_data']))
+            js_code = "function make_option(jsonData) { return JSON.parse(jsonData); }"
+        else:
+            json_data = chart['json_data']
+            js_code = _load_js_code(chart['js_file'])
+        containers.append(f"#chart-container-{index}")
+        bodies.append(f"<div id='chart-container-{index}' class='chart-container' style='{style}'></div>")
+        bodies.append(_batch_chart_script(index, framework, json_data, js_code))
+
+    html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <title>Chart Batch</title>
+        {lib_tags}
+        {CHART_READY_SCRIPT}
+        <style>
+            body {{
+                font-family: Arial, sans-serif;
+                margin: {20 if framework == "d3" else 0}px;
+            }}
+            .chart-container {{
+                background-color: {'white' if framework == "d3" else 'transparent'};
+                overflow: hidden;
+            }}
+        </style>
+    </head>
+    <body>
+        {utils_tag}
+        {"".join(bodies)}
+    </body>
+    </html>
+    """
+    return _save_to_file(html, output_file, prefix="_batch"), containers
+
+def _render_html_batch(batch, framework, background_color=None):
+    """回退路径：把多个图表写入一个批量 HTML 页面，由渲染服务一次加载后逐个提取"""
+    temp_dir = create_temp_dir(prefix=f"{framework}_batch_")
+    try:
+        html_file, containers = load_charts_batch(batch, framework, os.path.join(temp_dir, 'batch.html'))
+        request_charts = []
+        for chart, container in zip(batch, containers):
+            if chart.get('png_path'):
+                os.makedirs(os.path.dirname(os.path.abspath(chart['png_path'])), exist_ok=True)
+            request_charts.append({
+                'container': container,
+                'width': int(chart['width']),
+                'height': int(chart['height']),
+                'png_file': chart.get('png_path')
+            })
+        return get_render_service().render_batch(
+            html_file, request_charts,
+            width=max(chart['width'] for chart in batch),
+            height=max(chart['height'] for chart in batch),
+            background_color=background_color
+        )
+    finally:
+        if os.path.exists(temp_dir):
+            cleanup_temp_dir(temp_dir)
+
+def render_charts_batch(charts, background_color=None):
+    """
+    批量渲染多个图表：逐个在按框架预加载的页面中渲染（图表库只加载一次，模板源码按 mtime 缓存），
+    每个图表返回 SVG、边界框和 PNG。渲染服务出错（重启、不可用或不支持 render_chart）后，
+    该框架剩余的图表合并到一个批量 HTML 页面中重试
+
+    Args:
+        charts: [{'json_data', 'js_file', 'framework', 'framework_type', 'png_path'(可选), 'width'/'height'(可选)}]
+        background_color: 背景色（hex），与背景色相同的图形不计入边界框
+
+    Returns:
+        与 charts 一一对应的列表，每项为 render_chart_artifacts 格式的 dict；
+        渲染失败（或框架不支持批量）的图表为 None，调用方应对这些图表单独渲染
+    """
+    results = [None] * len(charts)
+    groups = {}
+    for index, chart in enumerate(charts):
+        framework = (chart.get('framework') or '').lower()
+        if framework in ("d3", "echarts"):
+            groups.setdefault(framework, []).append(index)
+
+    for framework, indices in groups.items():
+        retry = []
+        for index in indices:
+            chart = dict(charts[index])
+            if chart.get('width') is None or chart.get('height') is None:
+                w, h = _get_dimensions(chart['json_data'])
+                chart['width'] = chart.get('width') or w
+                chart['height'] = chart.get('height') or h
+            if retry:
+                # 渲染服务已出错，剩余图表直接走批量页面，不再逐个重试预加载页面
+                retry.append((index, chart))
+                continue
+            try:
+                results[index] = _render_on_chart_page(
+                    chart['json_data'], chart['js_file'], chart['width'], chart['height'],
+                    framework, chart.get('framework_type', 'js'),
+                    artifacts=True, png_path=chart.get('png_path'), background_color=background_color
+                )
+            except RenderServiceError as e:
+                logger.warning(f"Chart page render failed for {framework}, retrying in batch page: {e}")
+                retry.append((index, chart))
+            except Exception as e:
+                logger.warning(f"Failed to render chart on {framework} chart page: {e}")
+
+        if not retry:
+            continue
+        try:
+            batch_results = _render_html_batch([chart for _, chart in retry], framework, background_color)
+            for (index, _), result in zip(retry, batch_results):
+                results[index] = result
+        except RenderServiceError as e:
+            logger.warning(f"Batch render failed for {framework}: {e}")
+        except Exception as e:
+            logger.warning(f"Failed to build batch page for {framework}: {e}")
+    return results
+
 def render_chart_to_svg(json_data, \
                         js_file=None, width=None, height=None, \
                         framework="echarts", framework_type='js', html_output_path=None):
@@ -508,24 +932,23 @@ def render_chart_to_svg(json_data, \
         #     print(f"Error: {e}")
         #     return None
     
+    # 优先在预加载页面中渲染，不生成 HTML 文件；渲染服务不可用时回退到 HTML 文件 + 一次性 node 进程
+    if framework.lower() in ("echarts", "d3"):
+        try:
+            svg_content = _render_on_chart_page(json_data, js_file, width, height, framework, framework_type)['svg']
+            if svg_content:
+                return None, svg_content
+        except Exception as e:
+            # 包括渲染服务错误、缺少 JS 文件和 make_options 异常：回退到 HTML 文件路径，由其返回 None
+            logger.warning(f"Render service failed, falling back to HTML file: {e}")
+
     # 为引擎创建临时目录，用于生成HTML文件
     temp_dir = create_temp_dir(prefix=f"{framework}_svg_")
     html_file = os.path.join(temp_dir, 'chart.html')
 
     try:
         # 根据框架类型生成HTML文件
-        if framework.lower() == "echarts" and framework_type == 'js':
-            load_js_echarts(json_data=json_data, output_file=html_file, js_file=js_file, width=width, height=height)
-        elif framework.lower() == "echarts" and framework_type == 'py':
-            template = js_file
-            options = template.make_options(json_data)
-            option_data = json.dumps(options)
-            load_js_echarts(json_data=option_data, output_file=html_file, width=width, height=height)
-        elif framework.lower() == "d3":
-            load_d3js(json_data=json_data, output_file=html_file, js_file=js_file, width=width, height=height)
-        else:
-            raise ValueError(f"Unsupported framework: {framework}")
-        
+        _write_chart_html(json_data, js_file, width, height, framework, framework_type, html_file)
         
         # 使用html_to_svg转换为SVG
         svg_content = html_to_svg(html_file, width=width, height=height)
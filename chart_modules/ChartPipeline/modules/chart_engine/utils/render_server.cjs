@@ -0,0 +1,586 @@
+// 常驻渲染服务：启动一次 Chrome，维护 N 个可复用页面，通过 stdin/stdout 按行收发 JSON 请求
+// 请求:  {"id": 1, "cmd": "render", "html_file": "/abs/chart.html", "width": 1200, "height": 800}
+//        {"id": 2, "cmd": "render", "html_file": "...", "artifacts": true, "png_file": "/abs/chart.png", "background_color": "#ffffff"}
+//        {"id": 3, "cmd": "render_batch", "html_file": "...", "artifacts": true, "background_color": "#ffffff",
+//         "charts": [{"container": "#chart-container-0", "width": 600, "height": 400, "png_file": "/abs/0.png"}, ...]}
+//        {"id": 4, "cmd": "render_chart", "page_file": "/abs/chart_page_d3.html", "template_id": "...",
+//         "template_source": "...", "json_data": {...}, "width": 1200, "height": 800, "artifacts": true, ...}
+//        {"id": 5, "cmd": "ping"}
+// 响应:  {"id": 1, "ok": true, "svg": "<svg ...>"} 或 {"id": 1, "ok": false, "error": "..."}
+//        artifacts 请求在同一次页面加载中额外返回 bbox（紧致边界框）、elements（元素边界框），
+//        并把裁剪到 bbox 的透明背景截图写入 png_file
+//        render_batch 在一个页面中渲染多个图表（库只加载一次），返回 {"results": [{ok, svg, bbox, elements, png_file}]}
+//        render_chart 复用已加载图表库的预加载页面（page_file），模板源码按 template_id 缓存，
+//        只在服务第一次遇到该模板时需要 template_source，缺少时返回 template_not_loaded 错误
+const puppeteer = require('puppeteer');
+const path = require('path');
+const readline = require('readline');
+
+const POOL_SIZE = parseInt(process.env.CHART_RENDER_POOL_SIZE || '3', 10);
+const MAX_RENDERS_PER_PAGE = parseInt(process.env.CHART_RENDER_MAX_RENDERS_PER_PAGE || '50', 10);
+const CHROME_PATH = process.env.CHART_RENDER_CHROME_PATH || '/usr/bin/google-chrome';
+// 等待页面发出渲染完成信号（window.__chartReady）的最长时间，超时后按当前页面内容继续提取
+const READY_TIMEOUT = parseInt(process.env.CHART_RENDER_READY_TIMEOUT || '10000', 10);
+// 完成信号之后等待网络空闲（图表中引用的图片等）的时间窗口
+const NETWORK_IDLE_TIME = parseInt(process.env.CHART_RENDER_NETWORK_IDLE_TIME || '50', 10);
+
+let browser = null;
+let launching = null;
+const idleSlots = [];
+const waiters = [];
+let totalRenders = 0;
+// 模板源码缓存：template_id -> source
+const templateSources = new Map();
+
+function log(...args) {
+    // stdout 只用于协议输出，日志一律写 stderr
+    console.error('[render_server]', ...args);
+}
+
+function send(message) {
+    process.stdout.write(JSON.stringify(message) + '\n');
+}
+
+async function launchBrowser() {
+    if (browser && browser.connected) {
+        return browser;
+    }
+    if (!launching) {
+        launching = (async () => {
+            const instance = await puppeteer.launch({
+                headless: 'new',
+                executablePath: CHROME_PATH,
+                args: ['--no-sandbox', '--disable-setuid-sandbox']
+            });
+            instance.on('disconnected', () => {
+                log('browser disconnected, pages will be recreated on next render');
+                browser = null;
+                idleSlots.length = 0;
+            });
+            browser = instance;
+            idleSlots.length = 0;
+            for (let i = 0; i < POOL_SIZE; i++) {
+                idleSlots.push(await createSlot());
+            }
+            while (waiters.length > 0 && idleSlots.length > 0) {
+                waiters.shift()(idleSlots.pop());
+            }
+            return instance;
+        })().finally(() => {
+            launching = null;
+        });
+    }
+    return launching;
+}
+
+async function createSlot() {
+    const page = await browser.newPage();
+    return { page, browser, renders: 0, templates: new Set() };
+}
+
+async function acquireSlot() {
+    await launchBrowser();
+    if (idleSlots.length > 0) {
+        return idleSlots.pop();
+    }
+    return new Promise(resolve => waiters.push(resolve));
+}
+
+async function releaseSlot(slot, broken) {
+    if (slot.browser !== browser) {
+        // 浏览器已重启，新浏览器启动时已补满页面，旧页面直接丢弃
+        return;
+    }
+    let next = slot;
+    if (broken || slot.renders >= MAX_RENDERS_PER_PAGE || slot.page.isClosed()) {
+        // 页面出错或达到复用上限时回收，换一个新页面
+        try {
+            if (!slot.page.isClosed()) {
+                await slot.page.close();
+            }
+        } catch (e) {
+            log('failed to close page:', e.message);
+        }
+        try {
+            await launchBrowser();
+            next = await createSlot();
+        } catch (e) {
+            log('failed to recreate page:', e.message);
+            next = null;
+        }
+    }
+    if (!next) {
+        return;
+    }
+    const waiter = waiters.shift();
+    if (waiter) {
+        waiter(next);
+    } else {
+        idleSlots.push(next);
+    }
+}
+
+async function loadChartPage(page, htmlFile) {
+    // 页面 load 之后等待图表发出完成信号（见 paint_innerchart.CHART_READY_SCRIPT），取代 networkidle0 + 固定 1 秒等待；
+    // 没有完成信号的旧页面在 load 之后直接继续
+    await page.goto('file://' + path.resolve(htmlFile), { waitUntil: 'load' });
+    const started = Date.now();
+    try {
+        await page.waitForFunction(
+            () => window.__chartReady === undefined || window.__chartReady === true,
+            { timeout: READY_TIMEOUT }
+        );
+    } catch (e) {
+        log(`chart ready signal timed out after ${READY_TIMEOUT}ms: ${htmlFile}`);
+    }
+    const remaining = Math.max(0, READY_TIMEOUT - (Date.now() - started));
+    await page.waitForNetworkIdle({ idleTime: NETWORK_IDLE_TIME, timeout: remaining }).catch(() => {});
+    const errors = await page.evaluate(() => window.__chartErrors || []);
+    if (errors.length) {
+        log('chart errors:', errors.join('; '));
+    }
+}
+
+async function extractSvg(page, width, height, container = '#chart-container', screenshotFallback = true) {
+    // 检查是否是ECharts图表
+    const isECharts = await page.evaluate(() => typeof echarts !== 'undefined');
+
+    let svgContent = null;
+    if (isECharts) {
+        svgContent = await page.evaluate((container) => {
+            const element = document.querySelector(container);
+            const chart = element ? echarts.getInstanceByDom(element) : null;
+            if (!chart) return null;
+            chart.setOption({animation: false});
+            try {
+                chart.setOption({renderer: 'svg'});
+            } catch (e) {
+                console.log('无法设置SVG渲染器:', e.message);
+            }
+            return chart.renderToSVGString();
+        }, container);
+    }
+
+    // 回退到直接SVG提取
+    if (!svgContent) {
+        svgContent = await page.evaluate((container) => {
+            const svg = document.querySelector(`${container} svg`);
+            if (!svg) return null;
+
+            const clone = svg.cloneNode(true);
+            if (!clone.hasAttribute('width')) {
+                clone.setAttribute('width', svg.clientWidth);
+            }
+            if (!clone.hasAttribute('height')) {
+                clone.setAttribute('height', svg.clientHeight);
+            }
+            if (!clone.hasAttribute('viewBox')) {
+                clone.setAttribute('viewBox', `0 0 ${svg.clientWidth} ${svg.clientHeight}`);
+            }
+            return clone.outerHTML;
+        }, container);
+    }
+
+    // 最终回退 - 截图转SVG
+    if (!svgContent && screenshotFallback) {
+        const screenshot = await page.screenshot({encoding: 'base64'});
+        svgContent = `<svg width="${width}" height="${height}" xmlns="http://www.w3.org/2000/svg">
+            <image href="data:image/png;base64,${screenshot}" width="100%" height="100%"/>
+        </svg>`;
+    }
+    return svgContent;
+}
+
+async function measureChart(page, backgroundColor, container = '#chart-container') {
+    // 在页面中按渲染后的几何计算图表的紧致边界框（SVG 用户坐标），规则与 Python 端 svg_geometry 一致：
+    // fill/stroke 都不可见（none、透明、接近背景色）的图形不计入，描边向外扩展半个线宽
+    return page.evaluate((backgroundColor, container) => {
+        const svg = document.querySelector(`${container} svg`);
+        if (!svg) return null;
+
+        const BACKGROUND_THRESHOLD = 15;
+        const parseColor = (value) => {
+            if (!value) return null;
+            value = value.trim().toLowerCase();
+            let match = value.match(/^#([0-9a-f]{3}|[0-9a-f]{6})$/);
+            if (match) {
+                let hex = match[1];
+                if (hex.length === 3) hex = hex.split('').map(ch => ch + ch).join('');
+                return [0, 2, 4].map(i => parseInt(hex.slice(i, i + 2), 16)).concat([1]);
+            }
+            match = value.match(/^rgba?\(([^)]*)\)$/);
+            if (match) {
+                const parts = match[1].split(/[\s,\/]+/).filter(Boolean).map(parseFloat);
+                return [parts[0], parts[1], parts[2], parts.length > 3 ? parts[3] : 1];
+            }
+            return null;
+        };
+        const background = parseColor(backgroundColor);
+        const paintVisible = (paint, opacity) => {
+            if (!paint || paint === 'none') return false;
+            if (parseFloat(opacity) <= 0) return false;
+            const color = parseColor(paint);
+            if (!color) return true;  // url(#gradient) 等
+            if (color[3] <= 0) return false;
+            if (background && [0, 1, 2].every(i => Math.abs(color[i] - background[i]) < BACKGROUND_THRESHOLD)) {
+                return false;
+            }
+            return true;
+        };
+        const hiddenByAncestor = (el) => {
+            for (let node = el; node && node !== svg.parentNode; node = node.parentNode) {
+                if (node.nodeType === 1 && getComputedStyle(node).opacity === '0') return true;
+            }
+            return false;
+        };
+
+        const svgRect = svg.getBoundingClientRect();
+        const viewBox = svg.viewBox && svg.viewBox.baseVal && svg.viewBox.baseVal.width ? svg.viewBox.baseVal : null;
+        const scaleX = viewBox && svgRect.width ? viewBox.width / svgRect.width : 1;
+        const scaleY = viewBox && svgRect.height ? viewBox.height / svgRect.height : 1;
+        const toUser = (x, y) => [
+            (viewBox ? viewBox.x : 0) + (x - svgRect.left) * scaleX,
+            (viewBox ? viewBox.y : 0) + (y - svgRect.top) * scaleY
+        ];
+        const userRect = (rect, pad) => {
+            const [x0, y0] = toUser(rect.left - pad, rect.top - pad);
+            const [x1, y1] = toUser(rect.right + pad, rect.bottom + pad);
+            return { x: x0, y: y0, width: x1 - x0, height: y1 - y0 };
+        };
+
+        let minX = Infinity, minY = Infinity, maxX = -Infinity, maxY = -Infinity;
+        const shapes = svg.querySelectorAll('rect, circle, ellipse, line, polyline, polygon, path, text, image, foreignObject, use');
+        for (const el of shapes) {
+            if (el.closest('defs, clipPath, mask, marker, pattern, symbol')) continue;
+            const style = getComputedStyle(el);
+            if (style.display === 'none' || style.visibility === 'hidden' || style.visibility === 'collapse') continue;
+            const tag = el.tagName;
+            const isBox = tag === 'image' || tag === 'foreignObject' || tag === 'use';
+            const fillVisible = isBox || (tag !== 'line' && paintVisible(style.fill, style.fillOpacity));
+            const strokeVisible = !isBox && tag !== 'text' && parseFloat(style.strokeWidth) > 0
+                && paintVisible(style.stroke, style.strokeOpacity);
+            if (!fillVisible && !strokeVisible) continue;
+            if (hiddenByAncestor(el)) continue;
+            const rect = el.getBoundingClientRect();
+            if (rect.width === 0 && rect.height === 0) continue;
+            const box = userRect(rect, strokeVisible ? parseFloat(style.strokeWidth) / 2 : 0);
+            minX = Math.min(minX, box.x);
+            minY = Math.min(minY, box.y);
+            maxX = Math.max(maxX, box.x + box.width);
+            maxY = Math.max(maxY, box.y + box.height);
+        }
+        if (minX === Infinity) return null;
+
+        // 与像素扫描一致：覆盖到的像素范围，宽高包含末尾像素
+        const left = Math.floor(minX);
+        const top = Math.floor(minY);
+        const bbox = {
+            min_x: minX, min_y: minY, max_x: maxX, max_y: maxY,
+            width: Math.ceil(maxX) - left + 1,
+            height: Math.ceil(maxY) - top + 1,
+            offset_x: -left,
+            offset_y: -top
+        };
+
+        // 顶层元素和文字的边界框（已平移到裁剪后的坐标）
+        const elements = [];
+        const targets = new Set([...svg.children, ...svg.querySelectorAll('text')]);
+        for (const el of targets) {
+            if (elements.length >= 500) break;
+            if (el.closest('defs') || !el.getBoundingClientRect) continue;
+            const rect = el.getBoundingClientRect();
+            if (rect.width === 0 && rect.height === 0) continue;
+            const box = userRect(rect, 0);
+            elements.push({
+                tag: el.tagName,
+                id: el.id || null,
+                class: el.getAttribute('class'),
+                text: el.tagName === 'text' ? el.textContent : undefined,
+                x: box.x + bbox.offset_x,
+                y: box.y + bbox.offset_y,
+                width: box.width,
+                height: box.height
+            });
+        }
+        return { bbox, elements };
+    }, backgroundColor || null, container);
+}
+
+async function detachContainers(page, containers) {
+    // 批量截图前把所有图表容器移出文档，避免不同图表之间重复的 id（渐变、裁剪路径等）互相引用
+    await page.evaluate((containers) => {
+        window.__detachedContainers = window.__detachedContainers || {};
+        for (const container of containers) {
+            const element = document.querySelector(container);
+            if (element) {
+                window.__detachedContainers[container] = element;
+                element.remove();
+            }
+        }
+    }, containers);
+}
+
+async function screenshotChart(page, bbox, pngFile, container = '#chart-container') {
+    // 把图表内容移到裁剪后的新 SVG 中（与 Python 端生成的 SVG 结构一致），隐藏其余内容后截透明背景图
+    await page.evaluate((bbox, container) => {
+        const detached = window.__detachedContainers && window.__detachedContainers[container];
+        const svg = (detached || document).querySelector(detached ? 'svg' : `${container} svg`);
+        const ns = 'http://www.w3.org/2000/svg';
+        const output = document.createElementNS(ns, 'svg');
+        output.setAttribute('width', bbox.width);
+        output.setAttribute('height', bbox.height);
+        const group = document.createElementNS(ns, 'g');
+        group.setAttribute('transform', `translate(${bbox.offset_x}, ${bbox.offset_y})`);
+        // 移动而不是克隆，避免渐变等 id 引用指向被隐藏的原节点
+        for (const child of Array.from(svg.childNodes)) {
+            group.appendChild(child);
+        }
+        output.appendChild(group);
+
+        for (const node of Array.from(document.body.children)) {
+            node.style.display = 'none';
+        }
+        const previous = document.getElementById('chart-artifact-host');
+        if (previous) {
+            previous.remove();
+        }
+        const host = document.createElement('div');
+        host.id = 'chart-artifact-host';
+        host.style.cssText = 'position:absolute;left:0;top:0;margin:0;padding:0;background:transparent;';
+        host.appendChild(output);
+        document.documentElement.style.background = 'transparent';
+        document.body.style.background = 'transparent';
+        document.body.style.margin = '0';
+        document.body.appendChild(host);
+    }, bbox, container);
+    await page.screenshot({
+        path: pngFile,
+        clip: { x: 0, y: 0, width: bbox.width, height: bbox.height },
+        omitBackground: true,
+        captureBeyondViewport: true
+    });
+}
+
+async function collectArtifacts(page, request, width, height) {
+    // 从已渲染的页面中提取 SVG；artifacts 请求同时计算边界框并截图
+    const svg = await extractSvg(page, width, height);
+    if (!request.artifacts) {
+        return { ok: true, svg };
+    }
+
+    const measured = await measureChart(page, request.background_color);
+    let pngFile = null;
+    if (measured && request.png_file) {
+        await screenshotChart(page, measured.bbox, request.png_file);
+        pngFile = request.png_file;
+    }
+    return {
+        ok: true,
+        svg,
+        bbox: measured ? measured.bbox : null,
+        elements: measured ? measured.elements : [],
+        png_file: pngFile
+    };
+}
+
+function withTimeout(promise, timeout) {
+    let timer;
+    return Promise.race([
+        promise,
+        new Promise(resolve => { timer = setTimeout(() => resolve(null), timeout); })
+    ]).finally(() => clearTimeout(timer));
+}
+
+async function ensureChartPage(slot, pageFile, width, height) {
+    // 页面已经是该预加载页面时只调整视口，否则加载页面（图表库只在这里加载）
+    const viewport = slot.page.viewport();
+    if (!viewport || viewport.width !== width || viewport.height !== height) {
+        await slot.page.setViewport({ width, height });
+    }
+    const url = 'file://' + path.resolve(pageFile);
+    if (slot.page.url() !== url) {
+        await slot.page.goto(url, { waitUntil: 'load' });
+        slot.templates = new Set();
+    }
+}
+
+async function handleRenderChart(request) {
+    const width = request.width || 1200;
+    const height = request.height || 800;
+    const templateId = request.template_id;
+    if (request.template_source) {
+        templateSources.set(templateId, request.template_source);
+    }
+    const source = templateSources.get(templateId);
+    if (source === undefined) {
+        throw new Error(`template_not_loaded: ${templateId}`);
+    }
+
+    const slot = await acquireSlot();
+    let broken = false;
+    try {
+        slot.renders += 1;
+        totalRenders += 1;
+        await ensureChartPage(slot, request.page_file, width, height);
+        const payload = {
+            template_id: templateId,
+            template_source: slot.templates.has(templateId) ? null : source,
+            json_data: request.json_data,
+            width,
+            height
+        };
+        const rendered = await withTimeout(
+            slot.page.evaluate(payload => window.__renderChart(payload), payload),
+            READY_TIMEOUT
+        );
+        if (rendered === null) {
+            // 页面状态未知（图表可能仍在渲染），不返回半成品，回收该页面
+            throw new Error(`render_timeout: chart render timed out after ${READY_TIMEOUT}ms: ${templateId}`);
+        }
+        slot.templates.add(templateId);
+        if (rendered.errors.length) {
+            log('chart errors:', rendered.errors.join('; '));
+        }
+        return await collectArtifacts(slot.page, request, width, height);
+    } catch (e) {
+        broken = true;
+        throw e;
+    } finally {
+        await releaseSlot(slot, broken);
+    }
+}
+
+async function handleRender(request) {
+    const width = request.width || 1200;
+    const height = request.height || 800;
+    const slot = await acquireSlot();
+    let broken = false;
+    try {
+        slot.renders += 1;
+        totalRenders += 1;
+        await slot.page.setViewport({ width, height });
+        await loadChartPage(slot.page, request.html_file);
+        return await collectArtifacts(slot.page, request, width, height);
+    } catch (e) {
+        broken = true;
+        throw e;
+    } finally {
+        await releaseSlot(slot, broken);
+    }
+}
+
+async function handleRenderBatch(request) {
+    const width = request.width || 1200;
+    const height = request.height || 800;
+    const charts = request.charts || [];
+    const slot = await acquireSlot();
+    let broken = false;
+    try {
+        // 按图表数计数，页面回收上限对批量渲染同样有效
+        slot.renders += charts.length;
+        totalRenders += charts.length;
+        await slot.page.setViewport({ width, height });
+        await loadChartPage(slot.page, request.html_file);
+
+        // 先提取所有图表的 SVG 和边界框，再逐个截图（截图会移动图表节点）
+        const results = [];
+        for (const chart of charts) {
+            try {
+                const svg = await extractSvg(slot.page, chart.width || width, chart.height || height, chart.container, false);
+                if (!svg) {
+                    results.push({ ok: false, error: `no chart rendered in ${chart.container}` });
+                    continue;
+                }
+                const measured = request.artifacts ? await measureChart(slot.page, request.background_color, chart.container) : null;
+                results.push({
+                    ok: true,
+                    svg,
+                    bbox: measured ? measured.bbox : null,
+                    elements: measured ? measured.elements : [],
+                    png_file: null
+                });
+            } catch (e) {
+                results.push({ ok: false, error: String(e && e.stack || e) });
+            }
+        }
+
+        if (request.artifacts) {
+            await detachContainers(slot.page, charts.map(chart => chart.container));
+            for (let i = 0; i < charts.length; i++) {
+                const result = results[i];
+                if (!result.ok || !result.bbox || !charts[i].png_file) continue;
+                try {
+                    await screenshotChart(slot.page, result.bbox, charts[i].png_file, charts[i].container);
+                    result.png_file = charts[i].png_file;
+                } catch (e) {
+                    log('batch screenshot failed:', e.message);
+                }
+            }
+        }
+        return { ok: true, results };
+    } catch (e) {
+        broken = true;
+        throw e;
+    } finally {
+        await releaseSlot(slot, broken);
+    }
+}
+
+async function handlePing() {
+    await launchBrowser();
+    const version = await browser.version();
+    return {
+        ok: true,
+        browser: version,
+        pool_size: POOL_SIZE,
+        idle_pages: idleSlots.length,
+        waiting: waiters.length,
+        total_renders: totalRenders
+    };
+}
+
+async function dispatch(request) {
+    switch (request.cmd) {
+        case 'render':
+            return handleRender(request);
+        case 'render_batch':
+            return handleRenderBatch(request);
+        case 'render_chart':
+            return handleRenderChart(request);
+        case 'ping':
+            return handlePing();
+        default:
+            throw new Error(`unknown command: ${request.cmd}`);
+    }
+}
+
+const rl = readline.createInterface({ input: process.stdin });
+rl.on('line', line => {
+    if (!line.trim()) return;
+    let request;
+    try {
+        request = JSON.parse(line);
+    } catch (e) {
+        log('invalid request:', e.message);
+        return;
+    }
+    dispatch(request)
+        .then(result => send({ id: request.id, ...result }))
+        .catch(e => send({ id: request.id, ok: false, error: String(e && e.stack || e) }));
+});
+
+rl.on('close', async () => {
+    // Python 端关闭 stdin 即退出
+    if (browser) {
+        try {
+            await browser.close();
+        } catch (e) {
+            log('failed to close browser:', e.message);
+        }
+    }
+    process.exit(0);
+});
+
+launchBrowser()
+    .then(() => send({ id: null, ok: true, ready: true, pool_size: POOL_SIZE }))
+    .catch(e => send({ id: null, ok: false, ready: false, error: String(e && e.stack || e) }));
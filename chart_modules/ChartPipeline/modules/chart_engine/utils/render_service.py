@@ -0,0 +1,369 @@
+import os
+import json
+import time
+import atexit
+import itertools
+import subprocess
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 渲染服务配置，可通过环境变量覆盖
+RENDER_POOL_SIZE = int(os.environ.get('CHART_RENDER_POOL_SIZE', 3))
+RENDER_MAX_RENDERS_PER_PAGE = int(os.environ.get('CHART_RENDER_MAX_RENDERS_PER_PAGE', 50))
+RENDER_TIMEOUT = float(os.environ.get('CHART_RENDER_TIMEOUT', 60))
+RENDER_STARTUP_TIMEOUT = float(os.environ.get('CHART_RENDER_STARTUP_TIMEOUT', 60))
+RENDER_HEALTH_CHECK_INTERVAL = float(os.environ.get('CHART_RENDER_HEALTH_CHECK_INTERVAL', 30))
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'render_server.cjs')
+
+
+class RenderServiceError(Exception):
+    """渲染服务启动或请求失败"""
+
+
+class ChartRenderService:
+    """
+    常驻的 Puppeteer 渲染服务。
+
+    进程内只启动一个 node 子进程（render_server.cjs），由它维护一个 Chrome 实例和
+    pool_size 个可复用页面；页面渲染 max_renders_per_page 次后自动回收。Python 端
+    通过 stdin/stdout 的 JSON 行协议发送请求，多线程可并发调用。
+    """
+
+    def __init__(self, pool_size=RENDER_POOL_SIZE, max_renders_per_page=RENDER_MAX_RENDERS_PER_PAGE,
+                 timeout=RENDER_TIMEOUT, health_check_interval=RENDER_HEALTH_CHECK_INTERVAL):
+        self.pool_size = pool_size
+        self.max_renders_per_page = max_renders_per_page
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._proc = None
+        self._reader = None
+        self._lock = threading.RLock()
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._last_health_check = 0.0
+        # 已发送给当前 node 进程的模板 id（进程重启后清空）
+        self._sent_templates = set()
+        self._sent_templates_proc = None
+
+    def _ensure_puppeteer(self):
+        """启动前确认 puppeteer 已安装（每个服务只检查一次）"""
+        try:
+            subprocess.run(['npm', 'list', 'puppeteer'], check=True, capture_output=True)
+        except subprocess.CalledProcessError:
+            print("正在安装puppeteer...")
+            subprocess.run(['npm', 'install', 'puppeteer'], check=True)
+
+    def _is_alive(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self):
+        """
+        启动 node 渲染进程并等待浏览器就绪
+
+        Raises:
+            RenderServiceError: npm/node 不存在、puppeteer 安装失败或浏览器启动失败
+        """
+        with self._lock:
+            if self._is_alive():
+                return
+            try:
+                self._ensure_puppeteer()
+            except (subprocess.CalledProcessError, OSError) as e:
+                raise RenderServiceError(f"puppeteer 不可用: {e}")
+
+            env = dict(os.environ)
+            env['CHART_RENDER_POOL_SIZE'] = str(self.pool_size)
+            env['CHART_RENDER_MAX_RENDERS_PER_PAGE'] = str(self.max_renders_per_page)
+            node_path = os.path.join(os.getcwd(), 'node_modules')
+            env['NODE_PATH'] = os.pathsep.join(p for p in [node_path, env.get('NODE_PATH')] if p)
+
+            try:
+                self._proc = subprocess.Popen(
+                    ['node', SERVER_SCRIPT],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=None,
+                    text=True,
+                    encoding='utf-8',
+                    bufsize=1,
+                    env=env
+                )
+            except OSError as e:
+                raise RenderServiceError(f"渲染服务启动失败: {e}")
+            ready = {'event': threading.Event(), 'message': None}
+            self._reader = threading.Thread(target=self._read_loop, args=(self._proc, ready), daemon=True)
+            self._reader.start()
+
+            if not ready['event'].wait(RENDER_STARTUP_TIMEOUT) or not (ready['message'] or {}).get('ok'):
+                error = (ready['message'] or {}).get('error', 'startup timeout or process exited')
+                self._terminate()
+                raise RenderServiceError(f"渲染服务启动失败: {error}")
+            self._last_health_check = time.time()
+            logger.info(f"Chart render service started (pool_size={self.pool_size})")
+
+    def _read_loop(self, proc, ready):
+        """读取 node 进程输出并分发给等待中的请求"""
+        for line in proc.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Render service produced invalid output: {line[:200]}")
+                continue
+
+            request_id = message.get('id')
+            if request_id is None:
+                ready['message'] = message
+                ready['event'].set()
+                continue
+            with self._lock:
+                waiter = self._pending.pop(request_id, None)
+            if waiter is not None:
+                waiter['response'] = message
+                waiter['event'].set()
+
+        # 进程退出：唤醒该进程上所有等待中的请求
+        ready['event'].set()
+        with self._lock:
+            pending = [rid for rid, waiter in self._pending.items() if waiter['proc'] is proc]
+            pending = [self._pending.pop(rid) for rid in pending]
+        for waiter in pending:
+            waiter['response'] = {'ok': False, 'error': 'render service exited'}
+            waiter['event'].set()
+
+    def _terminate(self):
+        proc = self._proc
+        self._proc = None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=5)
+        except Exception:
+            proc.kill()
+
+    def request(self, payload, timeout=None):
+        """发送一个请求并阻塞等待响应"""
+        if not self._is_alive():
+            self.start()
+
+        request_id = next(self._ids)
+        with self._lock:
+            waiter = {'event': threading.Event(), 'response': None, 'proc': self._proc}
+            self._pending[request_id] = waiter
+            try:
+                self._proc.stdin.write(json.dumps(dict(payload, id=request_id)) + '\n')
+                self._proc.stdin.flush()
+            except (BrokenPipeError, OSError, AttributeError) as e:
+                self._pending.pop(request_id, None)
+                raise RenderServiceError(f"渲染服务不可用: {e}")
+
+        if not waiter['event'].wait(timeout or self.timeout):
+            with self._lock:
+                self._pending.pop(request_id, None)
+            raise RenderServiceError(f"渲染请求超时: {payload.get('cmd')}")
+
+        response = waiter['response']
+        if not response.get('ok'):
+            raise RenderServiceError(response.get('error', 'unknown error'))
+        return response
+
+    def health_check(self, force=False):
+        """
+        检查渲染服务是否可用，不可用时重启。
+
+        Args:
+            force: 为 False 时距上次检查不足 health_check_interval 秒直接返回
+
+        Returns:
+            bool: 服务是否健康
+        """
+        if not force and self._is_alive() and time.time() - self._last_health_check < self.health_check_interval:
+            return True
+        try:
+            self.request({'cmd': 'ping'}, timeout=10)
+            self._last_health_check = time.time()
+            return True
+        except RenderServiceError as e:
+            logger.warning(f"Render service health check failed, restarting: {e}")
+            with self._lock:
+                self._terminate()
+            try:
+                self.start()
+                return True
+            except RenderServiceError as restart_error:
+                logger.error(f"Render service restart failed: {restart_error}")
+                return False
+
+    def render_html(self, html_file, width=1200, height=800):
+        """
+        在复用页面中加载 HTML 文件并导出图表 SVG
+
+        Args:
+            html_file: HTML 文件路径
+            width: 视口宽度
+            height: 视口高度
+
+        Returns:
+            SVG 内容字符串
+        """
+        self.health_check()
+        response = self.request({
+            'cmd': 'render',
+            'html_file': os.path.abspath(html_file),
+            'width': int(width),
+            'height': int(height)
+        })
+        return response['svg']
+
+    def render_html_artifacts(self, html_file, width=1200, height=800, png_file=None, background_color=None):
+        """
+        一次页面加载同时得到 SVG、紧致边界框、元素边界框和裁剪后的透明背景 PNG
+
+        Args:
+            html_file: HTML 文件路径
+            width: 视口宽度
+            height: 视口高度
+            png_file: PNG 输出路径，为 None 时不截图
+            background_color: 背景色（hex），与背景色相同的图形不计入边界框
+
+        Returns:
+            dict: svg（原始 SVG）、bbox（min_x/min_y/max_x/max_y/width/height/offset_x/offset_y，
+                  没有可见图形时为 None）、elements（顶层元素和文字的边界框）、png_file（未截图时为 None）
+        """
+        self.health_check()
+        response = self.request({
+            'cmd': 'render',
+            'html_file': os.path.abspath(html_file),
+            'width': int(width),
+            'height': int(height),
+            'artifacts': True,
+            'png_file': os.path.abspath(png_file) if png_file else None,
+            'background_color': background_color
+        })
+        return {
+            'svg': response['svg'],
+            'bbox': response.get('bbox'),
+            'elements': response.get('elements') or [],
+            'png_file': response.get('png_file')
+        }
+
+    def render_chart(self, page_file, template_id, template_source, json_data, width=1200, height=800,
+                     artifacts=False, png_file=None, background_color=None):
+        """
+        在预加载页面（图表库已加载）中通过 page.evaluate 渲染一个图表，不生成单独的 HTML 文件
+
+        Args:
+            page_file: 预加载页面 HTML 文件路径（见 paint_innerchart.chart_page_file）
+            template_id: 模板 id（路径 + mtime 的摘要），服务端按 id 缓存模板源码
+            template_source: 模板源码，只在服务第一次遇到该 id 时发送
+            json_data: 图表数据
+            width: 视口宽度
+            height: 视口高度
+            artifacts: 是否同时计算边界框并截图
+            png_file: PNG 输出路径
+            background_color: 背景色（hex）
+
+        Returns:
+            dict，格式同 render_html_artifacts（artifacts=False 时只有 svg）
+        """
+        self.health_check()
+        payload = {
+            'cmd': 'render_chart',
+            'page_file': os.path.abspath(page_file),
+            'template_id': template_id,
+            'json_data': json_data,
+            'width': int(width),
+            'height': int(height),
+            'artifacts': artifacts,
+            'png_file': os.path.abspath(png_file) if png_file else None,
+            'background_color': background_color
+        }
+        with self._lock:
+            if self._sent_templates_proc is not self._proc:
+                self._sent_templates = set()
+                self._sent_templates_proc = self._proc
+            send_source = template_id not in self._sent_templates
+        try:
+            response = self.request(dict(payload, template_source=template_source if send_source else None))
+        except RenderServiceError as e:
+            if send_source or 'template_not_loaded' not in str(e):
+                raise
+            # 服务端已重启，模板缓存丢失：带上源码重发
+            response = self.request(dict(payload, template_source=template_source))
+        with self._lock:
+            if self._sent_templates_proc is self._proc:
+                self._sent_templates.add(template_id)
+        return {
+            'svg': response['svg'],
+            'bbox': response.get('bbox'),
+            'elements': response.get('elements') or [],
+            'png_file': response.get('png_file')
+        }
+
+    def render_batch(self, html_file, charts, width=1200, height=800, artifacts=True, background_color=None):
+        """
+        在一个页面中渲染多个图表（库只加载一次）
+
+        Args:
+            html_file: 批量 HTML 文件路径（每个图表一个容器）
+            charts: [{'container': '#chart-container-0', 'width': ..., 'height': ..., 'png_file': ...}]
+            width: 视口宽度
+            height: 视口高度
+            artifacts: 是否同时计算边界框并截图
+            background_color: 背景色（hex）
+
+        Returns:
+            与 charts 一一对应的列表，每项为 render_html_artifacts 格式的 dict，失败的图表为 None
+        """
+        self.health_check()
+        response = self.request({
+            'cmd': 'render_batch',
+            'html_file': os.path.abspath(html_file),
+            'width': int(width),
+            'height': int(height),
+            'artifacts': artifacts,
+            'background_color': background_color,
+            'charts': [
+                dict(chart, png_file=os.path.abspath(chart['png_file']) if chart.get('png_file') else None)
+                for chart in charts
+            ]
+        }, timeout=self.timeout * max(1, len(charts)))
+        results = []
+        for chart, result in zip(charts, response.get('results', [])):
+            if not result.get('ok'):
+                logger.warning(f"Batch render failed for {chart.get('container')}: {result.get('error')}")
+                results.append(None)
+                continue
+            results.append({
+                'svg': result['svg'],
+                'bbox': result.get('bbox'),
+                'elements': result.get('elements') or [],
+                'png_file': result.get('png_file')
+            })
+        results.extend([None] * (len(charts) - len(results)))
+        return results
+
+    def close(self):
+        with self._lock:
+            self._terminate()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_render_service():
+    """获取进程级共享的渲染服务（首次调用时启动）"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ChartRenderService()
+            atexit.register(_service.close)
+        return _service
@@ -6,7 +6,10 @@
 基于输入数据特征，使用大模型自动推荐最合适的图表类型
 """
 
+import os
+import copy
 import json
+import hashlib
 import logging
 import argparse
 from typing import Dict, List, Any, Tuple
@@ -19,11 +22,15 @@ project_root = Path(__file__).parent.parent.parent.parent.parent
 sys.path.insert(0, str(project_root))
 
 import config
-import openai
+from chart_modules.llm_client import get_llm_client, TTLCache
 
 API_KEY = config.OPENAI_API_KEY
 BASE_URL = config.OPENAI_BASE_URL
 
+# 推荐结果缓存：/api/chart_types 每次请求（包括翻页）都会调用推荐，同一份数据的推荐结果在 TTL 内复用
+CHART_TYPE_CACHE_TTL = float(os.environ.get('CHART_TYPE_CACHE_TTL', 3600))
+_recommendation_cache = TTLCache(ttl=CHART_TYPE_CACHE_TTL)
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -84,6 +91,23 @@ def analyze_data_structure(data: Dict[str, Any]) -> Dict[str, Any]:
     
     return features
 
+def data_profile_hash(data: Dict[str, Any], available_chart_types: List[str]) -> str:
+    """
+    推荐输入的特征哈希：列定义、行数、提示词中使用的前20行数据和可用图表类型
+
+    与提示词的构造保持一致，哈希相同则大模型看到的输入相同
+    """
+    columns = data.get("data", {}).get("columns", [])
+    rows = data.get("data", {}).get("data", [])
+    profile = {
+        "columns": [{"name": col.get("name", ""), "type": col.get("data_type", "")} for col in columns],
+        "row_count": len(rows),
+        "rows": rows[:20],
+        "available_chart_types": sorted(available_chart_types),
+    }
+    profile_json = json.dumps(profile, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(profile_json.encode("utf-8")).hexdigest()
+
 def recommend_chart_types_with_llm(data: Dict[str, Any], available_chart_types: List[str] = None) -> List[Dict[str, Any]]:
     """
     使用大模型基于数据特征推荐合适的图表类型（最多6个）
@@ -97,6 +121,12 @@ def recommend_chart_types_with_llm(data: Dict[str, Any], available_chart_types:
     """
     if available_chart_types is None:
         available_chart_types = CHART_TYPES
+
+    cache_key = data_profile_hash(data, available_chart_types)
+    cached = _recommendation_cache.get(cache_key)
+    if cached is not None:
+        logger.info("图表类型推荐命中缓存")
+        return copy.deepcopy(cached)
     
     try:
         # 分析数据结构
@@ -198,12 +228,7 @@ def recommend_chart_types_with_llm(data: Dict[str, Any], available_chart_types:
 只返回JSON，不要其他文字。"""
         
         # 调用大模型（使用 Gemini 2.0 Flash）
-        client = openai.OpenAI(
-            api_key=API_KEY,
-            base_url=BASE_URL
-        )
-        
-        response = client.chat.completions.create(
+        response = get_llm_client(BASE_URL, API_KEY).chat(
             model="gemini-2.0-flash",  # 使用 Gemini 2.0 Flash 模型
             messages=[
                 {"role": "system", "content": "你是一个专业的数据可视化专家，擅长根据数据特征和具体数据内容推荐最合适的图表类型。"},
@@ -255,6 +280,9 @@ def recommend_chart_types_with_llm(data: Dict[str, Any], available_chart_types:
         
         # 按置信度排序
         valid_recommendations.sort(key=lambda x: x["confidence"], reverse=True)
+
+        # 只缓存大模型的有效推荐，规则后备结果不缓存，下次请求仍会尝试大模型
+        _recommendation_cache.put(cache_key, copy.deepcopy(valid_recommendations[:6]))
         
         return valid_recommendations[:6]  # 确保最多6个
         
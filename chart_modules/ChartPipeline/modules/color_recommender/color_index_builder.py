@@ -12,6 +12,7 @@ class ColorIndexBuilder:
         self.color_palette_path = data_path
         # Use the global ModelLoader to get the model instance
         self.model = ModelLoader.get_model(embed_model_path)
+        self.embeddings = ModelLoader.get_embedding_service(embed_model_path)
         self.index = None
         self.color_palettes = None
         self.index_path = index_path
@@ -53,19 +54,18 @@ class ColorIndexBuilder:
         # Load color palettes
         self.color_palettes = self.load_color_palettes()
         
-        # Create embeddings for each palette
-        embeddings = []
+        # Create embeddings for all palettes in one batched call
+        texts = []
         self.palette_indices = []
         
         for index, palette in self.color_palettes.items():
             text = self.create_text_for_embedding(palette)
             print('text', text)
-            embedding = self.model.encode(text)
-            embeddings.append(embedding)
+            texts.append(text)
             self.palette_indices.append(index)
             
         # Convert to numpy array
-        embeddings = np.array(embeddings).astype('float32')
+        embeddings = np.array(self.embeddings.encode(texts)).astype('float32')
         
         # Create and train the index
         self.index = faiss.IndexFlatL2(self.dimension)
@@ -86,7 +86,7 @@ class ColorIndexBuilder:
             self.build_index()
             
         # Create embedding for query
-        query_embedding = self.model.encode(query_text)
+        query_embedding = self.embeddings.encode(query_text)
         query_embedding = np.array([query_embedding]).astype('float32')
         
         # Search the index
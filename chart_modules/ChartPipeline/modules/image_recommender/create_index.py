@@ -15,6 +15,7 @@ from typing import Optional, List, Dict, Union
 class ImageRecommender:
     def __init__(self, embed_model_path: str):
         self.model = ModelLoader.get_model(embed_model_path)
+        self.embeddings = ModelLoader.get_embedding_service(embed_model_path)
         self.index = None
         self.image_paths = []
         self.image_data = []
@@ -134,7 +135,7 @@ class ImageRecommender:
             raise ValueError("Index not loaded. Please load the index first.")
             
         # Generate query embedding
-        query_embedding = self.model.encode(query_text)
+        query_embedding = self.embeddings.encode(query_text)
         query_embedding = np.array([query_embedding]).astype('float32')
         
         results = []
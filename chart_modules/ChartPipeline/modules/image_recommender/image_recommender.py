@@ -16,6 +16,8 @@ class ImageRecommender:
             self.index_builder = IndexBuilder(embed_model_path)
             self.index_builder.load_index(index_path, data_path)
         self.model = ModelLoader.get_model(embed_model_path)
+        # Batched, cached embeddings shared with the other recommenders
+        self.embeddings = ModelLoader.get_embedding_service(embed_model_path)
         self.base_url = base_url
         self.request_url = self.base_url + '/chat/completions'
         self.api_key = api_key
@@ -173,17 +175,15 @@ class ImageRecommender:
                 selected_type = random.choice(available_types)
             icons = special_icons[category][selected_type]
             
-            model = self.model
-            
             icon_names = [icon["name"] for icon in icons]
-            icon_embeddings = model.encode(icon_names)
+            icon_embeddings = self.embeddings.encode(icon_names)
+            
+            # Convert numpy types to Python native types
+            value_strs = [str(value.item() if hasattr(value, 'item') else value) for value in unique_values]
+            value_embeddings = self.embeddings.encode(value_strs)
             
             result = {}
-            for value in unique_values:
-                # Convert numpy types to Python native types
-                value_str = str(value.item() if hasattr(value, 'item') else value)
-                value_embedding = model.encode([value_str])[0]
-                
+            for value_str, value_embedding in zip(value_strs, value_embeddings):
                 # Calculate similarities
                 from scipy.spatial.distance import cosine
                 similarities = [1 - cosine(value_embedding, icon_emb) for icon_emb in icon_embeddings]
@@ -230,8 +230,10 @@ class ImageRecommender:
                      for group_candidates in all_group_icons.values()
                      for img in group_candidates}
         
-        for key in all_images:
-            all_images[key] = self.model.encode(self.get_semantic_text(all_images[key]))
+        image_keys = list(all_images)
+        image_embeddings = self.embeddings.encode([self.get_semantic_text(all_images[key]) for key in image_keys])
+        for key, embedding in zip(image_keys, image_embeddings):
+            all_images[key] = embedding
         
         # Select optimal icons
         return self.select_optimal_icons(all_group_icons, all_images)
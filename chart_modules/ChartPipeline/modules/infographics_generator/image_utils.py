@@ -1,9 +1,122 @@
 import numpy as np
 from typing import Tuple
-from .mask_utils import calculate_mask, expand_mask
+from scipy.ndimage import maximum_filter
+from scipy.signal import fftconvolve
+from .mask_utils import calculate_mask, expand_mask, grid_mask_from_array
+from .rasterizer import rasterize_svg
 import os
+import hashlib
+import threading
+from collections import OrderedDict
 from PIL import Image
 
+# 图片mask缓存配置，可通过环境变量覆盖
+IMAGE_MASK_BASE_SIZE = int(os.environ.get('IMAGE_MASK_BASE_SIZE', 1024))
+IMAGE_MASK_CACHE_SIZE = int(os.environ.get('IMAGE_MASK_CACHE_SIZE', 256))
+IMAGE_BASE_CACHE_SIZE = int(os.environ.get('IMAGE_BASE_CACHE_SIZE', 8))
+
+_image_base_cache = OrderedDict()   # image_hash -> 全分辨率RGB数组
+_image_mask_cache = OrderedDict()   # (image_hash, size, grid_size, bg_threshold, expand) -> mask
+_image_cache_lock = threading.Lock()
+
+def _cache_get(cache: OrderedDict, key):
+    with _image_cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+def _cache_put(cache: OrderedDict, key, value, max_size: int):
+    with _image_cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+
+def _get_base_image(image_content: str, image_hash: str, min_size: int) -> np.ndarray:
+    """
+    获取图片的全分辨率RGB渲染结果（白色背景）。
+    每张图片只渲染一次，只有请求尺寸超过已缓存的分辨率时才重新渲染。
+    """
+    base = _cache_get(_image_base_cache, image_hash)
+    if base is not None and base.shape[0] >= min_size:
+        return base
+    base_size = max(IMAGE_MASK_BASE_SIZE, min_size)
+    temp_svg = f"""<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{base_size}" height="{base_size}">
+            <image width="{base_size}" height="{base_size}" href="{image_content}"/>
+        </svg>"""
+    base = rasterize_svg(temp_svg, background_color="#ffffff")[:, :, :3]
+    if base.shape[0] != base_size or base.shape[1] != base_size:
+        base = np.array(Image.fromarray(base).resize((base_size, base_size), Image.LANCZOS))
+    _cache_put(_image_base_cache, image_hash, base, IMAGE_BASE_CACHE_SIZE)
+    return base
+
+def get_image_mask(image_content: str, size: int, grid_size: int = 5, bg_threshold: float = 240, expand: int = 0) -> np.ndarray:
+    """
+    获取图片在size x size尺寸下的二值mask（1为内容）。
+
+    图片只在全分辨率下渲染一次，各尺寸由内存中重采样得到；结果按(图片哈希, 尺寸, 参数)缓存，
+    同一张图片在side / overlay / background多次放置搜索之间共享。
+
+    Args:
+        image_content: 图片内容（base64 data URI或URL）
+        size: 目标尺寸（像素）
+        grid_size: 二值化的分块大小
+        bg_threshold: 背景像素阈值
+        expand: 大于0时对mask做expand_mask扩展
+
+    Returns:
+        np.ndarray: (size, size)的uint8 mask，调用方不应原地修改
+    """
+    image_hash = hashlib.md5(image_content.encode('utf-8')).hexdigest()
+    key = (image_hash, size, grid_size, bg_threshold, expand)
+    mask = _cache_get(_image_mask_cache, key)
+    if mask is not None:
+        return mask
+
+    base = _get_base_image(image_content, image_hash, size)
+    if base.shape[0] != size:
+        img_array = np.array(Image.fromarray(base).resize((size, size), Image.LANCZOS))
+    else:
+        img_array = base
+    mask = grid_mask_from_array(img_array, grid_size=grid_size, bg_threshold=bg_threshold)
+    if expand > 0:
+        mask = expand_mask(mask, expand)
+    mask.setflags(write=False)
+    _cache_put(_image_mask_cache, key, mask, IMAGE_MASK_CACHE_SIZE)
+    return mask
+
+def dilated_downsample(mask: np.ndarray, grid_size: int) -> np.ndarray:
+    """
+    将mask降采样到1/grid_size大小，降采样后的(i, j)只要在原图对应grid及其周围一圈grid
+    （3x3个grid）中有内容（1）就标记为1。
+
+    先按grid做分块max-pool，再在块网格上做3x3最大值滤波，一次完成。
+    """
+    h, w = mask.shape
+    downsampled_h = h // grid_size
+    downsampled_w = w // grid_size
+    # 多补一行/一列块，用来容纳不足一个grid的余数行列（它们属于最后一个块的邻域）
+    padded = np.zeros(((downsampled_h + 1) * grid_size, (downsampled_w + 1) * grid_size), dtype=bool)
+    padded[:h, :w] = mask == 1
+    blocks = padded.reshape(downsampled_h + 1, grid_size, downsampled_w + 1, grid_size).any(axis=(1, 3))
+    dilated = maximum_filter(blocks.astype(np.uint8), size=3, mode='constant', cval=0)
+    return dilated[:downsampled_h, :downsampled_w]
+
+def sliding_overlap(mask: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """
+    计算kernel在mask上所有(y, x)位置的重叠像素数（valid模式），
+    即 result[y, x] = sum(mask[y:y+kh, x:x+kw] & kernel)，使用FFT卷积一次算出
+    """
+    correlation = fftconvolve(mask.astype(np.float64), kernel[::-1, ::-1].astype(np.float64), mode='valid')
+    return np.rint(correlation).astype(np.int64)
+
+def _first_best_index(valid: np.ndarray, primary: np.ndarray, secondary: np.ndarray):
+    """在valid位置中按(primary, secondary)升序选择，平局时取行优先扫描顺序中的第一个"""
+    flat = np.flatnonzero(valid)
+    order = np.lexsort((secondary.ravel()[flat], primary.ravel()[flat]))
+    return np.unravel_index(flat[order[0]], valid.shape)
+
 def find_best_size_and_position(main_mask: np.ndarray, image_content: str, padding: int, mode: str = "side", chart_bbox: dict = None, avoid_mask: np.ndarray = None) -> Tuple[int, int, int]:
     """
     通过降采样加速查找最佳图片尺寸和位置
@@ -30,30 +143,12 @@ def find_best_size_and_position(main_mask: np.ndarray, image_content: str, paddi
     h, w = main_mask.shape
     downsampled_h = h // grid_size
     downsampled_w = w // grid_size
-    downsampled_main = np.zeros((downsampled_h, downsampled_w), dtype=np.uint8)
-        
-    # 对每个grid进行降采样，只要原grid中有内容（1）就标记为1
-    for i in range(downsampled_h):
-        for j in range(downsampled_w):
-            y_start = max(0, (i - 1) * (grid_size))
-            x_start = max(0, (j - 1) * (grid_size))
-            y_end = min((i + 2) * (grid_size), h)
-            x_end = min((j + 2) * (grid_size), w)
-            grid = main_mask[y_start:y_end, x_start:x_end]
-            downsampled_main[i, j] = 1 if np.any(grid == 1) else 0
+    downsampled_main = dilated_downsample(main_mask, grid_size)
     
     # 如果有avoid_mask，也进行降采样
     downsampled_avoid = None
     if avoid_mask is not None:
-        downsampled_avoid = np.zeros((downsampled_h, downsampled_w), dtype=np.uint8)
-        for i in range(downsampled_h):
-            for j in range(downsampled_w):
-                y_start = max(0, (i - 1) * (grid_size))
-                x_start = max(0, (j - 1) * (grid_size))
-                y_end = min((i + 2) * (grid_size), h)
-                x_end = min((j + 2) * (grid_size), w)
-                grid = avoid_mask[y_start:y_end, x_start:x_end]
-                downsampled_avoid[i, j] = 1 if np.any(grid == 1) else 0
+        downsampled_avoid = dilated_downsample(avoid_mask, grid_size)
     
     # 调整padding到降采样尺度
     downsampled_padding = max(1, padding // grid_size)
@@ -85,26 +180,14 @@ def find_best_size_and_position(main_mask: np.ndarray, image_content: str, paddi
         
         # 生成当前尺寸的图片mask并降采样
         original_size = mid_size * grid_size
-        temp_svg = f"""<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{original_size}" height="{original_size}">
-            <image width="{original_size}" height="{original_size}" href="{image_content}"/>
-        </svg>"""
-        image_mask = calculate_mask(temp_svg, original_size, original_size, 0, grid_size=grid_size, bg_threshold=240)
-        if mode == "background":
-            image_mask = expand_mask(image_mask, 10)
+        image_mask = get_image_mask(image_content, original_size, grid_size=grid_size, bg_threshold=240,
+                                    expand=10 if mode == "background" else 0)
         # Save the original image mask to PNG for debugging
         os.makedirs('tmp', exist_ok=True)
         mask_image = Image.fromarray((image_mask * 255).astype(np.uint8))
         mask_image.save('tmp/image_mask.png')
         # 将image_mask降采样
-        downsampled_image = np.zeros((mid_size, mid_size), dtype=np.uint8)
-        for i in range(mid_size):
-            for j in range(mid_size):
-                y_start = max(0, (i - 1) * (grid_size))
-                x_start = max(0, (j - 1) * (grid_size))
-                y_end = min((i + 2) * (grid_size), original_size)
-                x_end = min((j + 2) * (grid_size), original_size)
-                grid = image_mask[y_start:y_end, x_start:x_end]
-                downsampled_image[i, j] = 1 if np.any(grid == 1) else 0
+        downsampled_image = dilated_downsample(image_mask, grid_size)
         
         # 计算有效的搜索范围
         if mode == "background" and chart_bbox is not None:
@@ -130,14 +213,6 @@ def find_best_size_and_position(main_mask: np.ndarray, image_content: str, paddi
                 continue
         
         # 在降采样空间中寻找最佳位置
-        min_overlap = float('inf')
-        if mode == "side" or mode == "background":
-            min_overlap = float('inf')
-        elif mode == "overlay":
-            min_overlap = 0
-        current_x = downsampled_padding
-        current_y = downsampled_padding
-        min_distance = float('inf')
         mask_center_x = np.mean(np.where(downsampled_main == 1)[1]) if np.any(downsampled_main == 1) else downsampled_w // 2
         mask_center_y = np.mean(np.where(downsampled_main == 1)[0]) if np.any(downsampled_main == 1) else downsampled_h // 2
 
@@ -146,54 +221,61 @@ def find_best_size_and_position(main_mask: np.ndarray, image_content: str, paddi
             y_end = chart_y + chart_height - mid_size - downsampled_padding + 1
             x_start = chart_x + downsampled_padding
             x_end = chart_x + chart_width - mid_size - downsampled_padding + 1
+            border_left = chart_x + downsampled_padding
+            border_right = chart_x + chart_width - mid_size - downsampled_padding
+            border_top = chart_y + downsampled_padding
+            border_bottom = chart_y + chart_height - mid_size - downsampled_padding
         else:
             y_start = downsampled_padding
             y_end = downsampled_h - mid_size - downsampled_padding + 1
             x_start = downsampled_padding
             x_end = downsampled_w - mid_size - downsampled_padding + 1
+            border_left = downsampled_padding
+            border_right = downsampled_w - mid_size - downsampled_padding
+            border_top = downsampled_padding
+            border_bottom = downsampled_h - mid_size - downsampled_padding
+        
+        # 一次性计算所有候选位置(y, x)与main_mask的重叠比例
+        image_content_mask = downsampled_image == 1
+        total = np.sum(image_content_mask)
+        overlap = sliding_overlap(downsampled_main == 1, image_content_mask)[y_start:y_end, x_start:x_end]
+        overlap_ratio = overlap / total if total > 0 else np.ones(overlap.shape)
+        
+        # 与avoid_mask的重叠
+        if downsampled_avoid is not None:
+            avoid_overlap = sliding_overlap(downsampled_avoid == 1, image_content_mask)[y_start:y_end, x_start:x_end]
+        else:
+            avoid_overlap = np.zeros(overlap.shape, dtype=np.int64)
+        
+        ys, xs = np.mgrid[y_start:y_end, x_start:x_end]
         
-        for y in range(y_start, y_end):
-            for x in range(x_start, x_end):
-                region = downsampled_main[y:y + mid_size, x:x + mid_size]
-                
-                overlap = np.sum((region == 1) & (downsampled_image == 1))
-                total = np.sum(downsampled_image == 1)
-                overlap_ratio = overlap / total if total > 0 else 1.0
-                
-                # 检查与avoid_mask的重叠
-                avoid_overlap = 0
-                if downsampled_avoid is not None:
-                    avoid_region = downsampled_avoid[y:y + mid_size, x:x + mid_size]
-                    avoid_overlap = np.sum((avoid_region == 1) & (downsampled_image == 1))
-                
-                if mode == "side" or mode == "background":
-                    if mode == "background" and chart_bbox is not None:
-                        distance_to_left = x - (chart_x + downsampled_padding)
-                        distance_to_right = (chart_x + chart_width - mid_size - downsampled_padding) - x
-                        distance_to_top = y - (chart_y + downsampled_padding)
-                        distance_to_bottom = (chart_y + chart_height - mid_size - downsampled_padding) - y
-                    else:
-                        distance_to_left = x - downsampled_padding
-                        distance_to_right = downsampled_w - mid_size - downsampled_padding - x
-                        distance_to_top = y - downsampled_padding
-                        distance_to_bottom = downsampled_h - mid_size - downsampled_padding - y
-
-                    distance_to_border = min(distance_to_left, distance_to_right, distance_to_top, distance_to_bottom)
-                    if overlap_ratio < min_overlap or (overlap_ratio < overlap_threshold and distance_to_border < min_distance):
-                        min_overlap = overlap_ratio
-                        current_x = x
-                        current_y = y
-                        min_distance = distance_to_border
-                elif mode == "overlay":
-                    # 对于overlay模式，需要同时满足与main_mask的重叠足够大，且与avoid_mask没有重叠
-                    if avoid_overlap > 0:
-                        continue  # 跳过与avoid_mask有重叠的位置
-                    distance_to_center = np.sqrt(((x + mid_size / 2 - mask_center_x) ** 2 + (y + mid_size / 2 - mask_center_y) ** 2))
-                    if overlap_ratio > min_overlap or (overlap_ratio > overlap_threshold and distance_to_center < min_distance):
-                        min_overlap = overlap_ratio
-                        current_x = x
-                        current_y = y
-                        min_distance = distance_to_center
+        if mode == "side" or mode == "background":
+            # 优先选择重叠低于阈值且离边界最近的位置，没有满足阈值的位置时取重叠最小的位置
+            distance_to_border = np.minimum.reduce([xs - border_left, border_right - xs, ys - border_top, border_bottom - ys])
+            acceptable = overlap_ratio < overlap_threshold
+            if np.any(acceptable):
+                best_index = _first_best_index(acceptable, distance_to_border, overlap_ratio)
+            else:
+                best_index = _first_best_index(np.ones(overlap.shape, dtype=bool), overlap_ratio, distance_to_border)
+            min_overlap = overlap_ratio[best_index]
+            current_y, current_x = int(ys[best_index]), int(xs[best_index])
+        elif mode == "overlay":
+            # 需要同时满足与main_mask的重叠足够大，且与avoid_mask没有重叠；满足时取离内容中心最近的位置
+            distance_to_center = np.sqrt((xs + mid_size / 2 - mask_center_x) ** 2 + (ys + mid_size / 2 - mask_center_y) ** 2)
+            allowed = avoid_overlap == 0
+            acceptable = allowed & (overlap_ratio > overlap_threshold)
+            current_x = downsampled_padding
+            current_y = downsampled_padding
+            min_overlap = 0
+            if np.any(acceptable):
+                best_index = _first_best_index(acceptable, distance_to_center, -overlap_ratio)
+            elif np.any(allowed):
+                best_index = _first_best_index(allowed, -overlap_ratio, distance_to_center)
+            else:
+                best_index = None
+            if best_index is not None:
+                min_overlap = overlap_ratio[best_index]
+                current_y, current_x = int(ys[best_index]), int(xs[best_index])
         
         # print(f"Trying size {mid_size * grid_size}x{mid_size * grid_size}, minimum overlap ratio: {min_overlap:.3f}")
         
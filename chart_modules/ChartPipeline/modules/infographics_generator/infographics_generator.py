@@ -46,6 +46,7 @@ from modules.title_styler.title_styler import process as title_styler_process
 from modules.infographics_generator.mask_utils import fill_columns_between_bounds, calculate_mask_v2, expand_mask, calculate_mask_v3
 from modules.infographics_generator.svg_utils import extract_svg_content, extract_large_rect, adjust_and_get_bbox, add_gradient_to_rect, extract_background_element
 from modules.infographics_generator.image_utils import find_best_size_and_position
+from modules.infographics_generator.rasterizer import rasterize_svg_to_png
 from modules.infographics_generator.template_utils import (
     analyze_templates,
     check_template_compatibility,
@@ -992,15 +993,7 @@ def process(input: str, output: str, base_url: str, api_key: str, chart_name: st
                         fcntl.flock(f, fcntl.LOCK_UN)
 
                 # 转换为PNG
-                subprocess.run([
-                    'rsvg-convert',
-                    '-f', 'png',
-                    '-o', png_path,
-                    '--dpi-x', '300',
-                    '--dpi-y', '300',
-                    '--background-color', '#ffffff',
-                    output_path
-                ], check=True)
+                rasterize_svg_to_png(final_svg, png_path, background_color='#ffffff')
                 
                 # 如果所有操作都成功,跳出循环
                 break
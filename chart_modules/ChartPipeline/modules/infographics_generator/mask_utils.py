@@ -1,32 +1,45 @@
-import os
-import random
-import subprocess
 import re
 from PIL import Image
 import numpy as np
 from typing import Tuple
-import tempfile
 from bs4 import BeautifulSoup
 import scipy.ndimage as ndimage
-import time
 import logging
+from .rasterizer import rasterize_svg
 
 # 设置日志
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def validate_svg_file(file_path):
-    """验证SVG文件是否存在且内容有效"""
-    if not os.path.exists(file_path):
-        logger.error(f"SVG文件不存在: {file_path}")
-        return False
-    
-    file_size = os.path.getsize(file_path)
-    if file_size == 0:
-        logger.error(f"SVG文件为空: {file_path}")
-        return False
-    
-    return True
+def _fill_small_gaps_along_rows(mask: np.ndarray, mask_padding: int) -> np.ndarray:
+    """
+    逐行扫描，若同一行中相邻两个内容像素的距离小于mask_padding，则把两者之间填充为1。
+    使用前/后最近内容像素的累积索引实现，不需要Python循环。
+    """
+    height, width = mask.shape
+    content = mask == 1
+    columns = np.arange(width, dtype=np.int32)
+    # 每个位置左侧（含自身）最近的内容像素索引，不存在时为-1
+    prev_index = np.maximum.accumulate(np.where(content, columns, -1), axis=1)
+    # 每个位置右侧（含自身）最近的内容像素索引，不存在时为width
+    next_index = np.minimum.accumulate(np.where(content, columns, width)[:, ::-1], axis=1)[:, ::-1]
+    in_gap = (prev_index >= 0) & (next_index < width) & (next_index - prev_index < mask_padding)
+    return content | in_gap
+
+def fill_small_gaps(mask: np.ndarray, mask_padding: int = 3) -> np.ndarray:
+    """
+    分别在水平和竖直方向上填充内容像素之间距离小于mask_padding的间隙
+
+    Args:
+        mask: 二值mask，1表示内容
+        mask_padding: 相邻内容像素的距离阈值
+
+    Returns:
+        np.ndarray: 填充后的uint8 mask
+    """
+    filled = _fill_small_gaps_along_rows(mask, mask_padding)
+    filled |= _fill_small_gaps_along_rows(mask.T, mask_padding).T
+    return filled.astype(np.uint8)
 
 def calculate_mask_v3(svg_content: str, width: int, height: int, background_color: str, grid_size: int = 5, max_difference = 15) -> np.ndarray:
     """将SVG转换为基于背景色的二值化mask数组"""
@@ -67,59 +80,25 @@ def calculate_mask_v3(svg_content: str, width: int, height: int, background_colo
     # 重新获取处理后的SVG内容
     svg_content_without_text = str(soup)
     
-    # 创建临时文件
-    with tempfile.NamedTemporaryFile(suffix='.svg', delete=False) as mask_svg_file_without_text, \
-         tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_mask_png_file_without_text:
-        mask_svg_without_text = mask_svg_file_without_text.name
-        temp_mask_png_without_text = temp_mask_png_file_without_text.name
-        
-        # 修改SVG内容，移除渐变
-        # 将渐变填充替换为可见的纯色填充，而不是none
-        mask_svg_content = svg_content_without_text
-        # mask_svg_content = re.sub(r'fill="url\(#[^"]*\)"', 'fill="#333333"', mask_svg_content)
-        # mask_svg_content = re.sub(r'stroke="url\(#[^"]*\)"', 'stroke="#333333"', mask_svg_content)
-        mask_svg_content = mask_svg_content.replace('&', '&amp;')
-        
-        # 提取SVG内容并添加新的SVG标签
-        svg_content_match = re.search(r'<svg[^>]*>(.*?)</svg>', mask_svg_content, re.DOTALL)
-        if svg_content_match:
-            inner_content = svg_content_match.group(1)
-            # 创建新的SVG标签
-            mask_svg_content = f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{width}" height="{height}"> \
-            <rect width="{width}" height="{height}" fill="{original_background_color}" /> \
-            {inner_content} \
-            </svg>'
-        
-        mask_svg_file_without_text.write(mask_svg_content.encode('utf-8'))
-        mask_svg_file_without_text.flush()
-        
-        # 验证SVG文件
-        if not validate_svg_file(mask_svg_without_text):
-            logger.error(f"无效的SVG文件: {mask_svg_without_text}")
-        
-        retry_count = 0
-        max_retries = 3
-        while retry_count < max_retries:
-            try:
-                subprocess.run([
-                    'rsvg-convert',
-                    '-f', 'png',
-                    '-o', temp_mask_png_without_text,
-                    '--dpi-x', '300',
-                    '--dpi-y', '300',
-                    '--background-color', f"{original_background_color}",
-                    mask_svg_without_text
-                ], check=True)
-                break
-            except Exception as e:
-                retry_count += 1
-                logger.error(f"rsvg-convert执行失败 (尝试 {retry_count}/{max_retries}): {str(e)}")
-                if retry_count >= max_retries:
-                    raise e
-                time.sleep(1)
-                
-    img_without_text = Image.open(temp_mask_png_without_text).convert('RGB')
-    img_array_without_text = np.array(img_without_text)
+    # 修改SVG内容，移除渐变
+    # 将渐变填充替换为可见的纯色填充，而不是none
+    mask_svg_content = svg_content_without_text
+    # mask_svg_content = re.sub(r'fill="url\(#[^"]*\)"', 'fill="#333333"', mask_svg_content)
+    # mask_svg_content = re.sub(r'stroke="url\(#[^"]*\)"', 'stroke="#333333"', mask_svg_content)
+    mask_svg_content = mask_svg_content.replace('&', '&amp;')
+    
+    # 提取SVG内容并添加新的SVG标签
+    svg_content_match = re.search(r'<svg[^>]*>(.*?)</svg>', mask_svg_content, re.DOTALL)
+    if svg_content_match:
+        inner_content = svg_content_match.group(1)
+        # 创建新的SVG标签
+        mask_svg_content = f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{width}" height="{height}"> \
+        <rect width="{width}" height="{height}" fill="{original_background_color}" /> \
+        {inner_content} \
+        </svg>'
+    
+    img_array_without_text = rasterize_svg(mask_svg_content, background_color=original_background_color)[:, :, :3]
+    img_without_text = Image.fromarray(img_array_without_text)
     
     # 确保图像尺寸匹配预期尺寸
     actual_height, actual_width = img_array_without_text.shape[:2]
@@ -137,42 +116,8 @@ def calculate_mask_v3(svg_content: str, width: int, height: int, background_colo
     
     svg_content_only_text = str(soup)
     
-    # 创建临时文件
-    with tempfile.NamedTemporaryFile(suffix='.svg', delete=False) as mask_svg_file_only_text, \
-         tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_mask_png_file_only_text:
-        mask_svg_only_text = mask_svg_file_only_text.name
-        temp_mask_png_only_text = temp_mask_png_file_only_text.name
-        mask_svg_file_only_text.write(svg_content_only_text.encode('utf-8'))
-        mask_svg_file_only_text.flush()
-        
-        # 验证SVG文件
-        if not validate_svg_file(mask_svg_only_text):
-            logger.error(f"无效的SVG文件: {mask_svg_only_text}")
-            
-        retry_count = 0
-        max_retries = 3
-        while retry_count < max_retries:
-            try:
-                subprocess.run([
-                    'rsvg-convert',
-                    '-f', 'png', 
-                    '-o', temp_mask_png_only_text,
-                    '--dpi-x', '300',
-                    '--dpi-y', '300',
-                    '--background-color', f"{original_background_color}",
-                    mask_svg_only_text
-                ], check=True)
-                break
-            except Exception as e:
-                retry_count += 1
-                logger.error(f"rsvg-convert执行失败 (尝试 {retry_count}/{max_retries}): {str(e)}")
-                if retry_count >= max_retries:
-                    raise e
-                time.sleep(1)
-        
-        
-    img_only_text = Image.open(temp_mask_png_only_text).convert('RGB')
-    img_array_only_text = np.array(img_only_text)
+    img_array_only_text = rasterize_svg(svg_content_only_text, background_color=original_background_color)[:, :, :3]
+    img_only_text = Image.fromarray(img_array_only_text)
     
     # 确保图像尺寸匹配预期尺寸
     actual_height, actual_width = img_array_only_text.shape[:2]
@@ -209,56 +154,13 @@ def calculate_mask_v3(svg_content: str, width: int, height: int, background_colo
     color_diff_only_text = np.sqrt(np.sum((img_array_only_text - background_color) ** 2, axis=2))
     mask_only_text[color_diff_only_text >= 15] = 1  # 提高阈值从10到15,要求与背景色差异更大
     
-    # 初始化填充mask
-    fill_mask = np.zeros((height, width), dtype=np.uint8)
-    fill_mask_only_text = np.zeros((height, width), dtype=np.uint8)
+    # 填充水平/竖直方向上相邻内容之间的小间隙
     mask_padding = 3
-    for i in range(height):
-        last_j = -mask_padding
-        for j in range(width):
-            if mask[i, j] == 1:
-                if j - last_j < mask_padding:
-                    fill_mask[i, last_j:j+1] = 1
-                else:
-                    fill_mask[i, j] = 1
-                last_j = j
-
-    for j in range(width):
-        last_i = -mask_padding
-        for i in range(height):
-            if mask[i, j] == 1:
-                if i - last_i < mask_padding:
-                    fill_mask[last_i:i+1, j] = 1
-                else:
-                    fill_mask[i, j] = 1
-                last_i = i
-
-    for j in range(width):
-        last_i = -mask_padding
-        for i in range(height):
-            if mask_only_text[i, j] == 1:
-                if i - last_i < mask_padding:
-                    fill_mask_only_text[last_i:i+1, j] = 1
-                else:
-                    fill_mask_only_text[i, j] = 1
-                last_i = i
-
-    for i in range(height):
-        last_j = -mask_padding
-        for j in range(width):
-            if mask_only_text[i, j] == 1:
-                if j - last_j < mask_padding:
-                    fill_mask_only_text[i, last_j:j+1] = 1
-                else:
-                    fill_mask_only_text[i, j] = 1
-                last_j = j
+    fill_mask = fill_small_gaps(mask, mask_padding)
+    fill_mask_only_text = fill_small_gaps(mask_only_text, mask_padding)
 
     mask = fill_mask
     mask_only_text = fill_mask_only_text
-    os.remove(mask_svg_without_text)
-    os.remove(temp_mask_png_without_text)
-    os.remove(mask_svg_only_text)
-    os.remove(temp_mask_png_only_text)
     
     return mask, mask_only_text
 
@@ -299,59 +201,25 @@ def calculate_mask_v2(svg_content: str, width: int, height: int, background_colo
     # 重新获取处理后的SVG内容
     svg_content = str(soup)
     
-    # 创建临时文件
-    with tempfile.NamedTemporaryFile(suffix='.svg', delete=False) as mask_svg_file, \
-         tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_mask_png_file:
-        mask_svg = mask_svg_file.name
-        temp_mask_png = temp_mask_png_file.name
-        
-        # 修改SVG内容，移除渐变
-        # 将渐变填充替换为可见的纯色填充，而不是none
-        mask_svg_content = re.sub(r'fill="url\(#[^"]*\)"', 'fill="#333333"', svg_content)
-        mask_svg_content = re.sub(r'stroke="url\(#[^"]*\)"', 'stroke="#333333"', mask_svg_content)
-        mask_svg_content = mask_svg_content.replace('&', '&amp;')
-        
-        # 提取SVG内容并添加新的SVG标签
-        svg_content_match = re.search(r'<svg[^>]*>(.*?)</svg>', mask_svg_content, re.DOTALL)
-        if svg_content_match:
-            inner_content = svg_content_match.group(1)
-            # 创建新的SVG标签
-            mask_svg_content = f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{width}" height="{height}"> \
-            <rect width="{width}" height="{height}" fill="{original_background_color}" /> \
-            {inner_content} \
-            </svg>'
-        
-        mask_svg_file.write(mask_svg_content.encode('utf-8'))
-        mask_svg_file.flush()
-        
-        # 验证SVG文件
-        if not validate_svg_file(mask_svg):
-            logger.error(f"无效的SVG文件: {mask_svg}")
-        
-    max_retries = 3
-    retry_count = 0
-    while retry_count < max_retries:
-        try:
-            subprocess.run([
-                'rsvg-convert',
-                '-f', 'png', 
-                '-o', temp_mask_png,
-                '--dpi-x', '300',
-                '--dpi-y', '300',
-                '--background-color', f"{original_background_color}",
-                mask_svg
-            ], check=True)
-            break
-        except Exception as e:
-            retry_count += 1
-            logger.error(f"rsvg-convert执行失败 (尝试 {retry_count}/{max_retries}): {str(e)}")
-            if retry_count >= max_retries:
-                raise Exception(f"重试{max_retries}次后仍然失败: {str(e)}")
-            time.sleep(1)  # 等待1秒后重试
-    
-    # 读取为numpy数组并处理
-    img = Image.open(temp_mask_png).convert('RGB')
-    img_array = np.array(img)
+    # 修改SVG内容，移除渐变
+    # 将渐变填充替换为可见的纯色填充，而不是none
+    mask_svg_content = re.sub(r'fill="url\(#[^"]*\)"', 'fill="#333333"', svg_content)
+    mask_svg_content = re.sub(r'stroke="url\(#[^"]*\)"', 'stroke="#333333"', mask_svg_content)
+    mask_svg_content = mask_svg_content.replace('&', '&amp;')
+    
+    # 提取SVG内容并添加新的SVG标签
+    svg_content_match = re.search(r'<svg[^>]*>(.*?)</svg>', mask_svg_content, re.DOTALL)
+    if svg_content_match:
+        inner_content = svg_content_match.group(1)
+        # 创建新的SVG标签
+        mask_svg_content = f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{width}" height="{height}"> \
+        <rect width="{width}" height="{height}" fill="{original_background_color}" /> \
+        {inner_content} \
+        </svg>'
+    
+    # 渲染为numpy数组并处理
+    img_array = rasterize_svg(mask_svg_content, background_color=original_background_color)[:, :, :3]
+    img = Image.fromarray(img_array)
     
     # 确保图像尺寸匹配预期尺寸
     actual_height, actual_width = img_array.shape[:2]
@@ -375,10 +243,6 @@ def calculate_mask_v2(svg_content: str, width: int, height: int, background_colo
                     white_ratio = np.mean(background_diff < max_difference)
                     mask[y:y_end, x:x_end] = 0 if white_ratio > 0.95 else 1
     
-    # 删除临时文件
-    os.remove(mask_svg)
-    os.remove(temp_mask_png)
-    
     return mask
 
 def calculate_mask(svg_content: str, width: int, height: int, padding: int, grid_size: int = 5, bg_threshold: float = 220) -> np.ndarray:
@@ -386,99 +250,60 @@ def calculate_mask(svg_content: str, width: int, height: int, padding: int, grid
     width = int(width)
     height = int(height)
     
-    # 创建临时文件
-    tmp_dir = "./tmp"
-    os.makedirs(tmp_dir, exist_ok=True)
-    mask_svg = os.path.join(tmp_dir, f"temp_mask_{random.randint(0, 999999)}.svg")
-    temp_mask_png = os.path.join(tmp_dir, f"temp_mask_{random.randint(0, 999999)}.png")
-    
-    try:
-        # 修改SVG内容，移除渐变
-        # 将渐变填充替换为可见的纯色填充，而不是none
-        mask_svg_content = re.sub(r'fill="url\(#[^"]*\)"', 'fill="#333333"', svg_content)
-        mask_svg_content = re.sub(r'stroke="url\(#[^"]*\)"', 'stroke="#333333"', mask_svg_content)
-        mask_svg_content = mask_svg_content.replace('&', '&amp;')
-        
-        # 提取SVG内容并添加新的SVG标签
-        svg_content_match = re.search(r'<svg[^>]*>(.*?)</svg>', mask_svg_content, re.DOTALL)
-        if svg_content_match:
-            inner_content = svg_content_match.group(1)
-            # 创建新的SVG标签
-            mask_svg_content = f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{width}" height="{height}">{inner_content}</svg>'
-        
-        # 添加padding
-        if padding > 0:
-            svg_tag_match = re.search(r'<svg[^>]*>', mask_svg_content)
-            if svg_tag_match:
-                svg_tag = svg_tag_match.group(0)
-                svg_tag_end = svg_tag_match.end()
-                svg_content_part = mask_svg_content[svg_tag_end:]
-                svg_end_tag = '</svg>'
-                svg_content_without_end = svg_content_part.replace(svg_end_tag, '')
-                
-                # 添加transform group
-                mask_svg_content = svg_tag + f'<g transform="translate({padding}, {padding})">' + svg_content_without_end + '</g>' + svg_end_tag
-        
-        with open(mask_svg, "w", encoding="utf-8") as f:
-            f.write(mask_svg_content)
+    # 修改SVG内容，移除渐变
+    # 将渐变填充替换为可见的纯色填充，而不是none
+    mask_svg_content = re.sub(r'fill="url\(#[^"]*\)"', 'fill="#333333"', svg_content)
+    mask_svg_content = re.sub(r'stroke="url\(#[^"]*\)"', 'stroke="#333333"', mask_svg_content)
+    mask_svg_content = mask_svg_content.replace('&', '&amp;')
+    
+    # 提取SVG内容并添加新的SVG标签
+    svg_content_match = re.search(r'<svg[^>]*>(.*?)</svg>', mask_svg_content, re.DOTALL)
+    if svg_content_match:
+        inner_content = svg_content_match.group(1)
+        # 创建新的SVG标签
+        mask_svg_content = f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{width}" height="{height}">{inner_content}</svg>'
+    
+    # 添加padding
+    if padding > 0:
+        svg_tag_match = re.search(r'<svg[^>]*>', mask_svg_content)
+        if svg_tag_match:
+            svg_tag = svg_tag_match.group(0)
+            svg_tag_end = svg_tag_match.end()
+            svg_content_part = mask_svg_content[svg_tag_end:]
+            svg_end_tag = '</svg>'
+            svg_content_without_end = svg_content_part.replace(svg_end_tag, '')
             
-        # 验证SVG文件
-        if not validate_svg_file(mask_svg):
-            logger.error(f"无效的SVG文件: {mask_svg}")
-            
-        retry_count = 0
-        max_retries = 3
-        while retry_count < max_retries:
-            try:
-                subprocess.run([
-                    'rsvg-convert',
-                    '-f', 'png',
-                    '-o', temp_mask_png,
-                    '--dpi-x', '300',
-                    '--dpi-y', '300',
-                    '--background-color', "#ffffff",
-                    mask_svg
-                ], check=True)
-                break
-            except Exception as e:
-                retry_count += 1
-                logger.error(f"rsvg-convert执行失败 (尝试 {retry_count}/{max_retries}): {str(e)}")
-                if retry_count >= max_retries:
-                    raise e
-                time.sleep(1)
-        
-        # 读取为numpy数组并处理
-        img = Image.open(temp_mask_png).convert('RGB')
+            # 添加transform group
+            mask_svg_content = svg_tag + f'<g transform="translate({padding}, {padding})">' + svg_content_without_end + '</g>' + svg_end_tag
+    
+    # 渲染为numpy数组并处理
+    img_array = rasterize_svg(mask_svg_content, background_color="#ffffff")[:, :, :3]
+    img = Image.fromarray(img_array)
+    
+    # 确保图像尺寸匹配预期尺寸
+    actual_height, actual_width = img_array.shape[:2]
+    if actual_width != width or actual_height != height:
+        img = img.resize((width, height), Image.LANCZOS)
         img_array = np.array(img)
-        
-        # 确保图像尺寸匹配预期尺寸
-        actual_height, actual_width = img_array.shape[:2]
-        if actual_width != width or actual_height != height:
-            img = img.resize((width, height), Image.LANCZOS)
-            img_array = np.array(img)
-        
-        # 转换为二值mask
-        mask = np.ones((height, width), dtype=np.uint8)
-        
-        for y in range(0, height, grid_size):
-            for x in range(0, width, grid_size):
-                y_end = min(y + grid_size, height)
-                x_end = min(x + grid_size, width)
-                
-                if y_end > y and x_end > x:
-                    grid = img_array[y:y_end, x:x_end]
-                    if grid.size > 0:
-                        white_pixels = np.all(grid >= bg_threshold, axis=2)
-                        white_ratio = np.mean(white_pixels)
-                        mask[y:y_end, x:x_end] = 0 if white_ratio > 0.95 else 1
-        
-        return mask
-        
-    finally:
-        if os.path.exists(mask_svg):
-            os.remove(mask_svg)
-        if os.path.exists(temp_mask_png):
-            os.remove(temp_mask_png)
+    
+    # 转换为二值mask
+    return grid_mask_from_array(img_array, grid_size=grid_size, bg_threshold=bg_threshold)
+
+def grid_mask_from_array(img_array: np.ndarray, grid_size: int = 5, bg_threshold: float = 220) -> np.ndarray:
+    """
+    将RGB图像数组按grid_size分块二值化：块内超过95%的像素各通道都不低于bg_threshold时视为背景(0)，否则为内容(1)。
+    边缘不足一个grid的块按实际像素数计算比例。
+    """
+    height, width = img_array.shape[:2]
+    white_pixels = np.all(img_array >= bg_threshold, axis=2).astype(np.int32)
+    row_starts = np.arange(0, height, grid_size)
+    col_starts = np.arange(0, width, grid_size)
+    white_counts = np.add.reduceat(np.add.reduceat(white_pixels, row_starts, axis=0), col_starts, axis=1)
+    block_heights = np.diff(np.append(row_starts, height))
+    block_widths = np.diff(np.append(col_starts, width))
+    white_ratio = white_counts / np.outer(block_heights, block_widths)
+    block_mask = np.where(white_ratio > 0.95, 0, 1).astype(np.uint8)
+    return np.repeat(np.repeat(block_mask, block_heights, axis=0), block_widths, axis=1)
 
 def calculate_bbox(mask: np.ndarray) -> Tuple[int, int, int, int]:
     """计算mask的bbox"""
@@ -0,0 +1,156 @@
+"""
+SVG 光栅化后端
+
+提供统一的 SVG -> NumPy 数组 / PNG 接口，后端可配置：
+- cairosvg: 进程内渲染，直接处理字节串，不写临时文件也不启动子进程（默认）
+- rsvg: 调用 rsvg-convert，通过 stdin/stdout 传输数据，保留原有的重试逻辑
+
+后端通过环境变量 SVG_RASTERIZER_BACKEND 或 set_rasterizer_backend() 选择。
+"""
+import io
+import os
+import time
+import shutil
+import logging
+import subprocess
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = os.environ.get('SVG_RASTERIZER_BACKEND', 'cairosvg')
+DEFAULT_DPI = 300
+
+
+class SvgRasterizer(ABC):
+    """光栅化后端基类，子类实现 render_png 即可"""
+
+    name = 'base'
+
+    def is_available(self) -> bool:
+        return True
+
+    @abstractmethod
+    def render_png(self, svg_content: str, background_color: Optional[str] = None, dpi: int = DEFAULT_DPI) -> bytes:
+        """将 SVG 渲染为 PNG 字节串"""
+
+    def rasterize(self, svg_content: str, background_color: Optional[str] = None, dpi: int = DEFAULT_DPI) -> np.ndarray:
+        """将 SVG 渲染为 (H, W, 4) 的 RGBA uint8 数组"""
+        png_data = self.render_png(svg_content, background_color=background_color, dpi=dpi)
+        return np.array(Image.open(io.BytesIO(png_data)).convert('RGBA'))
+
+
+class CairoSvgRasterizer(SvgRasterizer):
+    """基于 cairosvg 的进程内后端"""
+
+    name = 'cairosvg'
+
+    def is_available(self) -> bool:
+        try:
+            import cairosvg  # noqa: F401
+            return True
+        except (ImportError, OSError):
+            return False
+
+    def render_png(self, svg_content: str, background_color: Optional[str] = None, dpi: int = DEFAULT_DPI) -> bytes:
+        import cairosvg
+        return cairosvg.svg2png(
+            bytestring=svg_content.encode('utf-8'),
+            dpi=dpi,
+            background_color=background_color
+        )
+
+
+class RsvgRasterizer(SvgRasterizer):
+    """基于 rsvg-convert 的子进程后端（stdin/stdout 传输，不落盘）"""
+
+    name = 'rsvg'
+
+    def __init__(self, max_retries: int = 3, retry_delay: float = 1.0):
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def is_available(self) -> bool:
+        return shutil.which('rsvg-convert') is not None
+
+    def render_png(self, svg_content: str, background_color: Optional[str] = None, dpi: int = DEFAULT_DPI) -> bytes:
+        cmd = ['rsvg-convert', '-f', 'png', '--dpi-x', str(dpi), '--dpi-y', str(dpi)]
+        if background_color:
+            cmd += ['--background-color', background_color]
+
+        retry_count = 0
+        while True:
+            try:
+                result = subprocess.run(cmd, input=svg_content.encode('utf-8'), capture_output=True, check=True)
+                return result.stdout
+            except Exception as e:
+                retry_count += 1
+                logger.error(f"rsvg-convert执行失败 (尝试 {retry_count}/{self.max_retries}): {str(e)}")
+                if retry_count >= self.max_retries:
+                    raise
+                time.sleep(self.retry_delay)
+
+
+_BACKENDS: Dict[str, SvgRasterizer] = {
+    CairoSvgRasterizer.name: CairoSvgRasterizer(),
+    RsvgRasterizer.name: RsvgRasterizer(),
+}
+_backend_name = DEFAULT_BACKEND
+_backend_lock = threading.Lock()
+
+
+def register_rasterizer(rasterizer: SvgRasterizer):
+    """注册自定义后端"""
+    with _backend_lock:
+        _BACKENDS[rasterizer.name] = rasterizer
+
+
+def set_rasterizer_backend(name: str):
+    """切换全局默认后端"""
+    global _backend_name
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown rasterizer backend: {name}. Available: {list(_BACKENDS)}")
+    with _backend_lock:
+        _backend_name = name
+
+
+def get_rasterizer(name: Optional[str] = None) -> SvgRasterizer:
+    """
+    获取光栅化后端；指定后端不可用时回退到其他可用后端
+
+    Args:
+        name: 后端名称，None 表示使用全局默认后端
+
+    Returns:
+        SvgRasterizer 实例
+    """
+    name = name or _backend_name
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown rasterizer backend: {name}. Available: {list(_BACKENDS)}")
+    rasterizer = _BACKENDS[name]
+    if rasterizer.is_available():
+        return rasterizer
+    for fallback in _BACKENDS.values():
+        if fallback is not rasterizer and fallback.is_available():
+            logger.warning(f"Rasterizer backend '{name}' unavailable, falling back to '{fallback.name}'")
+            return fallback
+    raise RuntimeError("No SVG rasterizer backend available (install cairosvg or rsvg-convert)")
+
+
+def rasterize_svg(svg_content: str, background_color: Optional[str] = None, dpi: int = DEFAULT_DPI,
+                  backend: Optional[str] = None) -> np.ndarray:
+    """将 SVG 内容渲染为 (H, W, 4) RGBA 数组"""
+    return get_rasterizer(backend).rasterize(svg_content, background_color=background_color, dpi=dpi)
+
+
+def rasterize_svg_to_png(svg_content: str, png_path: str, background_color: Optional[str] = None,
+                         dpi: int = DEFAULT_DPI, backend: Optional[str] = None) -> str:
+    """将 SVG 内容渲染并保存为 PNG 文件"""
+    png_data = get_rasterizer(backend).render_png(svg_content, background_color=background_color, dpi=dpi)
+    with open(png_path, 'wb') as f:
+        f.write(png_data)
+    return png_path
@@ -0,0 +1,672 @@
+"""
+根据 SVG 几何计算紧致边界框，替代"光栅化后扫描像素"的测量方式
+
+- 完整的仿射变换（matrix/translate/scale/rotate/skewX/skewY），沿祖先链累积
+- rect/circle/ellipse/line/polyline/polygon/path/image/foreignObject，<use> 解析引用的元素或 symbol
+- path 用 svgpathtools 解析，贝塞尔曲线先变换控制点再求精确极值，圆弧采样
+- stroke 按变换后的线宽向外扩展
+- clip-path：内容边界框与裁剪区域的边界框求交
+- 结果裁剪到画布（viewport）范围内，与光栅化只能扫描到画布内像素一致
+- 文字宽度按字体度量计算：每个 (字体, 字符) 的前进宽度只测量一次并缓存
+- 与光栅化结果保持一致：fill/stroke 都不可见（none、透明、接近背景色）的图形不计入
+"""
+import math
+import re
+import unicodedata
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from PIL import ImageFont
+from svgpathtools import parse_path, Line, QuadraticBezier, CubicBezier
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+# 与 get_precise_bbox_from_array 一致：与背景色每个通道相差小于该值视为背景
+BACKGROUND_THRESHOLD = 15
+
+# 字体度量的参考字号，字符前进宽度按 em 缓存
+FONT_REFERENCE_SIZE = 100
+# 找不到字体文件时的回退宽度（em），与 get_svg_actual_bbox 的 0.6 估算一致
+FALLBACK_CHAR_WIDTH = 0.6
+FALLBACK_WIDE_CHAR_WIDTH = 1.0
+# 基线以上/以下的高度（em）
+TEXT_ASCENT = 0.8
+TEXT_DESCENT = 0.2
+
+FONT_FILES = {
+    'arial': ['Arial.ttf', 'arial.ttf', '/usr/share/fonts/truetype/msttcorefonts/Arial.ttf'],
+    'times': ['Times New Roman.ttf', 'times.ttf', '/usr/share/fonts/truetype/msttcorefonts/Times_New_Roman.ttf'],
+    'courier': ['Courier New.ttf', 'cour.ttf', '/usr/share/fonts/truetype/msttcorefonts/Courier_New.ttf'],
+    'verdana': ['Verdana.ttf', 'verdana.ttf', '/usr/share/fonts/truetype/msttcorefonts/Verdana.ttf'],
+    'comic': ['Comic Sans MS.ttf', 'comic.ttf', '/usr/share/fonts/truetype/msttcorefonts/Comic_Sans_MS.ttf'],
+    'default': ['DejaVuSans.ttf', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'],
+}
+BOLD_FONT_FILES = {
+    'arial': ['Arial Bold.ttf', 'arialbd.ttf', '/usr/share/fonts/truetype/msttcorefonts/Arial_Bold.ttf'],
+    'default': ['DejaVuSans-Bold.ttf', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'],
+}
+
+# 不参与渲染的元素（及其子树）
+NON_RENDERED_TAGS = {
+    'defs', 'clipPath', 'mask', 'marker', 'pattern', 'symbol', 'linearGradient', 'radialGradient',
+    'filter', 'style', 'script', 'title', 'desc', 'metadata',
+}
+# 可继承的样式属性
+INHERITED_PROPERTIES = {
+    'fill', 'stroke', 'stroke-width', 'fill-opacity', 'stroke-opacity', 'visibility',
+    'font-size', 'font-family', 'font-weight', 'text-anchor', 'letter-spacing', 'dominant-baseline',
+}
+STYLE_PROPERTIES = INHERITED_PROPERTIES | {'opacity', 'display', 'clip-path'}
+
+NAMED_COLORS = {
+    'white': (255, 255, 255),
+    'black': (0, 0, 0),
+}
+
+_NUMBER_RE = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_TRANSFORM_RE = re.compile(r'(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)')
+_URL_REF_RE = re.compile(r'url\(\s*[\'"]?#([^\'")\s]+)[\'"]?\s*\)')
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+# <use> 嵌套引用的最大深度，防止循环引用
+MAX_USE_DEPTH = 16
+
+
+# ---------------------------------------------------------------------------
+# 变换
+# ---------------------------------------------------------------------------
+
+def multiply(m1: Tuple, m2: Tuple) -> Tuple:
+    """矩阵乘法 m1 * m2（先应用 m2 再应用 m1），矩阵形式为 (a, b, c, d, e, f)"""
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return (
+        a1 * a2 + c1 * b2,
+        b1 * a2 + d1 * b2,
+        a1 * c2 + c1 * d2,
+        b1 * c2 + d1 * d2,
+        a1 * e2 + c1 * f2 + e1,
+        b1 * e2 + d1 * f2 + f1,
+    )
+
+
+def apply(m: Tuple, x: float, y: float) -> Tuple[float, float]:
+    a, b, c, d, e, f = m
+    return a * x + c * y + e, b * x + d * y + f
+
+
+@lru_cache(maxsize=4096)
+def parse_transform(transform: Optional[str]) -> Tuple:
+    """解析 transform 属性为仿射矩阵"""
+    m = IDENTITY
+    if not transform:
+        return m
+    for name, args in _TRANSFORM_RE.findall(transform):
+        values = [float(v) for v in _NUMBER_RE.findall(args)]
+        if name == 'matrix' and len(values) == 6:
+            t = tuple(values)
+        elif name == 'translate' and values:
+            t = (1.0, 0.0, 0.0, 1.0, values[0], values[1] if len(values) > 1 else 0.0)
+        elif name == 'scale' and values:
+            sx = values[0]
+            sy = values[1] if len(values) > 1 else sx
+            t = (sx, 0.0, 0.0, sy, 0.0, 0.0)
+        elif name == 'rotate' and values:
+            rad = math.radians(values[0])
+            cos, sin = math.cos(rad), math.sin(rad)
+            t = (cos, sin, -sin, cos, 0.0, 0.0)
+            if len(values) >= 3:
+                cx, cy = values[1], values[2]
+                t = multiply(multiply((1.0, 0.0, 0.0, 1.0, cx, cy), t), (1.0, 0.0, 0.0, 1.0, -cx, -cy))
+        elif name == 'skewX' and values:
+            t = (1.0, 0.0, math.tan(math.radians(values[0])), 1.0, 0.0, 0.0)
+        elif name == 'skewY' and values:
+            t = (1.0, math.tan(math.radians(values[0])), 0.0, 1.0, 0.0, 0.0)
+        else:
+            continue
+        m = multiply(m, t)
+    return m
+
+
+def _scale_factor(m: Tuple) -> float:
+    """变换对长度的平均缩放（用于线宽）"""
+    return math.sqrt(abs(m[0] * m[3] - m[1] * m[2]))
+
+
+# ---------------------------------------------------------------------------
+# 样式
+# ---------------------------------------------------------------------------
+
+def _parse_length(value, reference: float = 0.0, font_size: float = 16.0) -> float:
+    """解析长度：支持 px/pt/em 和百分比（相对 reference）"""
+    if value is None:
+        return 0.0
+    value = str(value).strip()
+    if not value:
+        return 0.0
+    match = _NUMBER_RE.match(value)
+    if not match:
+        return 0.0
+    number = float(match.group(0))
+    unit = value[match.end():].strip()
+    if unit == '%':
+        return reference * number / 100
+    if unit == 'em':
+        return number * font_size
+    if unit == 'pt':
+        return number * 4 / 3
+    return number
+
+
+def _first_length(value, reference: float = 0.0, font_size: float = 16.0) -> float:
+    """x/y 等属性可以是列表，只取第一个值"""
+    if value is None:
+        return 0.0
+    parts = str(value).replace(',', ' ').split()
+    return _parse_length(parts[0], reference, font_size) if parts else 0.0
+
+
+def _element_style(elem, inherited: Dict) -> Dict:
+    """合并继承样式、表现属性和 style 属性（style 优先）"""
+    style = {key: value for key, value in inherited.items() if key in INHERITED_PROPERTIES}
+    for key in STYLE_PROPERTIES:
+        value = elem.get(key)
+        if value is not None:
+            style[key] = value.strip()
+    inline = elem.get('style')
+    if inline:
+        for declaration in inline.split(';'):
+            if ':' in declaration:
+                key, value = declaration.split(':', 1)
+                key = key.strip()
+                if key in STYLE_PROPERTIES:
+                    style[key] = value.replace('!important', '').strip()
+
+    parent_font_size = inherited.get('_font_size', 16.0)
+    if 'font-size' in style and style['font-size'] != inherited.get('font-size'):
+        style['_font_size'] = _parse_length(style['font-size'], parent_font_size, parent_font_size) or parent_font_size
+    else:
+        style['_font_size'] = parent_font_size
+    return style
+
+
+def _parse_color(value: str) -> Optional[Tuple]:
+    """解析颜色为 (r, g, b, a)，无法解析（如渐变引用、其他颜色名）时返回 None"""
+    value = value.strip().lower()
+    if value.startswith('#'):
+        hex_value = value[1:]
+        if len(hex_value) in (3, 4):
+            hex_value = ''.join(ch * 2 for ch in hex_value)
+        if len(hex_value) in (6, 8):
+            try:
+                channels = [int(hex_value[i:i + 2], 16) for i in range(0, len(hex_value), 2)]
+            except ValueError:
+                return None
+            alpha = channels[3] / 255 if len(channels) == 4 else 1.0
+            return channels[0], channels[1], channels[2], alpha
+        return None
+    if value.startswith('rgb'):
+        numbers = _NUMBER_RE.findall(value)
+        if len(numbers) >= 3:
+            rgb = [float(n) * 2.55 if '%' in value else float(n) for n in numbers[:3]]
+            alpha = float(numbers[3]) if len(numbers) >= 4 else 1.0
+            return rgb[0], rgb[1], rgb[2], alpha
+        return None
+    if value == 'transparent':
+        return 0, 0, 0, 0.0
+    if value in NAMED_COLORS:
+        return NAMED_COLORS[value] + (1.0,)
+    return None
+
+
+def _paint_visible(paint: Optional[str], opacity: Optional[str], background_rgb: Optional[Tuple]) -> bool:
+    """fill/stroke 是否会在（背景色上）画出可见像素"""
+    if paint is None:
+        return False
+    paint = paint.strip()
+    if not paint or paint == 'none':
+        return False
+    if opacity is not None and _parse_length(opacity) <= 0:
+        return False
+    color = _parse_color(paint)
+    if color is None:
+        return True
+    if color[3] <= 0:
+        return False
+    if background_rgb is not None and all(abs(color[i] - background_rgb[i]) < BACKGROUND_THRESHOLD for i in range(3)):
+        return False
+    return True
+
+
+# ---------------------------------------------------------------------------
+# 字体度量
+# ---------------------------------------------------------------------------
+
+def _font_key(font_family: Optional[str]) -> str:
+    """CSS font-family 列表映射到 FONT_FILES 中的字体"""
+    for family in (font_family or '').split(','):
+        family = family.strip().strip('"\'').lower()
+        for key in FONT_FILES:
+            if key != 'default' and key in family:
+                return key
+    return 'default'
+
+
+@lru_cache(maxsize=32)
+def _load_font(font_key: str, bold: bool):
+    """加载参考字号的字体，找不到时返回 None"""
+    candidates = []
+    if bold:
+        candidates += BOLD_FONT_FILES.get(font_key, []) + BOLD_FONT_FILES['default']
+    candidates += FONT_FILES.get(font_key, []) + FONT_FILES['default']
+    for path in candidates:
+        try:
+            return ImageFont.truetype(path, size=FONT_REFERENCE_SIZE)
+        except (OSError, IOError):
+            continue
+    return None
+
+
+@lru_cache(maxsize=65536)
+def char_advance(font_key: str, bold: bool, char: str) -> float:
+    """单个字符的前进宽度（em）"""
+    font = _load_font(font_key, bold)
+    if font is not None:
+        try:
+            return font.getlength(char) / FONT_REFERENCE_SIZE
+        except Exception:
+            pass
+    if unicodedata.east_asian_width(char) in ('W', 'F'):
+        return FALLBACK_WIDE_CHAR_WIDTH
+    return FALLBACK_CHAR_WIDTH
+
+
+def measure_text_width(text: str, font_family: Optional[str], font_size: float, font_weight: Optional[str] = None,
+                       letter_spacing: float = 0.0) -> float:
+    """按缓存的字符宽度计算文本宽度（px）"""
+    if not text:
+        return 0.0
+    weight = (font_weight or '').strip().lower()
+    bold = weight in ('bold', 'bolder') or (weight.isdigit() and int(weight) >= 600)
+    font_key = _font_key(font_family)
+    width = sum(char_advance(font_key, bold, ch) for ch in text) * font_size
+    return width + letter_spacing * len(text)
+
+
+# ---------------------------------------------------------------------------
+# 边界框
+# ---------------------------------------------------------------------------
+
+class _Bounds:
+    def __init__(self):
+        self.min_x = self.min_y = math.inf
+        self.max_x = self.max_y = -math.inf
+
+    def add_point(self, x: float, y: float, pad: float = 0.0):
+        x, y = float(x), float(y)
+        self.min_x = min(self.min_x, x - pad)
+        self.max_x = max(self.max_x, x + pad)
+        self.min_y = min(self.min_y, y - pad)
+        self.max_y = max(self.max_y, y + pad)
+
+    def add_points(self, m: Tuple, points, pad: float = 0.0):
+        for x, y in points:
+            tx, ty = apply(m, x, y)
+            self.add_point(tx, ty, pad)
+
+    def add_bounds(self, other: '_Bounds'):
+        if not other.empty():
+            self.add_point(other.min_x, other.min_y)
+            self.add_point(other.max_x, other.max_y)
+
+    def intersect(self, min_x: float, min_y: float, max_x: float, max_y: float):
+        """裁剪到矩形范围内，没有交集时变为空"""
+        self.min_x = max(self.min_x, min_x)
+        self.min_y = max(self.min_y, min_y)
+        self.max_x = min(self.max_x, max_x)
+        self.max_y = min(self.max_y, max_y)
+        if self.min_x > self.max_x or self.min_y > self.max_y:
+            self.min_x = self.min_y = math.inf
+            self.max_x = self.max_y = -math.inf
+
+    def empty(self) -> bool:
+        return self.min_x == math.inf
+
+
+class _WalkContext:
+    """
+    遍历时共享的参数
+
+    geometry_only: 计算 clipPath 的裁剪区域时只看几何形状，不看 fill/stroke 是否可见
+    """
+
+    def __init__(self, viewport: Tuple[float, float], background_rgb: Optional[Tuple], elements: Dict,
+                 geometry_only: bool = False, use_depth: int = 0):
+        self.viewport = viewport
+        self.background_rgb = background_rgb
+        self.elements = elements
+        self.geometry_only = geometry_only
+        self.use_depth = use_depth
+
+    def derive(self, **changes) -> '_WalkContext':
+        values = dict(viewport=self.viewport, background_rgb=self.background_rgb, elements=self.elements,
+                      geometry_only=self.geometry_only, use_depth=self.use_depth)
+        values.update(changes)
+        return _WalkContext(**values)
+
+
+def _transform_segment(segment, m: Tuple):
+    a, b, c, d, e, f = m
+    points = [complex(a * p.real + c * p.imag + e, b * p.real + d * p.imag + f) for p in segment.bpoints()]
+    return type(segment)(*points)
+
+
+def _add_path(bounds: _Bounds, d: str, m: Tuple, pad: float):
+    try:
+        path = parse_path(d)
+    except Exception as e:
+        print(f"Error parsing path: {e}")
+        return
+    for segment in path:
+        if isinstance(segment, (Line, QuadraticBezier, CubicBezier)):
+            # 仿射变换下贝塞尔曲线仍是贝塞尔曲线：变换控制点后求精确边界
+            xmin, xmax, ymin, ymax = _transform_segment(segment, m).bbox()
+            bounds.add_point(xmin, ymin, pad)
+            bounds.add_point(xmax, ymax, pad)
+        else:
+            for i in range(33):
+                point = segment.point(i / 32)
+                tx, ty = apply(m, point.real, point.imag)
+                bounds.add_point(tx, ty, pad)
+
+
+def _parse_points(points_str: str):
+    numbers = [float(v) for v in _NUMBER_RE.findall(points_str or '')]
+    return list(zip(numbers[0::2], numbers[1::2]))
+
+
+def _text_lines(elem, style: Dict, viewport: Tuple[float, float]):
+    """
+    拆分 text 元素为若干带位置的文本段：带 x/y 的 tspan 单独成段，其余内容接在前一段后面
+
+    Returns:
+        [(x, y, text, style)]
+    """
+    width, height = viewport
+    font_size = style['_font_size']
+    x = _first_length(elem.get('x'), width, font_size) + _first_length(elem.get('dx'), width, font_size)
+    y = _first_length(elem.get('y'), height, font_size) + _first_length(elem.get('dy'), height, font_size)
+    runs = [[x, y, elem.text or '', style]]
+    for child in elem:
+        tag = child.tag.split('}')[-1]
+        if tag != 'tspan':
+            if child.tail:
+                runs[-1][2] += child.tail
+            continue
+        child_style = _element_style(child, style)
+        if child_style.get('display') == 'none':
+            if child.tail:
+                runs[-1][2] += child.tail
+            continue
+        child_font_size = child_style['_font_size']
+        has_position = child.get('x') is not None or child.get('y') is not None
+        cx = _first_length(child.get('x'), width, child_font_size) if child.get('x') is not None else runs[-1][0]
+        cy = _first_length(child.get('y'), height, child_font_size) if child.get('y') is not None else runs[-1][1]
+        cx += _first_length(child.get('dx'), width, child_font_size)
+        cy += _first_length(child.get('dy'), height, child_font_size)
+        content = ''.join(child.itertext())
+        if has_position or child.get('dy') is not None:
+            runs.append([cx, cy, content, child_style])
+        else:
+            runs[-1][2] += content
+        if child.tail:
+            runs[-1][2] += child.tail
+    return [run for run in runs if run[2].strip()]
+
+
+def _add_text(bounds: _Bounds, elem, style: Dict, m: Tuple, context: _WalkContext):
+    for x, y, text, run_style in _text_lines(elem, style, context.viewport):
+        if not context.geometry_only and not _paint_visible(run_style.get('fill', 'black'),
+                                                            run_style.get('fill-opacity'), context.background_rgb):
+            continue
+        text = ' '.join(text.split()) if '\n' in text else text.strip()
+        font_size = run_style['_font_size']
+        text_width = measure_text_width(
+            text, run_style.get('font-family'), font_size, run_style.get('font-weight'),
+            _parse_length(run_style.get('letter-spacing'), 0, font_size)
+        )
+        anchor = run_style.get('text-anchor', 'start')
+        if anchor == 'middle':
+            left = x - text_width / 2
+        elif anchor == 'end':
+            left = x - text_width
+        else:
+            left = x
+        baseline = run_style.get('dominant-baseline', '')
+        if baseline in ('middle', 'central'):
+            top = y - font_size / 2
+        elif baseline in ('hanging', 'text-before-edge'):
+            top = y
+        elif baseline in ('text-after-edge', 'ideographic'):
+            top = y - font_size
+        else:
+            top = y - TEXT_ASCENT * font_size
+        bounds.add_points(m, [(left, top), (left + text_width, top), (left, top + font_size),
+                              (left + text_width, top + font_size)])
+
+
+def _add_shape(bounds: _Bounds, elem, tag: str, style: Dict, m: Tuple, context: _WalkContext):
+    width, height = context.viewport
+    font_size = style['_font_size']
+    if context.geometry_only:
+        # 裁剪区域只取决于几何形状（不含描边）
+        fill_visible, stroke_visible = True, False
+    else:
+        fill_visible = _paint_visible(style.get('fill', 'black'), style.get('fill-opacity'), context.background_rgb)
+        stroke_visible = _paint_visible(style.get('stroke'), style.get('stroke-opacity'), context.background_rgb)
+    if tag in ('line', 'polyline'):
+        fill_visible = fill_visible and tag == 'polyline'
+    if tag in ('image', 'foreignObject', 'use'):
+        fill_visible, stroke_visible = True, False
+    if not fill_visible and not stroke_visible:
+        return
+
+    pad = 0.0
+    if stroke_visible:
+        stroke_width = _parse_length(style.get('stroke-width', '1'), width, font_size)
+        pad = stroke_width / 2 * _scale_factor(m)
+
+    if tag in ('rect', 'image', 'foreignObject', 'use'):
+        x = _parse_length(elem.get('x', '0'), width, font_size)
+        y = _parse_length(elem.get('y', '0'), height, font_size)
+        w = _parse_length(elem.get('width', '0'), width, font_size)
+        h = _parse_length(elem.get('height', '0'), height, font_size)
+        if w <= 0 or h <= 0:
+            return
+        bounds.add_points(m, [(x, y), (x + w, y), (x, y + h), (x + w, y + h)], pad)
+    elif tag in ('circle', 'ellipse'):
+        cx = _parse_length(elem.get('cx', '0'), width, font_size)
+        cy = _parse_length(elem.get('cy', '0'), height, font_size)
+        if tag == 'circle':
+            rx = ry = _parse_length(elem.get('r', '0'), math.hypot(width, height) / math.sqrt(2), font_size)
+        else:
+            rx = _parse_length(elem.get('rx', '0'), width, font_size)
+            ry = _parse_length(elem.get('ry', '0'), height, font_size)
+        if rx <= 0 or ry <= 0:
+            return
+        # 仿射变换后椭圆的轴对齐边界
+        a, b, c, d, e, f = m
+        tx, ty = apply(m, cx, cy)
+        half_w = math.hypot(a * rx, c * ry)
+        half_h = math.hypot(b * rx, d * ry)
+        bounds.add_point(tx - half_w, ty - half_h, pad)
+        bounds.add_point(tx + half_w, ty + half_h, pad)
+    elif tag == 'line':
+        bounds.add_points(m, [
+            (_parse_length(elem.get('x1', '0'), width, font_size), _parse_length(elem.get('y1', '0'), height, font_size)),
+            (_parse_length(elem.get('x2', '0'), width, font_size), _parse_length(elem.get('y2', '0'), height, font_size)),
+        ], pad)
+    elif tag in ('polyline', 'polygon'):
+        bounds.add_points(m, _parse_points(elem.get('points')), pad)
+    elif tag == 'path':
+        d = elem.get('d')
+        if d:
+            _add_path(bounds, d, m, pad)
+
+
+def _referenced_id(value: Optional[str]) -> Optional[str]:
+    """url(#id) 中的 id"""
+    if not value:
+        return None
+    match = _URL_REF_RE.search(value)
+    return match.group(1) if match else None
+
+
+def _clip_bounds(elem, style: Dict, m: Tuple, content: _Bounds, context: _WalkContext) -> Optional[_Bounds]:
+    """
+    clip-path 引用的裁剪区域（已变换到画布坐标）的边界框
+
+    Returns:
+        没有 clip-path 或引用不存在时返回 None
+    """
+    clip_elem = context.elements.get(_referenced_id(style.get('clip-path')))
+    if clip_elem is None or clip_elem.tag.split('}')[-1] != 'clipPath':
+        return None
+    if clip_elem.get('clipPathUnits') == 'objectBoundingBox':
+        # 坐标相对于被裁剪元素的边界框（0~1），按其画布坐标边界框线性映射
+        if content.empty():
+            return content
+        base_matrix = (content.max_x - content.min_x, 0.0, 0.0, content.max_y - content.min_y,
+                       content.min_x, content.min_y)
+    else:
+        base_matrix = m
+    clip_matrix = multiply(base_matrix, parse_transform(clip_elem.get('transform')))
+    clip_context = context.derive(geometry_only=True)
+    clip = _Bounds()
+    for child in clip_elem:
+        _walk(clip, child, {}, clip_matrix, clip_context)
+    return clip
+
+
+def _add_use(bounds: _Bounds, elem, style: Dict, m: Tuple, context: _WalkContext) -> bool:
+    """
+    解析 <use> 引用的元素：x/y 作为平移；引用 symbol 时按 width/height 和 viewBox 缩放并裁剪到视口
+
+    Returns:
+        引用是否成功解析
+    """
+    target = context.elements.get((elem.get('href') or elem.get(XLINK_HREF) or '').lstrip('#'))
+    if target is None or context.use_depth >= MAX_USE_DEPTH:
+        return False
+    width, height = context.viewport
+    font_size = style['_font_size']
+    x = _parse_length(elem.get('x', '0'), width, font_size)
+    y = _parse_length(elem.get('y', '0'), height, font_size)
+    m = multiply(m, (1.0, 0.0, 0.0, 1.0, x, y))
+    use_context = context.derive(use_depth=context.use_depth + 1)
+
+    if target.tag.split('}')[-1] != 'symbol':
+        _walk(bounds, target, style, m, use_context)
+        return True
+
+    # symbol 的视口尺寸：use 的 width/height，其次是 symbol 自身的，默认 100%
+    symbol_width = _parse_length(elem.get('width') or target.get('width') or '100%', width, font_size)
+    symbol_height = _parse_length(elem.get('height') or target.get('height') or '100%', height, font_size)
+    view_box = [float(v) for v in _NUMBER_RE.findall(target.get('viewBox') or '')]
+    symbol_matrix = m
+    if len(view_box) == 4 and view_box[2] > 0 and view_box[3] > 0:
+        sx, sy = symbol_width / view_box[2], symbol_height / view_box[3]
+        tx, ty = 0.0, 0.0
+        if (target.get('preserveAspectRatio') or '').strip() != 'none':
+            # 默认 xMidYMid meet：等比缩放并居中
+            sx = sy = min(sx, sy)
+            tx = (symbol_width - view_box[2] * sx) / 2
+            ty = (symbol_height - view_box[3] * sy) / 2
+        symbol_matrix = multiply(m, (sx, 0.0, 0.0, sy, tx - view_box[0] * sx, ty - view_box[1] * sy))
+
+    content = _Bounds()
+    symbol_style = _element_style(target, style)
+    for child in target:
+        _walk(content, child, symbol_style, symbol_matrix, use_context)
+    if content.empty():
+        return True
+    # symbol 默认 overflow: hidden，内容裁剪到视口矩形
+    viewport_bounds = _Bounds()
+    viewport_bounds.add_points(m, [(0, 0), (symbol_width, 0), (0, symbol_height), (symbol_width, symbol_height)])
+    content.intersect(viewport_bounds.min_x, viewport_bounds.min_y, viewport_bounds.max_x, viewport_bounds.max_y)
+    bounds.add_bounds(content)
+    return True
+
+
+def _walk(bounds: _Bounds, elem, inherited: Dict, parent_matrix: Tuple, context: _WalkContext):
+    tag = elem.tag.split('}')[-1] if isinstance(elem.tag, str) else ''
+    if not tag or tag in NON_RENDERED_TAGS:
+        return
+    style = _element_style(elem, inherited)
+    if style.get('display') == 'none':
+        return
+    if not context.geometry_only and style.get('opacity') is not None and _parse_length(style['opacity']) <= 0:
+        return
+
+    m = multiply(parent_matrix, parse_transform(elem.get('transform')))
+    if tag == 'svg' and inherited:
+        # 嵌套 svg 的 x/y 相当于平移
+        x = _parse_length(elem.get('x', '0'), context.viewport[0])
+        y = _parse_length(elem.get('y', '0'), context.viewport[1])
+        m = multiply(m, (1.0, 0.0, 0.0, 1.0, x, y))
+
+    # 有 clip-path 时先单独计算内容边界，再与裁剪区域求交
+    content = _Bounds() if style.get('clip-path') else bounds
+    if style.get('visibility') not in ('hidden', 'collapse') or tag == 'use':
+        if tag == 'text':
+            _add_text(content, elem, style, m, context)
+        elif tag == 'use':
+            if not _add_use(content, elem, style, m, context) and style.get('visibility') not in ('hidden', 'collapse'):
+                # 引用无法解析（如外部文件）时按 width/height 估算
+                _add_shape(content, elem, tag, style, m, context)
+        elif tag in ('rect', 'circle', 'ellipse', 'line', 'polyline', 'polygon', 'path', 'image', 'foreignObject'):
+            _add_shape(content, elem, tag, style, m, context)
+    if tag not in ('text', 'use'):
+        for child in elem:
+            _walk(content, child, style, m, context)
+
+    if content is not bounds:
+        clip = _clip_bounds(elem, style, m, content, context)
+        if clip is not None:
+            content.intersect(clip.min_x, clip.min_y, clip.max_x, clip.max_y)
+        bounds.add_bounds(content)
+
+
+def compute_svg_bbox(svg, background_color: Optional[str] = None,
+                     viewport: Tuple[float, float] = (1000, 1000)) -> Optional[Dict]:
+    """
+    根据几何计算 SVG 中可见内容的边界框
+
+    Args:
+        svg: SVG 字符串或已解析的根元素
+        background_color: 背景色（hex），与背景色相同的填充不计入
+        viewport: 画布尺寸，百分比长度的参考尺寸；画布外的部分不计入
+
+    Returns:
+        与 get_svg_actual_bbox 相同格式的字典，没有可见图形时返回 None
+    """
+    if isinstance(svg, str):
+        svg = svg.encode('utf-8')
+    root = ET.fromstring(svg) if isinstance(svg, bytes) else svg
+    background = _parse_color(background_color) if background_color else None
+    background_rgb = background[:3] if background else None
+    elements = {elem.get('id'): elem for elem in root.iter() if elem.get('id')}
+
+    bounds = _Bounds()
+    _walk(bounds, root, {}, IDENTITY, _WalkContext(viewport, background_rgb, elements))
+    bounds.intersect(0, 0, viewport[0], viewport[1])
+    if bounds.empty():
+        return None
+    return {
+        'min_x': bounds.min_x,
+        'min_y': bounds.min_y,
+        'max_x': bounds.max_x,
+        'max_y': bounds.max_y,
+        'width': bounds.max_x - bounds.min_x,
+        'height': bounds.max_y - bounds.min_y
+    }
@@ -9,7 +9,21 @@ import subprocess
 import tempfile
 import os
 import re
+import io
+import math
+import logging
 import colorsys
+from .rasterizer import rasterize_svg, rasterize_svg_to_png
+from .svg_geometry import compute_svg_bbox
+
+logger = logging.getLogger(__name__)
+
+# adjust_and_get_bbox 的测量方式：
+# - geometry: 根据 SVG 几何计算（默认，不光栅化）
+# - raster: 光栅化后扫描像素（原方式）
+# - verify: 两者都算，差异超过 SVG_BBOX_VERIFY_TOLERANCE 像素时记录日志，返回光栅化结果
+SVG_BBOX_MODE = os.environ.get('SVG_BBOX_MODE', 'geometry')
+SVG_BBOX_VERIFY_TOLERANCE = float(os.environ.get('SVG_BBOX_VERIFY_TOLERANCE', 4))
 
 def add_gradient_to_rect(rect_svg):
     """
@@ -276,53 +290,90 @@ def parse_translate(transform_str):
     return 0.0, 0.0
 
 
-def adjust_and_get_bbox(svg_content, background_color = "#FFFFFF"):
-    """Adjust SVG and get precise bounding box."""
-    # Create temporary files for SVG and PNG
-    with tempfile.NamedTemporaryFile(suffix='.svg', delete=False) as temp_svg, \
-         tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_png:
-        temp_svg_path = temp_svg.name
-        temp_png_path = temp_png.name
+def adjust_and_get_bbox(svg_content, background_color = "#FFFFFF", mode = None):
+    """
+    Adjust SVG and get precise bounding box.
 
-        svg_container = f"<svg \
-            width='1000' \
-            height='1000' \
-            xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink'> \
-            {svg_content}</svg>"
-        with open(temp_svg_path, 'w', encoding='utf-8') as f:
-            f.write(svg_container)
-            f.flush()
-        print("temp_svg_path: ", temp_svg_path)
-        bbox = get_svg_actual_bbox(temp_svg_path)
-        # print("bbox: ", bbox)
-        padding = 150
-        new_width = bbox['width'] + padding * 2
-        new_height = bbox['height'] + padding * 2
-        svg_container = f"<svg \
-            width='{new_width}' \
-            height='{new_height}' \
-            xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink'> \
-            <rect width='{new_width}' height='{new_height}' fill='{background_color}' /> \
-            <g transform='translate({padding - bbox['min_x']}, {padding - bbox['min_y']})'> \
-                {svg_content} \
-            </g> \
-            </svg>"
-    
-        with open(temp_svg_path, 'w', encoding='utf-8') as f:
-            f.write(svg_container)
-            f.flush()
-        svg_to_png(temp_svg_path, temp_png_path, background_color)
-        x_min, y_min, x_max, y_max = get_precise_bbox(temp_png_path, background_color)
-        width = x_max - x_min + 1
-        height = y_max - y_min + 1
-        offset_x = padding - bbox['min_x'] - x_min
-        offset_y = padding - bbox['min_y'] - y_min
-        svg_container = f"<g transform='translate({offset_x}, {offset_y})'> \
+    mode: geometry / raster / verify，默认取 SVG_BBOX_MODE
+    """
+    mode = mode or SVG_BBOX_MODE
+    if mode == 'raster':
+        return adjust_and_get_bbox_raster(svg_content, background_color)
+
+    geometry_result = adjust_and_get_bbox_geometry(svg_content, background_color)
+    if geometry_result is None:
+        # 无法解析或没有可见图形时回退到光栅化
+        return adjust_and_get_bbox_raster(svg_content, background_color)
+    if mode != 'verify':
+        return geometry_result
+
+    raster_result = adjust_and_get_bbox_raster(svg_content, background_color)
+    differences = [abs(float(a) - float(b)) for a, b in zip(geometry_result[1:], raster_result[1:])]
+    if max(differences) > SVG_BBOX_VERIFY_TOLERANCE:
+        logger.warning(
+            f"Geometric bbox differs from raster bbox: geometry(w, h, dx, dy)={geometry_result[1:]}, "
+            f"raster={raster_result[1:]}"
+        )
+    return raster_result
+
+def adjust_and_get_bbox_geometry(svg_content, background_color = "#FFFFFF"):
+    """Same result format as adjust_and_get_bbox_raster, computed from the SVG geometry without rasterizing."""
+    svg_container = f"<svg \
+        width='1000' \
+        height='1000' \
+        xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink'> \
+        {svg_content}</svg>"
+    try:
+        bbox = compute_svg_bbox(svg_container, background_color)
+    except Exception as e:
+        logger.warning(f"Geometric bbox failed, falling back to raster: {e}")
+        return None
+    if bbox is None:
+        return None
+    # 与像素扫描一致：覆盖到的像素范围，宽高包含末尾像素
+    x_min = math.floor(bbox['min_x'])
+    y_min = math.floor(bbox['min_y'])
+    width = math.ceil(bbox['max_x']) - x_min + 1
+    height = math.ceil(bbox['max_y']) - y_min + 1
+    offset_x = -x_min
+    offset_y = -y_min
+    svg_container = f"<g transform='translate({offset_x}, {offset_y})'> \
+        {svg_content} \
+    </g>"
+
+    return svg_container, width, height, offset_x, offset_y
+
+def adjust_and_get_bbox_raster(svg_content, background_color = "#FFFFFF"):
+    """Rasterize the SVG and scan the pixels for the bounding box."""
+    svg_container = f"<svg \
+        width='1000' \
+        height='1000' \
+        xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink'> \
+        {svg_content}</svg>"
+    bbox = get_svg_actual_bbox(io.BytesIO(svg_container.encode('utf-8')))
+    # print("bbox: ", bbox)
+    padding = 150
+    new_width = bbox['width'] + padding * 2
+    new_height = bbox['height'] + padding * 2
+    svg_container = f"<svg \
+        width='{new_width}' \
+        height='{new_height}' \
+        xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink'> \
+        <rect width='{new_width}' height='{new_height}' fill='{background_color}' /> \
+        <g transform='translate({padding - bbox['min_x']}, {padding - bbox['min_y']})'> \
             {svg_content} \
-        </g>"
+        </g> \
+        </svg>"
 
-        os.unlink(temp_svg_path)
-        os.unlink(temp_png_path)
+    img_array = rasterize_svg(svg_container, background_color=background_color, dpi=96)
+    x_min, y_min, x_max, y_max = get_precise_bbox_from_array(img_array, background_color)
+    width = x_max - x_min + 1
+    height = y_max - y_min + 1
+    offset_x = padding - bbox['min_x'] - x_min
+    offset_y = padding - bbox['min_y'] - y_min
+    svg_container = f"<g transform='translate({offset_x}, {offset_y})'> \
+        {svg_content} \
+    </g>"
     
     return svg_container, width, height, offset_x, offset_y
     
@@ -351,18 +402,19 @@ def remove_image_element(svg_content: str) -> str:
         return svg_content
 
 def svg_to_png(svg_path, png_path, background_color = "#FFFFFF"):
-    """Convert SVG to PNG using rsvg-convert with a white background."""
-    # Add --background-color=#FFFFFF to set white background
-    cmd = ['rsvg-convert', '--background-color=' + background_color, svg_path, '-o', png_path]
-    subprocess.run(cmd, check=True)
+    """Convert SVG to PNG with the configured rasterizer backend and a solid background."""
+    with open(svg_path, 'r', encoding='utf-8') as f:
+        svg_content = f.read()
+    rasterize_svg_to_png(svg_content, png_path, background_color=background_color, dpi=96)
 
 def get_precise_bbox(png_path, background_color = "#FFFFFF"):
     """Get precise bounding box by detecting the exact non-transparent pixels."""
     img = Image.open(png_path).convert("RGBA")
-    width, height = img.size
-    
-    # Convert image to numpy array for efficient processing
-    img_array = np.array(img)
+    return get_precise_bbox_from_array(np.array(img), background_color)
+
+def get_precise_bbox_from_array(img_array, background_color = "#FFFFFF"):
+    """Same as get_precise_bbox, but on an in-memory (H, W, 4) RGBA array."""
+    height, width = img_array.shape[:2]
     
     # Get alpha channel and RGB values
     alpha = img_array[:, :, 3]
@@ -1,6 +1,9 @@
 from typing import Dict, List, Tuple, Optional, Union
 import random
 import json
+import itertools
+import threading
+from collections import OrderedDict
 from modules.infographics_generator.color_utils import get_contrast_color, has_indistinguishable_colors, generate_distinct_palette
 import os
 
@@ -52,13 +55,15 @@ def get_unique_fields_and_types(
 
     # Order fields according to field_order, keeping only those that exist
     ordered_fields = [field for field in field_order if field in field_types]
+    # 在副本上转换 "inf" 范围，不修改模板的 requirements
     for field in field_ranges:
-        r = field_ranges[field]
         try:
+            r = list(field_ranges[field])
             if r[0] == "-inf":
                 r[0] = float('-inf')
             if r[1] == "inf":
                 r[1] = float('inf')
+            field_ranges[field] = r
         except:
             pass
     ordered_ranges = [field_ranges[field] for field in ordered_fields]
@@ -113,7 +118,64 @@ def analyze_templates(templates: Dict) -> Tuple[int, Dict[str, str], int]:
 # block_list = ["multiple_line_graph_06", "layered_area_chart_02", "multiple_area_chart_01", "stacked_area_chart_01", "stacked_area_chart_03"]
 block_list = ["horizontal_group_bar_chart_13", "horizontal_group_bar_chart_06"]
 
-def check_field_color_compatibility(requirements: Dict, data: Dict) -> bool:
+class DataProfile:
+    """
+    Per-dataset statistics used by the template compatibility checks.
+
+    Everything here depends only on the data, so it is computed once per dataset
+    (lazily, on first use) and shared by all templates instead of rescanning the rows
+    for every template.
+    """
+
+    def __init__(self, data: Dict):
+        self.data = data
+        self.columns = data["data"]["columns"]
+        self.rows = data["data"]["data"]
+        self.column_types = [col["data_type"] for col in self.columns]
+        combination_type = data.get("data", {}).get("type_combination", "")
+        self.combination_type = combination_type or " + ".join(self.column_types)
+        self._unique_counts = {}
+        self._min_max = {}
+        self._combination_counts = {}
+        self._coverage = {}
+
+    def unique_count(self, name: str) -> int:
+        """Number of distinct values in a column"""
+        if name not in self._unique_counts:
+            self._unique_counts[name] = len(set(value[name] for value in self.rows))
+        return self._unique_counts[name]
+
+    def min_max(self, name: str) -> Tuple[float, float]:
+        """(min, max) of a numerical column"""
+        if name not in self._min_max:
+            self._min_max[name] = (min(value[name] for value in self.rows), max(value[name] for value in self.rows))
+        return self._min_max[name]
+
+    def combination_count(self, names: Tuple[str, ...]) -> int:
+        """Number of distinct value combinations over several columns"""
+        if names not in self._combination_counts:
+            self._combination_counts[names] = len(set(' '.join(str(value[name]) for name in names) for value in self.rows))
+        return self._combination_counts[names]
+
+    def values_covered(self, name: str, mapping: str) -> bool:
+        """Whether every value of a column has an entry in data[mapping]["field"] (mapping is "colors" or "images")"""
+        key = (name, mapping)
+        if key not in self._coverage:
+            mapped = self.data.get(mapping, {}).get("field", {}).keys()
+            self._coverage[key] = all(value[name] in mapped for value in self.rows)
+        return self._coverage[key]
+
+    def compatible_signatures(self) -> List[Tuple[str, ...]]:
+        """Template field-type signatures that can be satisfied by the data columns"""
+        # 模板中的categorical字段也可以接受temporal列
+        accepted = {
+            "categorical": ["categorical"],
+            "numerical": ["numerical"],
+            "temporal": ["categorical", "temporal"],
+        }
+        return list(itertools.product(*[accepted.get(column_type, []) for column_type in self.column_types]))
+
+def check_field_color_compatibility(requirements: Dict, data: Dict, profile: Optional[DataProfile] = None) -> bool:
     """Check if the field color is compatible with the template"""
     if len(requirements.get('required_fields_colors', [])) > 0 and len(data.get("colors", {}).get("field", {}).keys()) == 0:
         return False
@@ -127,12 +189,16 @@ def check_field_color_compatibility(requirements: Dict, data: Dict) -> bool:
         if field_column is None:
             return False
         field_name = field_column["name"]
+        if profile is not None:
+            if not profile.values_covered(field_name, "colors"):
+                return False
+            continue
         for value in data.get("data", {}).get("data", []):
             if value[field_name] not in data.get("colors", {}).get("field", {}).keys():
                 return False
     return True
 
-def check_field_icon_compatibility(requirements: Dict, data: Dict) -> bool:
+def check_field_icon_compatibility(requirements: Dict, data: Dict, profile: Optional[DataProfile] = None) -> bool:
     """Check if the field icon is compatible with the template"""
     if len(requirements.get('required_fields_icons', [])) > 0 and len(data.get("images", {}).get("field", {}).keys()) == 0:
         return False
@@ -145,39 +211,42 @@ def check_field_icon_compatibility(requirements: Dict, data: Dict) -> bool:
         if field_column is None:
             return False
         field_name = field_column["name"]
+        if profile is not None:
+            if not profile.values_covered(field_name, "images"):
+                return False
+            continue
         for value in data.get("data", {}).get("data", []):
             if value[field_name] not in data.get("images", {}).get("field", {}).keys():
                 return False
     return True
 
-def check_template_compatibility(data: Dict, templates: Dict, specific_chart_name: str = None) -> List[str]:
-    """Check which templates are compatible with the given data"""
-    compatible_templates = []
-
-    # print(data)
-    # print(templates)
-    # print(specific_chart_name)
-    
-    # try:
-        # 模拟出错的条件
-    # raise ValueError("这是一个自定义错误示例")
-    # except Exception:
-    #     # 捕获异常并打印完整traceback
-    #     with open('output.txt', 'w', encoding='utf-8') as f:
-    #         f.write(traceback.format_exc())
-    #         f.write(f"Data:\n{data}\n\n")
-    #         f.write(f"Templates:\n{templates}\n\n")
-    #         f.write(f"Chart Name:\n{specific_chart_name}\n")
- 
-    # Get the combination type from the data
-    combination_type = data.get("data", {}).get("type_combination", "")
-    combination_types = [col["data_type"] for col in data["data"]["columns"]]
-    if combination_type == "":
-        combination_type = " + ".join(combination_types)
-
-    if not combination_type:
-        return compatible_templates
+# 模板按字段类型签名分桶的索引缓存：(映射 id, 扫描代数) -> (映射, 索引)，只保留最近几个
+_template_index_cache = OrderedDict()
+_template_index_lock = threading.Lock()
+TEMPLATE_INDEX_CACHE_SIZE = 4
 
+def build_template_index(templates: Dict) -> Dict[Tuple[str, ...], List[Dict]]:
+    """
+    Bucket templates by the field-type signature of their requirements, e.g.
+    ("categorical", "numerical", "categorical").
+
+    The parsed fields/ranges of each template are stored alongside so the
+    compatibility pass does not reparse requirements for every dataset. The index
+    is cached for the template registry mapping (template_registry.TemplateDict)
+    and rebuilt when its scan generation changes; other dicts are indexed on
+    every call.
+    """
+    generation = getattr(templates, 'generation', None)
+    cache_key = (id(templates), generation)
+    if generation is not None:
+        with _template_index_lock:
+            cached = _template_index_cache.get(cache_key)
+            if cached is not None and cached[0] is templates:
+                _template_index_cache.move_to_end(cache_key)
+                return cached[1]
+
+    index = {}
+    order = 0
     for engine, templates_dict in templates.items():
         for chart_type, chart_names_dict in templates_dict.items():
             for chart_name, template_info in chart_names_dict.items():
@@ -185,127 +254,117 @@ def check_template_compatibility(data: Dict, templates: Dict, specific_chart_nam
                     continue
                 if engine == 'vegalite_py':
                     continue
+                req = template_info.get('requirements') if isinstance(template_info, dict) else None
+                if not req or 'required_fields' not in req or 'required_fields_type' not in req:
+                    continue
+                try:
+                    ordered_fields, field_types, ordered_ranges = get_unique_fields_and_types(
+                        req['required_fields'],
+                        req['required_fields_type'],
+                        req.get('required_fields_range', None)
+                    )
+                    signature = tuple(field_types[field] for field in ordered_fields)
+                except Exception:
+                    continue
+                index.setdefault(signature, []).append({
+                    'order': order,
+                    'template_key': f"{engine}/{chart_type}/{chart_name}",
+                    'chart_name': chart_name,
+                    'requirements': req,
+                    'ordered_fields': ordered_fields,
+                    'ordered_ranges': ordered_ranges,
+                })
+                order += 1
+
+    if generation is not None:
+        with _template_index_lock:
+            # 同时保存映射本身，保证 id 在缓存期间不会被复用
+            _template_index_cache[cache_key] = (templates, index)
+            while len(_template_index_cache) > TEMPLATE_INDEX_CACHE_SIZE:
+                _template_index_cache.popitem(last=False)
+    return index
+
+def _check_profile_against_template(profile: DataProfile, entry: Dict) -> bool:
+    """Check the range / grouping requirements of one template against the data profile"""
+    req = entry['requirements']
+    chart_name = entry['chart_name']
+    ordered_fields = entry['ordered_fields']
+    hierarchy = req.get('hierarchy', [])
+    columns = profile.columns
+
+    if len(req.get('required_fields_colors', [])) > 0 and len(profile.data.get("colors", {}).get("field", [])) == 0:
+        return False
+    if not check_field_color_compatibility(req, profile.data, profile):
+        return False
+    if not check_field_icon_compatibility(req, profile.data, profile):
+        return False
 
-                template_key = f"{engine}/{chart_type}/{chart_name}"
+    for i, range in enumerate(entry['ordered_ranges']):
+        if i >= len(columns):
+            return False
 
-                if specific_chart_name and specific_chart_name != chart_name:
-                    continue
+        key = columns[i]["name"]
+        if columns[i]["data_type"] in ["temporal", "categorical"]:
+            unique_count = profile.unique_count(key)
+            if unique_count > range[1] or unique_count < range[0]:
+                return False
+        elif columns[i]["data_type"] in ["numerical"]:
+            min_value, max_value = profile.min_max(key)
+            if min_value < range[0] or max_value > range[1]:
+                return False
+            elif "diverging" in chart_name and min_value >= 0 and range[0] < 0:
+                return False
+            elif "scatterplot" in chart_name and min_value >= 0 and range[0] < 0:
+                return False
 
-                try:
-                    if 'requirements' in template_info:
-                        req = template_info['requirements']
-                        hierarchy = req.get('hierarchy', [])
-                        if 'required_fields' in req and 'required_fields_type' in req:
-                            ordered_fields, field_types, ordered_ranges = get_unique_fields_and_types(
-                                req['required_fields'],
-                                req['required_fields_type'],
-                                req.get('required_fields_range', None)
-                            )
-                            data_types = [field_types[field] for field in ordered_fields]
-                            data_type_str = ' + '.join(data_types)
-                            if len(req.get('required_fields_colors', [])) > 0 and len(data.get("colors", {}).get("field", [])) == 0:
-                                # print(f"template {template_key} failed color compatibility check")
-                                continue
-
-                            # if len(req.get('required_fields_icons', [])) > 0 and len(data.get("images", {}).get("field", [])) == 0:
-                            #     print(f"template {template_key} failed icon compatibility check")
-                            #     continue
-
-                            if not check_field_color_compatibility(req, data):
-                                # print(f"template {template_key} failed color compatibility check")
-                                continue
-
-                            if not check_field_icon_compatibility(req, data):
-                                # print(f"template {template_key} failed icon compatibility check")
-                                continue
-                            # print("data_types", data_types)
-                            # print("combination_types", combination_types)
-                            # 如果data_types和combination_types相同，或者data_types是combination_types的一个子序列
-                            if len(data_types) == len(combination_types):# or all(data_type in combination_types for data_type in data_types):
-                                check_flag = True
-                                for data_type, combination_type in zip(data_types, combination_types[:len(data_types)]):
-                                    if data_type == "categorical" and (combination_type == "temporal" or combination_type == "categorical"):
-                                        pass
-                                    elif data_type == "numerical" and combination_type == "numerical":
-                                        pass
-                                    elif data_type == "temporal" and combination_type == "temporal":
-                                        pass
-                                    else:
-                                        check_flag = False
-                                        break
-                                if not check_flag:
-                                    # print(f"template {template_key} failed data type compatibility check")
-                                    continue
-                            else:
-                                # print(f"template {template_key} failed data type compatibility check")
-                                continue
-
-                            flag = True
-                            # print("check compatibility")
-                            for i, range in enumerate(ordered_ranges):
-                                if i >= len(data["data"]["columns"]):
-                                    flag = False
-                                    break
-
-                                if data["data"]["columns"][i]["data_type"] in ["temporal", "categorical"]:
-                                    key = data["data"]["columns"][i]["name"]
-                                    unique_values = list(set(value[key] for value in data["data"]["data"]))
-                                    if len(unique_values) > range[1] or len(unique_values) < range[0]:
-                                        flag = False
-                                        break
-                                    else:
-                                        pass
-                                        #if specific_chart_name and specific_chart_name == chart_name:
-                                        #    print(f"template {template_key} matched", data["name"], len(unique_values), range)
-                                elif data["data"]["columns"][i]["data_type"] in ["numerical"]:
-                                    key = data["data"]["columns"][i]["name"]
-                                    min_value = min(value[key] for value in data["data"]["data"])
-                                    max_value = max(value[key] for value in data["data"]["data"])
-                                    if min_value < range[0] or max_value > range[1]:
-                                        flag = False
-                                        break
-                                    elif "diverging" in chart_name and min_value >= 0 and range[0] < 0:
-                                        flag = False
-                                        break
-                                    elif "scatterplot" in chart_name and min_value >= 0 and range[0] < 0:
-                                        flag = False
-                                        break
-                            for i, field in enumerate(ordered_fields):
-                                if field == "group":
-                                    x_col = [j for j, field2 in enumerate(ordered_fields) if field2 == "x"][0]
-                                    x_name = data["data"]["columns"][x_col]["name"]
-                                    field_name = data["data"]["columns"][i]["name"]
-                                    num_unique_x  = len(list(set(value[x_name] for value in data["data"]["data"])))
-                                    num_unique_comb = len(list(set(str(value[x_name]) + ' ' + str(value[field_name]) for value in data["data"]["data"])))
-                                    if field in hierarchy:
-                                        if num_unique_comb > num_unique_x:
-                                            flag = False
-                                            break
-                                    else:
-                                        if num_unique_comb == num_unique_x:
-                                            flag = False
-                                            break
-                                elif field == "group2":
-                                    x_col = [j for j, field2 in enumerate(ordered_fields) if field2 == "x"][0]
-                                    group_col = [j for j, field2 in enumerate(ordered_fields) if field2 == "group"][0]
-                                    x_name = data["data"]["columns"][x_col]["name"]
-                                    group_name = data["data"]["columns"][group_col]["name"]
-                                    field_name = data["data"]["columns"][i]["name"]
-                                    num_unique_x  = len(list(set(str(value[x_name]) + ' ' + str(value[group_name]) for value in data["data"]["data"])))
-                                    num_unique_comb = len(list(set(str(value[x_name]) + ' ' + str(value[group_name]) + ' ' + str(value[field_name]) for value in data["data"]["data"])))
-                                    if field in hierarchy:
-                                        if num_unique_comb > num_unique_x:
-                                            flag = False
-                                            break
-                                    else:
-                                        if num_unique_comb == num_unique_x:
-                                            flag = False
-                                            break
-                            if flag:
-                                if specific_chart_name == None or specific_chart_name == chart_name:
-                                    compatible_templates.append((template_key, ordered_fields))
-                except:
-                    pass
+    for i, field in enumerate(ordered_fields):
+        if field == "group":
+            x_col = [j for j, field2 in enumerate(ordered_fields) if field2 == "x"][0]
+            x_name = columns[x_col]["name"]
+            field_name = columns[i]["name"]
+            num_unique_x = profile.unique_count(x_name)
+            num_unique_comb = profile.combination_count((x_name, field_name))
+        elif field == "group2":
+            x_col = [j for j, field2 in enumerate(ordered_fields) if field2 == "x"][0]
+            group_col = [j for j, field2 in enumerate(ordered_fields) if field2 == "group"][0]
+            x_name = columns[x_col]["name"]
+            group_name = columns[group_col]["name"]
+            field_name = columns[i]["name"]
+            num_unique_x = profile.combination_count((x_name, group_name))
+            num_unique_comb = profile.combination_count((x_name, group_name, field_name))
+        else:
+            continue
+        if field in hierarchy:
+            if num_unique_comb > num_unique_x:
+                return False
+        else:
+            if num_unique_comb == num_unique_x:
+                return False
+    return True
+
+def check_template_compatibility(data: Dict, templates: Dict, specific_chart_name: str = None) -> List[str]:
+    """Check which templates are compatible with the given data"""
+    compatible_templates = []
+
+    profile = DataProfile(data)
+    if not profile.combination_type:
+        return compatible_templates
+
+    # 只检查字段类型签名与数据列匹配的模板桶
+    index = build_template_index(templates)
+    candidates = []
+    for signature in profile.compatible_signatures():
+        candidates.extend(index.get(signature, []))
+    candidates.sort(key=lambda entry: entry['order'])
+
+    for entry in candidates:
+        if specific_chart_name and specific_chart_name != entry['chart_name']:
+            continue
+        try:
+            if _check_profile_against_template(profile, entry):
+                compatible_templates.append((entry['template_key'], entry['ordered_fields']))
+        except Exception:
+            pass
     #print("compatible_templates", compatible_templates)
     return compatible_templates
 
@@ -53,6 +53,7 @@ class RagTitleGenerator:
         self.data_path = data_path
         if embed_model_path:
             self.embed_model = ModelLoader.get_model(embed_model_path)
+            self.embeddings = ModelLoader.get_embedding_service(embed_model_path)
         else:
             print("fuck")
         #else:
@@ -223,7 +224,7 @@ class RagTitleGenerator:
         if self.index is None or len(self.training_data) == 0:
             return []
 
-        new_embedding = self.embed_model.encode([new_input])
+        new_embedding = self.embeddings.encode([new_input])
         topk = min(topk, len(self.training_data))
         _, I = self.index.search(np.array(new_embedding), k=topk)
 
@@ -0,0 +1,334 @@
+"""
+Shared text embedding service on top of ModelLoader.
+
+- Micro-batching: encode requests from all callers (threads) are queued and a single
+  worker thread encodes them together. It waits up to EMBEDDING_BATCH_WINDOW_MS after
+  the first request for more texts, up to EMBEDDING_MAX_BATCH_SIZE texts per model call.
+- Vector cache: every embedded text is stored in a persistent, memory-mapped float16
+  store keyed by a hash of the text, so repeated icon names, column names and semantic
+  texts are never embedded twice (also across restarts and processes).
+
+Store layout (one directory per model under EMBEDDING_CACHE_DIR):
+    meta.json     {"model": ..., "dim": ...}
+    vectors.f16   float16 matrix, row i is the vector of the i-th key
+    keys.bin      append-only 16-byte blake2b digests of the texts
+    store.lock    lock file for appends
+
+A key is appended only after its vector row has been written and flushed, so any key
+present in keys.bin has a valid vector. Appends are serialized across processes with
+an exclusive lock on store.lock.
+
+Configuration (environment variables):
+- EMBEDDING_CACHE_DIR: cache root, default buffer/embedding_cache
+- EMBEDDING_CACHE_ENABLED: set to 0 to disable the persistent cache
+- EMBEDDING_BATCH_WINDOW_MS: micro-batching window, default 5
+- EMBEDDING_MAX_BATCH_SIZE: max texts per model call, default 64
+"""
+import os
+import re
+import json
+import fcntl
+import time
+import queue
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from utils.model_loader import ModelLoader
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_DIR = os.environ.get('EMBEDDING_CACHE_DIR', 'buffer/embedding_cache')
+EMBEDDING_CACHE_ENABLED = os.environ.get('EMBEDDING_CACHE_ENABLED', '1') != '0'
+EMBEDDING_BATCH_WINDOW_MS = float(os.environ.get('EMBEDDING_BATCH_WINDOW_MS', 5))
+EMBEDDING_MAX_BATCH_SIZE = int(os.environ.get('EMBEDDING_MAX_BATCH_SIZE', 64))
+
+KEY_SIZE = 16
+INITIAL_CAPACITY = 1024
+
+
+def text_key(text: str) -> bytes:
+    """16-byte hash of a text, used as the cache key."""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=KEY_SIZE).digest()
+
+
+class VectorStore:
+    """
+    Persistent text-hash -> float16 vector store backed by a memory-mapped file.
+
+    Args:
+        cache_dir: Directory of the store (one per model).
+        model_name: Stored in meta.json; a store built for another model is discarded.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.keys_path = os.path.join(cache_dir, 'keys.bin')
+        self.vectors_path = os.path.join(cache_dir, 'vectors.f16')
+        self.meta_path = os.path.join(cache_dir, 'meta.json')
+        self.dim = None
+        self._rows: Dict[bytes, int] = {}
+        self._keys_read = 0          # bytes of keys.bin already indexed
+        self._vectors = None         # np.memmap, shape (capacity, dim)
+        self._lock = threading.Lock()
+        self._load_meta()
+
+    def _load_meta(self):
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        if meta.get('model') != self.model_name:
+            logger.warning(f"Embedding cache {self.cache_dir} was built for {meta.get('model')}, ignoring it")
+            return
+        self.dim = int(meta['dim'])
+        self._sync_keys()
+
+    def _init_store(self, dim: int):
+        """Create an empty store for vectors of the given dimension."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._lock_path(), 'a+b') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(self.meta_path):
+                    # another process initialized it first
+                    self._load_meta()
+                    if self.dim is not None:
+                        return
+                for path in (self.keys_path, self.vectors_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                open(self.keys_path, 'wb').close()
+                with open(self.vectors_path, 'wb') as f:
+                    f.truncate(INITIAL_CAPACITY * dim * 2)
+                tmp_path = f"{self.meta_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'model': self.model_name, 'dim': dim}, f)
+                os.replace(tmp_path, self.meta_path)
+                self.dim = dim
+                self._rows = {}
+                self._keys_read = 0
+                self._vectors = None
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _lock_path(self) -> str:
+        return os.path.join(self.cache_dir, 'store.lock')
+
+    def _map_vectors(self, min_rows: int = 0):
+        """(Re)map vectors.f16 when it has grown beyond the current mapping."""
+        if self._vectors is not None and self._vectors.shape[0] >= min_rows:
+            return
+        capacity = os.path.getsize(self.vectors_path) // (self.dim * 2)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float16, mode='r+', shape=(capacity, self.dim))
+
+    def _sync_keys(self):
+        """Index keys appended since the last sync (possibly by other processes)."""
+        try:
+            size = os.path.getsize(self.keys_path)
+        except OSError:
+            return
+        size -= size % KEY_SIZE
+        if size <= self._keys_read:
+            return
+        with open(self.keys_path, 'rb') as f:
+            f.seek(self._keys_read)
+            data = f.read(size - self._keys_read)
+        row = self._keys_read // KEY_SIZE
+        for offset in range(0, len(data), KEY_SIZE):
+            self._rows.setdefault(data[offset:offset + KEY_SIZE], row)
+            row += 1
+        self._keys_read = size
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """Cached float16 vectors for the keys (None for misses)."""
+        with self._lock:
+            if self.dim is None:
+                return [None] * len(keys)
+            if any(key not in self._rows for key in keys):
+                self._sync_keys()
+            rows = [self._rows.get(key) for key in keys]
+            present = [row for row in rows if row is not None]
+            if not present:
+                return [None] * len(keys)
+            self._map_vectors(max(present) + 1)
+            return [np.array(self._vectors[row]) if row is not None else None for row in rows]
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray):
+        """Append vectors for keys that are not stored yet."""
+        vectors = np.asarray(vectors, dtype=np.float16)
+        with self._lock:
+            if self.dim is None:
+                self._init_store(vectors.shape[1])
+            if vectors.shape[1] != self.dim:
+                logger.warning(f"Embedding dimension {vectors.shape[1]} does not match cache dimension {self.dim}")
+                return
+            self._append(keys, vectors)
+
+    def _append(self, keys: Sequence[bytes], vectors: np.ndarray):
+        with open(self._lock_path(), 'a+b') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._sync_keys()
+                new = {}
+                for key, vector in zip(keys, vectors):
+                    if key not in self._rows and key not in new:
+                        new[key] = vector
+                if not new:
+                    return
+                start = self._keys_read // KEY_SIZE
+                end = start + len(new)
+                capacity = os.path.getsize(self.vectors_path) // (self.dim * 2)
+                if end > capacity:
+                    # grow the file geometrically; the mapping is refreshed below
+                    self._vectors = None
+                    with open(self.vectors_path, 'r+b') as f:
+                        f.truncate(max(end, capacity * 2) * self.dim * 2)
+                self._map_vectors(end)
+                self._vectors[start:end] = np.stack(list(new.values()))
+                self._vectors.flush()
+                with open(self.keys_path, 'ab') as f:
+                    f.write(b''.join(new.keys()))
+                for row, key in enumerate(new, start):
+                    self._rows[key] = row
+                self._keys_read = end * KEY_SIZE
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._sync_keys()
+            return len(self._rows)
+
+
+class EmbeddingService:
+    """
+    Batched, cached text embeddings.
+
+    encode() mirrors SentenceTransformer.encode: a single string returns a 1-D vector,
+    a list of strings returns a 2-D array. Vectors are returned as float32 but carry
+    float16 precision, so cached and freshly computed results are identical.
+    """
+
+    def __init__(self, model_path: Optional[str] = None, cache_dir: Optional[str] = EMBEDDING_CACHE_DIR,
+                 batch_window_ms: float = EMBEDDING_BATCH_WINDOW_MS, max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE,
+                 model=None, model_name: Optional[str] = None):
+        self.model_path = model_path
+        self.model_name = model_name or ModelLoader.get_model_name(model_path)
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._model = model
+        self.store = None
+        if cache_dir:
+            store_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', self.model_name).strip('_') or 'default'
+            self.store = VectorStore(os.path.join(cache_dir, store_name), self.model_name)
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self.model_calls = 0
+        self.texts_embedded = 0
+
+    def _get_model(self):
+        if self._model is None:
+            self._model = ModelLoader.get_model(self.model_path)
+        return self._model
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            count = len(batch[0][0])
+            # collect more requests within the batching window
+            deadline = time.monotonic() + self.batch_window
+            while count < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                count += len(item[0])
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch):
+        texts = [text for request_texts, _ in batch for text in request_texts]
+        try:
+            vectors = np.asarray(self._get_model().encode(texts, batch_size=self.max_batch_size,
+                                                          convert_to_numpy=True, show_progress_bar=False))
+            self.model_calls += 1
+            self.texts_embedded += len(texts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        offset = 0
+        for request_texts, future in batch:
+            future.set_result(vectors[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts through the micro-batching worker."""
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((texts, future))
+        return future.result()
+
+    def encode(self, texts: Union[str, Sequence[str]]) -> np.ndarray:
+        single = isinstance(texts, str)
+        texts = [texts] if single else [str(text) for text in texts]
+        if not texts:
+            return np.zeros((0, self.store.dim or 0) if self.store is not None else (0, 0), dtype=np.float32)
+
+        keys = [text_key(text) for text in texts]
+        cached = self.store.get_many(keys) if self.store is not None else [None] * len(texts)
+
+        # embed each distinct missing text once
+        missing: Dict[bytes, str] = {}
+        for key, text, vector in zip(keys, texts, cached):
+            if vector is None:
+                missing.setdefault(key, text)
+        if missing:
+            fresh = self._embed(list(missing.values())).astype(np.float16)
+            if self.store is not None:
+                self.store.put_many(list(missing.keys()), fresh)
+            fresh_by_key = dict(zip(missing.keys(), fresh))
+            cached = [vector if vector is not None else fresh_by_key[key] for key, vector in zip(keys, cached)]
+
+        result = np.stack(cached).astype(np.float32)
+        return result[0] if single else result
+
+    def stats(self) -> Dict:
+        return {
+            'cached_vectors': len(self.store) if self.store is not None else 0,
+            'model_calls': self.model_calls,
+            'texts_embedded': self.texts_embedded,
+        }
+
+
+_services: Dict[str, EmbeddingService] = {}
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(model_path: Optional[str] = None) -> EmbeddingService:
+    """Process-wide embedding service for the model that ModelLoader serves."""
+    name = ModelLoader.get_model_name(model_path)
+    with _services_lock:
+        service = _services.get(name)
+        if service is None:
+            service = EmbeddingService(model_path, cache_dir=EMBEDDING_CACHE_DIR if EMBEDDING_CACHE_ENABLED else None,
+                                       model_name=name)
+            _services[name] = service
+        return service
@@ -2,8 +2,10 @@ from sentence_transformers import SentenceTransformer
 from typing import Optional
 
 class ModelLoader:
+    DEFAULT_MODEL = "all-MiniLM-L6-v2"
     _instance = None
     _model = None
+    _model_name = None
     
     def __new__(cls):
         if cls._instance is None:
@@ -23,8 +25,23 @@ class ModelLoader:
             SentenceTransformer instance
         """
         if cls._model is None:
-            if model_path:
-                cls._model = SentenceTransformer(model_path)
-            else:
-                cls._model = SentenceTransformer("all-MiniLM-L6-v2")
-        return cls._model 
\ No newline at end of file
+            cls._model_name = model_path or cls.DEFAULT_MODEL
+            cls._model = SentenceTransformer(cls._model_name)
+        return cls._model
+
+    @classmethod
+    def get_model_name(cls, model_path: Optional[str] = None) -> str:
+        """
+        Name of the model get_model serves: the loaded model if there is one,
+        otherwise the model that get_model(model_path) would load.
+        """
+        return cls._model_name or model_path or cls.DEFAULT_MODEL
+
+    @classmethod
+    def get_embedding_service(cls, model_path: Optional[str] = None):
+        """
+        Get the shared batched, cached embedding service for the model
+        (see utils.embedding_service).
+        """
+        from utils.embedding_service import get_embedding_service
+        return get_embedding_service(model_path) 
\ No newline at end of file
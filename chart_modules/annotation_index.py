@@ -0,0 +1,120 @@
+"""
+infographics/annotations.xml 的内存索引
+
+util.parse_reference_layout 和 reference_describe.get_reference_regions 原来每次调用都完整解析
+annotations.xml 并线性查找 image 元素，/authoring/chart、/api/layout 每个请求都会触发一次。
+这里把标注解析一次，建成 文件名 -> 标注 的字典，两个模块共用；文件 mtime 或大小变化后自动重建。
+
+标注文件超过 ANNOTATION_ITERPARSE_THRESHOLD 字节时用 iterparse 流式构建：
+每处理完一个 image 元素就释放它，内存中只保留索引本身，不持有整棵 DOM。
+
+配置（环境变量）：
+- ANNOTATIONS_PATH: 标注文件路径，默认 infographics/annotations.xml
+- ANNOTATION_ITERPARSE_THRESHOLD: 使用流式解析的文件大小阈值，默认 32MB
+"""
+import os
+import threading
+import xml.etree.ElementTree as ET
+from typing import Dict, Optional
+
+ANNOTATIONS_PATH = os.environ.get('ANNOTATIONS_PATH', 'infographics/annotations.xml')
+ANNOTATION_ITERPARSE_THRESHOLD = int(os.environ.get('ANNOTATION_ITERPARSE_THRESHOLD', 32 * 1024 * 1024))
+
+
+def _image_record(image_elem) -> Dict:
+    """image 元素转换为索引记录：{'width', 'height', 'boxes': [{'label', 'xtl', 'ytl', 'xbr', 'ybr'}]}"""
+    return {
+        'width': float(image_elem.get('width')),
+        'height': float(image_elem.get('height')),
+        'boxes': [
+            {
+                'label': box.get('label'),
+                'xtl': float(box.get('xtl')),
+                'ytl': float(box.get('ytl')),
+                'xbr': float(box.get('xbr')),
+                'ybr': float(box.get('ybr'))
+            }
+            for box in image_elem.findall('box')
+        ]
+    }
+
+
+def _build_from_tree(path: str) -> Dict[str, Dict]:
+    index = {}
+    for image_elem in ET.parse(path).getroot().findall('image'):
+        # 与原来的线性查找一致：同名的 image 以第一个为准
+        index.setdefault(image_elem.get('name'), _image_record(image_elem))
+    return index
+
+
+def _build_streaming(path: str) -> Dict[str, Dict]:
+    index = {}
+    root = None
+    for event, elem in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            continue
+        if elem.tag == 'image':
+            index.setdefault(elem.get('name'), _image_record(elem))
+            # 释放已处理的 image 元素（包括根节点对它的引用）
+            elem.clear()
+            root.clear()
+    return index
+
+
+class AnnotationIndex:
+    """按文件名索引的标注，文件变化（mtime、大小）后在下一次查询时重建"""
+
+    def __init__(self, path: str = ANNOTATIONS_PATH, iterparse_threshold: int = ANNOTATION_ITERPARSE_THRESHOLD):
+        self.path = path
+        self.iterparse_threshold = iterparse_threshold
+        self._index: Dict[str, Dict] = {}
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> bool:
+        """必要时重建索引，返回标注文件是否存在"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            with self._lock:
+                self._index = {}
+                self._signature = None
+            return False
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if signature != self._signature:
+                if stat.st_size > self.iterparse_threshold:
+                    self._index = _build_streaming(self.path)
+                else:
+                    self._index = _build_from_tree(self.path)
+                self._signature = signature
+        return True
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def get(self, name: str) -> Optional[Dict]:
+        """获取图片的标注记录，标注文件不存在或没有该图片时返回 None（记录不要修改）"""
+        if not self._refresh():
+            return None
+        return self._index.get(name)
+
+    def records(self) -> Dict[str, Dict]:
+        """所有图片的标注记录"""
+        self._refresh()
+        return dict(self._index)
+
+
+_annotation_index = None
+_annotation_index_lock = threading.Lock()
+
+
+def get_annotation_index() -> AnnotationIndex:
+    """获取进程级共享的标注索引"""
+    global _annotation_index
+    with _annotation_index_lock:
+        if _annotation_index is None:
+            _annotation_index = AnnotationIndex()
+        return _annotation_index
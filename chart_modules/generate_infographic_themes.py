@@ -5,7 +5,6 @@
 import os
 import json
 import base64
-import openai
 from pathlib import Path
 from typing import Dict, List
 import time
@@ -19,6 +18,7 @@ project_root = Path(__file__).resolve().parents[1]
 sys.path.append(str(project_root))
 
 import config
+from chart_modules.llm_client import get_llm_client
 
 API_KEY = config.OPENAI_API_KEY
 BASE_URL = config.OPENAI_BASE_URL
@@ -55,14 +55,9 @@ Return your response in the following JSON format:
 Return ONLY the JSON, no additional text."""
 
     try:
-        client = openai.OpenAI(
-            api_key=API_KEY,
-            base_url=BASE_URL
-        )
-
         base64_image = encode_image(image_path)
 
-        response = client.chat.completions.create(
+        response = get_llm_client(BASE_URL, API_KEY).chat(
             model="gpt-4o-mini",
             messages=[
                 {
@@ -25,12 +25,13 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'ChartPipeline'))
 print("sys.path:",sys.path)
 
 from chart_modules.ChartPipeline.modules.chart_engine.chart_engine import get_template_for_chart_name
-from chart_modules.ChartPipeline.modules.chart_engine.utils.paint_innerchart import render_chart_to_svg
+from chart_modules.ChartPipeline.modules.chart_engine.utils.paint_innerchart import render_chart_to_svg, render_chart_artifacts, render_charts_batch
 from chart_modules.ChartPipeline.modules.infographics_generator.svg_utils import extract_svg_content, adjust_and_get_bbox
 from chart_modules.ChartPipeline.modules.infographics_generator.template_utils import select_template
 from chart_modules.ChartPipeline.modules.infographics_generator.data_utils import process_temporal_data, process_numerical_data, deduplicate_combinations
 from chart_modules.ChartPipeline.modules.chart_engine.template.template_registry import get_template_for_chart_type, get_template_for_chart_name
 from chart_modules.reference_recognize.generate_color import generate_distinct_palette, rgb_to_hex
+from chart_modules.render_cache import get_render_cache
 
 padding = 50
 between_padding = 35
@@ -38,9 +39,52 @@ between_padding = 35
 
 from chart_modules.style_refinement import svg_to_png
 
-def make_infographic(data: Dict, chart_svg_content: str, output_dir: str, bg_color) -> str:
+
+class VariationResult:
+    """
+    generate_variation 的生成结果，调用方直接复用其中的产物，不必重新读取或转换
+
+    Attributes:
+        svg_path: 输出 SVG 文件路径
+        svg: SVG 内容
+        png_path: 同名 PNG 文件路径（转换失败时为 None）
+        bbox: 图表边界 (width, height, offset_x, offset_y)
+        elements: 顶层元素和文字在裁剪后图表中的边界框（由渲染服务提供，否则为空列表）
+        cached: 是否来自渲染缓存
+    """
+
+    def __init__(self, svg_path: str, svg: str, png_path: Optional[str], bbox: Optional[Tuple] = None,
+                 elements: Optional[List[Dict]] = None, cached: bool = False):
+        self.svg_path = svg_path
+        self.svg = svg
+        self.png_path = png_path
+        self.bbox = tuple(bbox) if bbox else None
+        self.elements = elements or []
+        self.cached = cached
+
+    def __fspath__(self):
+        return self.svg_path
+
+    def __repr__(self):
+        return f"<VariationResult {self.svg_path} png={self.png_path} bbox={self.bbox} cached={self.cached}>"
+
+
+def make_infographic(data: Dict, chart_svg_content: str, output_dir: str, bg_color, artifacts: Optional[Dict] = None) -> VariationResult:
+    """
+    裁剪图表并保存 SVG/PNG
+
+    artifacts 为渲染服务一次页面加载返回的结果（bbox、png_file）时直接使用，不再计算边界框和截图
+    """
     bg_color = rgb_to_hex(bg_color)
-    chart_content, chart_width, chart_height, chart_offset_x, chart_offset_y = adjust_and_get_bbox(chart_svg_content, bg_color)
+    if artifacts and artifacts.get('bbox'):
+        bbox = artifacts['bbox']
+        chart_width, chart_height = bbox['width'], bbox['height']
+        chart_offset_x, chart_offset_y = bbox['offset_x'], bbox['offset_y']
+        chart_content = f"<g transform='translate({chart_offset_x}, {chart_offset_y})'> \
+        {chart_svg_content} \
+    </g>"
+    else:
+        chart_content, chart_width, chart_height, chart_offset_x, chart_offset_y = adjust_and_get_bbox(chart_svg_content, bg_color)
     # bg_color = "#000001"
     chart_svg_content = f"""<svg xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink' width='{chart_width}' height='{chart_height}'>
         {chart_content}</svg>"""
@@ -54,7 +98,11 @@ def make_infographic(data: Dict, chart_svg_content: str, output_dir: str, bg_col
         f.write(chart_svg_content)
         
     # Convert to PNG
-    if output_dir.endswith('.svg'):
+    png_path = None
+    if artifacts and artifacts.get('bbox') and artifacts.get('png_file'):
+        # 渲染时已经截好图
+        png_path = artifacts['png_file']
+    elif output_dir.endswith('.svg'):
         png_path = output_dir.replace('.svg', '.png')
         try:
             print(f"Converting to PNG: {png_path}")
@@ -64,13 +112,178 @@ def make_infographic(data: Dict, chart_svg_content: str, output_dir: str, bg_col
                 print(f"Converted to PNG: {png_path}")
             else:
                 print(f"Error converting to PNG: conversion failed")
+                png_path = None
         except Exception as e:
             print(f"Error converting to PNG: {e}")
-            
-    return output_dir
+            png_path = None
+
+    return VariationResult(
+        svg_path=output_dir,
+        svg=chart_svg_content,
+        png_path=png_path,
+        bbox=(chart_width, chart_height, chart_offset_x, chart_offset_y),
+        elements=(artifacts or {}).get('elements')
+    )
 
 
-def generate_variation(input: str, output: str, chart_template, main_colors = None, bg_color = None) -> bool:
+def _prepare_variation(input: str, output: str, chart_template, main_colors=None, bg_color=None):
+    """
+    渲染前的准备：解析模板、查询渲染缓存、处理数据
+
+    Returns:
+        缓存命中时返回 VariationResult；模板被过滤或加载失败时返回 False；
+        否则返回渲染所需的参数 dict（交给 _render_variation / _finish_variation）
+    """
+    print(f"[DEBUG generate_variation] 开始")
+    print(f"[DEBUG generate_variation] input: {input}")
+    print(f"[DEBUG generate_variation] output: {output}")
+    print(f"[DEBUG generate_variation] chart_template: {chart_template}")
+    print(f"[DEBUG generate_variation] main_colors: {main_colors}")
+    print(f"[DEBUG generate_variation] bg_color: {bg_color}")
+
+    # 处理 chart_template 格式
+    if isinstance(chart_template, list):
+        # 格式: [template_path, fields] 或 [[template_path, fields]]
+        if len(chart_template) >= 2 and isinstance(chart_template[1], list):
+            template_path = chart_template[0]
+            template_fields = chart_template[1]
+        else:
+            template_path = chart_template[0]
+            template_fields = []
+        template_for_select = [(template_path, template_fields)]
+    else:
+        # 字符串格式的模板路径
+        template_path = chart_template
+        template_fields = []
+        template_for_select = [(template_path, [])]
+
+    print("chart_template:", chart_template)
+    print("template_for_select:", template_for_select)
+    # 读取输入文件
+    with open(input, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data["name"] = input
+
+    # 选择模板
+    engine, chart_type, chart_name, ordered_fields = select_template(template_for_select)
+
+    # 检查模板是否被过滤（在block_list中）
+    if engine is None or chart_name is None:
+        print(f"[跳过] 模板在block_list中，不生成: {chart_template}")
+        return False
+
+    # 获取图表模板
+    print("chart_name:",chart_name)
+    engine_obj, template = get_template_for_chart_name(chart_name)
+    if engine_obj is None or template is None:
+        print(f"Failed to load template: {engine}/{chart_type}/{chart_name}")
+        return False
+
+    # 渲染缓存：相同输入直接复用已生成的 SVG/PNG
+    render_cache = get_render_cache()
+    cache_key = None
+    if render_cache is not None:
+        try:
+            template_file = template if isinstance(template, str) else getattr(template, 'file_path', None)
+            cache_key = render_cache.make_key(input, template_path, template_fields, main_colors, bg_color,
+                                              template_file=template_file)
+            meta = render_cache.get(cache_key, output)
+            if meta is not None:
+                print(f"[渲染缓存] 命中: {chart_name} -> {output}")
+                with open(output, 'r', encoding='utf-8') as f:
+                    cached_svg = f.read()
+                png_path = output.replace('.svg', '.png') if output.endswith('.svg') else None
+                return VariationResult(
+                    svg_path=output,
+                    svg=cached_svg,
+                    png_path=png_path if png_path and os.path.exists(png_path) else None,
+                    bbox=meta.get('bbox'),
+                    elements=meta.get('elements'),
+                    cached=True
+                )
+        except Exception as e:
+            print(f"[渲染缓存] 读取失败: {e}")
+            cache_key = None
+
+    # 颜色
+    data = generate_distinct_palette(data, main_colors, bg_color)
+    # 处理数据
+    for i, field in enumerate(ordered_fields):
+        data["data"]["columns"][i]["role"] = field
+    process_temporal_data(data)
+    process_numerical_data(data)
+    deduplicate_combinations(data)
+
+    if '-' in engine:
+        framework, framework_type = engine.split('-')
+    elif '_' in engine:
+        framework, framework_type = engine.split('_')
+    else:
+        framework = engine
+        framework_type = None
+
+    return {
+        'data': data,
+        'output': output,
+        'template': template,
+        'chart_type': chart_type,
+        'framework': framework,
+        'framework_type': framework_type,
+        'bg_color': bg_color,
+        'png_path': output.replace('.svg', '.png') if output.endswith('.svg') else None,
+        'cache_key': cache_key,
+    }
+
+
+def _render_variation(spec: Dict) -> Optional[Dict]:
+    """单独渲染一个图表：优先一次页面加载同时得到 SVG、边界框和 PNG，渲染服务不可用时返回 None"""
+    return render_chart_artifacts(
+        json_data=spec['data'],
+        js_file=spec['template'],
+        framework=spec['framework'],
+        framework_type=spec['framework_type'],
+        png_path=spec['png_path'],
+        background_color=rgb_to_hex(spec['bg_color'])
+    )
+
+
+def _finish_variation(spec: Dict, artifacts: Optional[Dict]) -> VariationResult:
+    """根据渲染结果裁剪、保存并写入渲染缓存；artifacts 为 None 时回退到 SVG 渲染 + 裁剪 + 截图"""
+    data = spec['data']
+    output = spec['output']
+    if artifacts is not None:
+        chart_svg_content = artifacts['svg']
+    else:
+        _, chart_svg_content = render_chart_to_svg(
+            json_data=data,
+            js_file=spec['template'],
+            framework=spec['framework'],
+            framework_type=spec['framework_type']
+        )
+    chart_inner_content = extract_svg_content(chart_svg_content)
+    data["chart_type"] = spec['chart_type']
+
+    print("bg_color:", spec['bg_color'])
+    result = make_infographic(
+        data=data,
+        chart_svg_content=chart_inner_content,
+        output_dir=output,
+        bg_color=spec['bg_color'],
+        artifacts=artifacts
+    )
+
+    # PNG 转换失败的结果不缓存，下次重新生成
+    cache_key = spec['cache_key']
+    if cache_key is not None and (not output.endswith('.svg') or result.png_path):
+        try:
+            get_render_cache().put(cache_key, output, meta={'bbox': list(result.bbox), 'elements': result.elements})
+        except Exception as e:
+            print(f"[渲染缓存] 写入失败: {e}")
+
+    return result
+
+
+def generate_variation(input: str, output: str, chart_template, main_colors = None, bg_color = None) -> Union[VariationResult, bool]:
     """
     Pipeline入口函数，处理单个文件的信息图生成
 
@@ -80,110 +293,75 @@ def generate_variation(input: str, output: str, chart_template, main_colors = No
         chart_template: 可以是字符串（模板路径）或列表 [模板路径, 字段列表]
 
     Returns:
-        bool: 处理是否成功
+        成功时返回 VariationResult（SVG 内容、PNG 路径、bbox），失败返回 False
     """
     try:
-        print(f"[DEBUG generate_variation] 开始")
-        print(f"[DEBUG generate_variation] input: {input}")
-        print(f"[DEBUG generate_variation] output: {output}")
-        print(f"[DEBUG generate_variation] chart_template: {chart_template}")
-        print(f"[DEBUG generate_variation] main_colors: {main_colors}")
-        print(f"[DEBUG generate_variation] bg_color: {bg_color}")
-
-        # 处理 chart_template 格式
-        if isinstance(chart_template, list):
-            # 格式: [template_path, fields] 或 [[template_path, fields]]
-            if len(chart_template) >= 2 and isinstance(chart_template[1], list):
-                template_path = chart_template[0]
-                template_fields = chart_template[1]
-            else:
-                template_path = chart_template[0]
-                template_fields = []
-            template_for_select = [(template_path, template_fields)]
-        else:
-            # 字符串格式的模板路径
-            template_path = chart_template
-            template_for_select = [(template_path, [])]
-
-        print("chart_template:", chart_template)
-        print("template_for_select:", template_for_select)
-        # 读取输入文件
-        with open(input, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        data["name"] = input
-
-        # 选择模板
-        engine, chart_type, chart_name, ordered_fields = select_template(template_for_select)
-
-        # 检查模板是否被过滤（在block_list中）
-        if engine is None or chart_name is None:
-            print(f"[跳过] 模板在block_list中，不生成: {chart_template}")
-            return False
-
-        # 颜色
-        # print(data["colors"])
-        data = generate_distinct_palette(data, main_colors, bg_color)
-        # print(data)
-        # 处理数据
-        process_data_start = time.time()
-        for i, field in enumerate(ordered_fields):
-            data["data"]["columns"][i]["role"] = field
-        process_temporal_data(data)
-        process_numerical_data(data)
-        deduplicate_combinations(data)
-        
-        # print("数据:",time.time())
-        
-        # 获取图表模板
-        get_template_start = time.time()
-        print("chart_name:",chart_name)
-        engine_obj, template = get_template_for_chart_name(chart_name)
-        if engine_obj is None or template is None:
-            logger.error(f"Failed to load template: {engine}/{chart_type}/{chart_name}")
-            return False
-
-        # print("模板:",time.time())
-        
-        # 处理输出文件名，将路径分隔符替换为下划线
-        title_font_family = "Arial"
-        if "hand" in chart_name:
-            title_font_family = "Comics"
-        
-        if '-' in engine:
-            framework, framework_type = engine.split('-')
-        elif '_' in engine:
-            framework, framework_type = engine.split('_')
-        else:
-            framework = engine
-            framework_type = None
-
-        # print("开始渲染:",time.time())
-        _, chart_svg_content = render_chart_to_svg(
-            json_data=data,
-            js_file=template,
-            framework=framework,
-            framework_type=framework_type
-        )
-        chart_inner_content = extract_svg_content(chart_svg_content)
-        
-        assemble_start = time.time()
-        data["chart_type"] = chart_type
-        
-        # print("渲染结束:",time.time())
-        
-        print("bg_color:",bg_color)
-        return make_infographic(
-            data=data,
-            chart_svg_content=chart_inner_content,
-            output_dir=output,
-            bg_color=bg_color
-        )
-                
+        spec = _prepare_variation(input, output, chart_template, main_colors, bg_color)
+        if not isinstance(spec, dict):
+            return spec
+        return _finish_variation(spec, _render_variation(spec))
     except Exception as e:
         print(f"Error processing infographics: {e} {traceback.format_exc()}")
         return False
-    
-    
+
+
+def generate_variations_batch(requests: List[Dict]) -> List[Union[VariationResult, bool]]:
+    """
+    批量生成多个图表（图表类型预览、variation 预览）
+
+    未命中缓存的图表按框架分组放进同一个浏览器页面渲染，图表库只加载一次；
+    批量渲染失败的图表逐个回退到 generate_variation 的单图流程。
+
+    Args:
+        requests: [{'input', 'output', 'chart_template', 'main_colors', 'bg_color'}]
+
+    Returns:
+        与 requests 一一对应的结果列表（VariationResult 或 False）
+    """
+    results: List[Union[VariationResult, bool]] = [False] * len(requests)
+    specs = {}
+    for index, request in enumerate(requests):
+        try:
+            spec = _prepare_variation(request['input'], request['output'], request['chart_template'],
+                                      request.get('main_colors'), request.get('bg_color'))
+        except Exception as e:
+            print(f"Error processing infographics: {e} {traceback.format_exc()}")
+            continue
+        if isinstance(spec, dict):
+            specs[index] = spec
+        else:
+            results[index] = spec
+
+    if not specs:
+        return results
+
+    # 同一批次中背景色相同（同一会话的预览），按背景色分组以保证边界框计算一致
+    groups = {}
+    for index, spec in specs.items():
+        groups.setdefault(rgb_to_hex(spec['bg_color']), []).append(index)
+
+    batch_start = time.time()
+    for background_color, indices in groups.items():
+        charts = [{
+            'json_data': specs[index]['data'],
+            'js_file': specs[index]['template'],
+            'framework': specs[index]['framework'],
+            'framework_type': specs[index]['framework_type'],
+            'png_path': specs[index]['png_path'],
+        } for index in indices]
+        batch_artifacts = render_charts_batch(charts, background_color=background_color)
+        for index, artifacts in zip(indices, batch_artifacts):
+            spec = specs[index]
+            try:
+                if artifacts is None:
+                    artifacts = _render_variation(spec)
+                results[index] = _finish_variation(spec, artifacts)
+            except Exception as e:
+                print(f"Error processing infographics: {e} {traceback.format_exc()}")
+                results[index] = False
+    print(f"[批量渲染] {len(specs)} 个图表，耗时 {time.time() - batch_start:.2f}s")
+    return results
+
 
 if __name__ == "__main__":
     start = time.time()
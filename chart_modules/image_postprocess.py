@@ -0,0 +1,93 @@
+"""
+生成图片的后处理：背景转透明、去除小斑点、按背景色裁剪
+
+标题图、配图（InfographicImageGenerator.generate_image）和 title_generation 的 remove_background / crop
+原来都在 Python 里逐像素循环（getdata + putdata），1024x1024 的图片要构造上百万个元组；
+连通域过滤对每个连通域做一次 np.sum(labels == label)，复杂度是 连通域数 × 像素数。
+这里统一用 NumPy 布尔掩码和一次 connectedComponentsWithStats 完成，结果与原逐像素实现一致。
+"""
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# 接近白色的阈值：RGB 三个通道都大于该值视为白色背景
+WHITE_THRESHOLD = 235
+# 小于该像素数的非透明连通域视为斑点
+MIN_COMPONENT_AREA = 20
+TRANSPARENT_WHITE = (255, 255, 255, 0)
+
+
+def to_rgba_array(image: Image.Image) -> np.ndarray:
+    """PIL 图片转为 (H, W, 4) 的 uint8 数组"""
+    return np.array(image.convert('RGBA'))
+
+
+def color_match_mask(rgb: np.ndarray, color: Sequence[int], tolerance: int) -> np.ndarray:
+    """每个通道与 color 的差都不超过 tolerance 的像素（按有符号整数计算，避免 uint8 回绕）"""
+    diff = np.abs(rgb[..., :3].astype(np.int16) - np.asarray(color[:3], dtype=np.int16))
+    return np.all(diff <= tolerance, axis=-1)
+
+
+def white_to_transparent(data: np.ndarray, threshold: int = WHITE_THRESHOLD) -> np.ndarray:
+    """RGBA 数组中 RGB 都大于 threshold 的像素改为透明白色（原地修改并返回）"""
+    mask = np.all(data[..., :3] > threshold, axis=-1)
+    data[mask] = TRANSPARENT_WHITE
+    return data
+
+
+def remove_small_components(data: np.ndarray, min_area: int = MIN_COMPONENT_AREA,
+                            fill: Tuple[int, int, int, int] = TRANSPARENT_WHITE) -> np.ndarray:
+    """
+    把面积小于 min_area 的非透明连通域（8 邻域）填充为 fill（原地修改并返回）
+
+    一次 connectedComponentsWithStats 得到所有连通域面积，再用查找表一次性生成斑点掩码
+    """
+    mask = (data[..., 3] > 0).astype(np.uint8)
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    small = stats[:, cv2.CC_STAT_AREA] < min_area
+    small[0] = False   # 0 是背景（透明像素）
+    if small.any():
+        data[small[labels]] = fill
+    return data
+
+
+def dominant_color(rgb: np.ndarray) -> np.ndarray:
+    """出现次数最多的 RGB 颜色（三个通道打包成一个整数后统计，比 np.unique(axis=0) 快得多）"""
+    pixels = rgb[..., :3].reshape(-1, 3).astype(np.uint32)
+    packed = (pixels[:, 0] << 16) | (pixels[:, 1] << 8) | pixels[:, 2]
+    values, counts = np.unique(packed, return_counts=True)
+    # np.unique 结果有序，与原按行 unique 的平局处理一致（取最小的颜色）
+    color = values[counts.argmax()]
+    return np.array([(color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF], dtype=np.uint8)
+
+
+def remove_background_color(data: np.ndarray, tolerance: int = 30,
+                            bg_color: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把背景色（默认取出现最多的颜色）容差范围内的像素设为透明（原地修改）
+
+    Returns:
+        (修改后的数组, 背景色)
+    """
+    if bg_color is None:
+        bg_color = dominant_color(data)
+    data[color_match_mask(data, bg_color, tolerance), 3] = 0
+    return data, np.asarray(bg_color)
+
+
+def clean_generated_image(image: Image.Image, threshold: int = WHITE_THRESHOLD,
+                          min_area: int = MIN_COMPONENT_AREA) -> Image.Image:
+    """生成图片的标准后处理：接近白色的像素转透明，再去除小斑点"""
+    data = to_rgba_array(image)
+    white_to_transparent(data, threshold)
+    remove_small_components(data, min_area)
+    return Image.fromarray(data)
+
+
+def content_bbox(image: Image.Image, bg_color: Sequence[int], tolerance: int) -> Optional[Tuple[int, int, int, int]]:
+    """与背景色容差范围内的像素视为空白后，剩余内容的包围盒（语义同 Image.getbbox）"""
+    data = to_rgba_array(image)
+    data[color_match_mask(data, bg_color, tolerance)] = 0
+    return Image.fromarray(data).getbbox()
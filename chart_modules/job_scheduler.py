@@ -0,0 +1,260 @@
+"""
+后台任务调度器
+
+替代各个 API 中直接创建 Thread 的做法：所有后台任务按资源类型提交到有界线程池，
+并在任务注册表中登记，便于查询状态、取消和去重。
+
+资源类型（线程池大小可通过环境变量 JOB_POOL_<RESOURCE> 覆盖）：
+- task: 顶层会话任务（conduct_* 流程、最终导出），主要时间在等待子任务
+- browser: 浏览器渲染（generate_variation 预览等）
+- rasterize: SVG 光栅化
+- llm: LLM / 图像生成 API 调用
+- cpu: 其他 CPU 密集任务
+
+子任务在父任务中提交时自动记录父子关系，取消父任务会同时取消其子任务。
+正在运行的任务只能协作式取消：任务函数中调用 check_cancelled() 检查。
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_CPU_COUNT = os.cpu_count() or 4
+
+RESOURCE_POOL_SIZES = {
+    'task': int(os.environ.get('JOB_POOL_TASK', 8)),
+    'browser': int(os.environ.get('JOB_POOL_BROWSER', 3)),
+    'rasterize': int(os.environ.get('JOB_POOL_RASTERIZE', max(1, _CPU_COUNT // 2))),
+    'llm': int(os.environ.get('JOB_POOL_LLM', 6)),
+    'cpu': int(os.environ.get('JOB_POOL_CPU', _CPU_COUNT)),
+}
+# 注册表中保留的已结束任务数量
+JOB_HISTORY_SIZE = int(os.environ.get('JOB_HISTORY_SIZE', 500))
+
+
+class JobCancelledError(Exception):
+    """任务已被取消"""
+
+
+class Job:
+    """一个已提交的后台任务"""
+
+    def __init__(self, name: str, resource: str, dedup_key: Optional[Hashable] = None,
+                 session_id: Optional[str] = None, parent: Optional['Job'] = None):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.resource = resource
+        self.dedup_key = dedup_key
+        self.session_id = session_id
+        self.parent = parent
+        # 只保存子任务 id：已结束的子任务（及其结果）被清理出注册表后不再被父任务引用
+        self.children: List[str] = []
+        self.status = 'queued'
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def done(self) -> bool:
+        return self.status in ('completed', 'failed', 'cancelled')
+
+    def wait(self, timeout: Optional[float] = None):
+        """
+        等待任务结束并返回结果
+
+        Raises:
+            JobCancelledError: 任务被取消
+            Exception: 任务函数抛出的异常
+        """
+        try:
+            return self.future.result(timeout)
+        except CancelledError:
+            raise JobCancelledError(f"任务已取消: {self.name}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'resource': self.resource,
+            'status': self.status,
+            'error': self.error,
+            'parent_id': self.parent.id if self.parent else None,
+            'children': list(self.children),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+_local = threading.local()
+
+
+def current_job() -> Optional[Job]:
+    """当前线程正在执行的任务（不在任务中时为 None）"""
+    return getattr(_local, 'job', None)
+
+
+def check_cancelled():
+    """在任务函数中调用：当前任务（或其父任务）被取消时抛出 JobCancelledError"""
+    job = current_job()
+    while job is not None:
+        if job.cancelled:
+            raise JobCancelledError(f"任务已取消: {job.name}")
+        job = job.parent
+
+
+class JobScheduler:
+    """按资源类型划分的有界线程池 + 任务注册表"""
+
+    def __init__(self, pool_sizes: Optional[Dict[str, int]] = None, history_size: int = JOB_HISTORY_SIZE):
+        self.pool_sizes = dict(pool_sizes or RESOURCE_POOL_SIZES)
+        self.history_size = history_size
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._inflight: Dict[Hashable, Job] = {}
+        self._lock = threading.RLock()
+
+    def _executor(self, resource: str) -> ThreadPoolExecutor:
+        if resource not in self.pool_sizes:
+            raise ValueError(f"Unknown job resource: {resource}. Available: {list(self.pool_sizes)}")
+        executor = self._executors.get(resource)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=self.pool_sizes[resource], thread_name_prefix=f"job-{resource}")
+            self._executors[resource] = executor
+        return executor
+
+    def submit(self, fn: Callable, *args, resource: str = 'cpu', name: Optional[str] = None,
+               dedup_key: Optional[Hashable] = None, session_id: Optional[str] = None, **kwargs) -> Job:
+        """
+        提交任务
+
+        Args:
+            fn: 任务函数
+            resource: 资源类型，决定使用哪个线程池
+            name: 任务名称（用于展示）
+            dedup_key: 去重键，已有相同键的任务未结束时直接返回该任务
+            session_id: 所属会话
+            *args, **kwargs: 传给任务函数的参数
+
+        Returns:
+            Job
+        """
+        with self._lock:
+            if dedup_key is not None:
+                existing = self._inflight.get(dedup_key)
+                if existing is not None and not existing.done():
+                    return existing
+
+            parent = current_job()
+            job = Job(name or getattr(fn, '__name__', 'job'), resource, dedup_key,
+                      session_id if session_id is not None else (parent.session_id if parent else None), parent)
+            if parent is not None:
+                parent.children.append(job.id)
+            self._jobs[job.id] = job
+            if dedup_key is not None:
+                self._inflight[dedup_key] = job
+            job.future = self._executor(resource).submit(self._run, job, fn, args, kwargs)
+            job.future.add_done_callback(lambda future, job=job: self._on_done(job, future))
+            self._prune()
+            return job
+
+    def _run(self, job: Job, fn: Callable, args, kwargs):
+        if job.cancelled:
+            raise JobCancelledError(f"任务已取消: {job.name}")
+        job.status = 'running'
+        job.started_at = time.time()
+        previous = current_job()
+        _local.job = job
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.job = previous
+
+    def _on_done(self, job: Job, future):
+        job.finished_at = time.time()
+        if future.cancelled():
+            job.status = 'cancelled'
+        else:
+            error = future.exception()
+            if error is None:
+                job.status = 'completed'
+                job.result = future.result()
+            elif isinstance(error, JobCancelledError):
+                job.status = 'cancelled'
+            else:
+                job.status = 'failed'
+                job.error = str(error)
+                logger.error(f"Job {job.name} ({job.id}) failed: {error}")
+        with self._lock:
+            if job.dedup_key is not None and self._inflight.get(job.dedup_key) is job:
+                del self._inflight[job.dedup_key]
+
+    def _prune(self):
+        """只保留最近 history_size 个已结束的任务"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done()]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            job = self._jobs.pop(job_id)
+            if job.parent is not None and job_id in job.parent.children:
+                job.parent.children.remove(job_id)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self, session_id: Optional[str] = None) -> List[Job]:
+        with self._lock:
+            return [job for job in self._jobs.values() if session_id is None or job.session_id == session_id]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        取消任务及其子任务：排队中的任务直接移出队列，运行中的任务标记取消，由 check_cancelled() 协作退出
+
+        Returns:
+            bool: 任务存在且尚未结束
+        """
+        job = self.get(job_id)
+        if job is None or job.done():
+            return False
+        self._cancel(job)
+        return True
+
+    def _cancel(self, job: Job):
+        job._cancel_event.set()
+        if job.future is not None:
+            job.future.cancel()
+        with self._lock:
+            children = [self._jobs.get(child_id) for child_id in job.children]
+        for child in children:
+            # 不在注册表中的子任务已结束并被清理
+            if child is not None and not child.done():
+                self._cancel(child)
+
+    def shutdown(self, wait: bool = False):
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_job_scheduler() -> JobScheduler:
+    """获取进程级共享的任务调度器"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler()
+        return _scheduler
@@ -0,0 +1,395 @@
+"""
+共享的异步 LLM / 图像生成客户端
+
+替代各模块中每次调用（或每个实例）都新建 openai.OpenAI 客户端的做法：
+- 进程内只有一个后台事件循环线程，所有请求都在这个循环上通过 AsyncOpenAI 发出，
+  同一 (api_key, base_url) 共用一个 HTTP 连接池（keep-alive）
+- 每个模型一个并发信号量，避免图像生成等慢模型占满连接或触发限流
+- 超时、限流、连接错误和 5xx 按指数退避 + 随机抖动重试，优先使用服务端的 Retry-After
+- 记录每个模型的请求数、重试、失败、去重、token 用量和延迟，stats() 查询
+- single-flight：同一客户端上 (模型, 提示词哈希, 参数) 完全相同且仍在进行中的请求只发一次上游调用，
+  其余调用方等待并共享同一个响应；需要多次采样得到不同结果时用 variant 区分，或传 dedup=False
+- TTLCache：确定性调用（如图表类型推荐）的内存响应缓存，由调用方按业务 key（如数据特征哈希）使用
+
+同步代码通过 chat() / generate_image() 调用（内部提交到后台循环并等待），
+异步代码直接 await achat() / agenerate_image()；run_async() 用于在同步代码中运行一组异步任务。
+
+配置（环境变量）：
+- LLM_MAX_CONNECTIONS / LLM_MAX_KEEPALIVE_CONNECTIONS: 连接池大小，默认 32 / 16
+- LLM_TIMEOUT: 单次请求超时秒数，默认 120；图像模型使用 LLM_IMAGE_TIMEOUT，默认 300
+- LLM_MAX_RETRIES: 最大重试次数，默认 3
+- LLM_BACKOFF_BASE / LLM_BACKOFF_MAX: 退避基数和上限秒数，默认 1 / 30
+- LLM_DEFAULT_CONCURRENCY: 每个模型的默认并发数，默认 4
+- LLM_MODEL_CONCURRENCY: 按模型覆盖并发数的 JSON，如 {"gpt-image-1": 2}
+- LLM_SINGLE_FLIGHT: 设为 0 关闭进行中请求去重
+- LLM_RESPONSE_CACHE_TTL / LLM_RESPONSE_CACHE_SIZE: TTLCache 默认的过期秒数和条目上限，默认 3600 / 256
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import defaultdict, OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Dict, Optional
+
+import httpx
+import openai
+
+# Add project root to sys.path to allow importing config
+project_root = Path(__file__).resolve().parents[1]
+sys.path.append(str(project_root))
+
+import config
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONNECTIONS = int(os.environ.get('LLM_MAX_CONNECTIONS', 32))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('LLM_MAX_KEEPALIVE_CONNECTIONS', 16))
+LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 120))
+LLM_IMAGE_TIMEOUT = float(os.environ.get('LLM_IMAGE_TIMEOUT', 300))
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 3))
+LLM_BACKOFF_BASE = float(os.environ.get('LLM_BACKOFF_BASE', 1.0))
+LLM_BACKOFF_MAX = float(os.environ.get('LLM_BACKOFF_MAX', 30.0))
+LLM_DEFAULT_CONCURRENCY = int(os.environ.get('LLM_DEFAULT_CONCURRENCY', 4))
+LLM_MODEL_CONCURRENCY = {
+    # 图像生成模型慢且限流严格
+    'gpt-image-1': 2,
+    'gemini-3-pro-image-preview': 2,
+    **json.loads(os.environ.get('LLM_MODEL_CONCURRENCY') or '{}'),
+}
+# 返回图片的模型使用更长的超时
+IMAGE_MODELS = {'gpt-image-1', 'gemini-3-pro-image-preview'}
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+LLM_SINGLE_FLIGHT = os.environ.get('LLM_SINGLE_FLIGHT', '1') != '0'
+LLM_RESPONSE_CACHE_TTL = float(os.environ.get('LLM_RESPONSE_CACHE_TTL', 3600))
+LLM_RESPONSE_CACHE_SIZE = int(os.environ.get('LLM_RESPONSE_CACHE_SIZE', 256))
+
+
+class _LoopThread:
+    """后台事件循环线程：所有 LLM 请求都在这个循环上执行"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name='llm-client-loop', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def get_llm_loop() -> asyncio.AbstractEventLoop:
+    """获取（必要时启动）共享的后台事件循环"""
+    global _loop_thread
+    with _loop_lock:
+        if _loop_thread is None:
+            _loop_thread = _LoopThread()
+        return _loop_thread.loop
+
+
+def run_async(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """
+    在共享事件循环上运行协程并阻塞等待结果（供同步代码调用）
+
+    不能在事件循环线程内部调用（会死锁），异步代码应直接 await。
+    """
+    loop = get_llm_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        raise RuntimeError("run_async() 不能在 LLM 事件循环内部调用，请直接 await")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+
+class LLMMetrics:
+    """按模型统计请求数、重试、失败、token 用量和延迟"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = defaultdict(lambda: {
+            'requests': 0,
+            'failures': 0,
+            'retries': 0,
+            'deduplicated': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'total_tokens': 0,
+            'latency_total': 0.0,
+            'latency_max': 0.0,
+        })
+
+    def record_retry(self, model: str):
+        with self._lock:
+            self._models[model]['retries'] += 1
+
+    def record_dedup(self, model: str):
+        with self._lock:
+            self._models[model]['deduplicated'] += 1
+
+    def record(self, model: str, latency: float, usage=None, ok: bool = True):
+        with self._lock:
+            entry = self._models[model]
+            entry['requests'] += 1
+            if not ok:
+                entry['failures'] += 1
+            entry['latency_total'] += latency
+            entry['latency_max'] = max(entry['latency_max'], latency)
+            if usage is not None:
+                for field in ('prompt_tokens', 'completion_tokens', 'total_tokens'):
+                    entry[field] += getattr(usage, field, None) or 0
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            result = {}
+            for model, entry in self._models.items():
+                item = dict(entry)
+                item['latency_avg'] = entry['latency_total'] / entry['requests'] if entry['requests'] else 0.0
+                result[model] = item
+            return result
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """从错误响应的 Retry-After 头中读取等待秒数"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """超时、连接错误、限流和服务端错误可以重试；参数错误、鉴权失败等直接失败"""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+    return False
+
+
+def backoff_delay(attempt: int, base: float = LLM_BACKOFF_BASE, cap: float = LLM_BACKOFF_MAX) -> float:
+    """第 attempt 次重试前的等待时间：指数退避 + 完全随机抖动"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def request_key(kind: str, model: str, payload, params: Dict, variant=None) -> str:
+    """请求的去重 key：(调用类型, 模型, 提示词, 参数, variant) 的哈希"""
+    key_json = json.dumps([kind, model, payload, params, variant], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(key_json.encode('utf-8')).hexdigest()
+
+
+class TTLCache:
+    """
+    线程安全的内存响应缓存：条目在 ttl 秒后过期，超过 max_entries 时淘汰最久未使用的条目
+
+    值为 None 视为未命中，因此不要缓存 None。
+    """
+
+    def __init__(self, ttl: float = LLM_RESPONSE_CACHE_TTL, max_entries: int = LLM_RESPONSE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Any, tuple]' = OrderedDict()   # key -> (过期时间, 值)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + self.ttl, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class LLMClient:
+    """
+    共享连接池的异步 OpenAI 兼容客户端
+
+    Args:
+        api_key: API key，默认 config.OPENAI_API_KEY
+        base_url: API 地址，默认 config.OPENAI_BASE_URL
+        client: 已创建的 AsyncOpenAI 兼容对象（测试时注入），为 None 时在事件循环中按需创建
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, client=None,
+                 max_retries: int = LLM_MAX_RETRIES, timeout: float = LLM_TIMEOUT):
+        self.api_key = api_key or config.OPENAI_API_KEY
+        self.base_url = base_url or config.OPENAI_BASE_URL
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.metrics = LLMMetrics()
+        self._client = client
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        # 进行中的请求：去重 key -> 共享结果的 Future（只在事件循环线程中访问）
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _async_client(self):
+        if self._client is None:
+            self._client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                # 重试由这里统一处理
+                max_retries=0,
+                timeout=self.timeout,
+                http_client=openai.DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS
+                    )
+                )
+            )
+        return self._client
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(model)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(LLM_MODEL_CONCURRENCY.get(model, LLM_DEFAULT_CONCURRENCY))
+            self._semaphores[model] = semaphore
+        return semaphore
+
+    async def _call(self, model: str, make_request, timeout: Optional[float]):
+        """在模型信号量内发出请求，失败时按退避策略重试"""
+        if timeout is None:
+            timeout = LLM_IMAGE_TIMEOUT if model in IMAGE_MODELS else self.timeout
+        async with self._semaphore(model):
+            attempt = 0
+            while True:
+                start = time.time()
+                try:
+                    response = await make_request(timeout)
+                except Exception as e:
+                    latency = time.time() - start
+                    if attempt >= self.max_retries or not is_retryable(e):
+                        self.metrics.record(model, latency, ok=False)
+                        raise
+                    delay = _retry_after(e)
+                    if delay is None:
+                        delay = backoff_delay(attempt)
+                    attempt += 1
+                    self.metrics.record_retry(model)
+                    logger.warning(f"LLM request to {model} failed ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                self.metrics.record(model, time.time() - start, getattr(response, 'usage', None))
+                return response
+
+    async def _single_flight(self, key: Optional[str], model: str, make_call):
+        """key 相同的请求进行中时等待它的结果，否则发起请求并把结果共享给之后到达的调用方"""
+        if key is None or not LLM_SINGLE_FLIGHT:
+            return await make_call()
+        shared = self._inflight.get(key)
+        if shared is not None:
+            self.metrics.record_dedup(model)
+            # shield：等待方被取消时不影响发起方和其他等待方
+            return await asyncio.shield(shared)
+
+        shared = asyncio.get_running_loop().create_future()
+        self._inflight[key] = shared
+        try:
+            result = await make_call()
+        except asyncio.CancelledError:
+            shared.cancel()
+            raise
+        except Exception as e:
+            shared.set_exception(e)
+            # 标记异常已读取，没有等待方时不产生 "never retrieved" 警告
+            shared.exception()
+            raise
+        else:
+            shared.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    async def achat(self, model: str, messages, timeout: Optional[float] = None, dedup: bool = True,
+                    variant=None, **params):
+        """
+        chat.completions.create 的异步版本，返回原始响应对象
+
+        Args:
+            dedup: 是否与进行中的相同请求共享结果
+            variant: 计入去重 key、不发送给上游；同一提示词需要多个独立采样时用不同的 variant
+        """
+        client = self._async_client()
+        key = request_key('chat', model, messages, params, variant) if dedup else None
+        return await self._single_flight(key, model, lambda: self._call(
+            model,
+            lambda request_timeout: client.chat.completions.create(
+                model=model, messages=messages, timeout=request_timeout, **params
+            ),
+            timeout
+        ))
+
+    async def agenerate_image(self, model: str, prompt: str, timeout: Optional[float] = None, dedup: bool = True,
+                              variant=None, **params):
+        """images.generate 的异步版本，返回原始响应对象；dedup、variant 同 achat"""
+        client = self._async_client()
+        key = request_key('image', model, prompt, params, variant) if dedup else None
+        return await self._single_flight(key, model, lambda: self._call(
+            model,
+            lambda request_timeout: client.images.generate(
+                model=model, prompt=prompt, timeout=request_timeout, **params
+            ),
+            timeout
+        ))
+
+    def chat(self, model: str, messages, timeout: Optional[float] = None, **params):
+        """同步调用 chat.completions.create（在共享事件循环上执行）"""
+        return run_async(self.achat(model, messages, timeout=timeout, **params))
+
+    def generate_image(self, model: str, prompt: str, timeout: Optional[float] = None, **params):
+        """同步调用 images.generate（在共享事件循环上执行）"""
+        return run_async(self.agenerate_image(model, prompt, timeout=timeout, **params))
+
+    def stats(self) -> Dict[str, Dict]:
+        return self.metrics.snapshot()
+
+
+_clients: Dict[tuple, LLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(base_url: Optional[str] = None, api_key: Optional[str] = None) -> LLMClient:
+    """获取进程级共享的 LLM 客户端（按 api_key、base_url 区分）"""
+    key = (api_key or config.OPENAI_API_KEY, base_url or config.OPENAI_BASE_URL)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = LLMClient(api_key=key[0], base_url=key[1])
+            _clients[key] = client
+        return client
@@ -1,8 +1,8 @@
 import os
 import time
+import asyncio
 import random
 from datetime import datetime
-from threading import Thread
 import traceback
 from pathlib import Path
 import sys
@@ -15,9 +15,12 @@ from chart_modules.layout_extraction import get_compatible_extraction
 from chart_modules.ChartGalaxy.example_based_generation.generate_infographic import InfographicImageGenerator
 from chart_modules.reference_recognize.extract_chart_type import extract_chart_type
 from chart_modules.reference_recognize.extract_main_color import extract_main_color
-from chart_modules.generate_variation import generate_variation
+from chart_modules.generate_variation import generate_variation, generate_variations_batch
 from chart_modules.ChartPipeline.modules.infographics_generator.template_utils import block_list
 from chart_modules.reference_describe import get_reference_descriptions
+from chart_modules.reference_store import get_reference_store
+from chart_modules.job_scheduler import get_job_scheduler, check_cancelled, JobCancelledError
+from chart_modules.llm_client import run_async
 
 # 默认颜色配置（在选择参考图之前使用）
 DEFAULT_COLORS = [
@@ -29,6 +32,69 @@ DEFAULT_COLORS = [
 ]
 DEFAULT_BG_COLOR = [245, 243, 239]
 
+# 预览图批量渲染：每个批次在一个浏览器页面中渲染，图表库只加载一次；多个批次在 browser 池中并行
+PREVIEW_BATCH_SIZE = int(os.environ.get('PREVIEW_BATCH_SIZE', 12))
+
+
+def wait_for_jobs(jobs):
+    """等待子任务全部结束；单个子任务出错只打印日志，取消则继续向上抛出"""
+    for job in jobs:
+        try:
+            job.wait()
+        except JobCancelledError:
+            raise
+        except Exception as e:
+            print(f"子任务 {job.name} 出错: {e}")
+        # 父任务被取消时不再等待剩余子任务
+        check_cancelled()
+
+
+def run_llm_tasks(tasks):
+    """
+    在共享的 LLM 事件循环上并发运行一组协程并等待全部结束
+
+    Args:
+        tasks: (名称, 协程) 列表
+
+    Returns:
+        与 tasks 顺序一致的结果列表，出错的子任务只打印日志，结果为 None
+    """
+    check_cancelled()
+
+    async def gather():
+        return await asyncio.gather(*(coro for _, coro in tasks), return_exceptions=True)
+
+    results = run_async(gather())
+    for i, ((name, _), result) in enumerate(zip(tasks, results)):
+        if isinstance(result, BaseException):
+            print(f"子任务 {name} 出错: {result}")
+            results[i] = None
+    check_cancelled()
+    return results
+
+
+def submit_preview_batches(requests, name):
+    """
+    把预览图生成请求按 PREVIEW_BATCH_SIZE 分批提交到 browser 池
+
+    Args:
+        requests: generate_variations_batch 的请求列表
+        name: 任务名称前缀
+
+    Returns:
+        子任务列表
+    """
+    jobs = []
+    for start in range(0, len(requests), PREVIEW_BATCH_SIZE):
+        batch = requests[start:start + PREVIEW_BATCH_SIZE]
+        jobs.append(get_job_scheduler().submit(
+            generate_variations_batch,
+            resource='browser',
+            name=f'{name}:batch_{start // PREVIEW_BATCH_SIZE}({len(batch)})',
+            dedup_key=('generate_variations_batch',) + tuple(request['output'] for request in batch),
+            requests=batch,
+        ))
+    return jobs
 
 
 def conduct_reference_finding(datafile, generation_status):
@@ -67,13 +133,20 @@ def conduct_layout_extraction(reference, datafile, generation_status):
     try:
         # Step 1: 抽取参考信息图表布局
         generation_status['progress'] = '抽取参考信息图表布局...'
-        generation_status['style']["colors"], generation_status['style']["bg_color"] = extract_main_color(reference)
+        # 预计算索引命中时直接使用，否则实时提取
+        reference_record = get_reference_store().get(reference) or {}
+        palette = reference_record.get('palette')
+        if palette:
+            colors, bg_color = palette['colors'], palette['bg_color']
+        else:
+            colors, bg_color = extract_main_color(reference)
+        generation_status['style'] = dict(generation_status['style'], colors=colors, bg_color=bg_color)
         print("提取的颜色: %s %s", generation_status['style']["colors"], generation_status['style']["bg_color"])
 
         # Step 2: 生成参考图的标题和pictogram描述
         generation_status['progress'] = '分析参考图风格...'
         try:
-            descriptions = get_reference_descriptions(reference, use_cache=True)
+            descriptions = reference_record.get('descriptions') or get_reference_descriptions(reference, use_cache=True)
             if descriptions:
                 generation_status['reference_descriptions'] = descriptions
                 print(f"已生成参考图描述")
@@ -125,31 +198,25 @@ def conduct_title_generation(datafile, generation_status, use_cache=True):
         if title_style_description:
              desc_hash = "_" + hashlib.md5(title_style_description.encode('utf-8')).hexdigest()[:8]
 
-        # 并行生成3个标题选项
+        # 并行生成3个标题选项（异步任务，共享 LLM 客户端的连接池和并发限制）
         title_options = {}
-        results = [None, None, None]
-        threads = []
 
-        def generate_title_task(index, output_filename):
-            result = generator.generate_single_title(
+        async def generate_title_task(index, output_filename):
+            result = await generator.agenerate_single_title(
                 csv_path=os.path.join('processed_data', datafile),
                 bg_color=bg_hex,
                 output_filename=output_filename,
                 use_cache=use_cache,
-                style_description=title_style_description
+                style_description=title_style_description,
+                variant=index
             )
-            results[index] = result
             print(f"Generated title {index}: {result['title_text']}")
+            return result
 
-        for i in range(3):
-            output_filename = f"buffer/{generation_status['id']}/title_{i}{desc_hash}.png"
-            thread = Thread(target=generate_title_task, args=(i, output_filename))
-            thread.start()
-            threads.append(thread)
-
-        # 等待所有线程完成
-        for thread in threads:
-            thread.join()
+        results = run_llm_tasks([
+            (f'title_{i}', generate_title_task(i, f"buffer/{generation_status['id']}/title_{i}{desc_hash}.png"))
+            for i in range(3)
+        ])
 
         # 收集结果
         for i in range(3):
@@ -201,31 +268,25 @@ def conduct_pictogram_generation(title, generation_status, use_cache=True):
         if pictogram_style_description:
              desc_hash = "_" + hashlib.md5(pictogram_style_description.encode('utf-8')).hexdigest()[:8]
 
-        # 并行生成3个配图选项
+        # 并行生成3个配图选项（异步任务，共享 LLM 客户端的连接池和并发限制）
         pictogram_options = {}
-        results = [None, None, None]
-        threads = []
 
-        def generate_pictogram_task(index, output_filename):
-            result = generator.generate_single_pictogram(
+        async def generate_pictogram_task(index, output_filename):
+            result = await generator.agenerate_single_pictogram(
                 title_text=title_text,
                 colors=generation_status['style']['colors'],
                 output_filename=output_filename,
                 use_cache=use_cache,
-                style_description=pictogram_style_description
+                style_description=pictogram_style_description,
+                variant=index
             )
-            results[index] = result
             print(f"Generated pictogram {index} for: {title_text}")
+            return result
 
-        for i in range(3):
-            output_filename = f"buffer/{generation_status['id']}/pictogram_{i}{desc_hash}.png"
-            thread = Thread(target=generate_pictogram_task, args=(i, output_filename))
-            thread.start()
-            threads.append(thread)
-
-        # 等待所有线程完成
-        for thread in threads:
-            thread.join()
+        results = run_llm_tasks([
+            (f'pictogram_{i}', generate_pictogram_task(i, f"buffer/{generation_status['id']}/pictogram_{i}{desc_hash}.png"))
+            for i in range(3)
+        ])
 
         # 收集结果
         for i in range(3):
@@ -263,7 +324,7 @@ def conduct_chart_type_preview_generation(chart_types_to_generate, generation_st
 
     # 存储生成的预览图信息，用于前端正确请求文件名
     chart_type_previews = {}
-    threads = []  # 保存所有线程
+    preview_requests = []  # 待生成的预览图
 
     try:
         templates = generation_status.get('extraction_templates', [])
@@ -309,23 +370,21 @@ def conduct_chart_type_preview_generation(chart_types_to_generate, generation_st
                 }
 
                 # 生成预览图 - 传入完整的 template 信息 [path, fields]
-                thread = Thread(target=generate_variation, kwargs={
+                preview_requests.append({
                     'input': generation_status["selected_data"],
                     'output': output_path,
                     'chart_template': [template_path, template_fields],
                     'main_colors': DEFAULT_COLORS,
                     'bg_color': DEFAULT_BG_COLOR,
                 })
-                thread.start()
-                threads.append(thread)
-                print(f"[DEBUG] 启动线程生成 {variation_name}")
             else:
                 print(f"[DEBUG] 没有找到匹配的 template for {chart_type}")
 
-        # 等待所有线程完成
-        for thread in threads:
-            thread.join()
-        print(f"[DEBUG] 所有预览图生成线程完成")
+        # 同一页面批量渲染所有预览图，等待所有子任务完成
+        jobs = submit_preview_batches(preview_requests, 'chart_type_preview')
+        print(f"[DEBUG] 提交 {len(jobs)} 个批量子任务，共 {len(preview_requests)} 个预览图")
+        wait_for_jobs(jobs)
+        print(f"[DEBUG] 所有预览图生成任务完成")
 
         # 保存预览图信息到 generation_status
         generation_status['chart_type_previews'] = chart_type_previews
@@ -349,7 +408,7 @@ def conduct_variation_preview_generation(variations_to_generate, generation_stat
     generation_status['progress'] = '生成图表样式预览...'
     generation_status['completed'] = False
 
-    threads = []  # 保存所有线程
+    preview_requests = []  # 待生成的预览图
 
     try:
         for variation_info in variations_to_generate:
@@ -370,20 +429,17 @@ def conduct_variation_preview_generation(variations_to_generate, generation_stat
             print(f"[DEBUG]   template_fields: {template_fields}")
 
             # 生成预览图 - 传入完整的 template 信息 [path, fields]
-            thread = Thread(target=generate_variation, kwargs={
+            preview_requests.append({
                 'input': generation_status["selected_data"],
                 'output': output_svg,
                 'chart_template': [template_path, template_fields],
                 'main_colors': DEFAULT_COLORS,
                 'bg_color': DEFAULT_BG_COLOR,
             })
-            thread.start()
-            threads.append(thread)
 
-        # 等待所有线程完成
-        for thread in threads:
-            thread.join()
-        print(f"[DEBUG] 所有 variation 预览图生成线程完成")
+        # 同一页面批量渲染所有预览图，等待所有子任务完成
+        wait_for_jobs(submit_preview_batches(preview_requests, 'variation_preview'))
+        print(f"[DEBUG] 所有 variation 预览图生成任务完成")
 
         generation_status['status'] = 'completed'
         generation_status['completed'] = True
@@ -6,10 +6,8 @@
 import os
 import json
 import base64
-import xml.etree.ElementTree as ET
 from PIL import Image
 from io import BytesIO
-import openai
 from pathlib import Path
 
 import sys
@@ -21,6 +19,8 @@ project_root = Path(__file__).resolve().parents[1]
 sys.path.append(str(project_root))
 
 import config
+from chart_modules.llm_client import get_llm_client
+from chart_modules.annotation_index import get_annotation_index
 
 API_KEY = config.OPENAI_API_KEY
 BASE_URL = config.OPENAI_BASE_URL
@@ -60,34 +60,31 @@ def get_reference_regions(reference_image_name):
     Returns:
         dict: 包含title和image区域的坐标信息
     """
-    annotations_path = 'infographics/annotations.xml'
+    annotation_index = get_annotation_index()
 
-    if not os.path.exists(annotations_path):
+    if not annotation_index.exists():
         print(f"annotations.xml不存在")
         return None
 
     try:
-        tree = ET.parse(annotations_path)
-        root = tree.getroot()
-
-        for image_elem in root.findall('image'):
-            if image_elem.get('name') == reference_image_name:
-                regions = {
-                    'width': float(image_elem.get('width')),
-                    'height': float(image_elem.get('height'))
-                }
-
-                for box in image_elem.findall('box'):
-                    label = box.get('label')
-                    if label in ['title', 'image']:
-                        regions[label] = {
-                            'xtl': float(box.get('xtl')),
-                            'ytl': float(box.get('ytl')),
-                            'xbr': float(box.get('xbr')),
-                            'ybr': float(box.get('ybr'))
-                        }
-
-                return regions
+        annotation = annotation_index.get(reference_image_name)
+        if annotation is not None:
+            regions = {
+                'width': annotation['width'],
+                'height': annotation['height']
+            }
+
+            for box in annotation['boxes']:
+                label = box['label']
+                if label in ['title', 'image']:
+                    regions[label] = {
+                        'xtl': box['xtl'],
+                        'ytl': box['ytl'],
+                        'xbr': box['xbr'],
+                        'ybr': box['ybr']
+                    }
+
+            return regions
 
         print(f"未找到图片 {reference_image_name} 的标注信息")
         return None
@@ -139,8 +136,6 @@ def generate_title_description(title_image):
     Returns:
         str: 标题的详细描述，包括颜色、字体风格、行数等
     """
-    client = openai.OpenAI(api_key=API_KEY, base_url=BASE_URL)
-
     img_base64 = image_to_base64(title_image)
 
     prompt = """请仔细分析这个标题图片，并提供详细的描述，用于指导生成类似风格的标题。请包括以下方面：
@@ -154,7 +149,7 @@ def generate_title_description(title_image):
 请用简洁的英文描述，方便后续用于图像生成prompt。描述要具体且实用。"""
 
     try:
-        response = client.chat.completions.create(
+        response = get_llm_client(BASE_URL, API_KEY).chat(
             model="gpt-4o",
             messages=[
                 {
@@ -190,8 +185,6 @@ def generate_pictogram_description(pictogram_image):
     Returns:
         str: pictogram的详细描述，包括颜色、风格、内容等
     """
-    client = openai.OpenAI(api_key=API_KEY, base_url=BASE_URL)
-
     img_base64 = image_to_base64(pictogram_image)
 
     prompt = """请仔细分析这个图表配图/插图（pictogram），并提供详细的描述，用于指导生成类似风格的配图。请包括以下方面：
@@ -205,7 +198,7 @@ def generate_pictogram_description(pictogram_image):
 请用简洁的英文描述，方便后续用于图像生成prompt。描述要具体且实用，不要描述文字内容。"""
 
     try:
-        response = client.chat.completions.create(
+        response = get_llm_client(BASE_URL, API_KEY).chat(
             model="gpt-4o",
             messages=[
                 {
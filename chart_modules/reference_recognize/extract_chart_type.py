@@ -5,7 +5,6 @@ from PIL import Image
 from collections import Counter
 import os
 import pandas as pd
-import openai
 import requests
 from pathlib import Path
 import time
@@ -31,6 +30,7 @@ project_root = Path(__file__).resolve().parents[2]
 sys.path.append(str(project_root))
 
 import config
+from chart_modules.llm_client import get_llm_client
 
 API_KEY = config.OPENAI_API_KEY
 BASE_URL = config.OPENAI_BASE_URL
@@ -84,12 +84,8 @@ def parse_chart_response(response_str):
 def get_response(image_path):
     with open(f"{Path(__file__).parent}/get_chart_type.md", 'r', encoding='utf-8') as f:
         prompt = f.read()
-    client = openai.OpenAI(
-        api_key=API_KEY,
-        base_url=BASE_URL
-    )
     base64_image = encode_image(image_path)
-    response = client.chat.completions.create(
+    response = get_llm_client(BASE_URL, API_KEY).chat(
         model="gpt-4o-mini",  # 确保模型支持图像
         messages=[
                 {
@@ -1,4 +1,4 @@
-from sklearn.cluster import KMeans
+from sklearn.cluster import MiniBatchKMeans
 import numpy as np
 import matplotlib.pyplot as plt
 from PIL import Image
@@ -17,11 +17,27 @@ import numpy as np
 import cv2
 from io import BytesIO
 import sys
+import hashlib
+import logging
+import argparse
+import threading
 
-def get_background_color(image_path, edge_width=20):
-    image = Image.open(image_path).convert('RGB')
-    np_image = np.array(image)
-    h, w, _ = np_image.shape
+logger = logging.getLogger(__name__)
+
+# 聚类时最多使用的像素数：均匀随机采样，主色和占比与全量聚类基本一致
+MAIN_COLOR_SAMPLE_SIZE = int(os.environ.get('MAIN_COLOR_SAMPLE_SIZE', 20000))
+# 主色提取结果按图片文件内容哈希持久化，同一张参考图只计算一次
+PALETTE_CACHE_DIR = os.environ.get('PALETTE_CACHE_DIR', 'buffer/palette_cache')
+PALETTE_CACHE_ENABLED = os.environ.get('PALETTE_CACHE_ENABLED', '1') != '0'
+# 算法或参数含义变化时递增，使旧缓存失效
+PALETTE_CACHE_VERSION = 2
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+_palette_memory_cache = {}
+_palette_cache_lock = threading.Lock()
+
+def _background_color_from_array(np_image, edge_width=20):
+    """四条边上出现次数最多的颜色"""
 
     # 提取四条边的像素，并 reshape 成 (N, 3)
     top = np_image[:edge_width, :, :].reshape(-1, 3)
@@ -32,42 +48,126 @@ def get_background_color(image_path, edge_width=20):
     edges = np.vstack([top, bottom, left, right])  # shape: (N, 3)
 
     # 统计出现频率最高的颜色
-    counts = Counter([tuple(p) for p in edges])
-    background_color = counts.most_common(1)[0][0]
+    colors, counts = np.unique(edges, axis=0, return_counts=True)
+    background_color = tuple(int(c) for c in colors[counts.argmax()])
     return background_color
 
+def get_background_color(image_path, edge_width=20):
+    image = Image.open(image_path).convert('RGB')
+    return _background_color_from_array(np.array(image), edge_width)
+
 def color_distance(c1, c2):
     return np.linalg.norm(np.array(c1) - np.array(c2))
 
-def extract_main_color(image_path, num_colors=6, bg_thresh=30, save_path=None):
+def _file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def _palette_cache_key(image_path, num_colors, bg_thresh):
+    return f"{_file_digest(image_path)}_{num_colors}_{bg_thresh}_v{PALETTE_CACHE_VERSION}"
+
+def _load_cached_palette(key):
+    with _palette_cache_lock:
+        if key in _palette_memory_cache:
+            return _palette_memory_cache[key]
+    try:
+        with open(os.path.join(PALETTE_CACHE_DIR, key + '.json'), 'r', encoding='utf-8') as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+    with _palette_cache_lock:
+        _palette_memory_cache[key] = result
+    return result
+
+def _save_cached_palette(key, result):
+    with _palette_cache_lock:
+        _palette_memory_cache[key] = result
+    try:
+        os.makedirs(PALETTE_CACHE_DIR, exist_ok=True)
+        cache_path = os.path.join(PALETTE_CACHE_DIR, key + '.json')
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Failed to save palette cache {key}: {e}")
+
+def _cluster_colors(pixels, num_colors):
+    """
+    对采样后的像素做 MiniBatchKMeans 聚类，返回按占比降序排列的 (颜色, 像素数)
+
+    像素数由采样中的计数按采样比例换算到整张图，是估计值
+    """
+    total = len(pixels)
+    if total > MAIN_COLOR_SAMPLE_SIZE:
+        rng = np.random.default_rng(42)
+        pixels = pixels[rng.choice(total, MAIN_COLOR_SAMPLE_SIZE, replace=False)]
+    kmeans = MiniBatchKMeans(n_clusters=num_colors, random_state=42, batch_size=4096, n_init=3)
+    kmeans.fit(pixels.astype(np.float32))
+    colors = kmeans.cluster_centers_.astype(int)
+    counts = np.bincount(kmeans.labels_, minlength=num_colors)
+    counts = np.rint(counts * (total / len(pixels))).astype(int)
+
+    # 排序（颜色按出现频率降序）
+    sorted_idx = np.argsort(counts)[::-1]
+    return colors[sorted_idx], counts[sorted_idx]
+
+def _compute_main_color(image_path, num_colors, bg_thresh):
+    """
+    Returns:
+        dict: colors（排除背景后的主色 [r, g, b]，按占比降序）、counts（与 colors 对应的整张图估计像素数）、
+              bg_color（背景色 [r, g, b]）
+    """
     # 加载图像
     image = Image.open(image_path).convert('RGB')
     np_image = np.array(image)
-    h, w, _ = np_image.shape
     pixels = np_image.reshape(-1, 3)
 
     # 提取背景色
-    bg_color = get_background_color(image_path)
-
-    # KMeans 聚类
-    kmeans = KMeans(n_clusters=num_colors, random_state=42)
-    kmeans.fit(pixels)
-    colors = kmeans.cluster_centers_.astype(int)
-    labels = kmeans.labels_
-    counts = np.bincount(labels)
+    bg_color = _background_color_from_array(np_image)
 
-    # 排序（颜色按出现频率降序）
-    sorted_idx = np.argsort(counts)[::-1]
-    colors = colors[sorted_idx]
-    counts = counts[sorted_idx]
+    # 采样 + MiniBatchKMeans 聚类
+    colors, counts = _cluster_colors(pixels, num_colors)
 
     # 排除接近背景色的颜色
     filtered_colors = []
     filtered_counts = []
     for color, count in zip(colors, counts):
         if color_distance(color, bg_color) > bg_thresh:
-            filtered_colors.append(color)
-            filtered_counts.append(count)
+            filtered_colors.append([int(i) for i in color])
+            filtered_counts.append(int(count))
+
+    return {
+        'colors': filtered_colors,
+        'counts': filtered_counts,
+        'bg_color': [int(i) for i in bg_color],
+    }
+
+def extract_main_color(image_path, num_colors=6, bg_thresh=30, save_path=None, use_cache=True):
+    """
+    提取图片主色（排除背景色）和背景色
+
+    结果按图片文件内容哈希缓存（内存 + PALETTE_CACHE_DIR），同一张图只计算一次
+
+    Returns:
+        (主色列表, 背景色)，颜色均为 [r, g, b]
+    """
+    key = None
+    result = None
+    if use_cache and PALETTE_CACHE_ENABLED:
+        key = _palette_cache_key(image_path, num_colors, bg_thresh)
+        result = _load_cached_palette(key)
+    if result is None:
+        result = _compute_main_color(image_path, num_colors, bg_thresh)
+        if key is not None:
+            _save_cached_palette(key, result)
+
+    filtered_colors = [list(color) for color in result['colors']]
+    filtered_counts = result['counts']
+    bg_color = list(result['bg_color'])
 
     # print(filtered_colors)
     # 绘制饼图
@@ -99,6 +199,19 @@ def extract_main_color(image_path, num_colors=6, bg_thresh=30, save_path=None):
     bg_color = [int(i) for i in bg_color]
     return filtered_colors, bg_color
 
+def precompute_main_colors(image_dir, num_colors=6, bg_thresh=30):
+    """为目录下的所有参考图预先计算并缓存主色，返回处理的图片数"""
+    count = 0
+    for name in sorted(os.listdir(image_dir)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        try:
+            extract_main_color(os.path.join(image_dir, name), num_colors=num_colors, bg_thresh=bg_thresh)
+            count += 1
+        except Exception as e:
+            print(f"提取主色失败 {name}: {e}")
+    return count
+
 def main():
     # 使用示例
     image_path = '/data/minzhi/code/ChartGalaxyDemo/infographics/by_author_@visualcapitalist_chart_8b926a819becbe35565821f56e0c1337a66ffbf16e9f7836607b75c5e1d3cc79.png'
@@ -109,3 +222,12 @@ def main():
     )
     print(colors, bg)
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="参考图主色提取")
+    parser.add_argument("--precompute", metavar="DIR", help="预先计算目录下所有参考图的主色并写入缓存")
+    args = parser.parse_args()
+
+    if args.precompute:
+        print(f"已缓存 {precompute_main_colors(args.precompute)} 张参考图的主色")
+    else:
+        main()
@@ -0,0 +1,211 @@
+"""
+参考信息图的预计算索引
+
+选择参考图时需要：主色和背景色（KMeans 聚类）、标题/pictogram 风格描述（视觉大模型）、
+布局框（解析 annotations.xml）以及主题关键词（读取 themes.json）。这些都只取决于参考图本身，
+这里用离线任务一次性为 infographics/ 下的所有图片计算好，写入一个按文件名索引的 JSON 文件，
+运行时整体加载到内存中，每张参考图的查询都是一次字典查找。
+
+构建（参考图、annotations.xml、themes.json 更新后重新运行）：
+    python -m chart_modules.reference_store --dir infographics
+    python -m chart_modules.reference_store --dir infographics --describe   # 同时为缺少描述的图片调用大模型
+
+索引中没有的参考图（或文件大小与构建时不一致）返回 None，调用方回退到原来的实时计算。
+
+配置（环境变量）：
+- REFERENCE_STORE_PATH: 索引文件路径，默认 infographics/reference_store.json
+"""
+import os
+import sys
+import json
+import copy
+import time
+import hashlib
+import argparse
+import threading
+from typing import Dict, List, Optional
+
+REFERENCE_STORE_PATH = os.environ.get('REFERENCE_STORE_PATH', 'infographics/reference_store.json')
+REFERENCE_IMAGE_DIR = 'infographics'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# 索引格式变化时递增，旧索引不再使用
+REFERENCE_STORE_VERSION = 1
+
+
+class ReferenceStore:
+    """
+    预计算索引的运行时加载器
+
+    索引文件按 mtime 检测更新，变化后重新加载；每条记录保存构建时的图片文件大小，
+    查询时与当前文件比较，不一致说明参考图已被替换，视为未命中。
+    """
+
+    def __init__(self, path: str = REFERENCE_STORE_PATH, image_dir: str = REFERENCE_IMAGE_DIR):
+        self.path = path
+        self.image_dir = image_dir
+        self._references: Dict[str, Dict] = {}
+        self._mtime_ns = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        with self._lock:
+            if mtime_ns == self._mtime_ns:
+                return
+            references = {}
+            if mtime_ns is not None:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        store = json.load(f)
+                    if store.get('version') == REFERENCE_STORE_VERSION:
+                        references = store.get('references', {})
+                    else:
+                        print(f"参考图索引版本不匹配，忽略: {self.path}")
+                except (OSError, ValueError) as e:
+                    print(f"加载参考图索引失败: {e}")
+            self._references = references
+            self._mtime_ns = mtime_ns
+
+    def get(self, name: str, field: Optional[str] = None):
+        """
+        获取参考图的预计算记录（或其中一个字段）
+
+        Args:
+            name: 参考图文件名（如 "Art-Origin.png"），也接受带目录的路径
+            field: 'palette' / 'layout' / 'theme' / 'descriptions'，为 None 时返回整条记录
+
+        Returns:
+            记录或字段的副本；未命中或字段为空时返回 None
+        """
+        self._refresh()
+        name = os.path.basename(name)
+        record = self._references.get(name)
+        if record is None:
+            return None
+        try:
+            if os.path.getsize(os.path.join(self.image_dir, name)) != record.get('size'):
+                return None
+        except OSError:
+            return None
+        value = record if field is None else record.get(field)
+        return copy.deepcopy(value) if value is not None else None
+
+    def names(self) -> List[str]:
+        """索引中的所有参考图文件名"""
+        self._refresh()
+        return list(self._references)
+
+
+_reference_store = None
+_reference_store_lock = threading.Lock()
+
+
+def get_reference_store() -> ReferenceStore:
+    """获取进程级共享的参考图索引"""
+    global _reference_store
+    with _reference_store_lock:
+        if _reference_store is None:
+            _reference_store = ReferenceStore()
+        return _reference_store
+
+
+def _file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _theme_record(theme_info: Dict) -> Dict:
+    """主题信息，match_keywords 是 get_sorted_infographics_by_theme 用于计算相似度的完整关键词列表"""
+    keywords = theme_info.get('keywords', [])
+    theme_name = theme_info.get('theme', '').lower().split()
+    description = theme_info.get('description', '').lower().split()
+    return {
+        'theme': theme_info.get('theme', 'Unknown'),
+        'keywords': keywords,
+        'match_keywords': keywords + theme_name + description,
+    }
+
+
+def build_reference_store(image_dir: str = REFERENCE_IMAGE_DIR, output_path: str = REFERENCE_STORE_PATH,
+                          describe: bool = False) -> Dict[str, Dict]:
+    """
+    为 image_dir 下的所有参考图计算主色、背景色、布局、主题关键词和风格描述，写入 output_path
+
+    Args:
+        describe: 为描述缓存中没有的图片调用大模型生成描述；否则只使用已有的描述缓存
+
+    Returns:
+        写入的记录（文件名 -> 记录）
+    """
+    from chart_modules.annotation_index import AnnotationIndex
+    from chart_modules.util import layout_from_annotation
+    from chart_modules.reference_recognize.extract_main_color import extract_main_color
+    from chart_modules.reference_describe import load_description_cache, get_reference_descriptions
+
+    names = sorted(f for f in os.listdir(image_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+
+    # annotations.xml 和 themes.json 各只读一次
+    annotations = AnnotationIndex(os.path.join(image_dir, 'annotations.xml')).records()
+    themes = {}
+    themes_path = os.path.join(image_dir, 'themes.json')
+    if os.path.exists(themes_path):
+        with open(themes_path, 'r', encoding='utf-8') as f:
+            themes = json.load(f)
+    descriptions = load_description_cache()
+
+    references = {}
+    start = time.time()
+    for i, name in enumerate(names):
+        image_path = os.path.join(image_dir, name)
+        record = {
+            'size': os.path.getsize(image_path),
+            'sha256': _file_digest(image_path),
+            'palette': None,
+            'layout': None,
+            'theme': _theme_record(themes.get(name, {})),
+            'descriptions': descriptions.get(name),
+        }
+        try:
+            colors, bg_color = extract_main_color(image_path)
+            record['palette'] = {'colors': colors, 'bg_color': bg_color}
+        except Exception as e:
+            print(f"提取主色失败 {name}: {e}")
+        if name in annotations:
+            record['layout'] = layout_from_annotation(annotations[name])
+        if describe and record['descriptions'] is None and record['layout'] is not None:
+            try:
+                record['descriptions'] = get_reference_descriptions(image_path, use_cache=True)
+            except Exception as e:
+                print(f"生成描述失败 {name}: {e}")
+        references[name] = record
+        print(f"[{i + 1}/{len(names)}] {name}")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': REFERENCE_STORE_VERSION, 'references': references}, f,
+                  ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, output_path)
+    print(f"已写入 {len(references)} 张参考图的索引: {output_path}（{time.time() - start:.1f}s）")
+    return references
+
+
+if __name__ == "__main__":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    parser = argparse.ArgumentParser(description="预计算参考信息图的主色、布局、主题关键词和风格描述")
+    parser.add_argument("--dir", default=REFERENCE_IMAGE_DIR, help="参考图目录")
+    parser.add_argument("--output", default=REFERENCE_STORE_PATH, help="索引文件路径")
+    parser.add_argument("--describe", action="store_true", help="为缺少描述的参考图调用大模型生成描述")
+    args = parser.parse_args()
+
+    build_reference_store(args.dir, args.output, describe=args.describe)
@@ -0,0 +1,242 @@
+"""
+generate_variation 渲染结果的内容寻址缓存
+
+同一份数据、同一模板、同样的字段顺序和配色，渲染出的 SVG/PNG 是确定的，
+不同会话之间、/authoring/chart、图表类型预览和 variation 预览都会重复生成同一张图。
+这里以输入内容的哈希（数据 JSON、模板路径、字段顺序、主色、背景色、模板文件内容）作为 key，
+把 SVG、PNG 和元数据（如图表 bbox）存到共享目录，命中时直接复制到调用方的输出路径。
+
+缓存目录按最近访问时间（文件 mtime）做 LRU 淘汰，总大小和条目数都有上限：
+- RENDER_CACHE_DIR: 缓存目录，默认 buffer/render_cache
+- RENDER_CACHE_MAX_BYTES: 总大小上限，默认 512MB
+- RENDER_CACHE_MAX_ENTRIES: 条目数上限，默认 5000
+- RENDER_CACHE_ENABLED: 设为 0 关闭缓存
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+RENDER_CACHE_DIR = os.environ.get('RENDER_CACHE_DIR', 'buffer/render_cache')
+RENDER_CACHE_MAX_BYTES = int(os.environ.get('RENDER_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+RENDER_CACHE_MAX_ENTRIES = int(os.environ.get('RENDER_CACHE_MAX_ENTRIES', 5000))
+RENDER_CACHE_ENABLED = os.environ.get('RENDER_CACHE_ENABLED', '1') != '0'
+
+# 缓存 key 格式变化时递增，使旧条目失效
+RENDER_CACHE_VERSION = 1
+ARTIFACT_EXTENSIONS = ('.svg', '.png', '.json')
+
+
+def _file_digest(path: str) -> str:
+    """文件内容的 sha256"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class RenderCache:
+    """
+    共享渲染缓存：每个条目是缓存目录下的 <key>.svg，以及可选的 <key>.png 和元数据 <key>.json。
+
+    内存中维护按访问时间排序的索引，首次使用时扫描目录重建；
+    命中时更新文件 mtime，进程重启后 LRU 顺序仍然有效。
+    """
+
+    def __init__(self, cache_dir: str = RENDER_CACHE_DIR, max_bytes: int = RENDER_CACHE_MAX_BYTES,
+                 max_entries: int = RENDER_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()   # key -> 占用字节数，按访问时间从旧到新
+        self._total_bytes = 0
+        self._loaded = False
+        self._lock = threading.RLock()
+        # 模板文件摘要：path -> (mtime_ns, size, digest)
+        self._template_digests: Dict[str, tuple] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.cache_dir, key + ext)
+
+    def _entry_size(self, key: str) -> int:
+        size = 0
+        for ext in ARTIFACT_EXTENSIONS:
+            try:
+                size += os.path.getsize(self._path(key, ext))
+            except OSError:
+                pass
+        return size
+
+    def _load(self):
+        """扫描缓存目录重建索引（按 SVG 文件 mtime 排序）"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.isdir(self.cache_dir):
+            return
+        found = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.svg'):
+                    key = entry.name[:-len('.svg')]
+                    found.append((entry.stat().st_mtime, key))
+        for _, key in sorted(found):
+            size = self._entry_size(key)
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def template_digest(self, template_file: str) -> str:
+        """模板文件内容摘要，按 (mtime, size) 缓存，模板修改后自动失效"""
+        stat = os.stat(template_file)
+        with self._lock:
+            cached = self._template_digests.get(template_file)
+            if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                return cached[2]
+        digest = _file_digest(template_file)
+        with self._lock:
+            self._template_digests[template_file] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def make_key(self, input_path: str, template_path: str, template_fields, main_colors, bg_color,
+                 template_file: Optional[str] = None) -> str:
+        """
+        计算渲染输入的缓存 key
+
+        Args:
+            input_path: 输入数据 JSON 文件（按内容计算，不依赖路径）
+            template_path: 模板路径（如 d3-js/multiple pie chart/multiple_pie_chart_02）
+            template_fields: 字段顺序
+            main_colors: 主色列表
+            bg_color: 背景色
+            template_file: 模板源文件，提供时将其内容摘要计入 key
+        """
+        payload = {
+            'version': RENDER_CACHE_VERSION,
+            'data': _file_digest(input_path),
+            'template': template_path,
+            'fields': list(template_fields or []),
+            'main_colors': main_colors,
+            'bg_color': bg_color,
+            'template_file': self.template_digest(template_file) if template_file else None,
+        }
+        payload_json = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload_json.encode('utf-8')).hexdigest()
+
+    def get(self, key: str, output_svg: str) -> Optional[Dict]:
+        """
+        命中时把缓存的 SVG（以及 PNG）复制到 output_svg（以及同名 .png）
+
+        Returns:
+            命中时返回写入时的元数据（没有则为空字典），未命中返回 None
+        """
+        with self._lock:
+            self._load()
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            cached_svg = self._path(key, '.svg')
+            if not os.path.exists(cached_svg):
+                # 文件被外部删除
+                self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            now = time.time()
+            try:
+                os.utime(cached_svg, (now, now))
+            except OSError:
+                pass
+            self.hits += 1
+
+        output_dir = os.path.dirname(output_svg)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        shutil.copyfile(cached_svg, output_svg)
+        cached_png = self._path(key, '.png')
+        if output_svg.endswith('.svg') and os.path.exists(cached_png):
+            shutil.copyfile(cached_png, output_svg[:-len('.svg')] + '.png')
+        meta = {}
+        try:
+            with open(self._path(key, '.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            pass
+        return meta
+
+    def put(self, key: str, output_svg: str, meta: Optional[Dict] = None):
+        """把 output_svg（以及同名 .png，如果存在）和元数据存入缓存"""
+        if not os.path.exists(output_svg):
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if meta is not None:
+            meta_path = self._path(key, '.json')
+            tmp_path = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_path, meta_path)
+        sources = [(output_svg, '.svg')]
+        output_png = output_svg[:-len('.svg')] + '.png' if output_svg.endswith('.svg') else None
+        if output_png and os.path.exists(output_png):
+            sources.append((output_png, '.png'))
+
+        # 元数据和 PNG 先于 SVG 写入：索引以 SVG 是否存在判断条目是否完整
+        for source, ext in reversed(sources):
+            target = self._path(key, ext)
+            tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, target)
+
+        with self._lock:
+            self._load()
+            size = self._entry_size(key)
+            self._total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            for ext in ARTIFACT_EXTENSIONS:
+                try:
+                    os.remove(self._path(key, ext))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"Failed to evict render cache entry {key}{ext}: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._load()
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+_render_cache = None
+_render_cache_lock = threading.Lock()
+
+
+def get_render_cache() -> Optional[RenderCache]:
+    """获取进程级共享的渲染缓存；RENDER_CACHE_ENABLED=0 时返回 None"""
+    global _render_cache
+    if not RENDER_CACHE_ENABLED:
+        return None
+    with _render_cache_lock:
+        if _render_cache is None:
+            _render_cache = RenderCache()
+        return _render_cache
@@ -8,6 +8,16 @@ import tempfile
 import random
 import os
 import sys
+import threading
+from contextlib import contextmanager
+
+# 驱动池配置，可通过环境变量覆盖
+DRIVER_POOL_SIZE = int(os.environ.get('SCREENSHOT_DRIVER_POOL_SIZE', 2))
+DRIVER_MAX_USES = int(os.environ.get('SCREENSHOT_DRIVER_MAX_USES', 50))
+DRIVER_MAX_AGE = float(os.environ.get('SCREENSHOT_DRIVER_MAX_AGE', 1800))
+DRIVER_CHECKOUT_TIMEOUT = float(os.environ.get('SCREENSHOT_DRIVER_CHECKOUT_TIMEOUT', 120))
+# 截图前等待页面就绪（SVG 出现、图片和字体加载完成）的最长时间
+SCREENSHOT_READY_TIMEOUT = float(os.environ.get('SCREENSHOT_READY_TIMEOUT', 10))
 
 def get_driver(max_retries=1, delay=0):
     """
@@ -65,6 +75,162 @@ def get_driver(max_retries=1, delay=0):
                 raise  # 超过重试次数，抛出异常
 
 
+class DriverPool:
+    """
+    线程安全的 ChromeDriver 复用池。
+
+    最多同时存在 size 个 driver；checkout 优先复用空闲 driver，复用前检查其是否
+    仍然存活，使用次数超过 max_uses 或存活时间超过 max_age 秒的 driver 会被关闭
+    并重新创建。
+    """
+
+    def __init__(self, size=DRIVER_POOL_SIZE, max_uses=DRIVER_MAX_USES, max_age=DRIVER_MAX_AGE,
+                 checkout_timeout=DRIVER_CHECKOUT_TIMEOUT):
+        self.size = size
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.checkout_timeout = checkout_timeout
+
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._meta = {}
+
+    def _is_healthy(self, driver) -> bool:
+        """driver 对应的 Chrome 进程已崩溃或会话失效时返回 False"""
+        try:
+            driver.execute_script("return 1;")
+            return True
+        except WebDriverException:
+            return False
+
+    def _is_expired(self, driver) -> bool:
+        meta = self._meta.get(id(driver))
+        if meta is None:
+            return True
+        return meta['uses'] >= self.max_uses or time.time() - meta['created'] >= self.max_age
+
+    def _discard(self, driver):
+        with self._lock:
+            self._meta.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"清理 driver 时出错: {e}")
+
+    def checkout(self, timeout=None) -> webdriver.Chrome:
+        """取出一个可用的 driver，池满时最多等待 timeout 秒"""
+        if not self._slots.acquire(timeout=timeout or self.checkout_timeout):
+            raise TimeoutError("等待可用 ChromeDriver 超时")
+        try:
+            while True:
+                with self._lock:
+                    driver = self._idle.pop() if self._idle else None
+                if driver is None:
+                    break
+                if not self._is_expired(driver) and self._is_healthy(driver):
+                    with self._lock:
+                        self._meta[id(driver)]['uses'] += 1
+                    return driver
+                print(">>> 回收失效或已达使用上限的 ChromeDriver")
+                self._discard(driver)
+
+            driver = get_driver()
+            with self._lock:
+                self._meta[id(driver)] = {'uses': 1, 'created': time.time()}
+            return driver
+        except Exception:
+            self._slots.release()
+            raise
+
+    def checkin(self, driver: webdriver.Chrome, broken: bool = False):
+        """归还 driver；broken 为 True 时直接关闭而不放回池中"""
+        try:
+            if broken or self._is_expired(driver):
+                self._discard(driver)
+            else:
+                with self._lock:
+                    self._idle.append(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """with pool.driver() as driver: ... 形式的借用接口"""
+        driver = self.checkout(timeout)
+        broken = False
+        try:
+            yield driver
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self.checkin(driver, broken=broken)
+
+    def close_all(self):
+        """关闭所有空闲 driver（进程退出时调用）"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for driver in idle:
+            self._discard(driver)
+
+
+_driver_pool = None
+_driver_pool_lock = threading.Lock()
+
+
+def get_driver_pool() -> DriverPool:
+    """获取进程级共享的 ChromeDriver 池"""
+    global _driver_pool
+    with _driver_pool_lock:
+        if _driver_pool is None:
+            import atexit
+            _driver_pool = DriverPool()
+            atexit.register(_driver_pool.close_all)
+        return _driver_pool
+
+
+def _wait_for_next_frame(driver: webdriver.Chrome, timeout: float = SCREENSHOT_READY_TIMEOUT):
+    """等待字体就绪并完成两次绘制（布局变化已经反映到画面上）"""
+    driver.set_script_timeout(timeout)
+    driver.execute_async_script("""
+        const done = arguments[arguments.length - 1];
+        const fontsReady = document.fonts ? document.fonts.ready : Promise.resolve();
+        fontsReady.then(() => requestAnimationFrame(() => requestAnimationFrame(() => done(true))));
+    """)
+
+
+def _wait_for_svg_ready(driver: webdriver.Chrome, timeout: float = SCREENSHOT_READY_TIMEOUT) -> bool:
+    """
+    等待页面中的 SVG 可以截图：文档加载完成、存在 svg 元素、图片加载结束、字体就绪并完成绘制
+
+    Returns:
+        bool: 超时前是否找到 svg 元素
+    """
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import TimeoutException
+
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.02).until(
+            lambda d: d.execute_script(
+                "return document.readyState === 'complete' && document.querySelector('svg') !== null"
+            )
+        )
+    except TimeoutException:
+        return False
+
+    driver.set_script_timeout(timeout)
+    driver.execute_async_script("""
+        const done = arguments[arguments.length - 1];
+        const pending = Array.from(document.images)
+            .filter(img => !img.complete)
+            .map(img => new Promise(resolve => { img.onload = img.onerror = resolve; }));
+        Promise.all(pending).then(() => done(true));
+    """)
+    _wait_for_next_frame(driver, timeout)
+    return True
+
+
 def take_screenshot(driver: webdriver.Chrome, html_path: str):
     """
     对 HTML 文件中的 SVG 进行截图并保存为 PNG
@@ -94,7 +260,9 @@ def take_screenshot(driver: webdriver.Chrome, html_path: str):
         except Exception as e:
             print(f"设置透明背景失败 (可能不支持 CDP): {e}")
 
-        time.sleep(0.3)  # 增加等待时间，确保 SVG 加载完成
+        # 等待 SVG 加载完成（事件驱动，不再固定等待）
+        if not _wait_for_svg_ready(driver):
+            raise Exception(f"在 HTML 文件中未找到 SVG 元素: {html_path}")
 
         # 查找 SVG 元素
         try:
@@ -118,7 +286,8 @@ def take_screenshot(driver: webdriver.Chrome, html_path: str):
         target_height = max(required_height, 1080)
         
         driver.set_window_size(target_width, target_height)
-        time.sleep(0.3)
+        # 等待按新窗口尺寸重新布局并绘制
+        _wait_for_next_frame(driver)
 
         # 获取 SVG 位置和尺寸
         location = svg.location
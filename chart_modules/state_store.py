@@ -0,0 +1,412 @@
+"""
+按会话隔离的生成状态存储
+
+替代原来全局共享的 generation_status 字典 + generation_status_cache.json：
+- 每个会话（浏览器）一份 SessionState，多个用户可以同时走完整的生成流程
+- SessionState 是 dict 子类，现有 generation_status[...] 的读写代码无需改动；
+  顶层 key 的每次写入都会递增该 key 的版本号并记为脏数据
+- 持久化只写入变化的 key（SQLite 后端按 (session_id, key) 一行），不再整文件重写
+- set(key, value, expected_version=...) 提供乐观并发控制，版本不一致时抛出 StateConflictError
+- 最近的变更记录在有界日志中，wait_for_changes() 供进度推送（SSE）按版本号增量读取
+- 超过 GENERATION_STATE_IDLE_TIMEOUT 秒未访问、且没有推送连接或后台任务在使用的会话，
+  写回后从内存中移除，下次访问时再从后端加载（memory 后端下移除即丢弃）
+
+后端通过环境变量选择：
+- GENERATION_STATE_BACKEND: sqlite（默认，重启后可恢复）或 memory（纯内存）
+- GENERATION_STATE_DB: SQLite 数据库路径，默认 generation_status.db
+- GENERATION_STATE_IDLE_TIMEOUT: 会话空闲多少秒后从内存中移除，默认 1800
+"""
+import os
+import json
+import copy
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATE_BACKEND = os.environ.get('GENERATION_STATE_BACKEND', 'sqlite')
+STATE_DB_PATH = os.environ.get('GENERATION_STATE_DB', 'generation_status.db')
+# 每个会话保留的变更记录条数，推送连接落后超过这个数量时需要重新发送快照
+STATE_CHANGE_LOG_SIZE = int(os.environ.get('GENERATION_STATE_CHANGE_LOG_SIZE', 256))
+STATE_IDLE_TIMEOUT = float(os.environ.get('GENERATION_STATE_IDLE_TIMEOUT', 1800))
+# 空闲会话的检查间隔（秒），在 StateStore.get() 中顺带执行
+STATE_EVICT_INTERVAL = 60
+
+_MISSING = object()
+
+
+class StateConflictError(Exception):
+    """乐观写入时 key 的版本号与预期不一致"""
+
+
+def _digest(value_json: str) -> str:
+    return hashlib.md5(value_json.encode('utf-8')).hexdigest()
+
+
+class SessionState(dict):
+    """
+    单个会话的生成状态。
+
+    行为与普通 dict 一致；顶层 key 的写入/删除会记录版本号和脏标记，
+    嵌套修改（如 state['style']['colors'] = ...）在 flush(full_check=True) 时通过内容摘要检测。
+    """
+
+    def __init__(self, session_id: str, initial: Optional[Dict] = None, versions: Optional[Dict[str, int]] = None):
+        super().__init__(initial or {})
+        self.session_id = session_id
+        self.lock = threading.RLock()
+        self._changed = threading.Condition(self.lock)
+        self._change_log = deque(maxlen=STATE_CHANGE_LOG_SIZE)   # (version, key)
+        self._versions = dict(versions or {})
+        self._dirty = set()
+        self._deleted = set()
+        self._digests = {}
+        self._waiters = 0
+        self.version = max(self._versions.values(), default=0)
+        self.last_access = time.time()
+
+    def in_use(self) -> bool:
+        """是否有推送连接正在等待变更"""
+        return self._waiters > 0
+
+    def has_pending_changes(self) -> bool:
+        with self.lock:
+            return bool(self._dirty or self._deleted)
+
+    def _touch(self, key):
+        self.last_access = time.time()
+        self.version += 1
+        self._versions[key] = self.version
+        self._dirty.add(key)
+        self._deleted.discard(key)
+        self._log_change(key)
+
+    def _log_change(self, key):
+        self._change_log.append((self.version, key))
+        self._changed.notify_all()
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            super().__setitem__(key, value)
+            self._touch(key)
+
+    def __delitem__(self, key):
+        with self.lock:
+            super().__delitem__(key)
+            self.version += 1
+            self._versions.pop(key, None)
+            self._dirty.discard(key)
+            self._deleted.add(key)
+            self._log_change(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        with self.lock:
+            if key not in self:
+                self[key] = default
+            return super().__getitem__(key)
+
+    def pop(self, key, default=_MISSING):
+        with self.lock:
+            if key in self:
+                value = super().__getitem__(key)
+                del self[key]
+                return value
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+
+    def version_of(self, key) -> int:
+        """key 当前的版本号，不存在时为 0"""
+        return self._versions.get(key, 0)
+
+    def set(self, key, value, expected_version: Optional[int] = None) -> int:
+        """
+        写入单个 key，可选乐观并发检查
+
+        Args:
+            key: 状态键
+            value: 新值
+            expected_version: 读取时的版本号（version_of 的返回值），为 None 时不检查
+
+        Returns:
+            写入后的版本号
+        """
+        with self.lock:
+            if expected_version is not None and self.version_of(key) != expected_version:
+                raise StateConflictError(
+                    f"State key '{key}' changed (expected version {expected_version}, got {self.version_of(key)})"
+                )
+            self[key] = value
+            return self.version_of(key)
+
+    def mark_changed(self, key):
+        """显式标记嵌套修改过的 key"""
+        with self.lock:
+            if key in self:
+                self._touch(key)
+
+    def wait_for_changes(self, since_version: int, timeout: Optional[float] = None) -> Optional[Tuple[int, List[str]]]:
+        """
+        等待 since_version 之后的变更
+
+        Args:
+            since_version: 调用方已经看到的版本号
+            timeout: 最长等待秒数，超时返回 (当前版本, [])
+
+        Returns:
+            (当前版本, 按首次变更顺序去重后的 key 列表)；since_version 早于日志保留范围时返回 None，调用方应重新获取快照
+        """
+        with self.lock:
+            self.last_access = time.time()
+            if self.version <= since_version:
+                self._waiters += 1
+                try:
+                    self._changed.wait_for(lambda: self.version > since_version, timeout)
+                finally:
+                    self._waiters -= 1
+                    self.last_access = time.time()
+            if self.version <= since_version:
+                return self.version, []
+            if not self._change_log or self._change_log[0][0] > since_version + 1:
+                return None
+            keys = []
+            for version, key in self._change_log:
+                if version > since_version and key not in keys:
+                    keys.append(key)
+            return self.version, keys
+
+    def snapshot(self) -> Dict:
+        """返回当前状态的深拷贝（供序列化或跨线程读取）"""
+        with self.lock:
+            return copy.deepcopy(dict(self))
+
+    def collect_changes(self, full_check: bool = False):
+        """
+        取出需要持久化的变更并清空脏标记
+
+        Args:
+            full_check: 为 True 时对容器类型的值计算摘要，检测嵌套修改
+
+        Returns:
+            (upserts, deletes)：upserts 为 [(key, value_json, version)]，deletes 为 key 列表
+        """
+        with self.lock:
+            keys = set(self._dirty)
+            if full_check:
+                keys.update(key for key, value in self.items() if isinstance(value, (dict, list)))
+            upserts = []
+            for key in keys:
+                if key not in self:
+                    continue
+                value_json = json.dumps(super().__getitem__(key), ensure_ascii=False, default=str)
+                digest = _digest(value_json)
+                if key not in self._dirty and self._digests.get(key) == digest:
+                    continue
+                if key not in self._dirty:
+                    # 嵌套修改：补记版本号
+                    self._touch(key)
+                self._digests[key] = digest
+                upserts.append((key, value_json, self.version_of(key)))
+            deletes = list(self._deleted)
+            self._dirty.clear()
+            self._deleted.clear()
+            return upserts, deletes
+
+
+class MemoryStateBackend:
+    """纯内存后端：不持久化"""
+
+    def load(self, session_id: str) -> Optional[Dict[str, tuple]]:
+        return None
+
+    def save(self, session_id: str, upserts: Iterable[tuple], deletes: Iterable[str]):
+        pass
+
+    def close(self):
+        pass
+
+
+class SqliteStateBackend:
+    """
+    SQLite 后端：每个 (session_id, key) 一行，只写入变化的 key。
+    写入时只接受版本号更大的值，避免较旧的写入覆盖较新的状态。
+    """
+
+    def __init__(self, db_path: str = STATE_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_state ("
+                "session_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "version INTEGER NOT NULL, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (session_id, key))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, session_id: str) -> Optional[Dict[str, tuple]]:
+        rows = self._connect().execute(
+            "SELECT key, value, version FROM session_state WHERE session_id = ?", (session_id,)
+        ).fetchall()
+        if not rows:
+            return None
+        return {key: (json.loads(value), version) for key, value, version in rows}
+
+    def save(self, session_id: str, upserts: Iterable[tuple], deletes: Iterable[str]):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO session_state (session_id, key, value, version, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(session_id, key) DO UPDATE SET value = excluded.value, version = excluded.version, "
+                "updated_at = excluded.updated_at WHERE excluded.version > session_state.version",
+                [(session_id, key, value_json, version, now) for key, value_json, version in upserts]
+            )
+            conn.executemany(
+                "DELETE FROM session_state WHERE session_id = ? AND key = ?",
+                [(session_id, key) for key in deletes]
+            )
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class StateStore:
+    """
+    会话状态存储：内存中保存活跃会话，按需从后端加载，flush 时增量写回
+
+    Args:
+        backend: 持久化后端
+        default_factory: 新会话的初始状态
+        idle_timeout: 会话空闲多少秒后写回并从内存中移除，为 None 或 <= 0 时不移除
+        in_use: 判断会话是否仍被使用（如有未结束的后台任务）的回调，使用中的会话不移除
+    """
+
+    def __init__(self, backend=None, default_factory: Optional[Callable[[], Dict]] = None,
+                 idle_timeout: Optional[float] = STATE_IDLE_TIMEOUT, in_use: Optional[Callable[[str], bool]] = None):
+        self.backend = backend or MemoryStateBackend()
+        self.default_factory = default_factory or dict
+        self.idle_timeout = idle_timeout
+        self.in_use = in_use
+        self._sessions: Dict[str, SessionState] = {}
+        self._lock = threading.Lock()
+        self._last_eviction = time.time()
+
+    def get(self, session_id: str) -> SessionState:
+        """获取会话状态，不存在时从后端加载或按默认值创建"""
+        self._maybe_evict()
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is not None:
+                state.last_access = time.time()
+                return state
+
+            stored = None
+            try:
+                stored = self.backend.load(session_id)
+            except Exception as e:
+                logger.error(f"Failed to load state for session {session_id}: {e}")
+
+            if stored:
+                initial = self.default_factory()
+                initial.update({key: value for key, (value, _) in stored.items()})
+                state = SessionState(session_id, initial, {key: version for key, (_, version) in stored.items()})
+            else:
+                state = SessionState(session_id, self.default_factory())
+                with state.lock:
+                    for key in state:
+                        state._touch(key)
+            self._sessions[session_id] = state
+            return state
+
+    def flush(self, state: SessionState, full_check: bool = False):
+        """将会话中变化的 key 写回后端"""
+        upserts, deletes = state.collect_changes(full_check=full_check)
+        if not upserts and not deletes:
+            return
+        try:
+            self.backend.save(state.session_id, upserts, deletes)
+        except Exception as e:
+            logger.error(f"Failed to persist state for session {state.session_id}: {e}")
+
+    def sessions(self) -> Dict[str, SessionState]:
+        with self._lock:
+            return dict(self._sessions)
+
+    def _maybe_evict(self):
+        if not self.idle_timeout or self.idle_timeout <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            if now - self._last_eviction < STATE_EVICT_INTERVAL:
+                return
+            self._last_eviction = now
+        self.evict_idle(now)
+
+    def _evictable(self, state: SessionState, now: float) -> bool:
+        if now - state.last_access < self.idle_timeout or state.in_use():
+            return False
+        if self.in_use is not None:
+            try:
+                return not self.in_use(state.session_id)
+            except Exception as e:
+                logger.error(f"Failed to check whether session {state.session_id} is in use: {e}")
+                return False
+        return True
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """
+        写回并移除空闲的会话
+
+        Returns:
+            移除的会话数
+        """
+        if not self.idle_timeout or self.idle_timeout <= 0:
+            return 0
+        now = now if now is not None else time.time()
+        with self._lock:
+            candidates = [state for state in self._sessions.values() if self._evictable(state, now)]
+        evicted = 0
+        for state in candidates:
+            self.flush(state, full_check=True)
+            with self._lock:
+                # 写回期间被重新访问或修改的会话保留
+                if (self._sessions.get(state.session_id) is state and self._evictable(state, now)
+                        and not state.has_pending_changes()):
+                    del self._sessions[state.session_id]
+                    evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} idle session(s) from memory")
+        return evicted
+
+
+def create_state_store(default_factory: Optional[Callable[[], Dict]] = None,
+                       backend_name: str = STATE_BACKEND, db_path: str = STATE_DB_PATH,
+                       in_use: Optional[Callable[[str], bool]] = None) -> StateStore:
+    """根据配置创建状态存储；SQLite 不可用时回退到内存后端"""
+    backend = None
+    if backend_name == 'sqlite':
+        try:
+            backend = SqliteStateBackend(db_path)
+        except sqlite3.Error as e:
+            logger.error(f"SQLite state backend unavailable ({e}), falling back to memory")
+    return StateStore(backend or MemoryStateBackend(), default_factory, in_use=in_use)
@@ -4,7 +4,6 @@
 
 import os
 import base64
-import openai
 from pathlib import Path
 from PIL import Image
 from io import BytesIO
@@ -14,8 +13,11 @@ import hashlib
 from datetime import datetime
 import tempfile
 import shutil
+import threading
+from collections import OrderedDict
 from chart_modules.parse_utils import convert_svg_to_html
-from chart_modules.screenshot_utils import get_driver, take_screenshot
+from chart_modules.screenshot_utils import get_driver_pool, take_screenshot
+from chart_modules.llm_client import get_llm_client
 import config
 
 # API 配置
@@ -26,6 +28,11 @@ BASE_URL = config.OPENAI_BASE_URL
 MATERIAL_CACHE_DIR = "buffer/material_cache"
 MATERIAL_CACHE_INDEX = "buffer/material_cache/index.json"
 
+# 已光栅化的 SVG：内容摘要 -> (PNG 路径, mtime_ns, size)，相同内容直接复用已有 PNG
+RASTERIZED_SVG_CACHE_SIZE = int(os.environ.get('RASTERIZED_SVG_CACHE_SIZE', 512))
+_rasterized_svgs = OrderedDict()
+_rasterized_svgs_lock = threading.Lock()
+
 def create_material_key(materials: dict) -> str:
     """
     根据使用的素材生成唯一的缓存key
@@ -199,6 +206,47 @@ def check_material_cache(materials: dict) -> dict:
         traceback.print_exc()
         return {'found': False, 'all_versions': [], 'total_versions': 0}
 
+def _remember_rasterized_png(svg_digest: str, png_path: str):
+    """记录 SVG 内容摘要对应的 PNG 文件"""
+    stat = os.stat(png_path)
+    with _rasterized_svgs_lock:
+        _rasterized_svgs[svg_digest] = (os.path.abspath(png_path), stat.st_mtime_ns, stat.st_size)
+        _rasterized_svgs.move_to_end(svg_digest)
+        while len(_rasterized_svgs) > RASTERIZED_SVG_CACHE_SIZE:
+            _rasterized_svgs.popitem(last=False)
+
+
+def _reuse_rasterized_png(svg_digest: str, output_path: str) -> bool:
+    """
+    相同内容的 SVG 已经生成过 PNG 且文件未被改动时，直接复用（必要时复制到 output_path）
+
+    Returns:
+        bool: 是否复用成功
+    """
+    with _rasterized_svgs_lock:
+        cached = _rasterized_svgs.get(svg_digest)
+        if cached is not None:
+            _rasterized_svgs.move_to_end(svg_digest)
+    if cached is None:
+        return False
+
+    png_path, mtime_ns, size = cached
+    try:
+        stat = os.stat(png_path)
+    except OSError:
+        stat = None
+    if stat is None or stat.st_mtime_ns != mtime_ns or stat.st_size != size:
+        with _rasterized_svgs_lock:
+            _rasterized_svgs.pop(svg_digest, None)
+        return False
+
+    output_path = os.path.abspath(output_path)
+    if output_path != png_path:
+        shutil.copyfile(png_path, output_path)
+        _remember_rasterized_png(svg_digest, output_path)
+    return True
+
+
 def svg_to_png(svg_content: str, output_path: str, background_color: str = None) -> bool:
     """
     将 SVG 内容转换为 PNG 文件
@@ -212,7 +260,6 @@ def svg_to_png(svg_content: str, output_path: str, background_color: str = None)
     Returns:
         bool: 转换是否成功
     """
-    driver = None
     temp_dir = None
     try:
         # 确保输出目录存在
@@ -222,6 +269,12 @@ def svg_to_png(svg_content: str, output_path: str, background_color: str = None)
         else:  # 如果只是文件名，使用当前目录
             output_path = os.path.abspath(output_path)
 
+        # 相同 SVG 内容已经光栅化过时直接复用
+        svg_digest = hashlib.sha256(svg_content.encode('utf-8')).hexdigest()
+        if _reuse_rasterized_png(svg_digest, output_path):
+            print(f"SVG 内容未变化，复用已有 PNG: {output_path}")
+            return True
+
         # 创建临时文件（使用绝对路径）
         temp_dir = tempfile.mkdtemp()
         temp_svg_path = os.path.abspath(os.path.join(temp_dir, 'temp.svg'))
@@ -234,9 +287,9 @@ def svg_to_png(svg_content: str, output_path: str, background_color: str = None)
         # 2. 将 SVG 转换为 HTML
         convert_svg_to_html(temp_svg_path, temp_html_path)
 
-        # 3. 使用 screenshot 将 HTML 转换为 PNG
-        driver = get_driver()
-        take_screenshot(driver, temp_html_path)
+        # 3. 使用 screenshot 将 HTML 转换为 PNG（从复用池中借用 driver）
+        with get_driver_pool().driver() as driver:
+            take_screenshot(driver, temp_html_path)
 
         # 4. 移动生成的 PNG 到目标路径
         temp_png_path = os.path.join(temp_dir, 'temp.png')
@@ -248,6 +301,7 @@ def svg_to_png(svg_content: str, output_path: str, background_color: str = None)
             # 确保目标路径是绝对路径
             output_path = os.path.abspath(output_path)
             shutil.move(temp_png_path, output_path)
+            _remember_rasterized_png(svg_digest, output_path)
             print(f"SVG 转 PNG 成功: {output_path}")
             return True
         else:
@@ -264,12 +318,6 @@ def svg_to_png(svg_content: str, output_path: str, background_color: str = None)
         traceback.print_exc()
         return False
     finally:
-        # 清理 driver
-        if driver:
-            try:
-                driver.quit()
-            except Exception as e:
-                print(f"清理 driver 时出错: {e}")
         # 清理临时文件
         if temp_dir and os.path.exists(temp_dir):
             try:
@@ -415,12 +463,6 @@ def refine_with_gemini(reference_image_path: str, current_image_path: str, outpu
                 'error': '图片转换失败'
             }
 
-        # 创建 OpenAI 客户端
-        client = openai.OpenAI(
-            api_key=API_KEY,
-            base_url=BASE_URL
-        )
-
         # 构建提示词
         prompt = """You are an expert Infographic Designer and Data Visualization Specialist.
 
@@ -448,7 +490,7 @@ Redesign the **Original Image** by strictly applying the visual style of the **R
 Generate a high-fidelity design that combines the *data* of the Original Image with the *look and feel* of the Reference Image."""
 
         # 调用 Gemini 模型
-        response = client.chat.completions.create(
+        response = get_llm_client(BASE_URL, API_KEY).chat(
             model="gemini-3-pro-image-preview",
             messages=[
                 {
@@ -680,12 +722,6 @@ def direct_generate_with_ai(chart_image_path: str, output_path: str, materials:
                 'error': '图片转换失败'
             }
 
-        # 创建 OpenAI 客户端
-        client = openai.OpenAI(
-            api_key=API_KEY,
-            base_url=BASE_URL
-        )
-
         # 构建提示词
         prompt = """You are an expert infographic designer. You are given a chart/data visualization image.
 
@@ -714,7 +750,7 @@ Your task is to transform this chart into a beautiful, professional infographic
 Generate a stunning infographic that transforms the raw chart into a visually appealing, professional design while keeping all the data intact."""
 
         # 调用 Gemini 模型
-        response = client.chat.completions.create(
+        response = get_llm_client(BASE_URL, API_KEY).chat(
             model="gemini-3-pro-image-preview",
             messages=[
                 {
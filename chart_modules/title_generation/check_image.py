@@ -1,4 +1,3 @@
-from openai import OpenAI
 import base64
 import json
 import sys
@@ -10,6 +9,7 @@ project_root = os.path.dirname(os.path.dirname(current_dir))
 sys.path.append(project_root)
 
 import config
+from chart_modules.llm_client import get_llm_client
 
 # 获取当前文件所在目录的绝对路径
 _current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -21,10 +21,6 @@ def check(  title,
     if prompt_path is None:
         prompt_path = os.path.join(_current_dir, 'prompts/check_prompt_gpt_en.md')
         
-    client = OpenAI(
-        api_key=config.OPENAI_API_KEY,
-        base_url=config.OPENAI_BASE_URL
-    )
     with open(prompt_path, 'r', encoding='utf-8') as file:
         check_prompt = file.read()
     check_prompt = check_prompt.replace("{title}", title)
@@ -33,7 +29,7 @@ def check(  title,
         image_data = image_file.read()
     base64_image = base64.b64encode(image_data).decode('utf-8')
 
-    response = client.chat.completions.create(
+    response = get_llm_client(config.OPENAI_BASE_URL, config.OPENAI_API_KEY).chat(
         model="gpt-4o-mini",
         messages=[
             {
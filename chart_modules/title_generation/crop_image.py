@@ -1,5 +1,14 @@
+import os
+import sys
 from PIL import Image
 
+# Add project root to sys.path to import chart_modules
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(project_root)
+
+from chart_modules.image_postprocess import content_bbox
+
 def crop(image_path, edge = 10):
     img = Image.open(image_path).convert("RGBA")
     original_img = img.copy()
@@ -16,17 +25,9 @@ def crop(image_path, edge = 10):
         img = Image.open(image_path).convert("RGBA")
         original_img = img.copy()
         width, height = original_img.size
-        original_datas = img.getdata()
-        new_datas = []
         background_color = background_color_list[i]
-        for item in original_datas:
-            if abs(item[0] - background_color[0]) <= 12 and abs(item[1] - background_color[1]) <= 12 and abs(item[2] - background_color[2]) <= 12:
-                new_datas.append((0, 0, 0, 0))
-            else:
-                new_datas.append(item)
-        img.putdata(new_datas)
-
-        box = list(img.getbbox())
+        # 与背景色相近的像素视为空白，计算剩余内容的包围盒
+        box = list(content_bbox(img, background_color, 12))
         # 确保框不越界
         box[0] = max(0, box[0]-edge)
         box[1] = max(0, box[1]-edge)
@@ -1,4 +1,3 @@
-from openai import OpenAI
 import os
 import sys
 
@@ -8,6 +7,7 @@ project_root = os.path.dirname(os.path.dirname(current_dir))
 sys.path.append(project_root)
 
 import config
+from chart_modules.llm_client import get_llm_client
 
 # 获取当前文件所在目录的绝对路径
 _current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -32,11 +32,7 @@ def get_prompt( title,
     #     generate_prompt += f"\n\n## Reference Style Guide\nIMPORTANT: Please follow this visual style from the reference image when designing the title:\n{style_description}"
     #     print(f"Added style description to title prompt")
 
-    client = OpenAI(
-        api_key=config.OPENAI_API_KEY,
-        base_url=config.OPENAI_BASE_URL
-    )
-    response = client.chat.completions.create(
+    response = get_llm_client(config.OPENAI_BASE_URL, config.OPENAI_API_KEY).chat(
         model="gemini-2.5-flash",
         messages=[
             {
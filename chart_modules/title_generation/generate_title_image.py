@@ -14,7 +14,8 @@ import config
 from generate_prompt import get_prompt
 from crop_image import crop
 from check_image import check
-from openai import OpenAI
+from chart_modules.llm_client import get_llm_client
+from chart_modules.image_postprocess import remove_background_color
 import base64
 import os
 
@@ -37,19 +38,11 @@ def remove_background(image_path, tolerance=30):
         img = Image.open(image_path).convert("RGBA")
         data = np.array(img)
         
-        # Find the most frequent color (assuming it's the background)
-        # Only consider the RGB channels for frequency analysis
-        rgb_data = data[:, :, :3]
-        colors, counts = np.unique(rgb_data.reshape(-1, 3), axis=0, return_counts=True)
-        bg_color = colors[counts.argmax()]
+        # The most frequent color is assumed to be the background;
+        # pixels within tolerance of it become transparent
+        data, bg_color = remove_background_color(data, tolerance)
         
         print(f"Detected background color: {bg_color}")
-
-        # Create a mask for pixels that match the background color within tolerance
-        mask = np.all(np.abs(data[:, :, :3] - bg_color) <= tolerance, axis=2)
-        
-        # Set alpha channel to 0 for matching pixels
-        data[mask, 3] = 0
         
         # Create new image from modified data
         new_img = Image.fromarray(data)
@@ -69,17 +62,13 @@ def get_image(  bg_hex,
     # 使用绝对路径
     if prompt_path is None:
         prompt_path = os.path.join(_current_dir, 'prompts/generated_output.md')
-    client = OpenAI(
-        api_key=config.OPENAI_API_KEY,
-        base_url=config.OPENAI_BASE_URL
-    )
     with open(prompt_path, 'r', encoding='utf-8') as file:
         image_prompt = file.read()
     print("image_prompt: ", image_prompt)
 
     try:
         # 使用 chat completion 接口调用 Gemini 3.0 Pro
-        response = client.chat.completions.create(
+        response = get_llm_client(config.OPENAI_BASE_URL, config.OPENAI_API_KEY).chat(
             model="gemini-3-pro-image-preview",
             messages=[
                 {
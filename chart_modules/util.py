@@ -7,6 +7,8 @@ import os
 import socket
 import pandas as pd
 import json
+from chart_modules.reference_store import get_reference_store
+from chart_modules.annotation_index import get_annotation_index
 
 # 加载 infographics 主题配置
 def load_infographic_themes():
@@ -70,8 +72,9 @@ def get_sorted_infographics_by_theme(datafile):
     """
     根据用户数据的主题，返回按相似性排序的 infographics 列表
     """
-    themes = load_infographic_themes()
     data_keywords = get_data_keywords(datafile)
+    reference_store = get_reference_store()
+    themes = None
 
     # 获取所有 infographic 图片
     infographics_dir = 'infographics'
@@ -84,21 +87,30 @@ def get_sorted_infographics_by_theme(datafile):
     # 计算每个 infographic 的相似性分数
     scored_images = []
     for img in image_files:
-        theme_info = themes.get(img, {})
-        keywords = theme_info.get('keywords', [])
-
-        # 添加主题名称和描述作为额外关键词
-        theme_name = theme_info.get('theme', '').lower().split()
-        description = theme_info.get('description', '').lower().split()
-        all_keywords = keywords + theme_name + description
-
-        similarity = calculate_theme_similarity(data_keywords, all_keywords)
+        # 优先使用预计算索引中的主题关键词，索引中没有时才读取 themes.json
+        theme = reference_store.get(img, 'theme')
+        if theme is None:
+            if themes is None:
+                themes = load_infographic_themes()
+            theme_info = themes.get(img, {})
+            keywords = theme_info.get('keywords', [])
+
+            # 添加主题名称和描述作为额外关键词
+            theme_name = theme_info.get('theme', '').lower().split()
+            description = theme_info.get('description', '').lower().split()
+            theme = {
+                'theme': theme_info.get('theme', 'Unknown'),
+                'keywords': keywords,
+                'match_keywords': keywords + theme_name + description
+            }
+
+        similarity = calculate_theme_similarity(data_keywords, theme['match_keywords'])
 
         scored_images.append({
             'filename': img,
             'similarity': similarity,
-            'theme': theme_info.get('theme', 'Unknown'),
-            'keywords': keywords
+            'theme': theme['theme'],
+            'keywords': theme['keywords']
         })
 
     # 按相似性降序排序
@@ -158,6 +170,44 @@ def find_free_port(start_port=5000):
         except OSError:
             port += 1
 
+def layout_from_annotation(annotation: dict) -> dict:
+    """把标注索引中的一条记录（见 annotation_index）转换为 parse_reference_layout 返回的布局格式"""
+    img_width = annotation['width']
+    img_height = annotation['height']
+
+    layout = {
+        'width': img_width,
+        'height': img_height
+    }
+
+    # 提取所有 box
+    for box in annotation['boxes']:
+        label = box['label']
+        xtl = box['xtl']
+        ytl = box['ytl']
+        xbr = box['xbr']
+        ybr = box['ybr']
+
+        # 计算相对位置和尺寸（0-1之间的比例）
+        x_ratio = xtl / img_width
+        y_ratio = ytl / img_height
+        width_ratio = (xbr - xtl) / img_width
+        height_ratio = (ybr - ytl) / img_height
+
+        layout[label] = {
+            'x': x_ratio,
+            'y': y_ratio,
+            'width': width_ratio,
+            'height': height_ratio,
+            # 保留原始像素坐标用于调试
+            'xtl': xtl,
+            'ytl': ytl,
+            'xbr': xbr,
+            'ybr': ybr
+        }
+
+    return layout
+
 def parse_reference_layout(reference_image_name: str) -> dict:
     """
     从 infographics/annotations.xml 中解析参考图片的布局信息
@@ -175,55 +225,21 @@ def parse_reference_layout(reference_image_name: str) -> dict:
             'image': {...}
         }
     """
-    import xml.etree.ElementTree as ET
+    # 预计算索引命中时直接返回
+    layout = get_reference_store().get(reference_image_name, 'layout')
+    if layout is not None:
+        return layout
 
-    annotations_path = 'infographics/annotations.xml'
+    annotation_index = get_annotation_index()
 
-    if not os.path.exists(annotations_path):
+    if not annotation_index.exists():
         return None
 
     try:
-        tree = ET.parse(annotations_path)
-        root = tree.getroot()
-
-        # 查找匹配的 image 元素
-        for image_elem in root.findall('image'):
-            if image_elem.get('name') == reference_image_name:
-                img_width = float(image_elem.get('width'))
-                img_height = float(image_elem.get('height'))
-
-                layout = {
-                    'width': img_width,
-                    'height': img_height
-                }
-
-                # 提取所有 box 元素
-                for box in image_elem.findall('box'):
-                    label = box.get('label')
-                    xtl = float(box.get('xtl'))
-                    ytl = float(box.get('ytl'))
-                    xbr = float(box.get('xbr'))
-                    ybr = float(box.get('ybr'))
-
-                    # 计算相对位置和尺寸（0-1之间的比例）
-                    x_ratio = xtl / img_width
-                    y_ratio = ytl / img_height
-                    width_ratio = (xbr - xtl) / img_width
-                    height_ratio = (ybr - ytl) / img_height
-
-                    layout[label] = {
-                        'x': x_ratio,
-                        'y': y_ratio,
-                        'width': width_ratio,
-                        'height': height_ratio,
-                        # 保留原始像素坐标用于调试
-                        'xtl': xtl,
-                        'ytl': ytl,
-                        'xbr': xbr,
-                        'ybr': ybr
-                    }
-
-                return layout
+        # 按文件名在共享的标注索引中查找
+        annotation = annotation_index.get(reference_image_name)
+        if annotation is not None:
+            return layout_from_annotation(annotation)
 
         # 如果没有找到匹配的图片
         print(f"警告: 在 annotations.xml 中未找到图片 {reference_image_name}")
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { useNavigate } from 'react-router-dom';
+import { getStatus, watchStatus } from '../statusStream';
 
 function Wizard() {
   const navigate = useNavigate();
@@ -41,23 +42,23 @@ function Wizard() {
   }, []);
 
   const pollStatus = (callback) => {
-    const interval = setInterval(async () => {
-      try {
-        const res = await axios.get('/api/status');
-        if (res.data.id) {
-            setGenerationId(res.data.id);
-        }
-        if (res.data.completed) {
-          clearInterval(interval);
-          setLoading(false);
-          callback(res.data);
-        }
-      } catch (err) {
-        clearInterval(interval);
+    watchStatus((data) => {
+      if (data.id) {
+          setGenerationId(data.id);
+      }
+      if (data.completed) {
+        setLoading(false);
+        callback(data);
+        return true;
+      }
+      return false;
+    }, {
+      interval: 1000,
+      onError: (err) => {
         setLoading(false);
         console.error(err);
       }
-    }, 1000);
+    });
   };
 
   // Step 1: Data Selection
@@ -280,23 +281,21 @@ function Wizard() {
   };
 
   const pollDirectGenerateStatus = () => {
-      const interval = setInterval(async () => {
-          try {
-              const res = await axios.get('/api/status');
-              if (res.data.step === 'ai_direct_generate' && res.data.completed) {
-                  clearInterval(interval);
-                  setLoading(false);
-                  showDirectResult(res.data.result_image);
-              } else if (res.data.status === 'error') {
-                  clearInterval(interval);
-                  setLoading(false);
-                  alert('AI生成失败: ' + res.data.progress);
-              }
-          } catch (err) {
-              clearInterval(interval);
+      watchStatus((data) => {
+          if (data.step === 'ai_direct_generate' && data.completed) {
               setLoading(false);
+              showDirectResult(data.result_image);
+              return true;
+          } else if (data.status === 'error') {
+              setLoading(false);
+              alert('AI生成失败: ' + data.progress);
+              return true;
           }
-      }, 1000);
+          return false;
+      }, {
+          interval: 1000,
+          onError: () => setLoading(false)
+      });
   };
 
   const showDirectResult = (imagePath) => {
@@ -344,8 +343,8 @@ function Wizard() {
       // Backend `start_pictogram_generation` takes `title` (text).
       // We need to find the text corresponding to `selectedTitle`.
       // Let's fetch status again to be sure.
-      const statusRes = await axios.get('/api/status');
-      const options = statusRes.data.title_options;
+      const statusData = await getStatus();
+      const options = statusData.title_options;
       const text = options[selectedTitle]?.title_text || "Default Title";
       
       await axios.get(`/api/start_pictogram_generation/${encodeURIComponent(text)}`);
@@ -377,8 +376,8 @@ function Wizard() {
     setLoadingText('重新生成配图...');
     try {
         // Need title text again
-        const statusRes = await axios.get('/api/status');
-        const options = statusRes.data.title_options;
+        const statusData = await getStatus();
+        const options = statusData.title_options;
         const text = options[selectedTitle]?.title_text || "Default Title";
 
         await axios.get(`/api/regenerate_pictogram/${encodeURIComponent(text)}`);
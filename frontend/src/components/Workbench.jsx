@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
 import axios from 'axios';
 import { fabric } from 'fabric';
+import { getStatus, watchStatus, waitForStatusChange } from '../statusStream';
 import './Workbench.css';
 
 const CANVAS_MIN_WIDTH = 1200;
@@ -476,28 +477,26 @@ Generate a high-fidelity design that combines the *data* of the Original Image w
   };
 
   const pollStatus = (callback, targetStep, autoStopLoading = true) => {
-    const interval = setInterval(async () => {
-      try {
-        const res = await axios.get('/api/status');
-        const { completed, step } = res.data;
+    watchStatus((data) => {
+      const { completed, step } = data;
 
-        // If targetStep is provided, ensure we are in that step
-        if (targetStep && step !== targetStep) {
-            return;
-        }
+      // If targetStep is provided, ensure we are in that step
+      if (targetStep && step !== targetStep) {
+          return false;
+      }
 
-        if (completed) {
-          clearInterval(interval);
-          if (autoStopLoading) {
-            setLoading(false);
-          }
-          callback(res.data);
+      if (completed) {
+        if (autoStopLoading) {
+          setLoading(false);
         }
-      } catch (err) {
-        clearInterval(interval);
-        setLoading(false);
+        callback(data);
+        return true;
       }
-    }, 500);
+      return false;
+    }, {
+      interval: 500,
+      onError: () => setLoading(false)
+    });
   };
 
   // --- Logic: Chart Types ---
@@ -1304,8 +1303,8 @@ Generate a high-fidelity design that combines the *data* of the Original Image w
 
               // 即使使用 directUrl，也需要获取 layout 信息用于定位
               try {
-                  const statusRes = await axios.get('/api/status');
-                  const selectedReference = statusRes.data.selected_reference;
+                  const statusData = await getStatus();
+                  const selectedReference = statusData.selected_reference;
                   console.log('Fetched status, selected_reference:', selectedReference);
                   if (selectedReference) {
                       // 从后端获取 layout 信息
@@ -2287,13 +2286,14 @@ Generate a high-fidelity design that combines the *data* of the Original Image w
   };
   
   const pollRefinementStatus = async () => {
-      const maxAttempts = 120; // Max 2 minutes
-      let attempts = 0;
+      const deadline = Date.now() + 120 * 1000; // Max 2 minutes
+      let status = null;
 
-      while (attempts < maxAttempts) {
+      while (Date.now() < deadline) {
           try {
-              const response = await axios.get('/api/status');
-              const status = response.data;
+              if (!status) {
+                  status = await getStatus();
+              }
 
               // Update loading text with progress
               if (status.progress) {
@@ -2344,8 +2344,13 @@ Generate a high-fidelity design that combines the *data* of the Original Image w
               console.error('Status check failed:', error);
           }
 
-          await new Promise(resolve => setTimeout(resolve, 1000));
-          attempts++;
+          // 等待下一次状态推送（未连接推送时最多等待 1 秒后重新请求）
+          try {
+              status = await waitForStatusChange(1000);
+          } catch (error) {
+              console.error('Status check failed:', error);
+              status = null;
+          }
       }
 
       throw new Error('精修超时，请重试');
@@ -0,0 +1,141 @@
+import axios from 'axios';
+
+// 生成状态推送：通过 /api/status/stream (SSE) 接收增量事件并维护本地状态镜像，
+// 连接不可用时回退到轮询 /api/status。
+const EVENT_TYPES = ['step', 'progress', 'completed', 'artifact'];
+
+let source = null;
+let connected = false;
+let status = null;
+const listeners = new Set();
+const disconnectListeners = new Set();
+
+const notify = () => {
+  listeners.forEach((listener) => listener(status));
+};
+
+const connect = () => {
+  if (source || typeof EventSource === 'undefined') {
+    return;
+  }
+  source = new EventSource('/api/status/stream');
+
+  source.addEventListener('snapshot', (event) => {
+    status = JSON.parse(event.data).state;
+    connected = true;
+    notify();
+  });
+
+  const applyDelta = (event) => {
+    const delta = JSON.parse(event.data);
+    if (!status) {
+      return;
+    }
+    if (delta.deleted) {
+      const { [delta.key]: _removed, ...rest } = status;
+      status = rest;
+    } else if (!delta.omitted) {
+      status = { ...status, [delta.key]: delta.value };
+    }
+    notify();
+  };
+  EVENT_TYPES.forEach((type) => source.addEventListener(type, applyDelta));
+
+  source.onerror = () => {
+    // EventSource 会自动重连，重连成功后服务端重新发送 snapshot
+    if (connected) {
+      connected = false;
+      disconnectListeners.forEach((listener) => listener());
+    }
+  };
+};
+
+// 获取当前状态：推送连接正常时直接返回本地镜像，否则请求 /api/status
+export const getStatus = async () => {
+  connect();
+  if (connected && status) {
+    return status;
+  }
+  const res = await axios.get('/api/status');
+  return res.data;
+};
+
+// 监听状态变化，直到 onStatus 返回 true。
+// 与原来的轮询一样，第一次检查在 interval 之后进行；之后推送连接可用时由事件驱动，否则每 interval 轮询一次。
+// 返回停止监听的函数。
+export const watchStatus = (onStatus, { interval = 1000, onError } = {}) => {
+  connect();
+  let stopped = false;
+  let timer = null;
+
+  const handle = (current) => {
+    if (stopped || !current) {
+      return;
+    }
+    if (onStatus(current)) {
+      stop();
+    }
+  };
+
+  const unsubscribe = () => {
+    listeners.delete(handle);
+    disconnectListeners.delete(fallbackToPolling);
+  };
+
+  const stop = () => {
+    stopped = true;
+    clearTimeout(timer);
+    unsubscribe();
+  };
+
+  const fallbackToPolling = () => {
+    unsubscribe();
+    if (!stopped) {
+      timer = setTimeout(check, interval);
+    }
+  };
+
+  const check = async () => {
+    if (stopped) {
+      return;
+    }
+    if (connected && status) {
+      listeners.add(handle);
+      disconnectListeners.add(fallbackToPolling);
+      handle(status);
+      return;
+    }
+    try {
+      const res = await axios.get('/api/status');
+      handle(res.data);
+    } catch (err) {
+      stop();
+      if (onError) {
+        onError(err);
+      }
+      return;
+    }
+    if (!stopped) {
+      timer = setTimeout(check, interval);
+    }
+  };
+
+  timer = setTimeout(check, interval);
+  return stop;
+};
+
+// 等待下一次状态变化（最多 timeout 毫秒），返回最新状态
+export const waitForStatusChange = (timeout = 1000) => {
+  connect();
+  return new Promise((resolve) => {
+    const done = () => {
+      listeners.delete(done);
+      clearTimeout(timer);
+      resolve(getStatus());
+    };
+    const timer = setTimeout(done, timeout);
+    if (connected) {
+      listeners.add(done);
+    }
+  });
+};
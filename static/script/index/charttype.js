@@ -37,8 +37,7 @@ async function startChartTypeSelection() {
 // 检查状态并在完成后显示 chart types
 async function checkStatusForChartTypes() {
     try {
-        const response = await fetch('/api/status');
-        const status = await response.json();
+        const status = await fetchStatus();
 
         if (status.step === 'find_reference' && status.completed) {
             // 获取 templates 完成，显示 chart types
@@ -48,13 +47,13 @@ async function checkStatusForChartTypes() {
         } else if (status.status === 'processing') {
             // 继续轮询
             document.getElementById('loadingText').textContent = status.progress || '处理中...';
-            setTimeout(checkStatusForChartTypes, 500);
+            waitForStatusChange(500).then(checkStatusForChartTypes);
         } else if (status.status === 'error') {
             alert('处理失败: ' + status.progress);
             hideLoading();
             document.getElementById('nextStepBtn').disabled = false;
         } else {
-            setTimeout(checkStatusForChartTypes, 500);
+            waitForStatusChange(500).then(checkStatusForChartTypes);
         }
     } catch (error) {
         console.error('状态检查失败:', error);
@@ -128,13 +127,11 @@ async function showChartTypes() {
 
 // 等待预览图生成完成
 async function waitForPreviewsComplete() {
-    const maxAttempts = 60; // 最多等待30秒
-    let attempts = 0;
+    const deadline = Date.now() + 30000; // 最多等待30秒
 
-    while (attempts < maxAttempts) {
+    while (Date.now() < deadline) {
         try {
-            const response = await fetch('/api/status');
-            const status = await response.json();
+            const status = await fetchStatus();
 
             if (status.completed && (status.step === 'chart_type_preview' || status.step === 'variation_preview')) {
                 return true;
@@ -154,8 +151,7 @@ async function waitForPreviewsComplete() {
             console.error('检查状态失败:', error);
         }
 
-        await new Promise(resolve => setTimeout(resolve, 500));
-        attempts++;
+        await waitForStatusChange(500);
     }
 
     console.warn('等待预览生成超时');
@@ -621,8 +617,7 @@ async function selectReferenceAndStartTitleGeneration() {
 // 检查状态并在布局抽取完成后开始标题生成
 async function checkStatusForTitleGeneration() {
     try {
-        const response = await fetch('/api/status');
-        const status = await response.json();
+        const status = await fetchStatus();
 
         if (status.step === 'layout_extraction' && status.completed) {
             // 风格抽取完成，开始标题生成
@@ -631,12 +626,12 @@ async function checkStatusForTitleGeneration() {
         } else if (status.status === 'processing') {
             // 继续轮询
             document.getElementById('loadingText').textContent = status.progress || '处理中...';
-            setTimeout(checkStatusForTitleGeneration, 500);
+            waitForStatusChange(500).then(checkStatusForTitleGeneration);
         } else if (status.status === 'error') {
             alert('处理失败: ' + status.progress);
             hideLoading();
         } else {
-            setTimeout(checkStatusForTitleGeneration, 500);
+            waitForStatusChange(500).then(checkStatusForTitleGeneration);
         }
     } catch (error) {
         console.error('状态检查失败:', error);
@@ -743,8 +738,7 @@ async function directGenerateWithAI() {
 // 检查AI直接生成状态
 async function checkDirectGenerateStatus() {
     try {
-        const response = await fetch('/api/status');
-        const status = await response.json();
+        const status = await fetchStatus();
 
         if (status.step === 'ai_direct_generate' && status.completed) {
             // 生成完成
@@ -753,13 +747,13 @@ async function checkDirectGenerateStatus() {
         } else if (status.status === 'processing') {
             // 继续轮询
             document.getElementById('loadingText').textContent = status.progress || 'AI生成中...';
-            setTimeout(checkDirectGenerateStatus, 1000);
+            waitForStatusChange(1000).then(checkDirectGenerateStatus);
         } else if (status.status === 'error') {
             alert('AI生成失败: ' + status.progress);
             hideLoading();
             document.getElementById('selectReferenceBtn').disabled = false;
         } else {
-            setTimeout(checkDirectGenerateStatus, 1000);
+            waitForStatusChange(1000).then(checkDirectGenerateStatus);
         }
     } catch (error) {
         console.error('状态检查失败:', error);
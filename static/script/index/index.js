@@ -188,8 +188,7 @@ async function generateFinalInfographic() {
 // 检查最终生成状态
 async function checkFinalGenerationStatus() {
     try {
-        const response = await fetch('/api/status');
-        const status = await response.json();
+        const status = await fetchStatus();
         
         document.getElementById('loadingText').textContent = status.progress || '处理中...';
         
@@ -201,7 +200,7 @@ async function checkFinalGenerationStatus() {
             }, 500);
         } else if (status.status === 'processing') {
             // 继续轮询
-            setTimeout(checkFinalGenerationStatus, 500);
+            waitForStatusChange(500).then(checkFinalGenerationStatus);
         } else {
             hideLoading();
         }
@@ -56,8 +56,7 @@ async function regeneratePictogram() {
 // 显示配图选择（3选1版本）
 async function showPictogramSelection() {
     try {
-        const response = await fetch(`/api/status`);
-        const status = await response.json();
+        const status = await fetchStatus();
 
         const pictogramOptions = status.pictogram_options || {};
         const pictogramKeys = Object.keys(pictogramOptions);
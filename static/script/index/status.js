@@ -1,8 +1,7 @@
 // 检查布局抽取状态
 async function checkStatus() {
     try {
-        const response = await fetch('/api/status');
-        const status = await response.json();
+        const status = await fetchStatus();
         
         document.getElementById('loadingText').textContent = status.progress || '处理中...';
         
@@ -29,7 +28,7 @@ async function checkStatus() {
         } 
         else if (status.status === 'processing') {
             // 继续轮询
-            setTimeout(checkStatus, 500);
+            waitForStatusChange(500).then(checkStatus);
         } else {
             hideLoading();
         }
@@ -0,0 +1,74 @@
+// 生成状态推送：通过 /api/status/stream (SSE) 接收增量事件并维护本地状态镜像，
+// 推送连接不可用时回退到请求 /api/status。
+const statusStream = {
+    source: null,
+    connected: false,
+    status: null,
+    listeners: new Set()
+};
+
+function connectStatusStream() {
+    if (statusStream.source || typeof EventSource === 'undefined') {
+        return;
+    }
+    const source = new EventSource('/api/status/stream');
+    statusStream.source = source;
+
+    const notify = () => {
+        statusStream.listeners.forEach(listener => listener(statusStream.status));
+    };
+
+    source.addEventListener('snapshot', event => {
+        statusStream.status = JSON.parse(event.data).state;
+        statusStream.connected = true;
+        notify();
+    });
+
+    const applyDelta = event => {
+        const delta = JSON.parse(event.data);
+        if (!statusStream.status) {
+            return;
+        }
+        if (delta.deleted) {
+            delete statusStream.status[delta.key];
+        } else if (!delta.omitted) {
+            statusStream.status[delta.key] = delta.value;
+        }
+        notify();
+    };
+    ['step', 'progress', 'completed', 'artifact'].forEach(type => source.addEventListener(type, applyDelta));
+
+    // EventSource 会自动重连，重连成功后服务端重新发送 snapshot
+    source.onerror = () => {
+        statusStream.connected = false;
+    };
+}
+
+// 获取当前生成状态：推送连接正常时直接返回本地镜像，否则请求 /api/status
+async function fetchStatus() {
+    connectStatusStream();
+    if (statusStream.connected && statusStream.status) {
+        return statusStream.status;
+    }
+    const response = await fetch('/api/status');
+    return await response.json();
+}
+
+// 等待下一次状态变化，最多等待 timeout 毫秒
+function waitForStatusChange(timeout) {
+    connectStatusStream();
+    return new Promise(resolve => {
+        let timer = null;
+        const done = () => {
+            statusStream.listeners.delete(done);
+            clearTimeout(timer);
+            resolve();
+        };
+        timer = setTimeout(done, timeout);
+        if (statusStream.connected) {
+            statusStream.listeners.add(done);
+        }
+    });
+}
+
+connectStatusStream();
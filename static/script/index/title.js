@@ -57,8 +57,7 @@ async function regenerateTitle() {
 // 显示标题选择（3选1版本）
 async function showTitleSelection() {
     try {
-        const response = await fetch(`/api/status`);
-        const status = await response.json();
+        const status = await fetchStatus();
 
         const titleOptions = status.title_options || {};
         const titleKeys = Object.keys(titleOptions);
@@ -135,8 +134,7 @@ function setupTitleSelection() {
 // 获取并显示标题文字
 async function fetchAndDisplayTitleText() {
     try {
-        const response = await fetch('/api/status');
-        const status = await response.json();
+        const status = await fetchStatus();
 
         const titleTextDisplay = document.getElementById('titleTextDisplay');
         if (status.current_title_text) {
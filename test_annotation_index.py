@@ -0,0 +1,64 @@
+"""
+测试 annotations.xml 索引：整树解析和流式解析结果一致、同名取第一个、文件修改后重建
+"""
+
+import os
+import sys
+import time
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from chart_modules.annotation_index import AnnotationIndex
+
+ANNOTATIONS = """<?xml version="1.0" encoding="utf-8"?>
+<annotations>
+  <version>1.1</version>
+  <image id="0" name="Art-Origin.png" width="800" height="1200">
+    <box label="title" xtl="40.0" ytl="20.5" xbr="760.0" ybr="180.0"></box>
+    <box label="chart" xtl="40.0" ytl="300.0" xbr="760.0" ybr="1100.0"></box>
+  </image>
+  <image id="1" name="Space-Origin.png" width="1000" height="1000">
+    <box label="image" xtl="10" ytl="10" xbr="300" ybr="300"></box>
+  </image>
+  <image id="2" name="Art-Origin.png" width="1" height="1"></image>
+</annotations>
+"""
+
+
+def test_annotation_index():
+    print("=" * 60)
+    print("测试标注索引")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'annotations.xml')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(ANNOTATIONS)
+
+        tree_index = AnnotationIndex(path)
+        streaming_index = AnnotationIndex(path, iterparse_threshold=0)
+        assert tree_index.records() == streaming_index.records()
+
+        art = tree_index.get('Art-Origin.png')
+        assert art['width'] == 800.0 and art['height'] == 1200.0
+        assert [box['label'] for box in art['boxes']] == ['title', 'chart']
+        assert art['boxes'][0]['ytl'] == 20.5
+        assert tree_index.get('Missing.png') is None
+
+        # 文件修改后重建
+        time.sleep(0.01)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(ANNOTATIONS.replace('Space-Origin.png', 'Ocean-Origin.png'))
+        for index in (tree_index, streaming_index):
+            assert index.get('Space-Origin.png') is None
+            assert index.get('Ocean-Origin.png')['boxes'][0]['label'] == 'image'
+
+        os.remove(path)
+        assert not tree_index.exists()
+        assert tree_index.get('Art-Origin.png') is None
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_annotation_index()
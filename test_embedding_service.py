@@ -0,0 +1,102 @@
+"""
+测试共享 embedding 服务：并发请求合并为批量调用、重复文本不重复编码、float16 向量缓存持久化
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chart_modules', 'ChartPipeline'))
+
+from utils.embedding_service import EmbeddingService, VectorStore
+
+
+class FakeModel:
+    """按文本内容生成确定性向量，记录每次 encode 的文本"""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def encode(self, texts, **kwargs):
+        with self.lock:
+            self.calls.append(list(texts))
+        return np.stack([np.random.default_rng(abs(hash(text)) % (2 ** 32)).standard_normal(self.dim)
+                         for text in texts]).astype(np.float32)
+
+
+def test_embedding_service_batching_and_cache():
+    print("=" * 60)
+    print("测试 embedding 服务批量编码与缓存")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = FakeModel()
+        service = EmbeddingService(cache_dir=tmp, batch_window_ms=50, max_batch_size=64, model=model, model_name='fake')
+
+        # 单个字符串返回一维向量，列表返回二维数组，与 SentenceTransformer.encode 一致
+        single = service.encode('China')
+        assert single.shape == (model.dim,) and single.dtype == np.float32
+        batch = service.encode(['China', 'Japan', 'China'])
+        assert batch.shape == (3, model.dim)
+        assert np.array_equal(batch[0], single) and np.array_equal(batch[2], single)
+        assert model.calls == [['China'], ['Japan']]
+
+        # 并发的单条请求在批量窗口内合并为少量模型调用
+        model.calls.clear()
+        results = {}
+        barrier = threading.Barrier(16)
+
+        def worker(i):
+            barrier.wait()
+            results[i] = service.encode(f'value {i}')
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sum(len(call) for call in model.calls) == 16
+        assert len(model.calls) < 16
+        print(f"16 个并发请求合并为 {len(model.calls)} 次模型调用")
+
+        # 新的服务实例（模拟进程重启）从持久化缓存读取，不再调用模型
+        other_model = FakeModel()
+        restarted = EmbeddingService(cache_dir=tmp, model=other_model, model_name='fake')
+        assert np.array_equal(restarted.encode(['value 3', 'Japan'])[0], results[3])
+        assert other_model.calls == []
+        assert len(restarted.store) == 18
+
+        # 其他模型的缓存不复用
+        assert VectorStore(os.path.join(tmp, 'fake'), 'another-model').get_many([b'x' * 16]) == [None]
+
+    print("\n✅ 测试通过！")
+
+
+def test_vector_store_growth():
+    print("=" * 60)
+    print("测试向量缓存扩容")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(tmp, 'fake')
+        keys = [i.to_bytes(16, 'big') for i in range(3000)]
+        vectors = np.arange(3000 * 4, dtype=np.float16).reshape(3000, 4) % 1000
+        store.put_many(keys[:1000], vectors[:1000])
+        store.put_many(keys, vectors)   # 前 1000 个已存在，只追加剩余部分
+        assert len(store) == 3000
+
+        reopened = VectorStore(tmp, 'fake')
+        fetched = reopened.get_many([keys[0], keys[2999], b'\xff' * 16])
+        assert np.array_equal(fetched[0], vectors[0])
+        assert np.array_equal(fetched[1], vectors[2999])
+        assert fetched[2] is None
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_embedding_service_batching_and_cache()
+    test_vector_store_growth()
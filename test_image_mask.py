@@ -0,0 +1,174 @@
+"""
+测试图片 mask 缓存：一次全分辨率渲染重采样得到的 mask 与直接按尺寸渲染的 calculate_mask 相近，
+缓存键包含尺寸和二值化参数，不同尺寸共用同一次渲染，缓存的 mask 只读
+"""
+
+import io
+import os
+import re
+import sys
+import base64
+from contextlib import contextmanager
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chart_modules', 'ChartPipeline'))
+
+from modules.infographics_generator import image_utils, rasterizer
+from modules.infographics_generator.rasterizer import SvgRasterizer, CairoSvgRasterizer, register_rasterizer
+from modules.infographics_generator.image_utils import get_image_mask
+from modules.infographics_generator.mask_utils import calculate_mask
+
+# 重采样和直接渲染的 mask 允许的差异（只出现在图形边缘的分块上）
+MAX_DIFF_RATIO = 0.03
+
+
+class DataUriImageRasterizer(SvgRasterizer):
+    """测试用后端：只支持单个 <image href="data:..."> 铺满画布的 SVG，用 PIL 缩放后叠加到背景色上"""
+
+    name = 'test-data-uri-image'
+
+    def __init__(self):
+        self.calls = 0
+
+    def render_png(self, svg_content, background_color=None, dpi=300):
+        self.calls += 1
+        width = int(re.search(r'<svg[^>]*\swidth="(\d+)"', svg_content).group(1))
+        height = int(re.search(r'<svg[^>]*\sheight="(\d+)"', svg_content).group(1))
+        data = re.search(r'href="data:image/png;base64,([^"]+)"', svg_content).group(1)
+        image = Image.open(io.BytesIO(base64.b64decode(data))).convert('RGBA').resize((width, height), Image.BILINEAR)
+        canvas = Image.new('RGBA', (width, height), background_color or (0, 0, 0, 0))
+        canvas.alpha_composite(image)
+        buffer = io.BytesIO()
+        canvas.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+
+def _pictogram_data_uri(body_color=(30, 60, 120, 255)):
+    """透明背景上的人形图标（圆形头部 + 身体 + 细线），编码为 data URI"""
+    image = Image.new('RGBA', (256, 256), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((88, 16, 168, 96), fill=body_color)
+    draw.rounded_rectangle((72, 104, 184, 200), radius=24, fill=body_color)
+    draw.rectangle((84, 200, 116, 248), fill=(200, 80, 40, 255))
+    draw.rectangle((140, 200, 172, 248), fill=(200, 80, 40, 255))
+    draw.line((20, 140, 72, 120), fill=body_color, width=6)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def _direct_mask(image_content, size, grid_size=5, bg_threshold=240):
+    svg = f"""<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{size}" height="{size}">
+            <image width="{size}" height="{size}" href="{image_content}"/>
+        </svg>"""
+    return calculate_mask(svg, size, size, 0, grid_size=grid_size, bg_threshold=bg_threshold)
+
+
+@contextmanager
+def _use_backend(name):
+    """切换默认光栅化后端（test-data-uri-image 时注册测试后端），并清空图片缓存"""
+    previous = rasterizer._backend_name
+    backend = None
+    if name == DataUriImageRasterizer.name:
+        backend = DataUriImageRasterizer()
+        register_rasterizer(backend)
+    rasterizer.set_rasterizer_backend(name)
+    image_utils._image_base_cache.clear()
+    image_utils._image_mask_cache.clear()
+    try:
+        yield backend
+    finally:
+        rasterizer.set_rasterizer_backend(previous)
+        rasterizer._BACKENDS.pop(DataUriImageRasterizer.name, None)
+        image_utils._image_base_cache.clear()
+        image_utils._image_mask_cache.clear()
+
+
+def _check_close_to_direct_render(backend_name):
+    image_content = _pictogram_data_uri()
+    with _use_backend(backend_name):
+        for size in [120, 333]:
+            cached = get_image_mask(image_content, size, grid_size=5, bg_threshold=240)
+            direct = _direct_mask(image_content, size)
+            assert cached.shape == direct.shape == (size, size)
+            diff_ratio = np.mean(cached != direct)
+            print(f"{backend_name} size={size}: 差异比例 {diff_ratio:.4f}")
+            assert diff_ratio < MAX_DIFF_RATIO
+            # 两者的内容面积相近
+            assert abs(int(cached.sum()) - int(direct.sum())) / direct.sum() < 0.1
+
+
+def test_image_mask_close_to_direct_render():
+    """重采样得到的 mask 与按目标尺寸直接渲染的 calculate_mask 只在图形边缘有少量差异"""
+    print("=" * 60)
+    print("测试图片 mask 与直接渲染一致")
+    print("=" * 60)
+
+    _check_close_to_direct_render(DataUriImageRasterizer.name)
+
+    print("\n✅ 测试通过！")
+
+
+@pytest.mark.skipif(not CairoSvgRasterizer().is_available(), reason="cairosvg 不可用")
+def test_image_mask_close_to_direct_render_cairosvg():
+    """同上，使用默认的 cairosvg 后端"""
+    print("=" * 60)
+    print("测试图片 mask 与直接渲染一致（cairosvg）")
+    print("=" * 60)
+
+    _check_close_to_direct_render('cairosvg')
+
+    print("\n✅ 测试通过！")
+
+
+def test_image_mask_cache():
+    """相同参数命中缓存；不同尺寸共用一次全分辨率渲染；超过基础分辨率时重新渲染；mask 只读"""
+    print("=" * 60)
+    print("测试图片 mask 缓存")
+    print("=" * 60)
+
+    with _use_backend(DataUriImageRasterizer.name) as backend:
+        _check_mask_cache(backend)
+
+    print("\n✅ 测试通过！")
+
+
+def _check_mask_cache(backend):
+    image_content = _pictogram_data_uri()
+    first = get_image_mask(image_content, 120, grid_size=5, bg_threshold=240)
+    assert backend.calls == 1
+    # 第二次调用命中缓存，返回同一个只读数组
+    assert get_image_mask(image_content, 120, grid_size=5, bg_threshold=240) is first
+    assert backend.calls == 1
+    with pytest.raises(ValueError):
+        first[0, 0] = 1
+
+    # 其他尺寸和参数：新的缓存项，但不重新渲染
+    other_size = get_image_mask(image_content, 333, grid_size=5, bg_threshold=240)
+    expanded = get_image_mask(image_content, 120, grid_size=5, bg_threshold=240, expand=10)
+    threshold = get_image_mask(image_content, 120, grid_size=5, bg_threshold=200)
+    assert other_size.shape == (333, 333) and expanded is not first and threshold is not first
+    assert expanded.sum() > first.sum()
+    assert backend.calls == 1
+    assert len(image_utils._image_mask_cache) == 4 and len(image_utils._image_base_cache) == 1
+
+    # 不同的图片内容使用不同的缓存键
+    other_image = _pictogram_data_uri(body_color=(120, 30, 60, 255))
+    assert get_image_mask(other_image, 120, grid_size=5, bg_threshold=240) is not first
+    assert backend.calls == 2
+
+    # 超过已缓存的基础分辨率时按更大尺寸重新渲染，之后较小尺寸复用它
+    large = image_utils.IMAGE_MASK_BASE_SIZE + 100
+    get_image_mask(image_content, large, grid_size=5, bg_threshold=240)
+    assert backend.calls == 3
+    assert image_utils._image_base_cache[next(reversed(image_utils._image_base_cache))].shape[0] == large
+    get_image_mask(image_content, 250, grid_size=5, bg_threshold=240)
+    assert backend.calls == 3
+
+
+if __name__ == "__main__":
+    test_image_mask_close_to_direct_render()
+    if CairoSvgRasterizer().is_available():
+        test_image_mask_close_to_direct_render_cairosvg()
+    test_image_mask_cache()
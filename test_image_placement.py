@@ -0,0 +1,278 @@
+"""
+测试图片放置搜索：dilated_downsample / sliding_overlap 与原逐格循环结果一致，
+find_best_size_and_position 在 side / background / overlay 模式下与原逐位置扫描选出相同尺寸，
+且按文档规则选出的位置不比原扫描差
+"""
+
+import os
+import sys
+import numpy as np
+from unittest import mock
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chart_modules', 'ChartPipeline'))
+
+from modules.infographics_generator import image_utils
+from modules.infographics_generator.image_utils import (dilated_downsample, sliding_overlap, _first_best_index,
+                                                        find_best_size_and_position)
+from modules.infographics_generator.mask_utils import expand_mask
+
+GRID_SIZE = 5
+THRESHOLDS = {'side': 0.01, 'background': 0.05, 'overlay': 0.97}
+
+
+def dilated_downsample_reference(mask, grid_size):
+    """原 find_best_size_and_position 中的逐格降采样循环"""
+    h, w = mask.shape
+    downsampled = np.zeros((h // grid_size, w // grid_size), dtype=np.uint8)
+    for i in range(h // grid_size):
+        for j in range(w // grid_size):
+            grid = mask[max(0, (i - 1) * grid_size):min((i + 2) * grid_size, h),
+                        max(0, (j - 1) * grid_size):min((j + 2) * grid_size, w)]
+            downsampled[i, j] = 1 if np.any(grid == 1) else 0
+    return downsampled
+
+
+def _random_mask(rng, shape, rectangles=4):
+    mask = np.zeros(shape, dtype=np.uint8)
+    for _ in range(rectangles):
+        y, x = rng.integers(0, shape[0]), rng.integers(0, shape[1])
+        mask[y:y + rng.integers(1, shape[0] // 3 + 2), x:x + rng.integers(1, shape[1] // 3 + 2)] = 1
+    return mask
+
+
+def _pictogram_mask(size, grid_size=GRID_SIZE, bg_threshold=240, expand=0):
+    """测试用图片 mask：内切圆盘，代替渲染 data URI 图片"""
+    yy, xx = np.mgrid[0:size, 0:size]
+    radius = size * 0.4
+    mask = (((yy - size / 2) ** 2 + (xx - size / 2) ** 2) <= radius ** 2).astype(np.uint8)
+    if expand > 0:
+        mask = expand_mask(mask, expand)
+    return mask
+
+
+def _reference_search(main_mask, padding, mode, chart_bbox=None, avoid_mask=None):
+    """
+    原 find_best_size_and_position 的二分查找 + 逐位置贪心扫描（图片 mask 由 _pictogram_mask 提供）
+
+    Returns:
+        (image_size, best_x, best_y)，以及最后一个成功尺寸下所有可接受位置的集合（降采样坐标）
+    """
+    grid_size = GRID_SIZE
+    h, w = main_mask.shape
+    downsampled_h, downsampled_w = h // grid_size, w // grid_size
+    downsampled_main = dilated_downsample_reference(main_mask, grid_size)
+    downsampled_avoid = dilated_downsample_reference(avoid_mask, grid_size) if avoid_mask is not None else None
+    downsampled_padding = max(1, padding // grid_size)
+    min_size = max(1, 64 // grid_size)
+    max_size = int(min(downsampled_main.shape))
+    best_size, best_x, best_y = min_size, downsampled_padding, downsampled_padding
+    best_overlap_ratio = 0 if mode == "overlay" else float('inf')
+    overlap_threshold = THRESHOLDS[mode]
+    best_acceptable = None
+
+    while max_size - min_size >= 2:
+        mid_size = (min_size + max_size) // 2
+        image_mask = _pictogram_mask(mid_size * grid_size, expand=10 if mode == "background" else 0)
+        downsampled_image = dilated_downsample_reference(image_mask, grid_size)
+        if mode == "background" and chart_bbox is not None:
+            chart_x = max(0, chart_bbox["x"] // grid_size)
+            chart_y = max(0, chart_bbox["y"] // grid_size)
+            chart_width = min(chart_bbox["width"] // grid_size, downsampled_w - chart_x)
+            chart_height = min(chart_bbox["height"] // grid_size, downsampled_h - chart_y)
+            y_range = chart_height - mid_size - downsampled_padding * 2
+            x_range = chart_width - mid_size - downsampled_padding * 2
+        else:
+            y_range = downsampled_h - mid_size - downsampled_padding * 2
+            x_range = downsampled_w - mid_size - downsampled_padding * 2
+        if y_range <= 0 or x_range <= 0:
+            max_size = mid_size - 1
+            continue
+
+        min_overlap = 0 if mode == "overlay" else float('inf')
+        current_x = current_y = downsampled_padding
+        min_distance = float('inf')
+        mask_center_x = np.mean(np.where(downsampled_main == 1)[1]) if np.any(downsampled_main == 1) else downsampled_w // 2
+        mask_center_y = np.mean(np.where(downsampled_main == 1)[0]) if np.any(downsampled_main == 1) else downsampled_h // 2
+        if mode == "background" and chart_bbox is not None:
+            y_start, y_end = chart_y + downsampled_padding, chart_y + chart_height - mid_size - downsampled_padding + 1
+            x_start, x_end = chart_x + downsampled_padding, chart_x + chart_width - mid_size - downsampled_padding + 1
+        else:
+            y_start, y_end = downsampled_padding, downsampled_h - mid_size - downsampled_padding + 1
+            x_start, x_end = downsampled_padding, downsampled_w - mid_size - downsampled_padding + 1
+
+        acceptable = {}
+        for y in range(y_start, y_end):
+            for x in range(x_start, x_end):
+                region = downsampled_main[y:y + mid_size, x:x + mid_size]
+                overlap = np.sum((region == 1) & (downsampled_image == 1))
+                total = np.sum(downsampled_image == 1)
+                overlap_ratio = overlap / total if total > 0 else 1.0
+                avoid_overlap = 0
+                if downsampled_avoid is not None:
+                    avoid_overlap = np.sum((downsampled_avoid[y:y + mid_size, x:x + mid_size] == 1) & (downsampled_image == 1))
+                if mode == "side" or mode == "background":
+                    distance_to_border = min(x - (x_start), (x_end - 1) - x, y - y_start, (y_end - 1) - y)
+                    if overlap_ratio < overlap_threshold:
+                        acceptable[(x, y)] = distance_to_border
+                    if overlap_ratio < min_overlap or (overlap_ratio < overlap_threshold and distance_to_border < min_distance):
+                        min_overlap, current_x, current_y, min_distance = overlap_ratio, x, y, distance_to_border
+                else:
+                    if avoid_overlap > 0:
+                        continue
+                    distance_to_center = np.sqrt((x + mid_size / 2 - mask_center_x) ** 2 + (y + mid_size / 2 - mask_center_y) ** 2)
+                    if overlap_ratio > overlap_threshold:
+                        acceptable[(x, y)] = distance_to_center
+                    if overlap_ratio > min_overlap or (overlap_ratio > overlap_threshold and distance_to_center < min_distance):
+                        min_overlap, current_x, current_y, min_distance = overlap_ratio, x, y, distance_to_center
+
+        succeeded = min_overlap > overlap_threshold if mode == "overlay" else min_overlap < overlap_threshold
+        if succeeded:
+            best_size, best_overlap_ratio, best_x, best_y = mid_size, min_overlap, current_x, current_y
+            best_acceptable = acceptable
+            min_size = mid_size + 1
+        else:
+            max_size = mid_size - 1
+
+    if mode == "overlay":
+        failed = best_overlap_ratio < overlap_threshold
+    else:
+        failed = best_overlap_ratio > overlap_threshold
+    if failed:
+        return (0, 0, 0), None
+    return (best_size * grid_size, best_x * grid_size, best_y * grid_size), best_acceptable
+
+
+def test_dilated_downsample_matches_loop():
+    """随机 mask 上与原逐格循环逐位一致，包括尺寸不是 grid 整数倍的情况"""
+    print("=" * 60)
+    print("测试 dilated_downsample 一致性")
+    print("=" * 60)
+
+    rng = np.random.default_rng(0)
+    for shape in [(5, 5), (9, 14), (23, 17), (100, 100), (101, 64), (64, 203)]:
+        for grid_size in [1, 3, 5]:
+            for density in [0.0, 0.01, 0.3]:
+                mask = (rng.random(shape) < density).astype(np.uint8)
+                expected = dilated_downsample_reference(mask, grid_size)
+                actual = dilated_downsample(mask, grid_size)
+                assert actual.shape == expected.shape
+                assert np.array_equal(actual, expected), f"shape={shape}, grid_size={grid_size}, density={density}"
+
+    print("\n✅ 测试通过！")
+
+
+def test_sliding_overlap_matches_loop():
+    """FFT 计算的重叠像素数与逐位置求和一致"""
+    print("=" * 60)
+    print("测试 sliding_overlap 一致性")
+    print("=" * 60)
+
+    rng = np.random.default_rng(1)
+    for shape, kernel_shape in [((20, 30), (5, 5)), ((41, 37), (12, 12)), ((16, 16), (16, 16))]:
+        mask = rng.random(shape) < 0.4
+        kernel = rng.random(kernel_shape) < 0.6
+        result = sliding_overlap(mask, kernel)
+        assert result.shape == (shape[0] - kernel_shape[0] + 1, shape[1] - kernel_shape[1] + 1)
+        for y in range(result.shape[0]):
+            for x in range(result.shape[1]):
+                expected = np.sum(mask[y:y + kernel_shape[0], x:x + kernel_shape[1]] & kernel)
+                assert result[y, x] == expected
+
+    # 平局按行优先顺序取第一个
+    valid = np.array([[False, True, True], [True, True, False]])
+    primary = np.array([[0, 1, 1], [1, 1, 0]])
+    secondary = np.zeros((2, 3))
+    assert _first_best_index(valid, primary, secondary) == (0, 1)
+    secondary[0, 1] = 1
+    assert _first_best_index(valid, primary, secondary) == (0, 2)
+
+    print("\n✅ 测试通过！")
+
+
+def _downsampled_position(result):
+    size, x, y = result
+    return size // GRID_SIZE, x // GRID_SIZE, y // GRID_SIZE
+
+
+def test_find_best_size_and_position_matches_scan():
+    """side / background / overlay：与原扫描选出相同尺寸，位置可接受且按文档规则不比原扫描差"""
+    print("=" * 60)
+    print("测试 find_best_size_and_position 与原扫描一致")
+    print("=" * 60)
+
+    rng = np.random.default_rng(2)
+    cases = []
+    for shape in [(303, 247), (240, 320), (200, 200)]:
+        for _ in range(3):
+            main_mask = _random_mask(rng, shape, rectangles=rng.integers(1, 5))
+            cases.append(('side', main_mask, None, None))
+            chart_bbox = {'x': 20, 'y': 15, 'width': shape[1] - 30, 'height': shape[0] - 25}
+            cases.append(('background', main_mask, chart_bbox, None))
+            overlay_main = np.zeros(shape, dtype=np.uint8)
+            overlay_main[30:shape[0] - 30, 25:shape[1] - 40] = 1
+            avoid_mask = _random_mask(rng, shape, rectangles=1) if rng.random() < 0.6 else None
+            cases.append(('overlay', overlay_main, None, avoid_mask))
+
+    outcomes = {'side': 0, 'background': 0, 'overlay': 0}
+    with mock.patch.object(image_utils, 'get_image_mask', lambda content, size, **kwargs: _pictogram_mask(size, **kwargs)):
+        for mode, main_mask, chart_bbox, avoid_mask in cases:
+            actual = find_best_size_and_position(main_mask, 'pictogram', 10, mode=mode, chart_bbox=chart_bbox,
+                                                 avoid_mask=avoid_mask)
+            expected, acceptable = _reference_search(main_mask, 10, mode, chart_bbox=chart_bbox, avoid_mask=avoid_mask)
+            # 二分查找的每一步成功与否不变，最终尺寸相同
+            assert actual[0] == expected[0], (mode, actual, expected)
+            if expected[0] == 0:
+                assert actual == (0, 0, 0)
+                continue
+            outcomes[mode] += 1
+            _, x, y = _downsampled_position(actual)
+            _, old_x, old_y = _downsampled_position(expected)
+            # 新位置满足阈值（overlay 还不与 avoid_mask 重叠），且离边界 / 内容中心不比原扫描选出的位置远
+            assert (x, y) in acceptable, (mode, actual, expected)
+            assert acceptable[(x, y)] <= acceptable[(old_x, old_y)] + 1e-9, (mode, actual, expected)
+            assert acceptable[(x, y)] == min(acceptable.values())
+    # 每种模式都覆盖了找到位置的情况
+    assert all(count > 0 for count in outcomes.values()), outcomes
+
+    print("\n✅ 测试通过！")
+
+
+def test_find_best_size_and_position_modes():
+    """确定性场景：side 放在空白处，background 不超出图表区域，overlay 放在内容上且避开 avoid_mask"""
+    print("=" * 60)
+    print("测试 find_best_size_and_position 各模式")
+    print("=" * 60)
+
+    with mock.patch.object(image_utils, 'get_image_mask', lambda content, size, **kwargs: _pictogram_mask(size, **kwargs)):
+        # 内容只在左半边：side 放在右半边（图片四周有空白，可以略微伸入内容区域）
+        main_mask = np.zeros((300, 400), dtype=np.uint8)
+        main_mask[20:280, 20:180] = 1
+        size, x, y = find_best_size_and_position(main_mask, 'pictogram', 10, mode='side')
+        assert size >= 150 and x + size // 2 > 180
+        placed = _pictogram_mask(size)
+        assert np.sum(placed & main_mask[y:y + size, x:x + size]) / np.sum(placed) < THRESHOLDS['side']
+
+        # 内容占满画布：side 找不到位置
+        assert find_best_size_and_position(np.ones((300, 400), dtype=np.uint8), 'pictogram', 10, mode='side') == (0, 0, 0)
+
+        # background 限制在 chart_bbox 内
+        chart_bbox = {'x': 200, 'y': 0, 'width': 200, 'height': 300}
+        size, x, y = find_best_size_and_position(main_mask, 'pictogram', 10, mode='background', chart_bbox=chart_bbox)
+        assert size > 0 and x >= 200 and x + size <= 400 and y + size <= 300
+
+        # overlay 放在内容上，不与 avoid_mask 重叠
+        avoid_mask = np.zeros_like(main_mask)
+        avoid_mask[20:120, 20:180] = 1
+        size, x, y = find_best_size_and_position(main_mask, 'pictogram', 10, mode='overlay', avoid_mask=avoid_mask)
+        assert size > 0
+        placed = _pictogram_mask(size)
+        assert np.sum(placed & main_mask[y:y + size, x:x + size]) / np.sum(placed) > THRESHOLDS['overlay']
+        assert not np.any(placed & avoid_mask[y:y + size, x:x + size])
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_dilated_downsample_matches_loop()
+    test_sliding_overlap_matches_loop()
+    test_find_best_size_and_position_matches_scan()
+    test_find_best_size_and_position_modes()
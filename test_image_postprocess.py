@@ -0,0 +1,99 @@
+"""
+测试 image_postprocess：向量化的白色转透明、斑点去除和背景色裁剪与原逐像素实现结果一致，并对比耗时
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import cv2
+from PIL import Image
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from chart_modules.image_postprocess import clean_generated_image, content_bbox, dominant_color
+
+
+def clean_generated_image_reference(image):
+    """原 InfographicImageGenerator.generate_image 中的逐像素实现，作为对照"""
+    image = image.convert('RGBA')
+    new_data = []
+    for item in image.getdata():
+        if item[0] > 235 and item[1] > 235 and item[2] > 235:
+            new_data.append((255, 255, 255, 0))
+        else:
+            new_data.append(item)
+    image.putdata(new_data)
+
+    img_array = np.array(image)
+    mask = (img_array[:, :, 3] > 0).astype(np.uint8)
+    num_labels, labels = cv2.connectedComponents(mask)
+    for label in range(1, num_labels):
+        area = np.sum(labels == label)
+        if area < 20:
+            img_array[labels == label] = [255, 255, 255, 0]
+    return Image.fromarray(img_array)
+
+
+def content_bbox_reference(image, background_color, tolerance):
+    """原 crop_image.crop 中的逐像素实现，作为对照"""
+    img = image.convert('RGBA')
+    new_datas = []
+    for item in img.getdata():
+        if all(abs(item[c] - background_color[c]) <= tolerance for c in range(3)):
+            new_datas.append((0, 0, 0, 0))
+        else:
+            new_datas.append(item)
+    img.putdata(new_datas)
+    return img.getbbox()
+
+
+def _sample_image(size=256, seed=0):
+    """白色背景上的色块和随机斑点"""
+    rng = np.random.default_rng(seed)
+    data = np.full((size, size, 4), 255, dtype=np.uint8)
+    data[size // 4: size // 2, size // 4: size // 2, :3] = [200, 60, 40]
+    data[size // 2: size * 3 // 4, size // 8: size // 3, :3] = rng.integers(0, 240, (size // 4, size // 3 - size // 8, 3))
+    for y, x in rng.integers(0, size, (200, 2)):
+        data[y, x, :3] = rng.integers(0, 255, 3)
+    data[:8, :8, 3] = 0
+    return Image.fromarray(data)
+
+
+def test_clean_generated_image_matches_reference():
+    print("=" * 60)
+    print("测试生成图片后处理与原逐像素实现一致")
+    print("=" * 60)
+
+    for seed in range(3):
+        image = _sample_image(seed=seed)
+        start = time.time()
+        expected = np.array(clean_generated_image_reference(image))
+        reference_time = time.time() - start
+        start = time.time()
+        actual = np.array(clean_generated_image(image))
+        vectorized_time = time.time() - start
+        assert np.array_equal(actual, expected)
+        print(f"seed={seed}: 逐像素 {reference_time * 1000:.1f}ms, 向量化 {vectorized_time * 1000:.1f}ms")
+
+    print("\n✅ 测试通过！")
+
+
+def test_content_bbox_and_dominant_color():
+    print("=" * 60)
+    print("测试背景色包围盒与主背景色")
+    print("=" * 60)
+
+    image = _sample_image(seed=1)
+    for background_color, tolerance in [((255, 255, 255, 255), 12), ((200, 60, 40, 255), 12), ((10, 10, 10, 255), 30)]:
+        assert content_bbox(image, background_color, tolerance) == content_bbox_reference(image, background_color, tolerance)
+
+    rgb = np.array(image.convert('RGB'))
+    colors, counts = np.unique(rgb.reshape(-1, 3), axis=0, return_counts=True)
+    assert np.array_equal(dominant_color(rgb), colors[counts.argmax()])
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_clean_generated_image_matches_reference()
+    test_content_bbox_and_dominant_color()
@@ -0,0 +1,181 @@
+"""
+测试后台任务调度器：去重、排队/运行中任务的取消、父任务取消级联到子任务、已结束任务的清理
+"""
+
+import os
+import sys
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from chart_modules.job_scheduler import JobScheduler, JobCancelledError, check_cancelled
+
+
+def _wait_finished(job, timeout=5):
+    """等待任务结束（状态在 future 的完成回调中更新，可能晚于 wait() 返回）"""
+    try:
+        job.wait(timeout)
+    except JobCancelledError:
+        pass
+    for _ in range(int(timeout / 0.01)):
+        if job.done():
+            return
+        threading.Event().wait(0.01)
+
+
+def test_job_dedup():
+    """相同 dedup_key 的任务未结束时返回已有任务，结束后重新提交"""
+    print("=" * 60)
+    print("测试任务去重")
+    print("=" * 60)
+
+    scheduler = JobScheduler({'task': 2}, history_size=10)
+    release = threading.Event()
+    calls = []
+
+    def work(value):
+        calls.append(value)
+        release.wait(5)
+        return value * 2
+
+    first = scheduler.submit(work, 1, resource='task', dedup_key='k')
+    second = scheduler.submit(work, 1, resource='task', dedup_key='k')
+    other = scheduler.submit(work, 2, resource='task', dedup_key='other')
+    assert second is first and other is not first
+    release.set()
+    assert first.wait(5) == 2 and other.wait(5) == 4
+    _wait_finished(first)
+
+    third = scheduler.submit(work, 1, resource='task', dedup_key='k')
+    assert third is not first and third.wait(5) == 2
+    assert sorted(calls) == [1, 1, 2]
+    scheduler.shutdown()
+
+    print("\n✅ 测试通过！")
+
+
+def test_job_cancel():
+    """排队中的任务直接取消；运行中的任务通过 check_cancelled() 协作退出"""
+    print("=" * 60)
+    print("测试排队 / 运行中任务的取消")
+    print("=" * 60)
+
+    scheduler = JobScheduler({'task': 1}, history_size=10)
+    started = threading.Event()
+    ran = []
+
+    def running():
+        started.set()
+        while True:
+            check_cancelled()
+            threading.Event().wait(0.01)
+
+    def queued():
+        ran.append(True)
+
+    running_job = scheduler.submit(running, resource='task')
+    assert started.wait(5)
+    queued_job = scheduler.submit(queued, resource='task')
+    assert queued_job.status == 'queued'
+
+    assert scheduler.cancel(queued_job.id)
+    assert scheduler.cancel(running_job.id)
+    for job in (queued_job, running_job):
+        try:
+            job.wait(5)
+            assert False, "已取消的任务应当抛出 JobCancelledError"
+        except JobCancelledError:
+            pass
+        _wait_finished(job)
+    assert queued_job.status == 'cancelled' and running_job.status == 'cancelled'
+    assert ran == [] and queued_job.started_at is None
+    # 已结束的任务不能再次取消
+    assert not scheduler.cancel(running_job.id)
+    scheduler.shutdown()
+
+    print("\n✅ 测试通过！")
+
+
+def test_parent_cancel_cascades():
+    """取消父任务同时取消其未结束的子任务"""
+    print("=" * 60)
+    print("测试父任务取消级联")
+    print("=" * 60)
+
+    scheduler = JobScheduler({'task': 1, 'cpu': 2}, history_size=10)
+    children_started = threading.Barrier(3)
+    children = []
+
+    def child():
+        children_started.wait(5)
+        while True:
+            check_cancelled()
+            threading.Event().wait(0.01)
+
+    def parent():
+        children.extend(scheduler.submit(child, resource='cpu') for _ in range(2))
+        children_started.wait(5)
+        for job in children:
+            try:
+                job.wait(5)
+            except JobCancelledError:
+                pass
+        check_cancelled()
+
+    parent_job = scheduler.submit(parent, resource='task')
+    while len(children) < 2 or any(job.status != 'running' for job in children):
+        threading.Event().wait(0.01)
+    assert parent_job.children == [job.id for job in children]
+    assert all(job.parent is parent_job for job in children)
+
+    scheduler.cancel(parent_job.id)
+    for job in children + [parent_job]:
+        _wait_finished(job)
+        assert job.status == 'cancelled', job.status
+    scheduler.shutdown()
+
+    print("\n✅ 测试通过！")
+
+
+def test_history_pruning():
+    """只保留最近 history_size 个已结束任务；被清理的子任务不再被父任务引用"""
+    print("=" * 60)
+    print("测试已结束任务的清理")
+    print("=" * 60)
+
+    scheduler = JobScheduler({'task': 1, 'cpu': 1}, history_size=3)
+    proceed = threading.Event()
+    child_jobs = []
+
+    def parent():
+        for i in range(5):
+            job = scheduler.submit(lambda i=i: 'x' * (i + 1), resource='cpu')
+            job.wait(5)
+            child_jobs.append(job)
+        proceed.wait(5)
+
+    parent_job = scheduler.submit(parent, resource='task')
+    while len(child_jobs) < 5 or not all(job.done() for job in child_jobs):
+        threading.Event().wait(0.01)
+    child_ids = [job.id for job in child_jobs]
+
+    # 父任务仍在运行时提交新任务触发清理：5 个已结束的子任务只保留最近 3 个，父任务只引用保留的子任务
+    scheduler.submit(lambda: None, resource='cpu')
+    remaining = [job_id for job_id in child_ids if scheduler.get(job_id) is not None]
+    assert remaining == child_ids[2:]
+    assert parent_job.children == remaining
+    assert scheduler.get(parent_job.id) is parent_job
+
+    proceed.set()
+    _wait_finished(parent_job)
+    scheduler.submit(lambda: None, resource='cpu').wait(5)
+    assert len([job for job in scheduler.list_jobs() if job.done()]) <= 3 + 1
+    scheduler.shutdown()
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_job_dedup()
+    test_job_cancel()
+    test_parent_cancel_cascades()
+    test_history_pruning()
@@ -0,0 +1,181 @@
+"""
+测试共享 LLM 客户端：可重试错误按退避重试、不可重试错误直接失败、每个模型的并发上限和指标统计，
+进行中相同请求的去重和 TTL 响应缓存
+"""
+
+import os
+import sys
+import asyncio
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+import openai
+
+import chart_modules.llm_client as llm_client
+from chart_modules.llm_client import LLMClient, TTLCache, run_async
+
+
+def _status_error(status_code):
+    request = httpx.Request('POST', 'https://example.com/v1/chat/completions')
+    response = httpx.Response(status_code, request=request, headers={'retry-after': '0'})
+    return openai.APIStatusError(f"status {status_code}", response=response, body=None)
+
+
+class FakeCompletions:
+    """按预设顺序抛出错误或返回结果，并记录同时进行的请求数"""
+
+    def __init__(self, outcomes, delay=0.0):
+        self.outcomes = list(outcomes)
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            outcome = self.outcomes.pop(0) if self.outcomes else 'ok'
+            if isinstance(outcome, Exception):
+                raise outcome
+            usage = SimpleNamespace(prompt_tokens=3, completion_tokens=2, total_tokens=5)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=outcome))], usage=usage)
+        finally:
+            self.active -= 1
+
+
+def _fake_client(completions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def test_llm_client_retry():
+    """429/5xx 重试后成功；400 不重试；指标记录请求、重试、失败和 token"""
+    print("=" * 60)
+    print("测试 LLM 客户端重试与指标")
+    print("=" * 60)
+
+    completions = FakeCompletions([_status_error(429), _status_error(503), 'hello'])
+    client = LLMClient(api_key='test', base_url='https://example.com/v1', client=_fake_client(completions), max_retries=3)
+    response = client.chat(model='gpt-4.1', messages=[{'role': 'user', 'content': 'hi'}])
+    assert response.choices[0].message.content == 'hello'
+    assert completions.calls == 3
+
+    stats = client.stats()['gpt-4.1']
+    assert stats['requests'] == 1 and stats['retries'] == 2 and stats['failures'] == 0
+    assert stats['total_tokens'] == 5
+
+    completions = FakeCompletions([_status_error(400)])
+    client = LLMClient(api_key='test', base_url='https://example.com/v1', client=_fake_client(completions), max_retries=3)
+    try:
+        client.chat(model='gpt-4.1', messages=[])
+        assert False, "400 不应重试成功"
+    except openai.APIStatusError:
+        pass
+    assert completions.calls == 1
+    assert client.stats()['gpt-4.1']['failures'] == 1
+
+    # 退避时间不超过上限
+    assert all(0 <= llm_client.backoff_delay(attempt, base=1, cap=5) <= 5 for attempt in range(10))
+
+    print("\n✅ 测试通过！")
+
+
+def test_llm_client_model_concurrency():
+    """同一模型的并发请求数不超过配置的上限"""
+    print("=" * 60)
+    print("测试 LLM 客户端按模型限流")
+    print("=" * 60)
+
+    completions = FakeCompletions([], delay=0.05)
+    client = LLMClient(api_key='test', base_url='https://example.com/v1', client=_fake_client(completions))
+    limit = llm_client.LLM_MODEL_CONCURRENCY['gpt-image-1']
+
+    async def many():
+        return await asyncio.gather(*(client.achat(model='gpt-image-1', messages=[], variant=i) for i in range(limit * 3)))
+
+    results = run_async(many())
+    assert len(results) == limit * 3
+    assert completions.max_active == limit
+    print(f"并发上限 {limit}，实际最大并发 {completions.max_active}")
+
+    print("\n✅ 测试通过！")
+
+
+def test_llm_client_single_flight():
+    """相同的进行中请求只调用一次上游；variant 或参数不同时各自调用"""
+    print("=" * 60)
+    print("测试 LLM 客户端 single-flight 去重")
+    print("=" * 60)
+
+    completions = FakeCompletions([], delay=0.05)
+    client = LLMClient(api_key='test', base_url='https://example.com/v1', client=_fake_client(completions))
+    messages = [{'role': 'user', 'content': 'recommend'}]
+
+    async def identical():
+        return await asyncio.gather(*(client.achat(model='gpt-4.1', messages=messages, temperature=0.3) for _ in range(5)))
+
+    results = run_async(identical())
+    assert completions.calls == 1
+    assert all(result is results[0] for result in results)
+    assert client.stats()['gpt-4.1']['deduplicated'] == 4
+
+    async def distinct():
+        return await asyncio.gather(
+            client.achat(model='gpt-4.1', messages=messages, temperature=0.3, variant=0),
+            client.achat(model='gpt-4.1', messages=messages, temperature=0.3, variant=1),
+            client.achat(model='gpt-4.1', messages=messages, temperature=0.7),
+            client.achat(model='gpt-4.1', messages=messages, temperature=0.3, dedup=False),
+        )
+
+    run_async(distinct())
+    assert completions.calls == 5
+
+    # 已完成的请求不再共享：之后的相同请求重新调用
+    client.chat(model='gpt-4.1', messages=messages, temperature=0.3)
+    assert completions.calls == 6
+
+    # 失败结果共享给所有等待方
+    completions = FakeCompletions([_status_error(400)], delay=0.05)
+    client = LLMClient(api_key='test', base_url='https://example.com/v1', client=_fake_client(completions))
+
+    async def failing():
+        return await asyncio.gather(*(client.achat(model='gpt-4.1', messages=messages) for _ in range(3)),
+                                    return_exceptions=True)
+
+    errors = run_async(failing())
+    assert completions.calls == 1
+    assert all(isinstance(error, openai.APIStatusError) for error in errors)
+
+    print("\n✅ 测试通过！")
+
+
+def test_ttl_cache():
+    """TTL 过期和条目上限淘汰"""
+    print("=" * 60)
+    print("测试 TTL 响应缓存")
+    print("=" * 60)
+
+    cache = TTLCache(ttl=60, max_entries=2)
+    cache.put('a', [1])
+    cache.put('b', [2])
+    assert cache.get('a') == [1]          # a 变为最近使用
+    cache.put('c', [3])
+    assert cache.get('b') is None
+    assert cache.get('a') == [1] and cache.get('c') == [3]
+
+    expired = TTLCache(ttl=0)
+    expired.put('a', [1])
+    assert expired.get('a') is None
+    assert expired.stats()['entries'] == 0
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_llm_client_retry()
+    test_llm_client_model_concurrency()
+    test_llm_client_single_flight()
+    test_ttl_cache()
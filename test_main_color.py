@@ -0,0 +1,121 @@
+"""
+测试参考图主色提取：内存 / JSON 文件缓存的读写和按文件内容失效，以及采样 MiniBatchKMeans 与全量 KMeans 的一致性
+"""
+
+import os
+import sys
+import tempfile
+from unittest import mock
+import numpy as np
+from PIL import Image
+from sklearn.cluster import KMeans
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import chart_modules.reference_recognize.extract_main_color as main_color
+
+BACKGROUND = (245, 243, 239)
+# (颜色, 占整张图的像素比例)
+BLOCKS = [((220, 40, 40), 0.30), ((40, 90, 200), 0.18), ((250, 190, 30), 0.10), ((30, 150, 90), 0.05)]
+
+
+def _synthetic_image(path, width=400, height=300, seed=0):
+    """背景 + 若干色块（带少量噪声），各色块面积已知"""
+    rng = np.random.default_rng(seed)
+    image = np.empty((height, width, 3), dtype=np.int16)
+    image[:] = BACKGROUND
+    inner = image[20:-20, 20:-20].reshape(-1, 3)
+    start = 0
+    for color, share in BLOCKS:
+        count = int(share * width * height)
+        inner[start:start + count] = color
+        start += count
+    image[20:-20, 20:-20] = inner.reshape(height - 40, width - 40, 3)
+    image[20:-20, 20:-20] += rng.integers(-4, 5, size=(height - 40, width - 40, 3), dtype=np.int16)
+    Image.fromarray(np.clip(image, 0, 255).astype(np.uint8)).save(path)
+    return path
+
+
+def test_palette_cache_round_trip():
+    """第一次计算并写入缓存；之后依次命中内存、JSON 文件；文件内容变化后重新计算"""
+    print("=" * 60)
+    print("测试主色缓存")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = _synthetic_image(os.path.join(tmp, 'reference.png'))
+        compute = mock.Mock(wraps=main_color._compute_main_color)
+        with mock.patch.object(main_color, 'PALETTE_CACHE_DIR', os.path.join(tmp, 'cache')), \
+                mock.patch.object(main_color, '_palette_memory_cache', {}), \
+                mock.patch.object(main_color, '_compute_main_color', compute):
+            colors, bg_color = main_color.extract_main_color(image_path)
+            assert compute.call_count == 1
+            assert bg_color == list(BACKGROUND) and len(colors) >= len(BLOCKS)
+            key = main_color._palette_cache_key(image_path, 6, 30)
+            assert os.path.exists(os.path.join(tmp, 'cache', key + '.json'))
+
+            # 内存命中
+            assert main_color.extract_main_color(image_path) == (colors, bg_color)
+            assert compute.call_count == 1
+
+            # 进程重启后从 JSON 文件命中
+            main_color._palette_memory_cache.clear()
+            assert main_color.extract_main_color(image_path) == (colors, bg_color)
+            assert compute.call_count == 1 and key in main_color._palette_memory_cache
+
+            # 参数不同不共用缓存
+            main_color.extract_main_color(image_path, num_colors=5)
+            assert compute.call_count == 2
+
+            # 同一路径的图片被替换后重新计算
+            _synthetic_image(image_path, seed=1)
+            assert main_color._palette_cache_key(image_path, 6, 30) != key
+            main_color.extract_main_color(image_path)
+            assert compute.call_count == 3
+
+            # use_cache=False 总是重新计算
+            main_color.extract_main_color(image_path, use_cache=False)
+            assert compute.call_count == 4
+
+    print("\n✅ 测试通过！")
+
+
+def test_sampled_palette_matches_full_kmeans():
+    """采样聚类的主色与全量 KMeans 相近，counts 换算为整张图的像素数"""
+    print("=" * 60)
+    print("测试采样聚类与全量聚类的一致性")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = _synthetic_image(os.path.join(tmp, 'reference.png'), width=600, height=400)
+        pixels = np.array(Image.open(image_path).convert('RGB')).reshape(-1, 3)
+        assert len(pixels) > main_color.MAIN_COLOR_SAMPLE_SIZE
+
+        # 簇数 = 背景 + 色块数，聚类结果唯一，便于逐个比较
+        num_colors = len(BLOCKS) + 1
+        colors, counts = main_color._cluster_colors(pixels, num_colors)
+        full = KMeans(n_clusters=num_colors, random_state=42, n_init=3).fit(pixels.astype(np.float32))
+        full_counts = np.bincount(full.labels_, minlength=num_colors)
+        order = np.argsort(full_counts)[::-1]
+        full_colors, full_counts = full.cluster_centers_[order], full_counts[order]
+
+        # 换算后的像素数之和约等于总像素数
+        assert abs(int(counts.sum()) - len(pixels)) <= 6
+        # 每个簇的颜色和占比都接近
+        for color, count, full_color, full_count in zip(colors, counts, full_colors, full_counts):
+            assert np.linalg.norm(color - full_color) < 10, (color, full_color)
+            assert abs(count - full_count) / len(pixels) < 0.01, (count, full_count)
+
+        result = main_color._compute_main_color(image_path, num_colors, 30)
+        assert result['bg_color'] == list(BACKGROUND) and len(result['colors']) == len(BLOCKS)
+        expected = [list(color) for color, _ in BLOCKS]
+        for color, expected_color in zip(result['colors'], expected):
+            assert np.linalg.norm(np.array(color) - expected_color) < 10
+        for count, (_, share) in zip(result['counts'], BLOCKS):
+            assert abs(count / len(pixels) - share) < 0.01
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_palette_cache_round_trip()
+    test_sampled_palette_matches_full_kmeans()
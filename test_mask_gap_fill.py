@@ -0,0 +1,114 @@
+"""
+测试 calculate_mask_v3 的间隙填充：向量化实现与原逐像素循环结果完全一致、calculate_mask_v3 的输出经过填充，并对比耗时
+"""
+
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chart_modules', 'ChartPipeline'))
+
+from modules.infographics_generator import mask_utils
+from modules.infographics_generator.mask_utils import fill_small_gaps, calculate_mask_v3
+
+
+def fill_small_gaps_reference(mask, mask_padding=3):
+    """原 calculate_mask_v3 中的逐像素循环实现，作为对照"""
+    height, width = mask.shape
+    fill_mask = np.zeros((height, width), dtype=np.uint8)
+    for i in range(height):
+        last_j = -mask_padding
+        for j in range(width):
+            if mask[i, j] == 1:
+                if j - last_j < mask_padding:
+                    fill_mask[i, last_j:j+1] = 1
+                else:
+                    fill_mask[i, j] = 1
+                last_j = j
+
+    for j in range(width):
+        last_i = -mask_padding
+        for i in range(height):
+            if mask[i, j] == 1:
+                if i - last_i < mask_padding:
+                    fill_mask[last_i:i+1, j] = 1
+                else:
+                    fill_mask[i, j] = 1
+                last_i = i
+    return fill_mask
+
+
+def test_fill_small_gaps_matches_reference():
+    """随机 mask 上与原实现逐位一致"""
+    print("=" * 60)
+    print("测试间隙填充结果一致性")
+    print("=" * 60)
+
+    rng = np.random.default_rng(0)
+    for shape in [(1, 1), (1, 7), (7, 1), (40, 60), (123, 97)]:
+        for density in [0.05, 0.3, 0.6]:
+            for mask_padding in [2, 3, 5]:
+                mask = (rng.random(shape) < density).astype(np.uint8)
+                expected = fill_small_gaps_reference(mask, mask_padding)
+                actual = fill_small_gaps(mask, mask_padding)
+                assert actual.dtype == np.uint8
+                assert np.array_equal(actual, expected), \
+                    f"结果不一致: shape={shape}, density={density}, mask_padding={mask_padding}"
+
+    print("\n✅ 测试通过！")
+
+
+def test_calculate_mask_v3_fills_gaps():
+    """calculate_mask_v3 返回的两个 mask 都经过间隙填充"""
+    print("=" * 60)
+    print("测试 calculate_mask_v3 间隙填充")
+    print("=" * 60)
+
+    width, height = 40, 20
+    content = np.zeros((height, width), dtype=bool)
+    content[10, [5, 6, 8, 9]] = True     # 第 7 列是 1 像素的间隙
+    content[[2, 4], 30] = True           # 第 3 行是 1 像素的间隙
+    content[15, [20, 25]] = True         # 间距超过 mask_padding，不填充
+    image = np.full((height, width, 4), 255, dtype=np.uint8)
+    image[content, :3] = (10, 20, 30)
+
+    original_rasterize_svg = mask_utils.rasterize_svg
+    mask_utils.rasterize_svg = lambda svg_content, background_color=None: image.copy()
+    try:
+        svg = f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}"><rect width="1" height="1"/></svg>'
+        mask, mask_only_text = calculate_mask_v3(svg, width, height, "#ffffff")
+    finally:
+        mask_utils.rasterize_svg = original_rasterize_svg
+
+    expected = fill_small_gaps(content.astype(np.uint8))
+    for result in (mask, mask_only_text):
+        assert result.shape == (height, width)
+        assert np.array_equal(result, expected)
+        assert result[10, 7] == 1 and result[3, 30] == 1
+        assert result[15, 22] == 0
+
+    print("\n✅ 测试通过！")
+
+
+def benchmark(size=1500, density=0.3, repeat=3):
+    """在 size x size 的随机 mask 上对比两种实现的耗时"""
+    mask = (np.random.default_rng(1).random((size, size)) < density).astype(np.uint8)
+
+    start = time.time()
+    expected = fill_small_gaps_reference(mask)
+    reference_time = time.time() - start
+
+    start = time.time()
+    for _ in range(repeat):
+        actual = fill_small_gaps(mask)
+    vectorized_time = (time.time() - start) / repeat
+
+    assert np.array_equal(actual, expected)
+    print(f"{size}x{size} mask: 循环实现 {reference_time:.3f}s, 向量化实现 {vectorized_time:.4f}s, "
+          f"加速 {reference_time / vectorized_time:.0f}x")
+
+
+if __name__ == "__main__":
+    test_fill_small_gaps_matches_reference()
+    test_calculate_mask_v3_fills_gaps()
+    benchmark()
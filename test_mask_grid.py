@@ -0,0 +1,61 @@
+"""
+测试 mask 分块二值化：grid_mask_from_array 与原 calculate_mask 中的逐块循环结果完全一致，
+calculate_mask 系列接口仍可从 mask_utils 导入
+"""
+
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chart_modules', 'ChartPipeline'))
+
+from modules.infographics_generator import mask_utils
+from modules.infographics_generator.mask_utils import grid_mask_from_array
+
+
+def grid_mask_reference(img_array, grid_size=5, bg_threshold=220):
+    """原 calculate_mask 中的逐块循环实现，作为对照"""
+    height, width = img_array.shape[:2]
+    mask = np.ones((height, width), dtype=np.uint8)
+    for y in range(0, height, grid_size):
+        for x in range(0, width, grid_size):
+            y_end = min(y + grid_size, height)
+            x_end = min(x + grid_size, width)
+            if y_end > y and x_end > x:
+                grid = img_array[y:y_end, x:x_end]
+                if grid.size > 0:
+                    white_pixels = np.all(grid >= bg_threshold, axis=2)
+                    white_ratio = np.mean(white_pixels)
+                    mask[y:y_end, x:x_end] = 0 if white_ratio > 0.95 else 1
+    return mask
+
+
+def test_grid_mask_matches_reference():
+    """随机图像上与原实现逐位一致，包括不足一个 grid 的边缘块"""
+    print("=" * 60)
+    print("测试分块二值化结果一致性")
+    print("=" * 60)
+
+    rng = np.random.default_rng(0)
+    for shape in [(1, 1), (4, 9), (23, 17), (100, 100), (101, 64)]:
+        for white_ratio in [0.5, 0.97, 1.0]:
+            for grid_size in [1, 5, 8]:
+                white = rng.random(shape) < white_ratio
+                img_array = np.where(white[..., None], 255, rng.integers(0, 220, shape + (3,))).astype(np.uint8)
+                expected = grid_mask_reference(img_array, grid_size=grid_size)
+                actual = grid_mask_from_array(img_array, grid_size=grid_size)
+                assert actual.dtype == np.uint8
+                assert np.array_equal(actual, expected), \
+                    f"结果不一致: shape={shape}, white_ratio={white_ratio}, grid_size={grid_size}"
+
+    print("\n✅ 测试通过！")
+
+
+def test_mask_utils_exports():
+    """image_utils、infographics_generator 依赖的 mask 接口都存在"""
+    for name in ['calculate_mask', 'calculate_mask_v2', 'calculate_mask_v3', 'grid_mask_from_array', 'fill_small_gaps']:
+        assert callable(getattr(mask_utils, name, None)), f"mask_utils 缺少 {name}"
+
+
+if __name__ == "__main__":
+    test_grid_mask_matches_reference()
+    test_mask_utils_exports()
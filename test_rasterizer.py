@@ -0,0 +1,135 @@
+"""
+测试 SVG 光栅化后端：后端注册与回退、cairosvg 渲染结果的像素检查、cairosvg 与 rsvg-convert 输出一致性
+"""
+
+import io
+import os
+import sys
+import numpy as np
+import pytest
+from PIL import Image
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chart_modules', 'ChartPipeline'))
+
+from modules.infographics_generator import rasterizer
+from modules.infographics_generator.rasterizer import (CairoSvgRasterizer, RsvgRasterizer, SvgRasterizer,
+                                                       get_rasterizer, register_rasterizer, rasterize_svg)
+
+CAIROSVG_AVAILABLE = CairoSvgRasterizer().is_available()
+RSVG_AVAILABLE = RsvgRasterizer().is_available()
+
+# 测试 SVG 内容：矩形、圆、路径、折线、透明度和文字
+test_svg = """
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="400" height="240">
+    <rect x="20" y="20" width="120" height="80" fill="#3f8aff"/>
+    <circle cx="220" cy="60" r="40" fill="#ff6a00"/>
+    <path d="M 20 200 L 120 130 L 220 190 L 380 120" stroke="#333333" stroke-width="4" fill="none"/>
+    <polygon points="300,20 380,20 340,100" fill="#4ecdc4" opacity="0.6"/>
+    <g transform="translate(20, 230)">
+        <text x="0" y="0" font-family="Arial" font-size="18" fill="#111111">Rasterizer parity</text>
+    </g>
+</svg>
+"""
+
+# 允许的差异：抗锯齿和字体渲染会带来少量像素差异
+PIXEL_TOLERANCE = 48
+MAX_DIFF_RATIO = 0.02
+
+
+class SolidRasterizer(SvgRasterizer):
+    """测试用后端：输出纯色 PNG"""
+
+    def __init__(self, name, available=True):
+        self.name = name
+        self.available = available
+
+    def is_available(self):
+        return self.available
+
+    def render_png(self, svg_content, background_color=None, dpi=300):
+        buffer = io.BytesIO()
+        Image.new('RGB', (4, 3), background_color or '#000000').save(buffer, format='PNG')
+        return buffer.getvalue()
+
+
+def test_rasterizer_backends():
+    """基类是抽象类；自定义后端可注册，指定后端不可用时回退到可用后端"""
+    print("=" * 60)
+    print("测试光栅化后端注册与回退")
+    print("=" * 60)
+
+    with pytest.raises(TypeError):
+        SvgRasterizer()
+
+    available = SolidRasterizer('test-solid')
+    unavailable = SolidRasterizer('test-unavailable', available=False)
+    register_rasterizer(available)
+    register_rasterizer(unavailable)
+    try:
+        array = rasterize_svg(test_svg, background_color='#3f8aff', backend='test-solid')
+        assert array.shape == (3, 4, 4) and array.dtype == np.uint8
+        assert tuple(array[0, 0]) == (0x3f, 0x8a, 0xff, 255)
+        assert get_rasterizer('test-unavailable').is_available()
+        with pytest.raises(ValueError):
+            get_rasterizer('missing-backend')
+    finally:
+        rasterizer._BACKENDS.pop(available.name, None)
+        rasterizer._BACKENDS.pop(unavailable.name, None)
+
+    print("\n✅ 测试通过！")
+
+
+@pytest.mark.skipif(not CAIROSVG_AVAILABLE, reason="cairosvg 不可用")
+def test_cairosvg_golden_pixels():
+    """cairosvg（默认后端）渲染结果：尺寸和各图形内部的像素颜色"""
+    print("=" * 60)
+    print("测试 cairosvg 渲染结果")
+    print("=" * 60)
+
+    array = rasterize_svg(test_svg, background_color="#ffffff", backend='cairosvg')
+    assert array.shape == (240, 400, 4)
+    expected = {
+        (60, 80): (0x3f, 0x8a, 0xff),     # 矩形
+        (60, 220): (0xff, 0x6a, 0x00),    # 圆
+        (5, 5): (0xff, 0xff, 0xff),       # 背景
+        (160, 320): (0xff, 0xff, 0xff),
+    }
+    for (y, x), color in expected.items():
+        assert np.abs(array[y, x, :3].astype(int) - color).max() <= 2, f"({x}, {y}) 的颜色为 {array[y, x]}"
+    # 半透明三角形与白色背景混合
+    triangle = array[40, 340, :3].astype(int)
+    blended = np.array([0x4e, 0xcd, 0xc4]) * 0.6 + 255 * 0.4
+    assert np.abs(triangle - blended).max() <= 3
+    # 文字区域有深色像素
+    assert array[212:240, 20:200, :3].min() < 100
+
+    print("\n✅ 测试通过！")
+
+
+@pytest.mark.skipif(not (CAIROSVG_AVAILABLE and RSVG_AVAILABLE), reason="cairosvg 或 rsvg-convert 不可用")
+def test_rasterizer_parity():
+    """cairosvg 与 rsvg-convert 渲染结果逐像素对比"""
+    print("=" * 60)
+    print("测试 cairosvg / rsvg-convert 渲染一致性")
+    print("=" * 60)
+
+    for background_color in ["#ffffff", "#f5f3ef"]:
+        cairo_array = rasterize_svg(test_svg, background_color=background_color, backend='cairosvg')
+        rsvg_array = rasterize_svg(test_svg, background_color=background_color, backend='rsvg')
+
+        assert cairo_array.shape == rsvg_array.shape, \
+            f"尺寸不一致: cairosvg={cairo_array.shape}, rsvg={rsvg_array.shape}"
+
+        diff = np.abs(cairo_array.astype(np.int16) - rsvg_array.astype(np.int16)).max(axis=2)
+        diff_ratio = float(np.mean(diff > PIXEL_TOLERANCE))
+        print(f"背景 {background_color}: 差异像素比例 {diff_ratio:.4%}")
+        assert diff_ratio <= MAX_DIFF_RATIO, f"差异像素比例过高: {diff_ratio:.4%}"
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_rasterizer_backends()
+    if CAIROSVG_AVAILABLE:
+        test_cairosvg_golden_pixels()
+    if CAIROSVG_AVAILABLE and RSVG_AVAILABLE:
+        test_rasterizer_parity()
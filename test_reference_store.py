@@ -0,0 +1,72 @@
+"""
+测试参考图预计算索引的加载：按文件名查询字段、参考图被替换后不命中、索引文件更新后重新加载
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from chart_modules.reference_store import ReferenceStore, REFERENCE_STORE_VERSION
+
+
+def _write_store(path, references, version=REFERENCE_STORE_VERSION):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'references': references}, f)
+
+
+def test_reference_store_lookup():
+    print("=" * 60)
+    print("测试参考图索引查询")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_dir = os.path.join(tmp, 'infographics')
+        os.makedirs(image_dir)
+        with open(os.path.join(image_dir, 'Art-Origin.png'), 'wb') as f:
+            f.write(b'png-bytes')
+        store_path = os.path.join(image_dir, 'reference_store.json')
+        record = {
+            'size': len(b'png-bytes'),
+            'palette': {'colors': [[10, 20, 30]], 'bg_color': [245, 243, 239]},
+            'layout': {'width': 100.0, 'height': 200.0},
+            'theme': {'theme': 'Art', 'keywords': ['art'], 'match_keywords': ['art']},
+            'descriptions': None,
+        }
+        _write_store(store_path, {'Art-Origin.png': record})
+
+        store = ReferenceStore(path=store_path, image_dir=image_dir)
+        assert store.get('infographics/Art-Origin.png', 'palette') == record['palette']
+        assert store.get('Art-Origin.png', 'layout') == record['layout']
+        assert store.get('Art-Origin.png', 'descriptions') is None
+        assert store.get('Missing.png') is None
+
+        # 返回副本，调用方修改不影响索引
+        store.get('Art-Origin.png', 'palette')['colors'].append([0, 0, 0])
+        assert store.get('Art-Origin.png', 'palette') == record['palette']
+
+        # 参考图被替换（大小变化）后不命中
+        with open(os.path.join(image_dir, 'Art-Origin.png'), 'wb') as f:
+            f.write(b'new-png-bytes')
+        assert store.get('Art-Origin.png') is None
+
+        # 索引文件重新构建后重新加载
+        time.sleep(0.01)
+        record['size'] = len(b'new-png-bytes')
+        record['palette'] = {'colors': [[1, 2, 3]], 'bg_color': [0, 0, 0]}
+        _write_store(store_path, {'Art-Origin.png': record})
+        assert store.get('Art-Origin.png', 'palette') == record['palette']
+        assert store.names() == ['Art-Origin.png']
+
+        # 版本不匹配的索引被忽略
+        time.sleep(0.01)
+        _write_store(store_path, {'Art-Origin.png': record}, version=REFERENCE_STORE_VERSION + 1)
+        assert store.get('Art-Origin.png') is None
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_reference_store_lookup()
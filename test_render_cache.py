@@ -0,0 +1,88 @@
+"""
+测试 generate_variation 渲染缓存：命中复制、模板修改失效、LRU 淘汰
+"""
+
+import os
+import sys
+import time
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from chart_modules.render_cache import RenderCache
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def test_render_cache_hit_and_invalidation():
+    """相同输入命中缓存；数据、配色或模板文件变化后不命中"""
+    print("=" * 60)
+    print("测试渲染缓存命中与失效")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = RenderCache(cache_dir=os.path.join(tmp, 'cache'))
+        data_path = os.path.join(tmp, 'data.json')
+        template_file = os.path.join(tmp, 'template.js')
+        _write(data_path, '{"data": {"columns": []}}')
+        _write(template_file, 'function make_chart() {}')
+
+        key = cache.make_key(data_path, 'd3-js/bar/bar_01', ['x', 'y'], [[1, 2, 3]], [255, 255, 255], template_file)
+        output = os.path.join(tmp, 'session1', 'bar.svg')
+        assert cache.get(key, output) is None
+
+        _write(output, '<svg>bar</svg>')
+        _write(output.replace('.svg', '.png'), 'png-bytes')
+        cache.put(key, output, meta={'bbox': [400, 300, 10, 20]})
+
+        other_output = os.path.join(tmp, 'session2', 'bar.svg')
+        assert cache.get(key, other_output) == {'bbox': [400, 300, 10, 20]}
+        with open(other_output, encoding='utf-8') as f:
+            assert f.read() == '<svg>bar</svg>'
+        assert os.path.exists(other_output.replace('.svg', '.png'))
+
+        # 重建索引（模拟进程重启）后仍然命中
+        assert RenderCache(cache_dir=cache.cache_dir).get(key, other_output) is not None
+
+        assert cache.make_key(data_path, 'd3-js/bar/bar_01', ['x', 'y'], [[1, 2, 4]], [255, 255, 255], template_file) != key
+        assert cache.make_key(data_path, 'd3-js/bar/bar_01', ['y', 'x'], [[1, 2, 3]], [255, 255, 255], template_file) != key
+
+        time.sleep(0.01)
+        _write(template_file, 'function make_chart() { return 1; }')
+        assert cache.make_key(data_path, 'd3-js/bar/bar_01', ['x', 'y'], [[1, 2, 3]], [255, 255, 255], template_file) != key
+
+    print("\n✅ 测试通过！")
+
+
+def test_render_cache_eviction():
+    """超过条目上限时淘汰最久未访问的条目"""
+    print("=" * 60)
+    print("测试渲染缓存 LRU 淘汰")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = RenderCache(cache_dir=os.path.join(tmp, 'cache'), max_entries=2)
+        output = os.path.join(tmp, 'out', 'chart.svg')
+        for key in ['a', 'b']:
+            _write(output, f'<svg>{key}</svg>')
+            cache.put(key, output)
+
+        assert cache.get('a', output) is not None   # a 变为最近访问
+        _write(output, '<svg>c</svg>')
+        cache.put('c', output)
+
+        assert cache.get('a', output) is not None
+        assert cache.get('c', output) is not None
+        assert cache.get('b', output) is None
+        assert not os.path.exists(os.path.join(cache.cache_dir, 'b.svg'))
+        assert cache.stats()['entries'] == 2
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_render_cache_hit_and_invalidation()
+    test_render_cache_eviction()
@@ -0,0 +1,114 @@
+"""
+测试批量预览渲染：逐个图表在预加载页面中渲染（模板源码来自 mtime 缓存，不生成批量 HTML），
+渲染服务出错后剩余图表回退到批量 HTML 页面
+"""
+
+import os
+import sys
+import tempfile
+from unittest import mock
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chart_modules', 'ChartPipeline'))
+
+from modules.chart_engine.utils import paint_innerchart
+from modules.chart_engine.utils.render_service import RenderServiceError
+
+
+class FakeRenderService:
+    """记录 render_chart / render_batch 调用；fail_after 次 render_chart 之后抛出 RenderServiceError"""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.chart_calls = []
+        self.batch_calls = []
+
+    def render_chart(self, page_file, template_id, template_source, json_data, width=1200, height=800,
+                     artifacts=False, png_file=None, background_color=None):
+        if self.fail_after is not None and len(self.chart_calls) >= self.fail_after:
+            raise RenderServiceError("渲染服务不可用: broken pipe")
+        self.chart_calls.append({'page_file': page_file, 'template_id': template_id,
+                                 'template_source': template_source, 'width': width, 'height': height})
+        return {'svg': f"<svg>{template_id}</svg>", 'bbox': None, 'elements': [], 'png_file': png_file}
+
+    def render_batch(self, html_file, charts, width=1200, height=800, artifacts=True, background_color=None):
+        with open(html_file, 'r', encoding='utf-8') as f:
+            self.batch_calls.append({'html': f.read(), 'charts': charts})
+        return [{'svg': f"<svg>{chart['container']}</svg>", 'bbox': None, 'elements': [], 'png_file': None}
+                for chart in charts]
+
+
+def _write_templates(tmp):
+    paths = []
+    for name in ('bar', 'line', 'pie'):
+        path = os.path.join(tmp, f"{name}.js")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"function makeChart(containerSelector, data) {{ /* {name} */ }}\n")
+        paths.append(path)
+    return paths
+
+
+def _charts(paths):
+    return [{'json_data': {'data': [index]}, 'js_file': path, 'framework': 'd3', 'framework_type': 'js',
+             'width': 600 + index, 'height': 400} for index, path in enumerate(paths)]
+
+
+def test_batch_renders_on_chart_page():
+    """每个图表在同一个预加载页面中渲染，模板源码和 id 来自 _load_js_source，不生成批量 HTML"""
+    print("=" * 60)
+    print("测试批量渲染复用预加载页面")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = _write_templates(tmp)
+        service = FakeRenderService()
+        load_batch = mock.Mock(wraps=paint_innerchart.load_charts_batch)
+        with mock.patch.object(paint_innerchart, 'get_render_service', return_value=service), \
+                mock.patch.object(paint_innerchart, 'load_charts_batch', load_batch):
+            charts = _charts(paths) + [{'json_data': {}, 'js_file': paths[0], 'framework': 'vegalite'}]
+            results = paint_innerchart.render_charts_batch(charts, background_color='#ffffff')
+
+        assert load_batch.call_count == 0 and service.batch_calls == []
+        assert len(service.chart_calls) == 3 and results[3] is None
+        assert {call['page_file'] for call in service.chart_calls} == {paint_innerchart.chart_page_file('d3')}
+        for path, call, result in zip(paths, service.chart_calls, results):
+            source, template_id = paint_innerchart._load_js_source(path)
+            assert call['template_id'] == template_id and call['template_source'] == source
+            assert result['svg'] == f"<svg>{template_id}</svg>"
+        assert [call['width'] for call in service.chart_calls] == [600, 601, 602]
+
+    print("\n✅ 测试通过！")
+
+
+def test_batch_falls_back_to_html_page():
+    """渲染服务出错后，剩余图表合并到一个批量 HTML 页面中重试"""
+    print("=" * 60)
+    print("测试渲染服务出错时回退到批量 HTML")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = _write_templates(tmp)
+        service = FakeRenderService(fail_after=1)
+        with mock.patch.object(paint_innerchart, 'get_render_service', return_value=service):
+            results = paint_innerchart.render_charts_batch(_charts(paths))
+
+        # 第一个图表在预加载页面中完成，第二个出错后不再尝试预加载页面
+        assert len(service.chart_calls) == 1
+        assert len(service.batch_calls) == 1
+        batch = service.batch_calls[0]
+        assert [chart['container'] for chart in batch['charts']] == ['#chart-container-0', '#chart-container-1']
+        assert '/* line */' in batch['html'] and '/* pie */' in batch['html'] and '/* bar */' not in batch['html']
+        assert results[1]['svg'] == "<svg>#chart-container-0</svg>"
+        assert results[2]['svg'] == "<svg>#chart-container-1</svg>"
+
+        # 回退也失败时返回 None，由调用方单独渲染
+        service = FakeRenderService(fail_after=0)
+        service.render_batch = mock.Mock(side_effect=RenderServiceError("渲染服务启动失败"))
+        with mock.patch.object(paint_innerchart, 'get_render_service', return_value=service):
+            assert paint_innerchart.render_charts_batch(_charts(paths)) == [None, None, None]
+        assert service.render_batch.call_count == 1
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_batch_renders_on_chart_page()
+    test_batch_falls_back_to_html_page()
@@ -0,0 +1,54 @@
+"""
+测试渲染服务启动失败时统一抛出 RenderServiceError（npm / node 不存在、puppeteer 安装失败）
+"""
+
+import os
+import sys
+import subprocess
+from unittest import mock
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chart_modules', 'ChartPipeline'))
+
+from modules.chart_engine.utils.render_service import ChartRenderService, RenderServiceError
+
+
+def _assert_start_fails(**patches):
+    service = ChartRenderService(pool_size=1)
+    with mock.patch.multiple(subprocess, **patches):
+        try:
+            service.start()
+            assert False, "启动失败应当抛出 RenderServiceError"
+        except RenderServiceError:
+            pass
+    assert service._proc is None
+
+
+def test_start_failures_raise_render_service_error():
+    """启动阶段的 CalledProcessError / FileNotFoundError 被包装为 RenderServiceError"""
+    print("=" * 60)
+    print("测试渲染服务启动失败")
+    print("=" * 60)
+
+    def npm_missing(*args, **kwargs):
+        raise FileNotFoundError("npm")
+
+    def install_fails(cmd, *args, **kwargs):
+        raise subprocess.CalledProcessError(1, cmd)
+
+    def puppeteer_installed(*args, **kwargs):
+        return subprocess.CompletedProcess(args, 0)
+
+    def node_missing(*args, **kwargs):
+        raise FileNotFoundError("node")
+
+    # npm 不存在
+    _assert_start_fails(run=npm_missing)
+    # puppeteer 未安装且安装失败
+    _assert_start_fails(run=install_fails)
+    # puppeteer 已安装但 node 不存在
+    _assert_start_fails(run=puppeteer_installed, Popen=node_missing)
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_start_failures_raise_render_service_error()
@@ -0,0 +1,178 @@
+"""
+测试会话状态存储：SessionState 版本号与乐观并发冲突、SQLite 写入的版本保护、
+wait_for_changes 的增量读取与日志截断，以及空闲会话的写回和移除
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import chart_modules.state_store as state_store
+from chart_modules.state_store import (SessionState, StateStore, SqliteStateBackend, MemoryStateBackend,
+                                       StateConflictError)
+
+
+def test_session_state_versions():
+    """顶层写入递增版本号，expected_version 不一致时抛出 StateConflictError"""
+    print("=" * 60)
+    print("测试 SessionState 版本号与冲突检测")
+    print("=" * 60)
+
+    state = SessionState('s1', {'step': 'idle'})
+    assert state.version == 0 and state.version_of('step') == 0
+
+    state['step'] = 'layout'
+    assert state.version == 1 and state.version_of('step') == 1
+    state['progress'] = '10%'
+    assert state.version == 2 and state.version_of('step') == 1
+
+    version = state.set('step', 'chart', expected_version=1)
+    assert version == 3 and state['step'] == 'chart'
+    try:
+        state.set('step', 'title', expected_version=1)
+        assert False, "过期的版本号应当冲突"
+    except StateConflictError:
+        pass
+    assert state['step'] == 'chart'
+
+    # 删除后版本号归零
+    del state['progress']
+    assert state.version_of('progress') == 0 and state.version == 4
+
+    # 脏数据只取出一次
+    upserts, deletes = state.collect_changes()
+    assert [key for key, _, _ in upserts] == ['step'] and deletes == ['progress']
+    assert state.collect_changes() == ([], [])
+
+    # 嵌套修改只在 full_check 时通过摘要检测到
+    state['style'] = {'colors': []}
+    upserts, _ = state.collect_changes()
+    assert [key for key, _, _ in upserts] == ['style']
+    state['style']['colors'].append('#ffffff')
+    assert state.collect_changes() == ([], [])
+    upserts, _ = state.collect_changes(full_check=True)
+    assert [key for key, _, _ in upserts] == ['style']
+    assert upserts[0][2] == state.version_of('style') == state.version
+
+    print("\n✅ 测试通过！")
+
+
+def test_sqlite_version_guard():
+    """SQLite 后端只接受版本号更大的写入"""
+    print("=" * 60)
+    print("测试 SQLite 写入的版本保护")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SqliteStateBackend(os.path.join(tmp, 'state.db'))
+        backend.save('s1', [('step', '"chart"', 5)], [])
+        backend.save('s1', [('step', '"layout"', 3)], [])    # 较旧的写入被忽略
+        assert backend.load('s1') == {'step': ('chart', 5)}
+        backend.save('s1', [('step', '"title"', 6), ('progress', '"50%"', 7)], [])
+        assert backend.load('s1') == {'step': ('title', 6), 'progress': ('50%', 7)}
+        backend.save('s1', [], ['progress'])
+        assert backend.load('s1') == {'step': ('title', 6)}
+        assert backend.load('missing') is None
+
+        # 重新加载的会话沿用持久化的版本号
+        store = StateStore(backend, lambda: {'step': 'idle', 'id': ''})
+        state = store.get('s1')
+        assert state['step'] == 'title' and state['id'] == ''
+        assert state.version == 6 and state.version_of('step') == 6
+        state['step'] = 'done'
+        store.flush(state)
+        assert backend.load('s1')['step'] == ('done', 7)
+        backend.close()
+
+    print("\n✅ 测试通过！")
+
+
+def test_wait_for_changes():
+    """按版本号增量读取变更；落后超过日志长度时返回 None"""
+    print("=" * 60)
+    print("测试 wait_for_changes")
+    print("=" * 60)
+
+    state = SessionState('s1')
+    assert state.wait_for_changes(0, timeout=0.01) == (0, [])
+
+    def writer():
+        time.sleep(0.05)
+        state['step'] = 'layout'
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    assert state.wait_for_changes(0, timeout=5) == (1, ['step'])
+    thread.join()
+
+    state['progress'] = '1'
+    state['step'] = 'chart'
+    state['progress'] = '2'
+    assert state.wait_for_changes(1, timeout=0) == (4, ['progress', 'step'])
+
+    # 变更日志被覆盖后需要重新获取快照
+    for i in range(state_store.STATE_CHANGE_LOG_SIZE + 1):
+        state['progress'] = str(i)
+    assert state.wait_for_changes(4, timeout=0) is None
+    latest = state.version
+    assert state.wait_for_changes(latest - 1, timeout=0) == (latest, ['progress'])
+
+    print("\n✅ 测试通过！")
+
+
+def test_idle_session_eviction():
+    """空闲会话写回后移除；正在使用的会话保留"""
+    print("=" * 60)
+    print("测试空闲会话移除")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SqliteStateBackend(os.path.join(tmp, 'state.db'))
+        busy_sessions = {'busy'}
+        store = StateStore(backend, lambda: {'step': 'idle'}, idle_timeout=60,
+                           in_use=lambda session_id: session_id in busy_sessions)
+
+        idle = store.get('idle')
+        idle['step'] = 'chart'
+        store.get('busy')['step'] = 'layout'
+        store.get('recent')
+        now = time.time()
+        idle.last_access = now - 120
+        store.get('busy').last_access = now - 120
+
+        assert store.evict_idle(now) == 1
+        assert set(store.sessions()) == {'busy', 'recent'}
+        # 移除前已写回，重新访问时从后端加载
+        assert backend.load('idle')['step'] == ('chart', idle.version_of('step'))
+        reloaded = store.get('idle')
+        assert reloaded is not idle and reloaded['step'] == 'chart'
+
+        # 有推送连接等待变更的会话不移除
+        busy_sessions.clear()
+        streaming = store.get('busy')
+        waiter = threading.Thread(target=streaming.wait_for_changes, args=(streaming.version, 5))
+        waiter.start()
+        time.sleep(0.05)
+        streaming.last_access = now - 120
+        assert store.evict_idle(now) == 0
+        streaming['step'] = 'done'
+        waiter.join()
+
+        # memory 后端也会移除，不再无限增长
+        memory_store = StateStore(MemoryStateBackend(), idle_timeout=60)
+        for i in range(10):
+            memory_store.get(f'session-{i}').last_access = now - 120
+        assert memory_store.evict_idle(now) == 10 and memory_store.sessions() == {}
+        backend.close()
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_session_state_versions()
+    test_sqlite_version_guard()
+    test_wait_for_changes()
+    test_idle_session_eviction()
@@ -0,0 +1,124 @@
+"""
+测试几何边界框：基本图形、变换、描边、背景色过滤、clip-path、画布范围和 <use>，以及（可用时）与光栅化结果的一致性
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chart_modules', 'ChartPipeline'))
+
+from modules.infographics_generator.svg_geometry import compute_svg_bbox
+from modules.infographics_generator.svg_utils import adjust_and_get_bbox
+from modules.infographics_generator.rasterizer import CairoSvgRasterizer
+
+SVG_NS = "xmlns='http://www.w3.org/2000/svg'"
+
+
+def _bbox(content, background_color=None):
+    bbox = compute_svg_bbox(f"<svg {SVG_NS} width='1000' height='1000'>{content}</svg>", background_color)
+    if bbox is None:
+        return None
+    return tuple(round(bbox[key], 3) for key in ('min_x', 'min_y', 'max_x', 'max_y'))
+
+
+def test_geometric_bbox():
+    """几何边界框与手算结果一致"""
+    print("=" * 60)
+    print("测试几何边界框")
+    print("=" * 60)
+
+    assert _bbox("<rect x='10' y='20' width='30' height='40'/>") == (10, 20, 40, 60)
+    # 与背景同色的矩形不计入
+    assert _bbox("<rect width='1000' height='1000' fill='#ffffff'/><rect x='10' y='20' width='30' height='40'/>",
+                 '#FFFFFF') == (10, 20, 40, 60)
+    # 嵌套平移 + 旋转
+    assert _bbox("<g transform='translate(100,50) rotate(90)'><rect width='10' height='20'/></g>") == (80, 50, 100, 60)
+    # 描边向外扩展半个线宽
+    assert _bbox("<circle cx='50' cy='50' r='10' stroke='red' stroke-width='4' fill='none'/>") == (38, 38, 62, 62)
+    # 贝塞尔曲线的精确极值（缩放后）
+    assert _bbox("<g transform='scale(2)'><path d='M0 0 C 10 20 30 20 40 0'/></g>") == (0, 0, 80, 30)
+    # 半圆弧
+    assert _bbox("<path d='M10 30 A 20 20 0 0 1 50 30'/>") == (10, 10, 50, 30)
+    # defs 和不可见元素不计入
+    assert _bbox("<defs><rect width='999' height='999'/></defs><rect width='5' height='5' style='display:none'/>"
+                 "<rect x='1' y='1' width='5' height='5' opacity='0'/>") is None
+
+    # 文字：宽度随内容增长，居中对齐以 x 为中心
+    short = _bbox("<text x='100' y='100' font-size='20' text-anchor='middle'>ab</text>")
+    long = _bbox("<text x='100' y='100' font-size='20' text-anchor='middle'>abcdef</text>")
+    assert long[2] - long[0] > short[2] - short[0]
+    assert abs((long[0] + long[2]) / 2 - 100) < 1e-6
+    assert long[1] == 84 and long[3] == 104
+
+    print("\n✅ 测试通过！")
+
+
+def test_geometric_bbox_clipping():
+    """clip-path、画布范围和 <use> 引用"""
+    print("=" * 60)
+    print("测试几何边界框的裁剪和引用")
+    print("=" * 60)
+
+    # clip-path 把 900x900 的矩形裁剪到 100x100
+    assert _bbox("<defs><clipPath id='c'><rect x='50' y='60' width='100' height='100'/></clipPath></defs>"
+                 "<rect width='900' height='900' clip-path='url(#c)'/>") == (50, 60, 150, 160)
+    # 裁剪区域在被裁剪元素的坐标系中（包括其 transform），圆形裁剪取外接矩形
+    assert _bbox("<clipPath id='c'><circle cx='0' cy='0' r='10'/></clipPath>"
+                 "<g transform='translate(100, 100)' clip-path='url(#c)'><rect x='-50' y='-50' width='500' height='500'/></g>"
+                 ) == (90, 90, 110, 110)
+    # objectBoundingBox 单位相对于内容边界框
+    assert _bbox("<clipPath id='c' clipPathUnits='objectBoundingBox'><rect width='0.5' height='0.5'/></clipPath>"
+                 "<rect x='100' y='100' width='200' height='400' style='clip-path: url(#c)'/>") == (100, 100, 200, 300)
+    # 裁剪区域与内容没有交集时不计入
+    assert _bbox("<clipPath id='c'><rect width='10' height='10'/></clipPath>"
+                 "<rect x='100' y='100' width='10' height='10' clip-path='url(#c)'/>"
+                 "<rect x='300' y='300' width='10' height='10'/>") == (300, 300, 310, 310)
+
+    # 画布外的部分不计入，与光栅化结果一致
+    assert _bbox("<rect x='-200' y='100' width='1500' height='50'/>") == (0, 100, 1000, 150)
+    assert _bbox("<rect x='1200' y='100' width='50' height='50'/>") is None
+
+    # <use> 引用普通元素：x/y 作为平移
+    assert _bbox("<defs><rect id='r' width='20' height='10'/></defs><use href='#r' x='5' y='7'/>") == (5, 7, 25, 17)
+    # <use> 引用 symbol（xlink:href），没有 width/height 时视口为 100%
+    assert _bbox("<symbol id='sym'><circle cx='30' cy='30' r='10'/></symbol>"
+                 "<use xmlns:xlink='http://www.w3.org/1999/xlink' xlink:href='#sym'/>") == (20, 20, 40, 40)
+    # symbol 的 viewBox 按 use 的 width/height 等比缩放
+    assert _bbox("<symbol id='sym' viewBox='0 0 10 10'><rect width='10' height='10'/></symbol>"
+                 "<use href='#sym' x='100' y='100' width='50' height='50'/>") == (100, 100, 150, 150)
+
+    print("\n✅ 测试通过！")
+
+
+def test_geometry_matches_raster():
+    """几何结果与光栅化扫描结果相差不超过几个像素"""
+    print("=" * 60)
+    print("测试几何 / 光栅化边界框一致性")
+    print("=" * 60)
+
+    if not CairoSvgRasterizer().is_available():
+        print("\n⚠️  cairosvg 不可用，跳过一致性测试")
+        return
+
+    content = """
+        <rect x='0' y='0' width='1000' height='1000' fill='#f5f3ef'/>
+        <g transform='translate(120, 80)'>
+            <rect x='0' y='0' width='200' height='120' fill='#3f8aff'/>
+            <circle cx='260' cy='60' r='40' fill='#ff6a00'/>
+            <path d='M 0 200 L 100 150 L 200 190 L 320 140' stroke='#333333' stroke-width='4' fill='none'/>
+        </g>
+        <clipPath id='parity-clip'><circle cx='500' cy='400' r='60'/></clipPath>
+        <rect x='0' y='0' width='1000' height='1000' fill='#2a9d8f' clip-path='url(#parity-clip)'/>
+    """
+    _, geo_w, geo_h, geo_dx, geo_dy = adjust_and_get_bbox(content, '#f5f3ef', mode='geometry')
+    _, ras_w, ras_h, ras_dx, ras_dy = adjust_and_get_bbox(content, '#f5f3ef', mode='raster')
+    print(f"geometry: {geo_w}x{geo_h} offset ({geo_dx}, {geo_dy}); raster: {ras_w}x{ras_h} offset ({ras_dx}, {ras_dy})")
+    for geo, ras in [(geo_w, ras_w), (geo_h, ras_h), (geo_dx, ras_dx), (geo_dy, ras_dy)]:
+        assert abs(float(geo) - float(ras)) <= 4
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_geometric_bbox()
+    test_geometric_bbox_clipping()
+    test_geometry_matches_raster()
@@ -0,0 +1,278 @@
+"""
+测试模板字段类型索引：注册表映射按扫描代数缓存、不修改模板 requirements，
+以及 DataProfile + 分桶检查与原先逐模板检查的结果一致
+"""
+
+import os
+import sys
+import copy
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chart_modules', 'ChartPipeline'))
+
+from modules.chart_engine.template.template_registry import TemplateDict, scan_templates
+from modules.infographics_generator.template_utils import (
+    build_template_index, check_template_compatibility, get_unique_fields_and_types,
+    check_field_color_compatibility, check_field_icon_compatibility
+)
+
+TEMPLATES = {
+    'd3-js': {
+        'bar': {
+            'bar_01': {'requirements': {
+                'required_fields': ['x', 'y'],
+                'required_fields_type': [['categorical'], ['numerical']],
+                'required_fields_range': [[2, 10], [0, 'inf']],
+            }},
+        },
+        'line': {
+            'line_01': {'requirements': {
+                'required_fields': ['x', 'y'],
+                'required_fields_type': [['temporal'], ['numerical']],
+            }},
+        },
+    }
+}
+
+
+def test_template_index_cache():
+    print("=" * 60)
+    print("测试模板索引缓存")
+    print("=" * 60)
+
+    templates = TemplateDict(copy.deepcopy(TEMPLATES))
+    index = build_template_index(templates)
+    assert set(index) == {('categorical', 'numerical'), ('temporal', 'numerical')}
+    assert build_template_index(templates) is index
+
+    # "inf" 只在索引中转换，模板的 requirements 保持原样
+    bar = templates['d3-js']['bar']['bar_01']['requirements']
+    assert bar['required_fields_range'] == [[2, 10], [0, 'inf']]
+    assert index[('categorical', 'numerical')][0]['ordered_ranges'] == [[2, 10], [0, float('inf')]]
+
+    # 重新扫描（generation 递增）后重建
+    bar['required_fields_type'] = [['temporal'], ['numerical']]
+    templates.generation += 1
+    rebuilt = build_template_index(templates)
+    assert rebuilt is not index
+    assert set(rebuilt) == {('temporal', 'numerical')}
+    assert [entry['chart_name'] for entry in rebuilt[('temporal', 'numerical')]] == ['bar_01', 'line_01']
+    assert build_template_index(templates) is rebuilt
+
+    # 普通字典不缓存，每次按当前内容建立索引
+    plain = copy.deepcopy(TEMPLATES)
+    first = build_template_index(plain)
+    del plain['d3-js']['line']['line_01']
+    assert set(build_template_index(plain)) == {('categorical', 'numerical')} and len(first) == 2
+
+    print("\n✅ 测试通过！")
+
+
+def _legacy_check_template_compatibility(data, templates, specific_chart_name=None):
+    """优化前逐模板、逐行扫描的实现，作为一致性测试的基准"""
+    compatible_templates = []
+    combination_type = data.get("data", {}).get("type_combination", "")
+    combination_types = [col["data_type"] for col in data["data"]["columns"]]
+    if combination_type == "":
+        combination_type = " + ".join(combination_types)
+    if not combination_type:
+        return compatible_templates
+
+    for engine, templates_dict in templates.items():
+        for chart_type, chart_names_dict in templates_dict.items():
+            for chart_name, template_info in chart_names_dict.items():
+                if 'base' in chart_name or engine == 'vegalite_py':
+                    continue
+                template_key = f"{engine}/{chart_type}/{chart_name}"
+                if specific_chart_name and specific_chart_name != chart_name:
+                    continue
+                try:
+                    req = template_info['requirements']
+                    hierarchy = req.get('hierarchy', [])
+                    if 'required_fields' not in req or 'required_fields_type' not in req:
+                        continue
+                    ordered_fields, field_types, ordered_ranges = get_unique_fields_and_types(
+                        req['required_fields'], req['required_fields_type'], req.get('required_fields_range', None))
+                    data_types = [field_types[field] for field in ordered_fields]
+                    if len(req.get('required_fields_colors', [])) > 0 and len(data.get("colors", {}).get("field", [])) == 0:
+                        continue
+                    if not check_field_color_compatibility(req, data):
+                        continue
+                    if not check_field_icon_compatibility(req, data):
+                        continue
+                    if len(data_types) != len(combination_types):
+                        continue
+                    check_flag = True
+                    for data_type, column_type in zip(data_types, combination_types):
+                        if not ((data_type == "categorical" and column_type in ("temporal", "categorical"))
+                                or (data_type == column_type and data_type in ("numerical", "temporal"))):
+                            check_flag = False
+                            break
+                    if not check_flag:
+                        continue
+
+                    flag = True
+                    rows = data["data"]["data"]
+                    columns = data["data"]["columns"]
+                    for i, range in enumerate(ordered_ranges):
+                        if i >= len(columns):
+                            flag = False
+                            break
+                        key = columns[i]["name"]
+                        if columns[i]["data_type"] in ["temporal", "categorical"]:
+                            unique_values = list(set(value[key] for value in rows))
+                            if len(unique_values) > range[1] or len(unique_values) < range[0]:
+                                flag = False
+                                break
+                        elif columns[i]["data_type"] in ["numerical"]:
+                            min_value = min(value[key] for value in rows)
+                            max_value = max(value[key] for value in rows)
+                            if min_value < range[0] or max_value > range[1]:
+                                flag = False
+                                break
+                            elif "diverging" in chart_name and min_value >= 0 and range[0] < 0:
+                                flag = False
+                                break
+                            elif "scatterplot" in chart_name and min_value >= 0 and range[0] < 0:
+                                flag = False
+                                break
+                    for i, field in enumerate(ordered_fields):
+                        if field == "group":
+                            x_name = columns[[j for j, f in enumerate(ordered_fields) if f == "x"][0]]["name"]
+                            field_name = columns[i]["name"]
+                            num_unique_x = len(set(value[x_name] for value in rows))
+                            num_unique_comb = len(set(str(value[x_name]) + ' ' + str(value[field_name]) for value in rows))
+                        elif field == "group2":
+                            x_name = columns[[j for j, f in enumerate(ordered_fields) if f == "x"][0]]["name"]
+                            group_name = columns[[j for j, f in enumerate(ordered_fields) if f == "group"][0]]["name"]
+                            field_name = columns[i]["name"]
+                            num_unique_x = len(set(str(value[x_name]) + ' ' + str(value[group_name]) for value in rows))
+                            num_unique_comb = len(set(str(value[x_name]) + ' ' + str(value[group_name]) + ' ' +
+                                                      str(value[field_name]) for value in rows))
+                        else:
+                            continue
+                        if field in hierarchy:
+                            if num_unique_comb > num_unique_x:
+                                flag = False
+                                break
+                        elif num_unique_comb == num_unique_x:
+                            flag = False
+                            break
+                    if flag:
+                        compatible_templates.append((template_key, ordered_fields))
+                except Exception:
+                    pass
+    return compatible_templates
+
+
+def _dataset(columns, rows, colors=(), images=()):
+    """columns: [(列名, 类型)]；rows: 每行的取值元组；colors / images: 有映射的字段取值"""
+    names = [name for name, _ in columns]
+    return {
+        'data': {
+            'columns': [{'name': name, 'data_type': data_type} for name, data_type in columns],
+            'data': [dict(zip(names, row)) for row in rows],
+        },
+        'colors': {'field': {value: '#336699' for value in colors}},
+        'images': {'field': {value: 'data:image/png;base64,' for value in images}},
+    }
+
+
+def _parity_datasets():
+    letters = [chr(ord('A') + i) for i in range(26)]
+    cats = letters[:6]
+    datasets = {
+        # 分类 + 数值，颜色和图标都有映射
+        'cat_num': _dataset([('name', 'categorical'), ('value', 'numerical')],
+                            [(c, 10 * (i + 1)) for i, c in enumerate(cats)], colors=cats, images=cats),
+        # 含负数（diverging / scatterplot 的特殊判断）
+        'cat_num_negative': _dataset([('name', 'categorical'), ('value', 'numerical')],
+                                     [(c, 10 * i - 25) for i, c in enumerate(cats)], colors=cats, images=cats),
+        # 类别数低于所有模板的下限
+        'cat_num_single': _dataset([('name', 'categorical'), ('value', 'numerical')], [('A', 5)],
+                                   colors=['A'], images=['A']),
+        # 类别数正好等于上下限、数值正好在边界上
+        'cat_num_edges': _dataset([('name', 'categorical'), ('value', 'numerical')], [('A', 0), ('B', 100)],
+                                  colors=['A', 'B'], images=['A', 'B']),
+        'cat_num_40': _dataset([('name', 'categorical'), ('value', 'numerical')],
+                               [(f"c{i}", i + 1) for i in range(40)], colors=[f"c{i}" for i in range(40)]),
+        # 颜色映射缺少一个取值
+        'cat_num_partial_colors': _dataset([('name', 'categorical'), ('value', 'numerical')],
+                                           [(c, i + 1) for i, c in enumerate(cats)], colors=cats[:-1], images=cats),
+        # 时间 + 数值 + 分组
+        'temporal_num_group': _dataset([('year', 'temporal'), ('value', 'numerical'), ('kind', 'categorical')],
+                                       [(str(2000 + y), (y * 7) % 11 - 5, g) for y in range(10) for g in ('P', 'Q')],
+                                       colors=['P', 'Q'], images=['P', 'Q']),
+        # 分组与 x 交叉（非层级）
+        'cat_num_group': _dataset([('name', 'categorical'), ('value', 'numerical'), ('kind', 'categorical')],
+                                  [(c, i + j, g) for i, c in enumerate(cats[:5]) for j, g in enumerate('PQR')],
+                                  colors=cats + list('PQR'), images=cats + list('PQR')),
+        # 分组由 x 决定（层级）
+        'cat_num_group_hierarchy': _dataset([('name', 'categorical'), ('value', 'numerical'), ('kind', 'categorical')],
+                                            [(c, i + 1, 'PQR'[i // 2]) for i, c in enumerate(cats)],
+                                            colors=cats + list('PQR'), images=cats + list('PQR')),
+        # 两个数值列
+        'cat_num_num': _dataset([('name', 'categorical'), ('value', 'numerical'), ('value2', 'numerical')],
+                                [(f"c{i}", i + 1, 2 * i + 1) for i in range(10)], images=[f"c{i}" for i in range(10)]),
+        'cat_num_num_group': _dataset([('name', 'categorical'), ('value', 'numerical'), ('value2', 'numerical'),
+                                       ('kind', 'categorical')],
+                                      [(f"c{i}", i + 1, i + 2, 'PQR'[i % 3]) for i in range(12)],
+                                      colors=list('PQR'), images=[f"c{i}" for i in range(12)] + list('PQR')),
+        # group + group2 完全交叉
+        'cat_num_group_group2': _dataset([('name', 'categorical'), ('value', 'numerical'), ('kind', 'categorical'),
+                                          ('side', 'categorical')],
+                                         [(c, i + j + k, g, s) for i, c in enumerate(cats[:4])
+                                          for j, g in enumerate('PQ') for k, s in enumerate('LMN')],
+                                         colors=cats + list('PQLMN'), images=cats + list('PQLMN')),
+        # group2 由 (x, group) 决定
+        'cat_num_group_group2_hierarchy': _dataset([('name', 'categorical'), ('value', 'numerical'),
+                                                    ('kind', 'categorical'), ('side', 'categorical')],
+                                                   [(c, i + j, g, 'LM'[(i + j) % 2]) for i, c in enumerate(cats[:4])
+                                                    for j, g in enumerate('PQ')],
+                                                   colors=cats + list('PQLM'), images=cats + list('PQLM')),
+        # 分组在前的模板（group, x, y）
+        'cat_cat_num': _dataset([('region', 'categorical'), ('name', 'categorical'), ('value', 'numerical')],
+                                [(r, c, i + 1) for r in 'PQR' for i, c in enumerate(cats[:4])],
+                                colors=cats + list('PQR')),
+    }
+    return datasets
+
+
+def test_compatibility_matches_per_template_loop():
+    """对仓库中的全部模板，分桶检查与原先的逐模板检查返回相同的列表（包括顺序）"""
+    print("=" * 60)
+    print("测试模板兼容性检查与原实现一致")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        templates = scan_templates(force=True, index_path=os.path.join(tmp, 'index.json'))
+    assert isinstance(templates, TemplateDict)
+    generation = templates.generation
+    assert sum(len(names) for engine in templates.values() for names in engine.values()) > 100
+
+    total = 0
+    for name, data in _parity_datasets().items():
+        expected = _legacy_check_template_compatibility(copy.deepcopy(data), templates)
+        actual = check_template_compatibility(data, templates)
+        assert actual == expected, (name, sorted(set(actual) ^ set(expected), key=str)[:5])
+        print(f"{name}: {len(actual)} 个兼容模板")
+        total += len(actual)
+
+        # 指定模板名
+        for template_key, _ in expected[:2]:
+            chart_name = template_key.split('/')[-1]
+            assert check_template_compatibility(data, templates, chart_name) == \
+                _legacy_check_template_compatibility(data, templates, chart_name)
+    assert total > 0
+
+    # 数据检查不会改变模板，也不会触发重新扫描
+    assert templates.generation == generation
+    with tempfile.TemporaryDirectory() as tmp:
+        scan_templates(force=True, index_path=os.path.join(tmp, 'index.json'))
+    assert templates.generation == generation + 1
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_template_index_cache()
+    test_compatibility_matches_per_template_loop()
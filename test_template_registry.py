@@ -0,0 +1,157 @@
+"""
+测试模板注册表：.template_index.json 的增量刷新（mtime/size 变化）、已删除文件的清理、版本不符时重建，
+以及 LazyTemplateModule 的延迟导入和多线程下只导入一次
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+from unittest import mock
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chart_modules', 'ChartPipeline'))
+
+from modules.chart_engine.template import template_registry
+from modules.chart_engine.template.template_registry import LazyTemplateModule, scan_templates
+
+
+def _write_template(path, chart_type, chart_name, body=''):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    requirements = json.dumps({'chart_type': chart_type, 'chart_name': chart_name})
+    quote = ('"""', '"""') if path.endswith('.py') else ('/*', '*/')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"{quote[0]}\nREQUIREMENTS_BEGIN\n{requirements}\nREQUIREMENTS_END\n{quote[1]}\n{body}")
+
+
+def _reset_registry():
+    for engine_templates in template_registry.templates.values():
+        engine_templates.clear()
+    template_registry._templates_scanned = False
+
+
+def test_template_index_refresh():
+    """未变化的文件复用索引；修改、删除和版本不符时重新解析"""
+    print("=" * 60)
+    print("测试模板索引的增量刷新")
+    print("=" * 60)
+
+    extract = mock.Mock(wraps=template_registry.extract_requirements)
+    with tempfile.TemporaryDirectory() as tmp, mock.patch.object(template_registry, 'extract_requirements', extract):
+        index_path = os.path.join(tmp, '.template_index.json')
+        bar = os.path.join(tmp, 'd3-js', 'bar', 'simple_bar.js')
+        line = os.path.join(tmp, 'echarts-js', 'line', 'basic_line.js')
+        pie = os.path.join(tmp, 'echarts_py', 'pie_chart.py')
+        _write_template(bar, 'Vertical Bar Chart', 'simple_bar')
+        _write_template(line, 'Line Chart', 'basic_line')
+        _write_template(pie, 'Pie Chart', 'pie_chart', "def make_options(data):\n    return {}\n")
+
+        def scan():
+            return scan_templates(force=True, template_dir=tmp, index_path=index_path)
+
+        try:
+            # 首次扫描解析所有文件并写入索引
+            templates = scan()
+            assert extract.call_count == 3
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            assert index['version'] == template_registry.TEMPLATE_INDEX_VERSION
+            assert set(index['files']) == {os.path.relpath(path, tmp) for path in (bar, line, pie)}
+            assert templates['d3-js']['vertical bar chart']['simple_bar']['template'] == bar
+            assert isinstance(templates['echarts_py']['pie chart']['pie_chart']['template'], LazyTemplateModule)
+
+            # 没有变化时不解析任何文件，也不重写索引
+            index_mtime = os.stat(index_path).st_mtime_ns
+            extract.reset_mock()
+            templates = scan()
+            assert extract.call_count == 0 and os.stat(index_path).st_mtime_ns == index_mtime
+            assert templates['echarts-js']['line chart']['basic_line']['template'] == line
+
+            # 修改的文件（size 变化）重新解析
+            _write_template(bar, 'Vertical Bar Chart', 'renamed_bar')
+            templates = scan()
+            assert [call.args[0] for call in extract.call_args_list] == [bar]
+            assert list(templates['d3-js']['vertical bar chart']) == ['renamed_bar']
+
+            # 只有 mtime 变化（内容长度相同）也重新解析
+            extract.reset_mock()
+            stat = os.stat(line)
+            os.utime(line, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            scan()
+            assert [call.args[0] for call in extract.call_args_list] == [line]
+
+            # 删除的文件从索引和注册表中移除
+            os.remove(pie)
+            templates = scan()
+            with open(index_path, 'r', encoding='utf-8') as f:
+                assert os.path.relpath(pie, tmp) not in json.load(f)['files']
+            assert templates['echarts_py'] == {}
+
+            # 版本不符时整体重建
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            index['version'] = template_registry.TEMPLATE_INDEX_VERSION - 1
+            with open(index_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f)
+            extract.reset_mock()
+            scan()
+            assert extract.call_count == 2
+            with open(index_path, 'r', encoding='utf-8') as f:
+                assert json.load(f)['version'] == template_registry.TEMPLATE_INDEX_VERSION
+        finally:
+            _reset_registry()
+
+    print("\n✅ 测试通过！")
+
+
+def test_lazy_template_module():
+    """首次访问属性前不导入模块；并发访问时只导入一次"""
+    print("=" * 60)
+    print("测试 LazyTemplateModule")
+    print("=" * 60)
+
+    original_load = template_registry.load_python_template
+
+    def slow_load(file_path):
+        time.sleep(0.05)
+        return original_load(file_path)
+
+    load = mock.Mock(side_effect=slow_load)
+    with tempfile.TemporaryDirectory() as tmp, mock.patch.object(template_registry, 'load_python_template', load):
+        path = os.path.join(tmp, 'echarts_py', 'pie_chart.py')
+        _write_template(path, 'Pie Chart', 'pie_chart', "def make_options(data):\n    return {'series': data}\n")
+        try:
+            templates = scan_templates(force=True, template_dir=tmp, index_path=os.path.join(tmp, 'index.json'))
+            module = templates['echarts_py']['pie chart']['pie_chart']['template']
+            assert load.call_count == 0 and 'not loaded' in repr(module)
+
+            barrier = threading.Barrier(8)
+            results = []
+
+            def access():
+                barrier.wait(5)
+                results.append(module.make_options([1]))
+
+            threads = [threading.Thread(target=access) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert load.call_count == 1
+            assert results == [{'series': [1]}] * 8 and 'loaded' in repr(module)
+
+            # 不存在的属性照常抛出 AttributeError
+            try:
+                module.missing_attribute
+                assert False, "不存在的属性应当抛出 AttributeError"
+            except AttributeError:
+                pass
+        finally:
+            _reset_registry()
+
+    print("\n✅ 测试通过！")
+
+
+if __name__ == "__main__":
+    test_template_index_refresh()
+    test_lazy_template_module()